@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'django_project.settings')
+# List and detail reads are served by async views, see ASYNC_READS.
+os.environ.setdefault('ASYNC_READS', 'true')
 
 application = get_asgi_application()
@@ -43,12 +43,15 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'rest_framework',
+    'rest_framework.authtoken',  # Tokens for TokenAuthentication
     'django_filters',
     'drf_yasg',  # Swagger
     'employee_management',
 ]
 
 MIDDLEWARE = [
+    'utils.query_budget.QueryBudgetMiddleware',  # Query counts and budgets, see QUERY_BUDGET
+    'utils.db_router.ReplicaRoutingMiddleware',  # Reads from replicas, see REPLICA_ROUTING
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -82,17 +85,64 @@ WSGI_APPLICATION = 'django_project.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# Connections come from a per-process pool (utils/pooled_postgresql), which
+# needs CONN_MAX_AGE = 0: connections go back to the pool when requests end.
+# DB_POOL=false opens one per request instead.
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'utils.pooled_postgresql' if os.environ.get('DB_POOL', 'true').lower() == 'true' else 'django.db.backends.postgresql',
         'NAME': os.environ.get('DB_NAME', 'employee_db'),
         'USER': os.environ.get('DB_USER', 'postgres'),
         'PASSWORD': os.environ.get('DB_PASSWORD', ''),
         'HOST': os.environ.get('DB_HOST', 'localhost'),
         'PORT': os.environ.get('DB_PORT', '5432'),
+        'CONN_MAX_AGE': 0,
+        'POOL': {
+            'MAX_SIZE': int(os.environ.get('DB_POOL_SIZE', 10)),  # Per process
+            'TIMEOUT': float(os.environ.get('DB_POOL_TIMEOUT', 30)),  # Seconds to wait for a free connection
+            'MAX_LIFETIME': 3600,
+            'MAX_IDLE': 600,
+            'CHECK_AFTER': 1,  # Idle seconds after which a connection is checked before reuse
+        },
     }
 }
 
+# Read replicas of the primary: DB_REPLICA_HOSTS=replica1.internal,replica2.internal
+# adds the aliases replica1, replica2 with the primary's other settings, and
+# DB_ANALYTICS_HOST an 'analytics' replica for exports and reports.  Tests
+# run them against the test database.
+for number, host in enumerate(filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(',')), 1):
+    DATABASES[f'replica{number}'] = {**DATABASES['default'], 'HOST': host.strip(), 'TEST': {'MIRROR': 'default'}}
+if os.environ.get('DB_ANALYTICS_HOST'):
+    DATABASES['analytics'] = {**DATABASES['default'], 'HOST': os.environ['DB_ANALYTICS_HOST'], 'TEST': {'MIRROR': 'default'}}
+
+DATABASE_ROUTERS = ['utils.db_router.ReplicaRouter']
+
+# See utils/db_router.py.  Pins must be seen by every process, so they are
+# kept in the 'shared' cache (a system check refuses a per-process one).
+REPLICA_ROUTING = {
+    'REPLICAS': [alias for alias in DATABASES if alias.startswith('replica')],
+    'ANALYTICS_REPLICA': 'analytics' if 'analytics' in DATABASES else None,
+    'STICKY_SECONDS': 10,  # Reads after a write go to the primary for this long
+    'MAX_LAG_SECONDS': 5,
+    'CHECK_INTERVAL': 5,
+    'CACHE': 'shared',
+}
+
+# DB_ENGINE=sqlite runs against a local SQLite file instead, e.g. to try out
+# generate_data without a PostgreSQL server.
+if os.environ.get('DB_ENGINE') == 'sqlite':
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+    }
+
+
+# ModelBackend with each user's permission set cached, see
+# employee_management/authentication.py.
+AUTHENTICATION_BACKENDS = [
+    'employee_management.authentication.CachedModelBackend',
+]
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -114,7 +164,7 @@ AUTH_PASSWORD_VALIDATORS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'employee_management.authentication.CachedTokenAuthentication',  # Token auth with the lookup cached
         'rest_framework.authentication.BasicAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -127,16 +177,119 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,  # Default page size
-    'DEFAULT_THROTTLE_CLASSES': [ #  Default throttling
-        'rest_framework.throttling.UserRateThrottle',
-        'rest_framework.throttling.AnonRateThrottle'
+    'DEFAULT_THROTTLE_CLASSES': [ #  Default throttling, counted across processes (THROTTLE_STORE)
+        'employee_management.throttling.SharedUserRateThrottle',
+        'employee_management.throttling.SharedAnonRateThrottle'
     ],
     'DEFAULT_THROTTLE_RATES': {
         'user': '100/day', # 100 requests per day for logged in users.
-        'anon': '10/day'  # 10 requests per day for anonymous users
+        'anon': '10/day',  # 10 requests per day for anonymous users
+        'bulk': '100/hour',  # Bulk create/upsert/delete calls, counted instead of 'user'
+        'export': '20/hour',  # CSV exports and background export jobs, counted instead of 'user'
+        'changes': '1000/hour',  # Change feed pages, counted instead of 'user'
     }
 }
 
+# Where the throttles count requests, see employee_management/throttling.py.
+# 'sqlite' shares the counters between the processes of one host through the
+# file at PATH; 'cache' keeps them in the Django cache CACHE, which must be a
+# cache server (Redis, Memcached) to be shared between hosts.
+THROTTLE_STORE = {
+    'BACKEND': os.environ.get('THROTTLE_STORE_BACKEND', 'sqlite'),
+    'PATH': os.environ.get('THROTTLE_STORE_PATH', BASE_DIR / 'throttle.sqlite3'),
+    'CACHE': 'default',
+}
+
+# Gives the tests a throttle store of their own, see utils/test_runner.py.
+TEST_RUNNER = 'utils.test_runner.TestRunner'
+
+# Per-request query budgets, see utils/query_budget.py.  Views declare budgets
+# per action in ``query_budgets``; DEFAULT applies to everything else.
+QUERY_BUDGET = {
+    'DEFAULT': None,  # No budget
+    'HEADERS': DEBUG,  # X-DB-Queries and X-DB-Time-Ms response headers
+    'RAISE': False,  # Log requests over budget instead of failing them
+}
+
+# 'shared' holds the few keys every worker process must see the same, such
+# as the response cache versions, the auth cache generation and the replica
+# router's read-your-writes pins.  By default it is a SQLite file shared by
+# the processes of one host (utils/sqlite_cache.py); with several hosts, set
+# SHARED_CACHE_BACKEND and SHARED_CACHE_LOCATION to a cache server, e.g.
+# django.core.cache.backends.redis.RedisCache and redis://cache:6379.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': os.environ.get('SHARED_CACHE_BACKEND', 'utils.sqlite_cache.SQLiteCache'),
+        'LOCATION': os.environ.get('SHARED_CACHE_LOCATION', str(BASE_DIR / 'shared_cache.sqlite3')),
+        'TIMEOUT': None,
+    },
+}
+
+# Cached list and detail responses with ETags, see
+# employee_management/response_cache.py.  Versions are kept in CACHE, which
+# must be shared by all processes (a system check refuses a per-process one).
+RESPONSE_CACHE = {
+    'ENABLED': True,
+    'CACHE': 'shared',  # Cache alias holding the per-model version counters
+    'MAX_BYTES': 32 * 1024 * 1024,  # Rendered responses kept per process
+}
+
+# In-process caches of token -> user and user -> permissions, see
+# employee_management/authentication.py.  Invalidations are announced through
+# CACHE, which must be shared by all processes for revocation to reach every
+# process immediately (a system check refuses a per-process one).
+AUTH_CACHE = {
+    'ENABLED': True,
+    'CACHE': 'shared',
+    'TTL': 300,  # Seconds a cached token or permission set is trusted
+    'MAX_ENTRIES': 10000,  # Per cache, per process
+}
+
+# Serve GET list and detail requests of the resource viewsets with async
+# views, see employee_management/async_views.py.  Only for ASGI: asgi.py
+# turns it on unless ASYNC_READS=false, while under WSGI each async view
+# would need its own event loop.
+ASYNC_READS = os.environ.get('ASYNC_READS', 'false').lower() == 'true'
+
+# Background CSV exports, see utils/export_jobs.py
+EXPORT_JOBS = {
+    'ROOT': BASE_DIR / 'exports',  # Where chunk files and finished exports are written
+    'MAX_WORKERS': int(os.environ.get('EXPORT_JOB_WORKERS', 2)),  # Size of the local process pool
+    'CHUNK_ROWS': 50000,  # Rows per compressed chunk file
+    'REUSE_SECONDS': 15 * 60,  # Identical exports requested within this window share one job
+}
+
+# Employee imports, see employee_management/employee_import.py
+IMPORT_JOBS = {
+    'ROOT': BASE_DIR / 'imports',  # Where uploads and the reports of rejected rows are written
+    'BATCH_SIZE': 5000,  # Rows validated with one email lookup and loaded in one transaction
+    'MAX_WORKERS': int(os.environ.get('IMPORT_JOB_WORKERS', 1)),  # Size of the local process pool
+}
+
+# Monthly partitions of the attendance table on PostgreSQL, see
+# employee_management/partitions.py and the attendance_partitions command.
+ATTENDANCE_PARTITIONS = {
+    'MONTHS_AHEAD': 3,  # Months past the current one to keep partitions for
+    'ARCHIVE_DIR': BASE_DIR / 'archive',  # Where archived partitions are written
+}
+
+# Change feed for incremental sync, see employee_management/change_feed.py
+CHANGE_FEED = {
+    'PAGE_SIZE': 1000,  # Changes per response unless ?limit= says otherwise
+    'MAX_PAGE_SIZE': 10000,
+    'TOMBSTONE_DAYS': 90,  # Deletes are reported for this long; older cursors must sync again from the start
+}
+
+# Nightly performance snapshots, see employee_management/performance_analytics.py
+# and the compute_performance_analytics command.
+PERFORMANCE_ANALYTICS = {
+    'WINDOW': 8,  # Latest reviews an employee's moving average and slope cover
+    'BATCH_SIZE': 100000,  # Reviews read and computed at a time
+}
+
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
 
@@ -159,13 +312,16 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Loggers hand records to the 'queue' handler, which returns at once; a
+# background thread formats them and writes them to 'console' and 'file'
+# (see utils/logging_pipeline.py).  django.request warnings (4xx responses)
+# are sampled; errors are always written.
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
     'formatters': {
-        'verbose': {
-            'format': '{levelname} {asctime} {module} {process:d} {thread:d} {message}',
-            'style': '{',
+        'json': {
+            '()': 'utils.logging_pipeline.JSONFormatter',
         },
         'simple': {
             'format': '{levelname} {message}',
@@ -174,7 +330,7 @@ LOGGING = {
     },
     'handlers': {
         'console': {
-            'level': 'DEBUG',
+            'level': 'DEBUG' if DEBUG else 'WARNING',
             'class': 'logging.StreamHandler',
             'formatter': 'simple',
         },
@@ -184,22 +340,32 @@ LOGGING = {
             'filename': 'logs/django.log',  # Create a logs directory
             'maxBytes': 1024 * 1024 * 5,  # 5 MB
             'backupCount': 5,
-            'formatter': 'verbose',
+            'formatter': 'json',
+        },
+        'queue': {
+            '()': 'utils.logging_pipeline.BackgroundQueueHandler',
+            'targets': ['console', 'file'],
+            'max_size': int(os.environ.get('LOG_QUEUE_SIZE', 10000)),
+            'sampling': {'django.request': float(os.environ.get('LOG_REQUEST_SAMPLE_RATE', 0.1))},
         },
     },
     'loggers': {
         'django': {
-            'handlers': ['console', 'file'],
+            'handlers': ['queue'],
             'level': 'INFO',
         },
         'django.request': {
-            'handlers': ['file'],
             'level': 'WARNING',  # Log HTTP 4xx and 5xx errors
             'propagate': True,
         },
+        'utils': {  # Shared helpers, e.g. query budget warnings
+            'handlers': ['queue'],
+            'level': 'INFO',
+            'propagate': True,
+        },
         'employee_management': {  #  App logger
-            'handlers': ['console', 'file'],
-            'level': 'DEBUG',  # Log within your app
+            'handlers': ['queue'],
+            'level': 'DEBUG' if DEBUG else 'INFO',  # Log within your app
             'propagate': True,
         },
     },
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class EmployeeManagementConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'employee_management'
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401  Registers the system checks, connects the signal handlers
@@ -0,0 +1,165 @@
+"""
+Async read handlers for the resource viewsets, for ASGI deployments.
+
+Under ASGI a sync view holds a worker thread for the whole request, so the
+number of requests in flight is bounded by the thread pool.
+``AsyncReadMixin`` serves ``GET``/``HEAD`` on the list and detail routes with
+coroutines instead: authentication (``aauthenticate``), throttling
+(``aallow_request``), the response cache, pagination
+(``apaginate_queryset``) and the queries themselves go through the async
+cache and ORM APIs, and the request only waits on them.  Everything else,
+writes and the other actions included, is handed to the viewset's ordinary
+sync view.  So are responses in other formats than JSON: the browsable API
+renders forms, which query the database.
+
+``async_read_urls()`` swaps the router's list and detail views for async ones
+when ``ASYNC_READS`` is set, which asgi.py does.  Under WSGI an async view
+runs in an event loop of its own, which only adds overhead.
+
+Building the filtered queryset is the one step run with ``sync_to_async``:
+filter backends validate their parameters synchronously, and a filter on a
+related model (``?employee=``) looks the row up.  Permission classes must
+answer without queries, which ``IsAuthenticated`` and
+``DjangoModelPermissions`` do for reads.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.http import Http404
+from rest_framework import exceptions
+from rest_framework.response import Response
+
+READ_ACTIONS = ('list', 'retrieve')
+
+
+class AsyncReadMixin:
+    """
+    Adds async ``alist`` and ``aretrieve`` handlers to a viewset, served by
+    the view ``as_async_read_view()`` returns.
+    """
+
+    @classmethod
+    def as_async_read_view(cls, sync_view):
+        """
+        Wraps the router's view for a list or detail route: ``GET`` and
+        ``HEAD`` JSON reads are handled by coroutines, everything else by
+        ``sync_view``.
+        """
+        actions, initkwargs = sync_view.actions, sync_view.initkwargs
+        action_map = {'head': actions['get'], **actions}
+        run_sync_view = sync_to_async(sync_view)
+
+        async def view(request, *args, **kwargs):
+            if action_map.get(request.method.lower()) in READ_ACTIONS:
+                self = cls(**initkwargs)
+                self.action_map = action_map
+                self.request, self.args, self.kwargs = request, args, kwargs
+                response = await self.async_dispatch(request, *args, **kwargs)
+                if response is not None:
+                    return response
+            return await run_sync_view(request, *args, **kwargs)
+
+        view.__name__, view.__doc__ = sync_view.__name__, sync_view.__doc__
+        view.cls, view.initkwargs, view.actions = cls, initkwargs, actions
+        view.csrf_exempt = True
+        return view
+
+    async def async_dispatch(self, request, *args, **kwargs):
+        """
+        APIView.dispatch() for reads.  Returns None for requests that are to
+        be served by the sync view.
+        """
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+        try:
+            self.format_kwarg = self.get_format_suffix(**kwargs)
+            request.accepted_renderer, request.accepted_media_type = self.perform_content_negotiation(request)
+            if request.accepted_renderer.format != 'json':
+                return None
+            request.version, request.versioning_scheme = self.determine_version(request, *args, **kwargs)
+            await self.aperform_authentication(request)
+            self.check_permissions(request)
+            await self.acheck_throttles(request)
+            handler = self.alist if self.action == 'list' else self.aretrieve
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def aperform_authentication(self, request):
+        """
+        Request._authenticate() with each authenticator's ``aauthenticate``,
+        or its ``authenticate`` in a thread.
+        """
+        for authenticator in request.authenticators:
+            authenticate = getattr(authenticator, 'aauthenticate', None) or sync_to_async(authenticator.authenticate)
+            try:
+                user_auth_tuple = await authenticate(request)
+            except exceptions.APIException:
+                request._not_authenticated()
+                raise
+            if user_auth_tuple is not None:
+                request._authenticator = authenticator
+                request.user, request.auth = user_auth_tuple
+                return
+        request._not_authenticated()
+
+    async def acheck_throttles(self, request):
+        durations = []
+        for throttle in self.get_throttles():
+            if hasattr(throttle, 'aallow_request'):
+                allowed = await throttle.aallow_request(request, self)
+            else:
+                allowed = throttle.allow_request(request, self)
+            if not allowed:
+                durations.append(throttle.wait())
+        if durations:
+            self.throttled(request, max((duration for duration in durations if duration is not None), default=None))
+
+    async def afilter_queryset(self):
+        return await sync_to_async(lambda: self.filter_queryset(self.get_queryset()))()
+
+    async def apaginate_queryset(self, queryset):
+        if self.paginator is None:
+            return None
+        if hasattr(self.paginator, 'apaginate_queryset'):
+            return await self.paginator.apaginate_queryset(queryset, self.request, view=self)
+        return await sync_to_async(self.paginator.paginate_queryset)(queryset, self.request, view=self)
+
+    async def aget_object(self):
+        queryset = await self.afilter_queryset()
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            instance = await queryset.aget(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except (queryset.model.DoesNotExist, TypeError, ValueError, DjangoValidationError):
+            raise Http404
+        self.check_object_permissions(self.request, instance)
+        return instance
+
+    async def alist(self, request, *args, **kwargs):
+        queryset = await self.afilter_queryset()
+        page = await self.apaginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer([row async for row in queryset], many=True).data)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        return Response(self.get_serializer(await self.aget_object()).data)
+
+
+def async_read_urls(urls):
+    """
+    Returns the router's ``urls`` with the views of AsyncReadMixin viewsets'
+    list and detail routes made async, if ``ASYNC_READS`` is set.
+    """
+    if not getattr(settings, 'ASYNC_READS', False):
+        return urls
+    for pattern in urls:
+        callback = getattr(pattern, 'callback', None)
+        cls = getattr(callback, 'cls', None)
+        if isinstance(cls, type) and issubclass(cls, AsyncReadMixin) and \
+                (getattr(callback, 'actions', None) or {}).get('get') in READ_ACTIONS:
+            pattern.callback = cls.as_async_read_view(callback)
+    return urls
@@ -0,0 +1,243 @@
+"""
+Hours-worked rollups per employee and per department, by day, week and month.
+
+Every Attendance write records the change it makes to the six rollup rows it
+falls into (three granularities for the employee and for their department);
+see signals.py.  The deltas are applied with one ``INSERT ... ON CONFLICT DO
+UPDATE`` per table that adds to the stored totals, in the writer's
+transaction.  Rows are written in key order so concurrent writers cannot
+deadlock.
+
+A shift's hours are ``clock_out - clock_in``; a clock_out earlier than the
+clock_in is an overnight shift and counts the hours up to midnight plus the
+hours after it.  Shifts are attributed to the day they started on.  A shift
+without a clock_out counts as an open shift with no hours until it is closed.
+
+Department rows add up the rollups of the department's current employees,
+as ``rebuild()`` computes them: an employee who changes department takes
+their history along (``move_employee()``), and one who is deleted takes it
+away.
+"""
+import calendar
+from datetime import timedelta
+
+from django.db import connections, router, transaction
+
+from .deltas import DeltaBuffer
+from .models import Attendance, DepartmentHoursRollup, EmployeeHoursRollup, HoursRollup
+
+GRANULARITIES = (HoursRollup.GRANULARITY_DAY, HoursRollup.GRANULARITY_WEEK, HoursRollup.GRANULARITY_MONTH)
+SECONDS_PER_DAY = 24 * 60 * 60
+BATCH_SIZE = 2000
+
+EMPLOYEE = 'employee'
+DEPARTMENT = 'department'
+
+
+def period_start(day, granularity):
+    if granularity == HoursRollup.GRANULARITY_WEEK:
+        return day - timedelta(days=day.weekday())
+    if granularity == HoursRollup.GRANULARITY_MONTH:
+        return day.replace(day=1)
+    return day
+
+
+def period_end(day, granularity):
+    if granularity == HoursRollup.GRANULARITY_WEEK:
+        return period_start(day, granularity) + timedelta(days=6)
+    if granularity == HoursRollup.GRANULARITY_MONTH:
+        return day.replace(day=calendar.monthrange(day.year, day.month)[1])
+    return day
+
+
+def _seconds_of_day(value):
+    return value.hour * 3600 + value.minute * 60 + value.second
+
+
+def shift_seconds(clock_in, clock_out):
+    """
+    Returns the length of a shift in whole seconds, or None if it is open.
+    """
+    if clock_out is None:
+        return None
+    seconds = _seconds_of_day(clock_out) - _seconds_of_day(clock_in)
+    if seconds < 0:  # Overnight shift
+        seconds += SECONDS_PER_DAY
+    return seconds
+
+
+def contributions(employee_id, department_id, day, clock_in, clock_out, sign=1):
+    """
+    Yields the (key, values) pairs an attendance row adds to the rollups.
+    Keys are (scope, owner, granularity, period_start) and values are
+    (seconds_worked, shifts, open_shifts).
+    """
+    fields = Attendance._meta
+    day = fields.get_field('date').to_python(day)
+    clock_in = fields.get_field('clock_in').to_python(clock_in)
+    clock_out = fields.get_field('clock_out').to_python(clock_out)
+    seconds = shift_seconds(clock_in, clock_out)
+    values = (sign * (seconds or 0), sign, sign if seconds is None else 0)
+    for granularity in GRANULARITIES:
+        start = period_start(day, granularity)
+        yield (EMPLOYEE, employee_id, granularity, start), values
+        if department_id:
+            yield (DEPARTMENT, department_id, granularity, start), values
+
+
+def record(employee_id, department_id, day, clock_in, clock_out, sign=1):
+    """
+    Records an attendance row being added (sign=1) or removed (sign=-1).
+    """
+    for key, values in contributions(employee_id, department_id, day, clock_in, clock_out, sign):
+        _buffer.add(key, values)
+
+
+def record_rollup(scope, owner, granularity, start, values):
+    """
+    Records a change to a single rollup row.
+    """
+    _buffer.add((scope, owner, granularity, start), values)
+
+
+def move_employee(employee_id, from_department, to_department):
+    """
+    Records an employee's rollups moving from one department's rollups to
+    another's, or only leaving ``from_department`` when ``to_department`` is
+    None.
+    """
+    rollups = EmployeeHoursRollup.objects.filter(employee_id=employee_id).values_list(
+        'granularity', 'period_start', 'seconds_worked', 'shifts', 'open_shifts',
+    )
+    for granularity, start, *values in rollups:
+        record_rollup(DEPARTMENT, from_department, granularity, start, tuple(-value for value in values))
+        if to_department is not None:
+            record_rollup(DEPARTMENT, to_department, granularity, start, tuple(values))
+
+
+def _increment(model, owner_column, rows):
+    """
+    Adds ``rows`` of ((owner, granularity, period_start), values) to the
+    model's table, inserting rows that do not exist yet.
+    """
+    if not rows:
+        return
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    totals = ['seconds_worked', 'shifts', 'open_shifts']
+    columns = ', '.join(quote(name) for name in [owner_column, 'granularity', 'period_start'] + totals)
+    updates = ', '.join(f'{quote(name)} = {table}.{quote(name)} + EXCLUDED.{quote(name)}' for name in totals)
+    with connection.cursor() as cursor:
+        for i in range(0, len(rows), BATCH_SIZE):
+            batch = rows[i:i + BATCH_SIZE]
+            params = []
+            for (owner, granularity, start), values in batch:
+                params.extend([owner, granularity, connection.ops.adapt_datefield_value(start), *values])
+            placeholders = ', '.join(['(%s, %s, %s, %s, %s, %s)'] * len(batch))
+            cursor.execute(
+                f'INSERT INTO {table} ({columns}) VALUES {placeholders} '
+                f'ON CONFLICT ({quote(owner_column)}, {quote("granularity")}, {quote("period_start")}) '
+                f'DO UPDATE SET {updates}',
+                params,
+            )
+
+
+def apply_deltas(deltas):
+    """
+    Applies ``{(scope, owner, granularity, period_start): values}``.
+    """
+    employee_rows = sorted((key[1:], values) for key, values in deltas.items() if key[0] == EMPLOYEE)
+    department_rows = sorted((key[1:], values) for key, values in deltas.items() if key[0] == DEPARTMENT)
+    with transaction.atomic():
+        _increment(EmployeeHoursRollup, 'employee_id', employee_rows)
+        _increment(DepartmentHoursRollup, 'department_id', department_rows)
+
+
+_buffer = DeltaBuffer(apply_deltas)
+deferred = _buffer.deferred
+suspended = _buffer.suspended
+is_suspended = _buffer.is_suspended
+
+
+def rebuild(start=None, end=None):
+    """
+    Recomputes the rollups from the attendance table in one ordered scan.
+
+    With ``start``/``end`` only the periods overlapping that date range are
+    replaced; the scan is widened to cover those periods completely.  Large
+    backfills can be run in slices this way.
+
+    Returns:
+        The number of attendance rows scanned.
+    """
+    ranges = {
+        granularity: (
+            period_start(start, granularity) if start else None,
+            period_end(end, granularity) if end else None,
+        )
+        for granularity in GRANULARITIES
+    }
+
+    def in_range(granularity, day):
+        low, high = ranges[granularity]
+        return (low is None or day >= low) and (high is None or day <= high)
+
+    attendance = Attendance.objects.order_by('employee_id', 'date')
+    if start:
+        attendance = attendance.filter(date__gte=min(low for low, _ in ranges.values()))
+    if end:
+        attendance = attendance.filter(date__lte=max(high for _, high in ranges.values()))
+    rows = attendance.values_list('employee_id', 'employee__department_id', 'date', 'clock_in', 'clock_out')
+
+    scanned = 0
+    department_totals = {}
+    employee_totals = {}
+    pending = []
+    current_employee = None
+
+    def flush_employee():
+        for (_, employee_id, granularity, start_day), values in employee_totals.items():
+            pending.append(EmployeeHoursRollup(
+                employee_id=employee_id, granularity=granularity, period_start=start_day,
+                seconds_worked=values[0], shifts=values[1], open_shifts=values[2],
+            ))
+        employee_totals.clear()
+        if len(pending) >= BATCH_SIZE:
+            EmployeeHoursRollup.objects.bulk_create(pending, batch_size=BATCH_SIZE)
+            pending.clear()
+
+    with transaction.atomic():
+        for granularity, (low, high) in ranges.items():
+            for model in (EmployeeHoursRollup, DepartmentHoursRollup):
+                stale = model.objects.filter(granularity=granularity)
+                if low:
+                    stale = stale.filter(period_start__gte=low)
+                if high:
+                    stale = stale.filter(period_start__lte=high)
+                stale.delete()
+
+        for employee_id, department_id, day, clock_in, clock_out in rows.iterator(chunk_size=BATCH_SIZE):
+            scanned += 1
+            if employee_id != current_employee:
+                flush_employee()
+                current_employee = employee_id
+            for key, values in contributions(employee_id, department_id, day, clock_in, clock_out):
+                if not in_range(key[2], key[3]):
+                    continue
+                totals = employee_totals if key[0] == EMPLOYEE else department_totals
+                current = totals.get(key, (0, 0, 0))
+                totals[key] = tuple(a + b for a, b in zip(current, values))
+        flush_employee()
+        EmployeeHoursRollup.objects.bulk_create(pending, batch_size=BATCH_SIZE)
+        DepartmentHoursRollup.objects.bulk_create(
+            [
+                DepartmentHoursRollup(
+                    department_id=department_id, granularity=granularity, period_start=start_day,
+                    seconds_worked=values[0], shifts=values[1], open_shifts=values[2],
+                )
+                for (_, department_id, granularity, start_day), values in sorted(department_totals.items())
+            ],
+            batch_size=BATCH_SIZE,
+        )
+    return scanned
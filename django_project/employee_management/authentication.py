@@ -0,0 +1,195 @@
+"""
+Token authentication and model permissions cached in process.
+
+``CachedTokenAuthentication`` remembers token key -> (user, token) and
+``CachedModelBackend`` remembers user -> permission set, each in an LRU of
+``AUTH_CACHE['MAX_ENTRIES']`` entries that expire after ``AUTH_CACHE['TTL']``
+seconds.  A cache hit saves the token+user query, and the user and group
+permission queries of ``DjangoModelPermissions`` checks.
+
+The handlers in signals.py call ``invalidate()`` when a token or user is
+deleted, a user is saved (other than a ``last_login`` update), or group
+memberships or permissions change.  It clears this process's caches and
+increments a generation counter in the Django cache ``AUTH_CACHE['CACHE']``;
+every lookup compares the counter with the one its caches were filled
+under, so other processes drop their caches on their next request.  The
+counter is kept in the ``'shared'`` cache, which all processes see (a
+SQLite file on one host, or a cache server; checks.py refuses a
+per-process cache), so revocation takes effect immediately everywhere, at
+the cost of one cache read per request.  The counter starts from the
+clock, so one that was evicted or cleared never comes back at a value
+some process filled its caches under.
+
+``CachedTokenAuthentication.aauthenticate`` is the same lookup for the async
+read views (async_views.py), using the async cache and ORM APIs.
+"""
+import copy
+import time
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication, get_authorization_header
+
+from utils.lru import LRUCache
+
+AUTH_CACHE_DEFAULTS = {
+    'ENABLED': True,
+    'CACHE': 'shared',
+    'TTL': 300,
+    'MAX_ENTRIES': 10000,
+}
+
+GENERATION_KEY = 'auth-cache:generation'
+
+
+def get_auth_cache_settings():
+    return {**AUTH_CACHE_DEFAULTS, **getattr(settings, 'AUTH_CACHE', {})}
+
+
+class AuthCache:
+    """
+    The process's token and permission caches, and the generation they were
+    filled under.
+    """
+
+    def __init__(self):
+        self.tokens = LRUCache(AUTH_CACHE_DEFAULTS['MAX_ENTRIES'], ttl=AUTH_CACHE_DEFAULTS['TTL'])
+        self.permissions = LRUCache(AUTH_CACHE_DEFAULTS['MAX_ENTRIES'], ttl=AUTH_CACHE_DEFAULTS['TTL'])
+        self.generation = None
+
+    def sync(self):
+        """
+        Returns whether the caches can be used, after clearing them if any
+        process has invalidated them since they were filled.
+        """
+        options = get_auth_cache_settings()
+        if not options['ENABLED']:
+            return False
+        for lru in (self.tokens, self.permissions):
+            lru.max_size, lru.ttl = options['MAX_ENTRIES'], options['TTL']
+        shared = caches[options['CACHE']]
+        generation = shared.get(GENERATION_KEY)
+        if generation is None:
+            shared.add(GENERATION_KEY, time.time_ns(), timeout=None)
+            generation = shared.get(GENERATION_KEY)
+            if generation is None:  # The cache does not store anything (DummyCache)
+                return False
+        if generation != self.generation:
+            self.clear()
+            self.generation = generation
+        return True
+
+    async def async_sync(self):
+        """
+        ``sync()`` for async code.
+        """
+        options = get_auth_cache_settings()
+        if not options['ENABLED']:
+            return False
+        for lru in (self.tokens, self.permissions):
+            lru.max_size, lru.ttl = options['MAX_ENTRIES'], options['TTL']
+        shared = caches[options['CACHE']]
+        generation = await shared.aget(GENERATION_KEY)
+        if generation is None:
+            await shared.aadd(GENERATION_KEY, time.time_ns(), timeout=None)
+            generation = await shared.aget(GENERATION_KEY)
+            if generation is None:
+                return False
+        if generation != self.generation:
+            self.clear()
+            self.generation = generation
+        return True
+
+    def clear(self):
+        self.tokens.clear()
+        self.permissions.clear()
+
+
+auth_cache = AuthCache()
+
+
+def _invalidate_everywhere():
+    auth_cache.clear()
+    shared = caches[get_auth_cache_settings()['CACHE']]
+    try:
+        shared.incr(GENERATION_KEY)
+    except ValueError:  # Not set, or evicted
+        shared.add(GENERATION_KEY, time.time_ns(), timeout=None)
+
+
+def invalidate():
+    """
+    Drops every cached token and permission set, in all processes.  Inside a
+    transaction this is repeated when it commits, so a lookup that read the
+    old rows in the meantime is not kept.
+    """
+    _invalidate_everywhere()
+    if connection.in_atomic_block:
+        transaction.on_commit(_invalidate_everywhere)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication with the token lookup cached.  Each request gets its
+    own copy of the cached user.
+    """
+
+    def authenticate_credentials(self, key):
+        if not auth_cache.sync():
+            return super().authenticate_credentials(key)
+        cached = auth_cache.tokens.get(key)
+        if cached is None:
+            cached = super().authenticate_credentials(key)  # Raises for invalid tokens, which are not cached
+            auth_cache.tokens.set(key, cached)
+        user, token = cached
+        return copy.copy(user), token
+
+    async def aauthenticate(self, request):
+        """
+        ``authenticate()`` for the async read views.
+        """
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            return self.authenticate(request)  # Raises the invalid header error
+        try:
+            key = auth[1].decode()
+        except UnicodeError:
+            return self.authenticate(request)
+        use_cache = await auth_cache.async_sync()
+        cached = auth_cache.tokens.get(key) if use_cache else None
+        if cached is None:
+            model = self.get_model()
+            try:
+                token = await model.objects.select_related('user').aget(key=key)
+            except model.DoesNotExist:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            if not token.user.is_active:
+                raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+            cached = (token.user, token)
+            if use_cache:
+                auth_cache.tokens.set(key, cached)
+        user, token = cached
+        return copy.copy(user), token
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend with each user's permission set cached.
+    """
+
+    def get_all_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        if not hasattr(user_obj, '_perm_cache') and auth_cache.sync():
+            permissions = auth_cache.permissions.get(user_obj.pk)
+            if permissions is None:
+                permissions = frozenset(super().get_all_permissions(user_obj))
+                auth_cache.permissions.set(user_obj.pk, permissions)
+            user_obj._perm_cache = permissions
+        return super().get_all_permissions(user_obj)
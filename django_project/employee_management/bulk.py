@@ -0,0 +1,282 @@
+"""
+Bulk create, upsert and delete endpoints for the resource viewsets.
+
+``POST <resource>/bulk/`` creates, ``PUT <resource>/bulk/`` upserts and
+``DELETE <resource>/bulk/`` deletes, each taking a JSON array (records, or
+ids for delete) of up to ``bulk_max_rows`` entries.  A bulk call is one
+request, so it counts as one throttle hit, against the ``bulk`` rate rather
+than the user's.
+
+Rows are validated and written in batches of ``bulk_batch_size``:
+
+* related primary keys are resolved with one ``in_bulk`` query per field per
+  batch (see ``PrefetchedPrimaryKeyRelatedField``);
+* the unique key (``bulk_unique_fields``) is checked with one query per batch
+  instead of a ``UniqueValidator`` query per row;
+* rows are written with ``bulk_create``, using ``ON CONFLICT (key) DO UPDATE``
+  for upserts.
+
+Invalid rows are reported by index and skipped; the valid rows are written in
+one transaction.  ``bulk_create`` does not send ``pre_save`` or ``post_save``:
+rows are numbered for the change feed here, a batch at a time, and
+``post_save`` is sent for every written row with the department stats and
+attendance rollups deferred, which sums their deltas and applies them once
+at the end.
+"""
+from contextlib import contextmanager
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import router, transaction
+from django.db.models.signals import post_save
+from rest_framework import serializers, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.response import Response
+from rest_framework.validators import UniqueTogetherValidator, UniqueValidator
+
+from . import attendance_rollups, change_feed, department_stats, response_cache
+
+
+class PrefetchedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField that looks the related object up in
+    ``context['prefetched'][field_name]`` when the bulk endpoints have loaded
+    it in advance, and queries for it as usual otherwise.
+    """
+
+    def to_internal_value(self, data):
+        prefetched = self.context.get('prefetched', {}).get(self.field_name)
+        if prefetched is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        pk = prefetch_key(self, data)
+        if pk is None:
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return prefetched[pk]
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+
+    def prefetch(self, values):
+        keys = {prefetch_key(self, value) for value in values} - {None}
+        return self.get_queryset().in_bulk(keys)
+
+
+def prefetch_key(field, value):
+    try:
+        return field.get_queryset().model._meta.pk.to_python(value)
+    except (TypeError, ValueError, DjangoValidationError):
+        return None
+
+
+def without_unique_validators(serializer, fields):
+    """
+    Drops ``serializer``'s validators for the unique key ``fields``, which
+    are a query per row; callers check the key once per batch instead.
+    """
+    key = set(fields or ())
+    serializer.validators = [
+        validator for validator in serializer.validators
+        if not (isinstance(validator, UniqueTogetherValidator) and set(validator.fields) == key)
+    ]
+    if len(key) == 1:
+        field = serializer.fields.get(next(iter(key)))
+        if field is not None:
+            field.validators = [v for v in field.validators if not isinstance(v, UniqueValidator)]
+    return serializer
+
+
+@contextmanager
+def deferred_aggregates():
+    """
+    Defers change feed tombstones, department stats and attendance rollup
+    maintenance, and response cache invalidation, for a block.
+    """
+    with change_feed.deferred(), response_cache.deferred(), department_stats.deferred(), \
+            attendance_rollups.deferred():
+        yield
+
+
+class BulkMixin:
+    """
+    Adds the ``bulk`` action to a ModelViewSet.
+
+    ``bulk_unique_fields`` names the model's unique key.  It is checked for
+    conflicts on create and is the ``ON CONFLICT`` target for upserts; views
+    without one do not support upserts.
+    """
+    bulk_max_rows = 10000
+    bulk_batch_size = 1000
+    bulk_unique_fields = None
+    throttle_scope = None  # Set to 'bulk' for the bulk action
+
+    @action(detail=False, methods=['post', 'put', 'delete'], throttle_scope='bulk')
+    def bulk(self, request, *args, **kwargs):
+        """
+        Endpoint to create (POST), upsert (PUT) or delete (DELETE) many rows.
+        """
+        rows = request.data
+        if not isinstance(rows, list):
+            raise ValidationError({'detail': 'Expected a list.'})
+        if len(rows) > self.bulk_max_rows:
+            raise ValidationError({'detail': f'At most {self.bulk_max_rows} rows per request.'})
+
+        if request.method == 'DELETE':
+            results, errors = self.bulk_delete(rows)
+            success = status.HTTP_200_OK
+        elif request.method == 'PUT':
+            if not self.bulk_unique_fields:
+                raise ValidationError({'detail': 'Upsert is not supported for this resource.'})
+            self.check_bulk_permission('add')
+            results, errors = self.bulk_save(rows, upsert=True)
+            success = status.HTTP_200_OK
+        else:
+            results, errors = self.bulk_save(rows, upsert=False)
+            success = status.HTTP_201_CREATED
+        return Response(
+            {'count': len(results), 'results': results, 'errors': errors},
+            status=status.HTTP_400_BAD_REQUEST if errors and not results else success,
+        )
+
+    def check_bulk_permission(self, action_name):
+        opts = self.get_queryset().model._meta
+        if not self.request.user.has_perm(f'{opts.app_label}.{action_name}_{opts.model_name}'):
+            raise PermissionDenied()
+
+    def get_bulk_serializer(self, context):
+        """
+        Returns one serializer that validates every row.  Validators for the
+        unique key are dropped; the key is checked per batch instead.
+        """
+        return without_unique_validators(self.get_serializer_class()(context=context), self.bulk_unique_fields)
+
+    def unique_key(self, instance):
+        opts = instance._meta
+        return tuple(getattr(instance, opts.get_field(name).attname) for name in self.bulk_unique_fields)
+
+    def fetch_by_key(self, model, keys):
+        """
+        Returns ``{key: instance}`` for the stored rows matching ``keys``.
+        """
+        if not keys:
+            return {}
+        opts = model._meta
+        lookups = {
+            f'{opts.get_field(name).attname}__in': {key[i] for key in keys}
+            for i, name in enumerate(self.bulk_unique_fields)
+        }
+        return {
+            key: instance
+            for instance in model._default_manager.filter(**lookups)
+            for key in [self.unique_key(instance)] if key in keys
+        }
+
+    def before_bulk_write(self, instances):
+        """
+        Called with each batch of valid instances, in the transaction that
+        writes them, before they are written.
+        """
+
+    def bulk_save(self, rows, upsert):
+        model = self.get_queryset().model
+        context = self.get_serializer_context()
+        context['prefetched'] = {}
+        serializer = self.get_bulk_serializer(context)
+        related = [
+            field for field in serializer.fields.values()
+            if isinstance(field, PrefetchedPrimaryKeyRelatedField) and not field.read_only
+        ]
+        update_fields = [
+            field.name for field in model._meta.concrete_fields
+            if not field.primary_key and field.name not in (self.bulk_unique_fields or ())
+        ]
+        using = router.db_for_write(model)
+        results, errors, seen = [], [], {}
+
+        with transaction.atomic(), deferred_aggregates():
+            for offset in range(0, len(rows), self.bulk_batch_size):
+                batch = rows[offset:offset + self.bulk_batch_size]
+                for field in related:
+                    context['prefetched'][field.field_name] = field.prefetch(
+                        row.get(field.field_name) for row in batch if isinstance(row, dict)
+                    )
+
+                valid = []
+                for index, row in enumerate(batch, offset):
+                    try:
+                        instance = model(**serializer.run_validation(row))
+                    except ValidationError as exc:
+                        errors.append({'index': index, 'errors': exc.detail})
+                        continue
+                    if self.bulk_unique_fields:
+                        key = self.unique_key(instance)
+                        if key in seen:
+                            errors.append({'index': index, 'errors': {'detail': f'Duplicates row {seen[key]}.'}})
+                            continue
+                        seen[key] = index
+                    valid.append((index, instance))
+
+                existing = {}
+                if self.bulk_unique_fields:
+                    existing = self.fetch_by_key(model, {self.unique_key(instance) for _, instance in valid})
+                if existing and not upsert:
+                    fields = ', '.join(self.bulk_unique_fields)
+                    for index, instance in valid:
+                        if self.unique_key(instance) in existing:
+                            errors.append({'index': index, 'errors': {'detail': f'A row with this {fields} already exists.'}})
+                    valid = [(index, instance) for index, instance in valid if self.unique_key(instance) not in existing]
+                if not valid:
+                    continue
+
+                instances = [instance for _, instance in valid]
+                self.before_bulk_write(instances)
+                change_feed.assign(instances)
+                if upsert:
+                    model._default_manager.bulk_create(
+                        instances, update_conflicts=True,
+                        unique_fields=self.bulk_unique_fields, update_fields=update_fields,
+                    )
+                    created = {key: row.pk for key, row in self.fetch_by_key(
+                        model, {self.unique_key(instance) for instance in instances if self.unique_key(instance) not in existing}
+                    ).items()}
+                else:
+                    model._default_manager.bulk_create(instances)
+
+                for index, instance in valid:
+                    previous = existing.get(self.unique_key(instance)) if upsert else None
+                    if previous is not None:
+                        instance.pk = previous.pk
+                        instance._loaded_values = getattr(previous, '_loaded_values', {})
+                    elif upsert:
+                        instance.pk = created[self.unique_key(instance)]
+                    instance._state.adding, instance._state.db = False, using
+                    post_save.send(sender=model, instance=instance, created=previous is None,
+                                   update_fields=None, raw=False, using=using)
+                    results.append({'index': index, 'id': instance.pk, 'created': previous is None})
+        errors.sort(key=lambda error: error['index'])
+        return results, errors
+
+    def bulk_delete(self, ids):
+        model = self.get_queryset().model
+        pk_field = model._meta.pk
+        keys, errors = {}, []
+        for index, value in enumerate(ids):
+            try:
+                keys[pk_field.to_python(value)] = index
+            except (TypeError, ValueError, DjangoValidationError):
+                errors.append({'index': index, 'errors': {'detail': f'Invalid id {value!r}.'}})
+
+        results, pks = [], list(keys)
+        with transaction.atomic(), deferred_aggregates():
+            for offset in range(0, len(pks), self.bulk_batch_size):
+                batch = pks[offset:offset + self.bulk_batch_size]
+                found = set(self.get_queryset().filter(pk__in=batch).values_list('pk', flat=True))
+                self.get_queryset().filter(pk__in=found).delete()
+                for pk in batch:
+                    if pk in found:
+                        results.append({'index': keys[pk], 'id': pk})
+                    else:
+                        errors.append({'index': keys[pk], 'errors': {'detail': 'Not found.'}})
+        errors.sort(key=lambda error: error['index'])
+        return results, errors
@@ -0,0 +1,331 @@
+"""
+Change feed for incremental sync of employees, performance records and
+attendance.
+
+Every write to those tables gives the row the next number of one sequence
+shared by the three (``change_seq``), and every delete records a
+``Tombstone`` with a number of its own.  ``GET <resource>/changes/`` returns
+the rows and tombstones numbered after the client's cursor, in sequence
+order, at most ``?limit=`` at a time, with the cursor to pass as ``?since=``
+next time.  A client that starts without a cursor gets every row, then only
+what changed, so a nightly sync reads the changes rather than the table.
+Each row appears once, as it is now, however often it changed.
+
+Numbers are handed out by ``allocate()`` right before the rows are written:
+saves in ``pre_save`` and deletes in ``pre_delete`` (see signals.py), inside
+the transaction the models' ``save()`` and ``delete()`` open, and bulk
+writes just before their INSERT.  In ``deferred()``, as the bulk endpoints
+use, tombstones are numbered and written together at the end of the block.
+``allocate()`` refuses to run outside a transaction, because the feed must
+know which numbers belong to writes that have not committed yet:
+
+* on PostgreSQL numbers come from the ``employee_management_change_seq``
+  sequence, which takes no lock, so writers do not wait for each other.
+  Before its first number, a transaction takes a shared advisory lock whose
+  key is the sequence value at that moment (its watermark), held until it
+  ends.  ``feed_bounds()`` reads the sequence, then the lowest watermark
+  still locked: every number below that belongs to a transaction that has
+  ended, so it is safe to serve;
+* elsewhere (SQLite, which runs one writer at a time anyway) numbers come
+  from the ``ChangeCounter`` row, whose lock the writer holds until it
+  commits, and its committed value is the safe point.
+
+Either way a reader that only serves numbers up to the safe point never
+skips a change that commits later with a lower number.  The feed reads from
+the primary, where the safe point is known.
+
+Rows written without the ORM must be numbered by the code writing them: the
+employee import (``assign()``) and ``generate_data`` (``reset()``, which
+also makes earlier cursors expire).  Partitions archived by
+``attendance_partitions archive`` leave no tombstones: archived attendance
+is not deleted, and ``restore`` brings it back as it was.  Archives written
+before the ``change_seq`` column was added cannot be restored as they are.
+
+Tombstones older than ``CHANGE_FEED['TOMBSTONE_DAYS']`` are removed by
+``python manage.py prune_tombstones``; a cursor older than the last pruned
+tombstone gets ``410 Gone``, and the client syncs again from the start.
+"""
+import base64
+import binascii
+import json
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.transaction import TransactionManagementError
+from django.db.models import F, Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.pagination import _positive_int
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from .models import ChangeCounter, Tombstone
+
+CHANGE_FEED_DEFAULTS = {
+    'PAGE_SIZE': 1000,
+    'MAX_PAGE_SIZE': 10000,
+    'TOMBSTONE_DAYS': 90,
+}
+
+COUNTER_ID = 1
+SEQUENCE = 'employee_management_change_seq'  # PostgreSQL, created by migration 0015
+WATERMARK_KEY = 1 << 62  # Advisory lock keys from here on are watermarks
+UPSERT, DELETE = 'upsert', 'delete'
+
+
+def get_change_feed_settings():
+    return {**CHANGE_FEED_DEFAULTS, **getattr(settings, 'CHANGE_FEED', {})}
+
+
+class CursorExpired(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = 'Deletes since this cursor are no longer recorded; sync again without since.'
+    default_code = 'cursor_expired'
+
+
+def allocate():
+    """
+    Returns a new sequence number.  See ``allocate_many()``.
+    """
+    return allocate_many(1)[0]
+
+
+def allocate_many(count):
+    """
+    Returns ``count`` new sequence numbers, in increasing order.  They must
+    be allocated in the transaction that writes the numbered rows, so the
+    feed holds them back until it ends.
+    """
+    using = router.db_for_write(ChangeCounter)
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        raise TransactionManagementError('Change sequence numbers must be allocated in the transaction of the write.')
+    if connection.vendor == 'postgresql':
+        return _allocate_from_sequence(connection, count)
+    rows = ChangeCounter.objects.using(using).filter(pk=COUNTER_ID)
+    if not rows.update(value=F('value') + count):
+        ChangeCounter.objects.using(using).bulk_create([ChangeCounter(pk=COUNTER_ID)], ignore_conflicts=True)
+        rows.update(value=F('value') + count)
+    last = rows.values_list('value', flat=True).get()
+    return list(range(last - count + 1, last + 1))
+
+
+def _allocate_from_sequence(connection, count):
+    with connection.cursor() as cursor:
+        if _holds_watermark(connection):
+            cursor.execute(f"SELECT nextval('{SEQUENCE}') FROM generate_series(1, %s)", [count])
+        else:
+            # The lock is taken before the first nextval(), so any number
+            # this transaction gets is above its watermark.
+            cursor.execute(
+                'WITH watermark AS MATERIALIZED ('
+                f' SELECT pg_advisory_xact_lock_shared(%s + last_value) FROM {SEQUENCE}'
+                f") SELECT nextval('{SEQUENCE}') FROM watermark, generate_series(1, %s)",
+                [WATERMARK_KEY, count],
+            )
+            _hold_watermark(connection)
+        return sorted(number for number, in cursor.fetchall())
+
+
+def _holds_watermark(connection):
+    # The marker is the first commit hook of the transaction that took the
+    # lock; Django drops the hooks when the transaction (or the savepoint the
+    # lock was taken in, which releases it) ends.
+    marker = getattr(connection, 'change_feed_watermark', None)
+    return marker is not None and any(func is marker for _, func, _ in connection.run_on_commit)
+
+
+def _hold_watermark(connection):
+    def marker():
+        pass
+
+    connection.on_commit(marker)
+    connection.change_feed_watermark = marker
+
+
+def feed_bounds(using):
+    """
+    Returns ``(highest, pruned_through)``: the highest sequence number up to
+    which every number handed out belongs to a transaction that has ended,
+    and the counter's ``pruned_through``.
+    """
+    counter = ChangeCounter.objects.using(using).filter(pk=COUNTER_ID)
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return counter.values_list('value', 'pruned_through').first() or (0, 0)
+    pruned_through = counter.values_list('pruned_through', flat=True).first() or 0
+    with connection.cursor() as cursor:
+        # The sequence first: a number it had handed out by then was
+        # allocated after its writer took its watermark lock.
+        cursor.execute(f'SELECT CASE WHEN is_called THEN last_value ELSE last_value - 1 END FROM {SEQUENCE}')
+        highest, = cursor.fetchone()
+        cursor.execute(
+            "SELECT min(key) - %s FROM ("
+            " SELECT (classid::bigint << 32) | objid::bigint AS key FROM pg_locks"
+            " WHERE locktype = 'advisory' AND objsubid = 1"
+            ") AS locks WHERE key >= %s",
+            [WATERMARK_KEY, WATERMARK_KEY],
+        )
+        watermark, = cursor.fetchone()
+    return highest if watermark is None else min(highest, watermark - 1), pruned_through
+
+
+def assign(instances):
+    """
+    Numbers instances about to be written without ``save()``.
+    """
+    for instance, number in zip(instances, allocate_many(len(instances))):
+        instance.change_seq = number
+
+
+_local = threading.local()
+
+
+def is_deferred():
+    return getattr(_local, 'pending', None) is not None
+
+
+@contextmanager
+def deferred():
+    """
+    Numbers and writes the tombstones of a block's deletes together when it
+    exits, in the block's transaction.
+    """
+    if is_deferred():
+        yield
+        return
+    _local.pending = []
+    try:
+        with transaction.atomic():
+            yield
+            pending, _local.pending = _local.pending, None
+            if pending:
+                assign(pending)
+                Tombstone.objects.bulk_create(pending)
+    finally:
+        _local.pending = None
+
+
+def prepare_delete(instance):
+    """
+    Numbers the tombstone of an instance about to be deleted.
+    """
+    if not is_deferred():
+        instance._change_seq = allocate()
+
+
+def record_delete(instance):
+    tombstone = Tombstone(resource=instance._meta.model_name, object_id=instance.pk, deleted_at=timezone.now())
+    if is_deferred():
+        _local.pending.append(tombstone)
+    else:
+        tombstone.change_seq = instance._change_seq
+        tombstone.save()
+
+
+def reset():
+    """
+    Drops the tombstones and makes every cursor expire, for tables that were
+    emptied and reloaded.  Returns the sequence number to give the reloaded
+    rows.
+    """
+    with transaction.atomic():
+        seq = allocate()
+        Tombstone.objects.all().delete()
+        ChangeCounter.objects.filter(pk=COUNTER_ID).update(pruned_through=seq)
+    return seq
+
+
+def prune(before):
+    """
+    Removes the tombstones of deletes before ``before`` (a datetime).
+    Returns how many were removed.
+    """
+    with transaction.atomic():
+        tombstones = Tombstone.objects.filter(deleted_at__lt=before)
+        last = tombstones.order_by('-change_seq').values_list('change_seq', flat=True).first()
+        if last is None:
+            return 0
+        count, _ = tombstones.delete()
+        ChangeCounter.objects.filter(pk=COUNTER_ID, pruned_through__lt=last).update(pruned_through=last)
+    return count
+
+
+def encode_cursor(seq, pk):
+    return base64.urlsafe_b64encode(json.dumps({'seq': seq, 'id': pk}).encode()).decode()
+
+
+def decode_cursor(encoded):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+        seq, pk = payload['seq'], payload['id']
+        if type(seq) is not int or type(pk) is not int:
+            raise ValueError('cursor values must be integers')
+    except (TypeError, ValueError, KeyError, binascii.Error):
+        raise ValidationError({'since': ['Invalid cursor.']})
+    return seq, pk
+
+
+class ChangeFeedMixin:
+    """
+    Adds the ``changes`` action to a viewset of a change-tracked model.
+    Rows are serialized with the viewset's serializer; filters do not apply,
+    as a row leaving a filter would not be reported.
+    """
+    throttle_scope = None  # Set to 'changes' for the changes action
+
+    @action(detail=False, methods=['get'], throttle_scope='changes')
+    def changes(self, request):
+        """
+        Endpoint for the rows changed and deleted since ``?since=``.
+        """
+        options = get_change_feed_settings()
+        try:
+            limit = _positive_int(request.query_params.get('limit', options['PAGE_SIZE']), strict=True,
+                                  cutoff=options['MAX_PAGE_SIZE'])
+        except ValueError:
+            raise ValidationError({'limit': ['Must be a positive integer.']})
+        since = request.query_params.get('since')
+        seq, pk = decode_cursor(since) if since else (-1, 0)
+
+        queryset = self.get_queryset()
+        queryset = queryset.using(router.db_for_write(queryset.model))
+        highest, pruned_through = feed_bounds(queryset.db)
+        if since and seq < pruned_through:
+            raise CursorExpired()
+        rows = list(
+            queryset.filter(Q(change_seq__gt=seq) | Q(change_seq=seq, pk__gt=pk), change_seq__lte=highest)
+            .order_by('change_seq', 'pk')[:limit + 1]
+        )
+        tombstones = list(
+            Tombstone.objects.using(queryset.db)
+            .filter(resource=queryset.model._meta.model_name, change_seq__gt=seq, change_seq__lte=highest)
+            .order_by('change_seq').values_list('change_seq', 'object_id')[:limit + 1]
+        )
+
+        entries = sorted(
+            [(row.change_seq, row.pk, UPSERT, row) for row in rows]
+            + [(change_seq, object_id, DELETE, None) for change_seq, object_id in tombstones],
+            key=lambda entry: entry[:2],
+        )
+        has_more = len(entries) > limit
+        entries = entries[:limit]
+        data = iter(self.get_serializer([row for _, _, kind, row in entries if kind == UPSERT], many=True).data)
+        results = [
+            {'seq': change_seq, 'id': object_id, 'action': kind, 'data': next(data) if kind == UPSERT else None}
+            for change_seq, object_id, kind, _ in entries
+        ]
+
+        if entries:
+            cursor = encode_cursor(*entries[-1][:2])
+        else:
+            cursor = since or encode_cursor(pruned_through, 0)
+        return Response({
+            'cursor': cursor,
+            'next': replace_query_param(request.build_absolute_uri(), 'since', cursor) if has_more else None,
+            'results': results,
+        })
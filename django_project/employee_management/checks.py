@@ -0,0 +1,56 @@
+"""
+System checks of the settings that must be the same in every worker process.
+"""
+from django.conf import settings
+from django.core.checks import Error, register
+
+from utils.db_router import get_replica_routing_settings
+
+from .authentication import get_auth_cache_settings
+from .response_cache import get_response_cache_settings
+
+# Backends whose entries only the process that wrote them can read.
+PER_PROCESS_CACHES = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+def check_shared_cache(setting, alias, error_id):
+    """
+    Returns an error unless the cache ``alias`` is one every process sees.
+    """
+    if alias not in settings.CACHES:
+        return [Error(f"{setting}['CACHE'] is {alias!r}, which is not in CACHES.", id=error_id)]
+    backend = settings.CACHES[alias].get('BACKEND')
+    if backend in PER_PROCESS_CACHES:
+        return [Error(
+            f"{setting}['CACHE'] is {alias!r}, a {backend.rsplit('.', 1)[-1]} that each process keeps to itself.",
+            hint="Use the 'shared' cache (utils.sqlite_cache.SQLiteCache) or a cache server.",
+            id=error_id,
+        )]
+    return []
+
+
+@register()
+def check_response_cache(app_configs, **kwargs):
+    options = get_response_cache_settings()
+    if not options['ENABLED']:
+        return []
+    return check_shared_cache('RESPONSE_CACHE', options['CACHE'], 'employee_management.E001')
+
+
+@register()
+def check_auth_cache(app_configs, **kwargs):
+    options = get_auth_cache_settings()
+    if not options['ENABLED']:
+        return []
+    return check_shared_cache('AUTH_CACHE', options['CACHE'], 'employee_management.E002')
+
+
+@register()
+def check_replica_routing(app_configs, **kwargs):
+    options = get_replica_routing_settings()
+    if not (options['REPLICAS'] or options['ANALYTICS_REPLICA']):
+        return []
+    return check_shared_cache('REPLICA_ROUTING', options['CACHE'], 'employee_management.E003')
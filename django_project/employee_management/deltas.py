@@ -0,0 +1,72 @@
+"""
+Buffering for incrementally maintained aggregates (department_stats.py,
+attendance_rollups.py).
+"""
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+
+DEFER = 'defer'
+SUSPEND = 'suspend'
+
+
+class DeltaBuffer:
+    """
+    Routes deltas to an ``apply`` function, which receives a dict of
+    ``{key: tuple of numbers}``.
+
+    Deltas are applied as soon as they are added, unless the current thread is
+    inside ``deferred()``, where they are summed per key and applied once when
+    the block exits (in the block's transaction), or inside ``suspended()``,
+    where they are dropped and the caller rebuilds the aggregate afterwards.
+    """
+
+    def __init__(self, apply):
+        self.apply = apply
+        self._local = threading.local()
+
+    @property
+    def mode(self):
+        return getattr(self._local, 'mode', None)
+
+    def is_suspended(self):
+        return self.mode == SUSPEND
+
+    def add(self, key, values):
+        if not any(values):
+            return
+        mode = self.mode
+        if mode == SUSPEND:
+            return
+        if mode == DEFER:
+            pending = self._local.pending
+            current = pending.get(key)
+            pending[key] = values if current is None else tuple(a + b for a, b in zip(current, values))
+            return
+        self.apply({key: values})
+
+    @contextmanager
+    def deferred(self):
+        if self.mode is not None:
+            yield
+            return
+        self._local.mode = DEFER
+        self._local.pending = {}
+        try:
+            with transaction.atomic():
+                yield
+                pending = self._local.pending
+                self._local.mode = self._local.pending = None
+                self.apply({key: values for key, values in pending.items() if any(values)})
+        finally:
+            self._local.mode = self._local.pending = None
+
+    @contextmanager
+    def suspended(self):
+        previous = self.mode
+        self._local.mode = SUSPEND
+        try:
+            yield
+        finally:
+            self._local.mode = previous
@@ -0,0 +1,118 @@
+"""
+Incremental maintenance of DepartmentalPerformance.
+
+Each department row keeps running totals: the number of active employees and
+the sum and count of the ratings those employees have received.  Writes to
+Employee and PerformanceRecord record a delta against these totals (see
+signals.py), which is applied with a single UPDATE in the writer's
+transaction.  The UPDATE takes the department row's lock only until the
+transaction commits, and departments are always updated in key order so two
+writers touching the same pair of departments cannot deadlock.
+
+Bulk code paths can wrap their writes in ``deferred()`` to sum all deltas per
+department and apply them once, or in ``suspended()`` to skip maintenance and
+call ``rebuild()`` afterwards.
+"""
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, Sum, When
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from . import response_cache
+from .deltas import DeltaBuffer
+from .models import DepartmentalPerformance, Employee, PerformanceRecord
+
+
+def record(department_id, employees=0, rating_sum=0, rating_count=0):
+    """
+    Records a change to a department's totals.  Applied immediately unless
+    called inside ``deferred()`` or ``suspended()``.
+    """
+    if department_id:
+        _buffer.add(department_id, (employees, rating_sum, rating_count))
+
+
+def apply_deltas(deltas):
+    """
+    Applies ``{department_id: (employees, rating_sum, rating_count)}``.
+    """
+    deltas = {key: totals for key, totals in deltas.items() if any(totals)}
+    if not deltas:
+        return
+    now = timezone.now()
+    with transaction.atomic():
+        for department_id in sorted(deltas):
+            employees, rating_sum, rating_count = deltas[department_id]
+            new_sum = F('rating_sum') + rating_sum
+            new_count = F('rating_count') + rating_count
+            changes = dict(
+                total_employees=F('total_employees') + employees,
+                rating_sum=new_sum,
+                rating_count=new_count,
+                # SET expressions all see the old row, so this is the new average.
+                average_rating=Case(
+                    When(rating_count__gt=-rating_count, then=Cast(new_sum, FloatField()) / new_count),
+                    default=0.0,
+                    output_field=FloatField(),
+                ),
+                last_updated=now,
+            )
+            rows = DepartmentalPerformance.objects.filter(department_id=department_id)
+            if not rows.update(**changes):
+                DepartmentalPerformance.objects.bulk_create(
+                    [DepartmentalPerformance(department_id=department_id)], ignore_conflicts=True,
+                )
+                rows.update(**changes)
+        response_cache.bump(DepartmentalPerformance)
+
+
+_buffer = DeltaBuffer(apply_deltas)
+deferred = _buffer.deferred
+suspended = _buffer.suspended
+is_suspended = _buffer.is_suspended
+
+
+def employee_ratings(employee_id):
+    """
+    Returns the (sum, count) of an employee's ratings.
+    """
+    totals = PerformanceRecord.objects.filter(employee_id=employee_id).aggregate(
+        rating_sum=Sum('rating'), rating_count=Count('id'),
+    )
+    return totals['rating_sum'] or 0, totals['rating_count']
+
+
+def rebuild():
+    """
+    Recomputes every department's totals from scratch with grouped queries.
+    Departments that no longer have active employees are reset to zero.
+    """
+    with transaction.atomic():
+        headcounts = dict(
+            Employee.objects.filter(is_active=True).order_by()
+            .values('department_id').annotate(n=Count('id')).values_list('department_id', 'n')
+        )
+        ratings = {
+            department_id: (rating_sum, rating_count)
+            for department_id, rating_sum, rating_count in
+            PerformanceRecord.objects.filter(employee__is_active=True).order_by()
+            .values('employee__department_id').annotate(s=Sum('rating'), c=Count('id'))
+            .values_list('employee__department_id', 's', 'c')
+        }
+        existing = {row.department_id: row for row in DepartmentalPerformance.objects.select_for_update()}
+        now = timezone.now()
+        to_create, to_update = [], []
+        for department_id in set(existing) | set(headcounts) | set(ratings):
+            row = existing.get(department_id) or DepartmentalPerformance(department_id=department_id)
+            row.total_employees = headcounts.get(department_id, 0)
+            row.rating_sum, row.rating_count = ratings.get(department_id, (0, 0))
+            row.average_rating = row.rating_sum / row.rating_count if row.rating_count else 0.0
+            row.last_updated = now
+            (to_update if row.pk else to_create).append(row)
+        DepartmentalPerformance.objects.bulk_update(
+            to_update, ['total_employees', 'rating_sum', 'rating_count', 'average_rating', 'last_updated'],
+            batch_size=500,
+        )
+        DepartmentalPerformance.objects.bulk_create(to_create, batch_size=500)
+        response_cache.bump(DepartmentalPerformance)
+    return len(to_update) + len(to_create)
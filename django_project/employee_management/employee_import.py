@@ -0,0 +1,314 @@
+"""
+Streaming bulk import of employees from CSV or NDJSON files.
+
+``POST /api/employees/import/`` (a multipart upload in ``file``) records a
+pending ImportJob, copies the upload under ``IMPORT_JOBS['ROOT']`` and
+hands the job to a local process pool, as background exports are (see
+utils/export_jobs.py); it answers ``202 Accepted`` with the job, whose
+progress and result are served at ``/api/import-jobs/<id>/``.  The
+``import_employees`` command runs a job in its own process.  Either way:
+
+* records are parsed one at a time (CSV with a header row, as the CSV
+  export writes it, or one JSON object per line), so memory does not grow
+  with the file;
+* every ``IMPORT_JOBS['BATCH_SIZE']`` records are validated with
+  EmployeeSerializer without its per-row uniqueness queries: emails are
+  checked against the table with one query per batch, and against earlier
+  records of the file;
+* the valid rows of a batch are loaded in one transaction, with ``COPY`` on
+  PostgreSQL and multi-row INSERTs elsewhere (``synthetic_data.load_rows``).
+  The loaders send no signals, so the department totals and the response
+  cache are updated here, once per batch;
+* rejected records are written to a gzip-compressed CSV report (line,
+  errors as JSON, the record as read), served at
+  ``/api/import-jobs/<id>/report/``.
+
+A dry run validates every record and loads nothing: validation only looks
+departments up, and new ones are created with the rows of their batch.
+Each batch commits on its own, so an
+import that fails part way keeps the batches before the failure, and
+importing the file again rejects their rows as existing emails.  For the
+same reason a job interrupted by a restart is not run again:
+``resume_import_jobs`` runs the jobs that had not started and marks the
+interrupted ones failed.
+"""
+import csv
+import gzip
+import io
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from . import change_feed, department_stats, response_cache, synthetic_data
+from .bulk import without_unique_validators
+from .models import Employee, ImportJob
+from .serializers import EmployeeSerializer, save_department
+
+logger = logging.getLogger(__name__)
+
+IMPORT_JOBS_DEFAULTS = {
+    'ROOT': Path(settings.BASE_DIR) / 'imports',
+    'BATCH_SIZE': 5000,
+    'MAX_WORKERS': 1,  # 0 runs jobs in the requesting process, e.g. for tests
+}
+
+FORMATS_BY_EXTENSION = {'.csv': ImportJob.FORMAT_CSV, '.ndjson': ImportJob.FORMAT_NDJSON, '.jsonl': ImportJob.FORMAT_NDJSON}
+FORMATS_BY_CONTENT_TYPE = {
+    'text/csv': ImportJob.FORMAT_CSV,
+    'application/x-ndjson': ImportJob.FORMAT_NDJSON,
+    'application/jsonl': ImportJob.FORMAT_NDJSON,
+}
+LOAD_COLUMNS = tuple(field.attname for field in Employee._meta.concrete_fields if not field.primary_key)
+REPORT_HEADER = ('line', 'errors', 'record')
+UPLOAD_BLOCK_SIZE = 64 * 1024
+
+_executor = None
+
+
+def get_import_job_settings():
+    return {**IMPORT_JOBS_DEFAULTS, **getattr(settings, 'IMPORT_JOBS', {})}
+
+
+def _init_worker():
+    """
+    Runs once in each pool process before it accepts jobs.
+    """
+    import django
+    django.setup()
+
+
+def get_executor():
+    """
+    Returns the process pool, creating it on first use.  Workers are spawned
+    rather than forked so they never inherit the parent's database connections
+    or threads.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=get_import_job_settings()['MAX_WORKERS'],
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+        )
+    return _executor
+
+
+def submit_import_job(job_id):
+    if get_import_job_settings()['MAX_WORKERS'] <= 0:
+        run_import_job(job_id)
+    else:
+        get_executor().submit(run_import_job, job_id)
+
+
+def detect_format(file_name, content_type=None):
+    """
+    Returns the format of a file from its extension or content type, or
+    None if neither tells.
+    """
+    extension = os.path.splitext(file_name or '')[1].lower()
+    if extension in FORMATS_BY_EXTENSION:
+        return FORMATS_BY_EXTENSION[extension]
+    return FORMATS_BY_CONTENT_TYPE.get((content_type or '').split(';')[0].strip().lower())
+
+
+def read_records(stream, input_format):
+    """
+    Yields ``(line, record)`` for each record of a binary stream.  The
+    record is a dict, or a message saying why the line is not one.  Empty
+    CSV cells are left out, as missing fields.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='' if input_format == ImportJob.FORMAT_CSV else None)
+    if input_format == ImportJob.FORMAT_CSV:
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, {key: value for key, value in row.items() if key is not None and value not in ('', None)}
+        return
+    for line, content in enumerate(text, 1):
+        if not content.strip():
+            continue
+        try:
+            record = json.loads(content)
+        except json.JSONDecodeError as exc:
+            yield line, f'Invalid JSON: {exc.msg}.'
+            continue
+        yield line, record if isinstance(record, dict) else 'Expected a JSON object.'
+
+
+class ErrorReport:
+    """
+    The rejected records of an import, written to a gzip-compressed CSV
+    file as they are found.  The file is only created for the first one.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = self.writer = None
+
+    def add(self, line, errors, record):
+        if self.file is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.file = gzip.open(self.path, 'wt', newline='', encoding='utf-8')
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(REPORT_HEADER)
+        self.writer.writerow([line, json.dumps(errors), record if isinstance(record, str) else json.dumps(record)])
+
+    def close(self):
+        """
+        Returns the size of the report, 0 if nothing was rejected.
+        """
+        if self.file is None:
+            return 0
+        self.file.close()
+        return os.path.getsize(self.path)
+
+
+def start_import(file_name, input_format, dry_run=False, requested_by=None):
+    return ImportJob.objects.create(
+        file_name=os.path.basename(file_name or '')[:255], input_format=input_format, dry_run=dry_run,
+        requested_by=requested_by,
+    )
+
+
+def enqueue_import(upload, input_format, dry_run=False, requested_by=None):
+    """
+    Records an import of an uploaded file and runs it in the background once
+    the current transaction commits.  Django may have spooled the upload to
+    a temporary file that is removed with the request, so it is copied
+    first.
+    """
+    job = start_import(upload.name, input_format, dry_run, requested_by=requested_by)
+    root = get_import_job_settings()['ROOT']
+    os.makedirs(root, exist_ok=True)
+    job.upload_path = os.path.join(root, f'import-{job.pk}-upload')
+    with open(job.upload_path, 'wb') as out:
+        for block in upload.chunks(UPLOAD_BLOCK_SIZE):
+            out.write(block)
+    job.save(update_fields=['upload_path'])
+    transaction.on_commit(lambda: submit_import_job(job.pk))
+    return job
+
+
+def save_progress(job):
+    ImportJob.objects.filter(pk=job.pk).update(
+        rows_read=job.rows_read, rows_loaded=job.rows_loaded, rows_rejected=job.rows_rejected,
+    )
+
+
+def run_import_job(job_id):
+    """
+    Runs a pending job over its upload, which is removed afterwards.  A job
+    that another worker already started is left alone.
+    """
+    try:
+        if not ImportJob.objects.filter(pk=job_id, status=ImportJob.STATUS_PENDING).update(
+                status=ImportJob.STATUS_RUNNING):
+            return
+        job = ImportJob.objects.get(pk=job_id)
+        try:
+            with open(job.upload_path, 'rb') as stream:
+                EmployeeImport(job, progress=save_progress).run(stream)
+        except OSError as e:
+            logger.exception("Import job %s failed", job_id)
+            ImportJob.objects.filter(pk=job_id).update(
+                status=ImportJob.STATUS_FAILED, error=str(e), finished_at=timezone.now(),
+            )
+        else:
+            os.remove(job.upload_path)
+            ImportJob.objects.filter(pk=job_id).update(upload_path='')
+    finally:
+        if get_import_job_settings()['MAX_WORKERS'] > 0:
+            connections.close_all()
+
+
+class EmployeeImport:
+    """
+    Runs an ImportJob over a binary stream.  ``progress`` is called with the
+    job after each batch.
+    """
+
+    def __init__(self, job, batch_size=None, progress=None):
+        self.job = job
+        self.batch_size = batch_size or get_import_job_settings()['BATCH_SIZE']
+        self.progress = progress
+        self.serializer = without_unique_validators(EmployeeSerializer(), ('email',))
+        self.seen = {}  # Email -> line of the record that has it
+        self.report = ErrorReport(os.path.join(get_import_job_settings()['ROOT'], f'import-{job.pk}-rejected.csv.gz'))
+
+    def run(self, stream):
+        job, started = self.job, time.monotonic()
+        if job.status != ImportJob.STATUS_RUNNING:
+            job.status = ImportJob.STATUS_RUNNING
+            job.save(update_fields=['status'])
+        records = read_records(stream, job.input_format)
+        try:
+            while batch := list(islice(records, self.batch_size)):
+                self.import_batch(batch)
+                if self.progress:
+                    self.progress(job)
+        except Exception as exc:
+            logger.exception("Import job %s failed", job.pk)
+            job.status, job.error = ImportJob.STATUS_FAILED, str(exc)
+        else:
+            job.status = ImportJob.STATUS_COMPLETED
+        job.report_size = self.report.close()
+        job.report_path = self.report.path if job.report_size else ''
+        job.rows_per_second = job.rows_read / max(time.monotonic() - started, 1e-9)
+        job.finished_at = timezone.now()
+        job.save()
+        return job
+
+    def reject(self, line, errors, record):
+        self.job.rows_rejected += 1
+        self.report.add(line, errors, record)
+
+    def import_batch(self, batch):
+        valid = []
+        for line, record in batch:
+            self.job.rows_read += 1
+            if isinstance(record, str):
+                self.reject(line, {'detail': [record]}, None)
+                continue
+            try:
+                employee = Employee(**self.serializer.run_validation(record))
+            except ValidationError as exc:
+                self.reject(line, exc.detail, record)
+                continue
+            if employee.email in self.seen:
+                self.reject(line, {'email': [f'Duplicates the email of line {self.seen[employee.email]}.']}, record)
+                continue
+            self.seen[employee.email] = line
+            valid.append((line, record, employee))
+
+        existing = set(Employee.objects.filter(email__in=[employee.email for _, _, employee in valid])
+                       .values_list('email', flat=True))
+        employees = []
+        for line, record, employee in valid:
+            if employee.email in existing:
+                self.reject(line, {'email': ['employee with this email already exists.']}, record)
+            else:
+                employees.append(employee)
+        if employees and not self.job.dry_run:
+            with transaction.atomic(), department_stats.deferred(), response_cache.deferred():
+                for employee in employees:
+                    employee.department = save_department(employee.department)
+                change_feed.assign(employees)  # Loaded without save()
+                synthetic_data.load_rows(
+                    Employee, LOAD_COLUMNS,
+                    [tuple(getattr(employee, column) for column in LOAD_COLUMNS) for employee in employees],
+                    self.batch_size,
+                )
+                for employee in employees:
+                    if employee.is_active:
+                        department_stats.record(employee.department_id, employees=1)
+                response_cache.bump(Employee)
+        self.job.rows_loaded += len(employees)
@@ -1,9 +1,19 @@
 import factory
 import factory.fuzzy
-from employee_management.models import Employee, PerformanceRecord, Attendance
+from employee_management.models import Department, Employee, PerformanceRecord, Attendance
 from django.utils import timezone
 import random
 
+class DepartmentFactory(factory.django.DjangoModelFactory):
+    """
+    Factory for creating Department instances, reusing existing names.
+    """
+    class Meta:
+        model = Department
+        django_get_or_create = ('name',)
+
+    name = factory.Faker('word')
+
 class EmployeeFactory(factory.django.DjangoModelFactory):
     """
     Factory for creating Employee instances.
@@ -15,11 +25,18 @@ class EmployeeFactory(factory.django.DjangoModelFactory):
     last_name = factory.Faker('last_name')
     email = factory.Faker('email')
     job_title = factory.Faker('job')
-    department = factory.Faker('word')  # Keep it simple, or use a list of departments
+    department = factory.SubFactory(DepartmentFactory)
     hire_date = factory.Faker('date_between', start_date='-10y', end_date='-1y')
-    salary = factory.FuzzyInteger(50000, 150000)
+    salary = factory.fuzzy.FuzzyInteger(50000, 150000)
     is_active = True
 
+    @classmethod
+    def _adjust_kwargs(cls, **kwargs):
+        """Accept a department name, e.g. ``EmployeeFactory(department='Sales')``."""
+        if isinstance(kwargs.get('department'), str):
+            kwargs['department'] = DepartmentFactory(name=kwargs['department'])
+        return kwargs
+
 class PerformanceRecordFactory(factory.django.DjangoModelFactory):
     """
     Factory for creating PerformanceRecord instances.
@@ -30,10 +47,10 @@ class PerformanceRecordFactory(factory.django.DjangoModelFactory):
     employee = factory.SubFactory(EmployeeFactory)  # Use SubFactory
     review_date = factory.Faker(
         'date_between',
-        start_date=factory.SelfAttribute('employee.hire_date'),  # Corrected attribute access
+        start_date=factory.SelfAttribute('..employee.hire_date'),  # Corrected attribute access
         end_date='today'
     )
-    rating = factory.FuzzyInteger(1, 5)
+    rating = factory.fuzzy.FuzzyInteger(1, 5)
     comments = factory.Faker('text')
     reviewer_name = factory.Faker('name')
 
@@ -59,4 +76,4 @@ class AttendanceFactory(factory.django.DjangoModelFactory):
         try:
             return model_class.objects.get(employee=employee, date=date)
         except model_class.DoesNotExist:
-            return super()._create(model_class, *args, **kwargs)
+            return super()._create(model_class, *args, employee=employee, date=date, **kwargs)
@@ -0,0 +1,191 @@
+"""
+Read-only fast path for list responses.
+
+A ModelSerializer builds a model instance for every row and then calls each
+field's ``get_attribute`` and ``to_representation``.  With ``fast_list =
+True`` a viewset's ``list`` (and async ``alist``) instead fetch the
+serializer's columns with ``values_list`` and turn each row tuple into the
+same dict with converters chosen once per serializer (``RowSerializer``):
+nothing for values that are already their own representation (integers,
+strings, booleans, related primary keys), ``isoformat`` for dates and times,
+a quantizing formatter for decimals, and the field's own
+``to_representation`` for anything else.  The dicts are rendered by the
+usual JSON renderer, so the response bytes are the same as the serializer's
+(``FastListConformanceTests`` checks this).
+
+Serializer fields must read a model field, possibly through foreign keys
+(``source='department.name'``, a SlugRelatedField), or a column the viewset
+provides in ``export_annotations``, as for CSV exports; other fields raise
+ImproperlyConfigured when the serializer is compiled.
+"""
+import datetime
+import decimal
+
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from rest_framework import fields as drf_fields, relations
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+# Fields whose representation of a database value is the value itself.
+IDENTITY_FIELDS = (drf_fields.IntegerField, drf_fields.CharField, drf_fields.EmailField, drf_fields.BooleanField)
+
+
+def get_converter(field):
+    """
+    Returns the function that turns a non-null column value into the field's
+    representation, or None if the value is its own representation.
+    """
+    if type(field) in IDENTITY_FIELDS:
+        return None
+    if isinstance(field, relations.PrimaryKeyRelatedField) and field.pk_field is None:
+        return None  # values_list() gives the related primary key
+    if isinstance(field, relations.SlugRelatedField):
+        return None  # The column is the slug field (see get_column())
+    if type(field) in (drf_fields.DateField, drf_fields.TimeField):
+        default = api_settings.DATE_FORMAT if type(field) is drf_fields.DateField else api_settings.TIME_FORMAT
+        output_format = getattr(field, 'format', default)
+        if output_format is not None and output_format.lower() == drf_fields.ISO_8601:
+            return (datetime.date if type(field) is drf_fields.DateField else datetime.time).isoformat
+    if type(field) is drf_fields.DecimalField and field.decimal_places is not None and not field.localize \
+            and getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING):
+        exponent = decimal.Decimal('.1') ** field.decimal_places
+        context = decimal.getcontext().copy()
+        if field.max_digits is not None:
+            context.prec = field.max_digits
+        rounding = field.rounding
+
+        def convert_decimal(value):
+            if not isinstance(value, decimal.Decimal):
+                value = decimal.Decimal(str(value).strip())
+            return '{:f}'.format(value.quantize(exponent, rounding=rounding, context=context))
+        return convert_decimal
+    return field.to_representation
+
+
+def get_column(model, field):
+    """
+    Returns the ``values_list`` column a serializer field reads: its source,
+    with dots followed through foreign keys, and a SlugRelatedField's slug
+    field appended.  None if the source is not a model field.
+    """
+    path = field.source.split('.') if field.source != '*' else []
+    if isinstance(field, relations.SlugRelatedField):
+        path += field.slug_field.split('__')
+    if not path:
+        return None
+    opts = model._meta
+    for index, part in enumerate(path):
+        try:
+            model_field = opts.get_field(part)
+        except FieldDoesNotExist:
+            return None
+        if index < len(path) - 1:
+            if not (model_field.many_to_one or model_field.one_to_one) or not model_field.concrete:
+                return None
+            opts = model_field.related_model._meta
+        elif not model_field.concrete or (model_field.is_relation and not isinstance(field, relations.RelatedField)):
+            return None  # A related object, e.g. its __str__()
+    return '__'.join(path)
+
+
+class RowSerializer:
+    """
+    Serializes ``values_list`` rows the way ``serializer_class`` serializes
+    model instances.  ``annotations`` maps field names that are not model
+    fields to query expressions.
+    """
+
+    def __init__(self, serializer_class, annotations=None):
+        serializer = serializer_class()
+        model = serializer.Meta.model
+        annotations = annotations or {}
+        self.names, self.columns, self.converters, self.annotations = [], [], [], {}
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if name in annotations:
+                self.annotations[name] = annotations[name]
+                column = name
+            else:
+                column = get_column(model, field)
+                if column is None:
+                    raise ImproperlyConfigured(
+                        f"{serializer_class.__name__}.{name} is not a model field; give it a column in annotations"
+                    )
+            self.names.append(name)
+            self.columns.append(column)
+            self.converters.append(get_converter(field))
+
+    def get_queryset(self, queryset, extra_columns=()):
+        """
+        Returns ``queryset`` as named rows of the serializer's columns,
+        followed by ``extra_columns`` not among them (e.g. what pagination
+        orders by).
+        """
+        extra = [column for column in dict.fromkeys(extra_columns) if column not in self.columns]
+        if self.annotations:
+            queryset = queryset.annotate(**self.annotations)
+        return queryset.values_list(*self.columns, *extra, named=True)
+
+    def to_representation(self, rows):
+        names, converters = self.names, self.converters
+        return [
+            dict(zip(names, [
+                value if convert is None or value is None else convert(value)
+                for convert, value in zip(converters, row)
+            ]))
+            for row in rows
+        ]
+
+
+class FastListMixin:
+    """
+    Serves ``list`` through a RowSerializer when ``fast_list`` is set.
+    """
+    fast_list = False
+
+    def get_row_serializer(self):
+        cls = type(self)
+        key = (self.get_serializer_class(), id(getattr(self, 'export_annotations', None)))
+        cached = cls.__dict__.get('_row_serializer')
+        if cached is None or cached[0] != key:
+            cached = (key, RowSerializer(key[0], getattr(self, 'export_annotations', None)))
+            cls._row_serializer = cached
+        return cached[1]
+
+    def get_fast_list_queryset(self, queryset):
+        """
+        The rows to list: the serializer's columns and the ones keyset
+        pagination may order by.
+        """
+        model = queryset.model
+        orderings = list(getattr(self, 'ordering_fields', None) or []) + list(model._meta.ordering or [])
+        extra = []
+        for name in orderings:
+            name = name.lstrip('-')
+            if name not in ('pk', '?'):
+                try:
+                    extra.append(model._meta.get_field(name).attname)
+                except FieldDoesNotExist:
+                    pass
+        return self.get_row_serializer().get_queryset(queryset, extra)
+
+    def list(self, request, *args, **kwargs):
+        if not self.fast_list:
+            return super().list(request, *args, **kwargs)
+        row_serializer = self.get_row_serializer()
+        queryset = self.get_fast_list_queryset(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(row_serializer.to_representation(page))
+        return Response(row_serializer.to_representation(queryset))
+
+    async def alist(self, request, *args, **kwargs):
+        if not self.fast_list:
+            return await super().alist(request, *args, **kwargs)
+        row_serializer = self.get_row_serializer()
+        queryset = self.get_fast_list_queryset(await self.afilter_queryset())
+        page = await self.apaginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(row_serializer.to_representation(page))
+        return Response(row_serializer.to_representation([row async for row in queryset]))
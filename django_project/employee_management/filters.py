@@ -0,0 +1,56 @@
+"""
+FilterSets for the API viewsets.
+"""
+import django_filters
+
+from .models import Attendance, DepartmentRatingSnapshot, Employee, EmployeePerformanceTrend
+
+
+class EmployeeFilter(django_filters.FilterSet):
+    """
+    ``department`` filters by department name, as it did when the name was
+    stored on the employee; the name is matched in the department table and
+    employees are found by its key.  ``department_id`` takes the key itself.
+    """
+    department = django_filters.CharFilter(field_name='department__name')
+    department_id = django_filters.NumberFilter(field_name='department_id')
+
+    class Meta:
+        model = Employee
+        fields = ['department', 'department_id', 'is_active']
+
+
+class AttendanceFilter(django_filters.FilterSet):
+    """
+    ``date_from`` and ``date_to`` bound the date, inclusively.  On a
+    partitioned attendance table the planner only reads the partitions of
+    the months they cover.
+    """
+    date_from = django_filters.DateFilter(field_name='date', lookup_expr='gte')
+    date_to = django_filters.DateFilter(field_name='date', lookup_expr='lte')
+
+    class Meta:
+        model = Attendance
+        fields = ['employee', 'date', 'date_from', 'date_to']
+
+
+class EmployeePerformanceTrendFilter(django_filters.FilterSet):
+    """
+    ``department`` filters by department name.
+    """
+    department = django_filters.CharFilter(field_name='department__name')
+
+    class Meta:
+        model = EmployeePerformanceTrend
+        fields = ['department']
+
+
+class DepartmentRatingSnapshotFilter(django_filters.FilterSet):
+    """
+    ``department`` filters by department name.
+    """
+    department = django_filters.CharFilter(field_name='department__name')
+
+    class Meta:
+        model = DepartmentRatingSnapshot
+        fields = ['department', 'year', 'quarter']
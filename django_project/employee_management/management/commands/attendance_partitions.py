@@ -0,0 +1,72 @@
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+from employee_management import partitions
+
+class Command(BaseCommand):
+    """
+    Command to maintain the monthly partitions of the attendance table on
+    PostgreSQL.  See employee_management/partitions.py.
+
+    ``create`` adds the partitions for the current month and the next
+    ``--months`` months; run it from cron so writes never fall through to
+    the default partition.  ``archive`` moves every partition before
+    ``--before`` to a compressed file, and ``restore`` attaches the archive
+    of one ``--month`` again.
+    """
+    help = 'Creates future attendance partitions, or archives and restores old ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['list', 'create', 'archive', 'restore'])
+        parser.add_argument('--months', type=int,
+                            help='Months ahead of the current one to create (default ATTENDANCE_PARTITIONS["MONTHS_AHEAD"])')
+        parser.add_argument('--before', type=partitions.parse_month, help='Archive the partitions before this month (YYYY-MM)')
+        parser.add_argument('--month', type=partitions.parse_month, help='Month to restore (YYYY-MM)')
+        parser.add_argument('--archive-dir', help='Where archives are written and read (default ATTENDANCE_PARTITIONS["ARCHIVE_DIR"])')
+
+    def handle(self, *args, **options):
+        """
+        Handles the execution of the command.
+        """
+        try:
+            if not partitions.is_partitioned(connection):
+                raise CommandError('The attendance table is not partitioned; apply the migrations first')
+            getattr(self, f"handle_{options['action']}")(options)
+        except (partitions.PartitioningError, DatabaseError) as exc:
+            raise CommandError(str(exc))
+
+    def handle_list(self, options):
+        months, default_rows = partitions.list_partitions(connection)
+        for month in months:
+            self.stdout.write(f'{month:%Y-%m}  {partitions.partition_name(month)}')
+        style = self.style.WARNING if default_rows else self.style.SUCCESS
+        self.stdout.write(style(f'{len(months)} monthly partitions, {default_rows} rows in the default partition.'))
+
+    def handle_create(self, options):
+        months = options['months']
+        if months is None:
+            months = partitions.get_attendance_partitions_settings()['MONTHS_AHEAD']
+        if months < 0:
+            raise CommandError('--months must not be negative')
+        through = partitions.add_months(partitions.month_start(date.today()), months)
+        created = partitions.create_partitions(connection, through)
+        for month in created:
+            self.stdout.write(f'Created {partitions.partition_name(month)}')
+        self.stdout.write(self.style.SUCCESS(f'Created {len(created)} partitions, through {through:%Y-%m}.'))
+
+    def handle_archive(self, options):
+        if options['before'] is None:
+            raise CommandError('archive needs --before')
+        if options['before'] > partitions.month_start(date.today()):
+            raise CommandError('--before must not be after the current month')
+        months = [month for month in partitions.list_partitions(connection)[0] if month < options['before']]
+        for month in months:
+            path = partitions.archive_partition(connection, month, options['archive_dir'])
+            self.stdout.write(f'Archived {month:%Y-%m} to {path}')
+        self.stdout.write(self.style.SUCCESS(f'Archived {len(months)} partitions.'))
+
+    def handle_restore(self, options):
+        if options['month'] is None:
+            raise CommandError('restore needs --month')
+        rows = partitions.restore_partition(connection, options['month'], options['archive_dir'])
+        self.stdout.write(self.style.SUCCESS(f"Restored {rows} attendance records of {options['month']:%Y-%m}."))
@@ -0,0 +1,166 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.utils import load_backend
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from rest_framework.test import APIRequestFactory, force_authenticate
+from employee_management.models import Employee, Attendance
+from employee_management.serializers import EmployeeSerializer, AttendanceSerializer
+from employee_management.views import EmployeeViewSet, AttendanceViewSet
+from utils import benchmarking, db_pool
+from utils.export_utils import export_to_csv
+import io
+import os
+
+# Roughly how many attendance rows generate_data creates per employee and
+# year of history.
+ATTENDANCE_PER_EMPLOYEE = 240
+SERIALIZE_ROWS = 1000
+# Requests simulated by the connection benchmarks: each connects, runs one
+# query and closes the connection.
+CONNECT_CYCLES = 50
+
+class Command(BaseCommand):
+    """
+    Command to benchmark the API's hot paths: serializers, search,
+    pagination and CSV export, and on PostgreSQL the cost of a request's
+    connection setup with and without the connection pool.
+
+    Each dataset is seeded with generate_data into a throwaway test database
+    (in memory on SQLite), so the configured database is never touched.
+    Results can be saved as a JSON baseline and later runs compared against
+    it; the command fails if any benchmark regressed.
+    """
+    help = 'Benchmarks serializers, filters, pagination and export against seeded datasets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10000,100000',
+                            help='Comma separated attendance row counts to seed (default 10000,100000)')
+        parser.add_argument('--repeat', type=int, default=3, help='Timed runs per benchmark; the best is kept')
+        parser.add_argument('--only', help='Only run benchmarks whose name contains this')
+        parser.add_argument('--baseline', default=os.path.join(settings.BASE_DIR, 'benchmarks', 'baseline.json'),
+                            help='Baseline file (default benchmarks/baseline.json)')
+        parser.add_argument('--save', action='store_true', help='Write the results to the baseline file')
+        parser.add_argument('--compare', action='store_true', help='Compare the results with the baseline file')
+        parser.add_argument('--threshold', type=float, default=benchmarking.DEFAULT_THRESHOLD,
+                            help='Relative slowdown or memory growth reported as a regression (default 0.2)')
+
+    def handle(self, *args, **options):
+        """
+        Handles the execution of the command.
+        """
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',')]
+        except ValueError:
+            raise CommandError('--sizes must be a comma separated list of integers')
+        baseline = None
+        if options['compare']:
+            if not os.path.exists(options['baseline']):
+                raise CommandError(f"No baseline at {options['baseline']}; run with --save first")
+            baseline = benchmarking.load_baseline(options['baseline'])
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            results = {}
+            # Repeated runs would otherwise measure the response cache.
+            with override_settings(RESPONSE_CACHE={'ENABLED': False}):
+                for size in sizes:
+                    results.update(self.run_size(size, options))
+                if connection.vendor == 'postgresql':
+                    results.update(self.run_connections(options))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if options['save']:
+            benchmarking.save_baseline(options['baseline'], results)
+            self.stdout.write(self.style.SUCCESS(f"Saved baseline to {options['baseline']}"))
+        if baseline is not None:
+            regressions = benchmarking.compare(baseline, results, options['threshold'])
+            for regression in regressions:
+                change = f' ({regression.change:+.0%})' if regression.change is not None else ''
+                self.stdout.write(self.style.ERROR(
+                    f'REGRESSION {regression.name} {regression.metric}: '
+                    f'{regression.baseline} -> {regression.current}{change}'
+                ))
+            if regressions:
+                raise CommandError(f'{len(regressions)} regression(s) against {options["baseline"]}')
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline.'))
+
+    def run_size(self, size, options):
+        employees = max(1, size // ATTENDANCE_PER_EMPLOYEE)
+        self.stdout.write(self.style.SUCCESS(f'Seeding {employees} employees for ~{size} attendance rows...'))
+        call_command('generate_data', employees=employees, seed=size, workers=0, stdout=io.StringIO())
+        self.stdout.write(f'{Employee.objects.count()} employees, {Attendance.objects.count()} attendance rows')
+
+        user = User.objects.create_superuser(f'benchmark{size}', password=None)
+        factory = APIRequestFactory()
+        last_name = Employee.objects.values_list('last_name', flat=True).first()
+        last_page = max(1, Attendance.objects.count() // 10)
+
+        def request(viewset, action, query=''):
+            view = viewset.as_view({'get': action}, throttle_classes=[])
+            req = factory.get(f'/benchmark/?{query}')
+            force_authenticate(req, user=user)
+            response = view(req)
+            if response.streaming:
+                for _ in response.streaming_content:
+                    pass
+            else:
+                response.render()
+            return response
+
+        def consume(response):
+            for _ in response.streaming_content:
+                pass
+
+        benchmarks = {
+            'serialize.employees': lambda: EmployeeSerializer(
+                Employee.objects.all()[:SERIALIZE_ROWS], many=True).data,
+            'serialize.attendance': lambda: AttendanceSerializer(
+                Attendance.objects.all()[:SERIALIZE_ROWS], many=True).data,
+            'search.employees': lambda: request(EmployeeViewSet, 'list', f'search={last_name}'),
+            'paginate.shallow': lambda: request(AttendanceViewSet, 'list', 'page=2'),
+            'paginate.deep': lambda: request(AttendanceViewSet, 'list', f'page={last_page}'),
+            'export_csv.attendance': lambda: request(AttendanceViewSet, 'export_csv'),
+            'export_to_csv.employees': lambda: consume(export_to_csv(Employee.objects.all(), 'employees')),
+        }
+        return self.run_benchmarks(benchmarks, f'@{size}', options)
+
+    def run_connections(self, options):
+        def connect_cycles(engine):
+            wrapper = load_backend(engine).DatabaseWrapper(
+                {**connection.settings_dict, 'ENGINE': engine, 'CONN_MAX_AGE': 0}, alias=f'benchmark-{engine}',
+            )
+
+            def run():
+                for _ in range(CONNECT_CYCLES):
+                    with wrapper.cursor() as cursor:
+                        cursor.execute('SELECT 1')
+                    wrapper.close()
+            return run
+
+        benchmarks = {
+            'connect.direct': connect_cycles('django.db.backends.postgresql'),
+            'connect.pooled': connect_cycles('utils.pooled_postgresql'),
+        }
+        try:
+            return self.run_benchmarks(benchmarks, f'@{CONNECT_CYCLES}', options)
+        finally:
+            db_pool.close_idle_connections(connection.settings_dict['NAME'])  # Before the test database is dropped
+
+    def run_benchmarks(self, benchmarks, suffix, options):
+        results = {}
+        for name, func in benchmarks.items():
+            if options['only'] and options['only'] not in name:
+                continue
+            key = f'{name}{suffix}'
+            results[key] = measurement = benchmarking.measure(func, repeat=options['repeat'])
+            self.stdout.write(
+                f'{key:<36} {measurement.seconds * 1000:>10.1f} ms {measurement.peak_kib:>10.1f} KiB '
+                f'{measurement.queries:>6} queries'
+            )
+        return results
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from employee_management import performance_analytics
+
+class Command(BaseCommand):
+    """
+    Command to recompute the performance trend and department rating
+    snapshots, meant to run nightly.
+    """
+    help = 'Recomputes the performance analytics snapshots from the performance records'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--window', type=int, help='Latest reviews the moving average and slope cover')
+        parser.add_argument('--batch-size', type=int, help='Reviews read and computed at a time')
+
+    def handle(self, *args, **options):
+        """
+        Handles the execution of the command.
+        """
+        for name in ('window', 'batch_size'):
+            if options[name] is not None and options[name] < 1:
+                raise CommandError(f"--{name.replace('_', '-')} must be at least 1")
+        stats = performance_analytics.compute_snapshots(
+            window=options['window'], batch_size=options['batch_size'],
+            progress=lambda reviews: self.stdout.write(f'{reviews} reviews read') if options['verbosity'] > 1 else None,
+        )
+        rate = stats['reviews'] / stats['seconds'] if stats['seconds'] else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Computed {stats['employee_trends']} employee trends and {stats['department_quarters']} department "
+            f"quarters from {stats['reviews']} reviews in {stats['seconds']:.2f}s ({rate:.0f} reviews/s)."
+        ))
@@ -1,109 +1,158 @@
-from django.core.management.base import BaseCommand
-from faker import Faker
-from employee_management.models import Employee, PerformanceRecord, Attendance, DepartmentalPerformance
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from employee_management.models import (
+    Department, Employee, PerformanceRecord, Attendance, DepartmentalPerformance, EmployeeHoursRollup, DepartmentHoursRollup,
+    EmployeePerformanceTrend, DepartmentRatingSnapshot,
+)
+from employee_management import attendance_rollups, change_feed, department_stats, partitions, response_cache, synthetic_data
 from django.utils import timezone
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import django
+import multiprocessing
+import os
 import random
-from django.db import transaction
+import time
+from datetime import timedelta
+from django.db import connection, transaction
 
 class Command(BaseCommand):
     """
-    Command to generate synthetic employee data.
+    Command to generate synthetic employee data.  See
+    employee_management/synthetic_data.py for how the data is built.
     """
     help = 'Generates synthetic employee data'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--employees', type=int, default=100, help='Number of employees (default 100)')
+        parser.add_argument('--years', type=int, default=1, help='Years of attendance history (default 1)')
+        parser.add_argument('--reviews', type=int, default=3, help='Performance reviews per employee (default 3)')
+        parser.add_argument('--departments', type=int, default=5, help='Number of departments (default 5)')
+        parser.add_argument('--seed', type=int, help='Random seed; the same seed generates the same data')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Worker processes (default: one per CPU; 0 generates in this process)')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Employees per worker task (default 500)')
+        parser.add_argument('--batch-size', type=int, default=50000, help='Rows per COPY or bulk insert (default 50000)')
+
     def handle(self, *args, **options):
         """
         Handles the execution of the command.
         """
-        fake = Faker()
+        for name in ('employees', 'years', 'reviews', 'departments', 'chunk_size', 'batch_size'):
+            if options[name] < (0 if name in ('employees', 'years', 'reviews') else 1):
+                raise CommandError(f"--{name.replace('_', '-')} is out of range")
+        seed = options['seed'] if options['seed'] is not None else random.randrange(2 ** 32)
+        # Parallel loading needs a database that takes concurrent writers;
+        # elsewhere the workers only generate and rows are loaded here.
+        load_in_workers = connection.vendor == 'postgresql'
+        departments = synthetic_data.department_names(options['departments'])
 
-        # Use a transaction to improve performance.
-        with transaction.atomic():
-            self.stdout.write(self.style.SUCCESS("Deleting existing data..."))
-            # Delete all existing data
-            Employee.objects.all().delete()
-            PerformanceRecord.objects.all().delete()
-            Attendance.objects.all().delete()
-            DepartmentalPerformance.objects.all().delete()
+        self.stdout.write(self.style.SUCCESS(f"Deleting existing data... (seed {seed})"))
+        tables = [model._meta.db_table for model in (
+            Employee, PerformanceRecord, Attendance, DepartmentalPerformance, EmployeeHoursRollup, DepartmentHoursRollup,
+            Department,
+        )]
+        # The analytics snapshots reference employees and departments; they
+        # are empty until compute_performance_analytics runs again.
+        snapshots = (EmployeePerformanceTrend, DepartmentRatingSnapshot)
+        connection.ops.execute_sql_flush(connection.ops.sql_flush(
+            no_style(), tables + [model._meta.db_table for model in snapshots], reset_sequences=True,
+        ))
+        for model in snapshots:
+            response_cache.bump(model)
+        today = timezone.localdate()
+        if connection.vendor == 'postgresql' and partitions.is_partitioned(connection):
+            # Otherwise the history would all go to the default partition.
+            months_ahead = partitions.get_attendance_partitions_settings()['MONTHS_AHEAD']
+            partitions.create_partitions(
+                connection, partitions.add_months(partitions.month_start(today), months_ahead),
+                since=today - timedelta(days=365 * options['years']),
+            )
+        # Sync clients start over: their cursors expire, and the new rows share one number.
+        change_seq = change_feed.reset()
+        Department.objects.bulk_create([Department(name=name) for name in departments])
+        ids = dict(Department.objects.values_list('name', 'pk'))
+        department_ids = [ids[name] for name in departments]
+        tasks = [
+            synthetic_data.ChunkTask(
+                seed=seed, first_id=first_id, count=min(options['chunk_size'], options['employees'] + 1 - first_id),
+                departments=department_ids, years=options['years'], reviews=options['reviews'],
+                today=today, load=load_in_workers, batch_size=options['batch_size'], change_seq=change_seq,
+            )
+            for first_id in range(1, options['employees'] + 1, options['chunk_size'])
+        ]
 
-            self.stdout.write(self.style.SUCCESS("Creating departments..."))
-            # Create Departments
-            departments = ['Sales', 'Marketing', 'Engineering', 'HR', 'Finance']
-            for dept_name in departments:
-                DepartmentalPerformance.objects.create(department_name=dept_name)
+        self.stdout.write(self.style.SUCCESS(
+            f"Generating {options['employees']} employees with {options['workers']} workers..."
+        ))
+        started = time.monotonic()
+        self.rows = self.employees = 0
+        self.last_report = started
+        department_rollups = {}
+        # Aggregates are written by the generator or rebuilt below, not per row.
+        with department_stats.suspended(), attendance_rollups.suspended():
+            for result in self.run_tasks(tasks, options['workers']):
+                if result.rows is not None:
+                    with transaction.atomic():
+                        for model, columns in synthetic_data.TABLES:
+                            synthetic_data.load_rows(model, columns, result.rows[model], options['batch_size'])
+                for key, values in result.department_rollups.items():
+                    current = department_rollups.get(key, (0, 0, 0))
+                    department_rollups[key] = tuple(a + b for a, b in zip(current, values))
+                self.report_progress(result, started)
 
-            self.stdout.write(self.style.SUCCESS("Creating employees..."))
-            # Create employees
-            employees = []
-            for _ in range(5):  # Generate 5 employees
-                first_name = fake.first_name()
-                last_name = fake.last_name()
-                email = fake.email()
-                job_title = fake.job()
-                department = random.choice(departments)
-                hire_date = fake.date_between(start_date='-10y', end_date='-1y')
-                salary = fake.random_int(min=50000, max=150000)
-                is_active = fake.boolean()
-                
-                employee = Employee(
-                    first_name=first_name,
-                    last_name=last_name,
-                    email=email,
-                    job_title=job_title,
-                    department=department,
-                    hire_date=hire_date,
-                    salary=salary,
-                    is_active=is_active,
+            self.stdout.write(self.style.SUCCESS("Updating department totals..."))
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    for sql in connection.ops.sequence_reset_sql(no_style(), [Employee]):
+                        cursor.execute(sql)
+                DepartmentHoursRollup.objects.bulk_create(
+                    (
+                        DepartmentHoursRollup(department_id=department_id, granularity=granularity, period_start=start,
+                                              seconds_worked=values[0], shifts=values[1], open_shifts=values[2])
+                        for (department_id, granularity, start), values in department_rollups.items()
+                    ),
+                    batch_size=options['batch_size'],
+                )
+                DepartmentalPerformance.objects.bulk_create(
+                    [DepartmentalPerformance(department_id=department_id) for department_id in department_ids],
                 )
-                employees.append(employee)
-            
-            Employee.objects.bulk_create(employees) # Use bulk_create
+                department_stats.rebuild()
+                # The rows were loaded without signals.
+                for model, _ in synthetic_data.TABLES:
+                    response_cache.bump(model)
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f"ANALYZE {', '.join(map(connection.ops.quote_name, tables))}")
 
-            # Get all employees
-            employees = Employee.objects.all() # get the employees from DB
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully generated synthetic data: {self.employees} employees, {self.rows} rows '
+            f'in {elapsed:.1f}s ({self.rows / max(elapsed, 1e-9):,.0f} rows/s).'
+        ))
 
-            self.stdout.write(self.style.SUCCESS("Creating performance records..."))
-            # Create performance records
-            for employee in employees:
-                for _ in range(3):  # Each employee has 3 performance records
-                    review_date = fake.date_between(start_date=employee.hire_date, end_date='today')
-                    rating = fake.random_int(min=1, max=5)
-                    comments = fake.text()
-                    reviewer_name = fake.name()
-                    PerformanceRecord.objects.create(
-                        employee=employee,
-                        review_date=review_date,
-                        rating=rating,
-                        comments=comments,
-                        reviewer_name=reviewer_name,
-                    )
-            
-            self.stdout.write(self.style.SUCCESS("Creating attendance records..."))
-            # Create attendance records
-            for employee in employees:
-                for _ in range(20):  # 20 attendance records per employee
-                    date = fake.date_between(start_date='-1y', end_date='today')
-                    clock_in = fake.time()
-                    clock_out = fake.time() if fake.boolean(chance_of_getting_true=70) else None  # 70% chance of clocking out
-                    notes = fake.text() if fake.boolean(chance_of_getting_true=20) else None
-                    Attendance.objects.create(
-                        employee=employee,
-                        date=date,
-                        clock_in=clock_in,
-                        clock_out=clock_out,
-                        notes=notes,
-                    )
-            
-            self.stdout.write(self.style.SUCCESS("Updating Departmental Performance"))
-            # Update Departmental Performance
-            for dept_name in departments:
-                department = DepartmentalPerformance.objects.get(department_name=dept_name)
-# Calculate the average rating for the department.
-                avg_rating = PerformanceRecord.objects.filter(employee__department=dept_name).aggregate(Avg('rating'))['rating__avg']
-                employee_count = Employee.objects.filter(department=dept_name).count()
-                
-                department.average_rating = avg_rating if avg_rating else 0.0
-                department.total_employees = employee_count
-                department.save()
+    def run_tasks(self, tasks, workers):
+        """
+        Yields each task's result as it finishes.
+        """
+        if workers <= 0:
+            for task in tasks:
+                yield synthetic_data.generate_chunk(task)
+            return
+        # Spawned, not forked, so workers open their own database connections.
+        connection.close()
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context('spawn'), initializer=django.setup,
+        ) as executor:
+            futures = [executor.submit(synthetic_data.generate_chunk, task) for task in tasks]
+            for future in as_completed(futures):
+                yield future.result()
 
-        self.stdout.write(self.style.SUCCESS('Successfully generated synthetic data.'))
\ No newline at end of file
+    def report_progress(self, result, started):
+        self.rows += sum(result.counts.values())
+        self.employees += result.counts[Employee._meta.model_name]
+        now = time.monotonic()
+        if now - self.last_report >= 2:
+            self.last_report = now
+            self.stdout.write(
+                f'{self.employees} employees, {self.rows} rows, {self.rows / (now - started):,.0f} rows/s'
+            )
@@ -0,0 +1,53 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from employee_management import employee_import
+from employee_management.models import ImportJob
+
+class Command(BaseCommand):
+    """
+    Command to import employees from a CSV or NDJSON file, as the
+    ``/api/employees/import/`` endpoint does.  See
+    employee_management/employee_import.py.
+    """
+    help = 'Imports employees from a CSV or NDJSON file, writing rejected rows to a report'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import')
+        parser.add_argument('--format', dest='input_format', choices=[choice for choice, _ in ImportJob.FORMAT_CHOICES],
+                            help="File format (default: from the file's extension)")
+        parser.add_argument('--dry-run', action='store_true', help='Validate every row without loading any')
+        parser.add_argument('--batch-size', type=int, help='Rows validated and loaded together (default IMPORT_JOBS["BATCH_SIZE"])')
+
+    def handle(self, *args, **options):
+        """
+        Handles the execution of the command.
+        """
+        input_format = options['input_format'] or employee_import.detect_format(options['path'])
+        if input_format is None:
+            raise CommandError('Cannot tell the format from the file name; pass --format')
+        if options['batch_size'] is not None and options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        try:
+            stream = open(options['path'], 'rb')
+        except OSError as exc:
+            raise CommandError(str(exc))
+        job = employee_import.start_import(options['path'], input_format, options['dry_run'])
+        self.last_report = self.started = time.monotonic()
+        with stream:
+            job = employee_import.EmployeeImport(job, options['batch_size'], progress=self.report_progress).run(stream)
+        if job.status != ImportJob.STATUS_COMPLETED:
+            raise CommandError(f'Import {job.pk} failed after {job.rows_read} rows: {job.error}')
+        verb = 'Would load' if job.dry_run else 'Loaded'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {job.rows_loaded} of {job.rows_read} rows, {job.rows_rejected} rejected '
+            f'({job.rows_per_second:,.0f} rows/s).'
+        ))
+        if job.report_path:
+            self.stdout.write(f'Rejected rows: {job.report_path}')
+
+    def report_progress(self, job):
+        now = time.monotonic()
+        if now - self.last_report >= 2:
+            self.last_report = now
+            self.stdout.write(f'{job.rows_read} rows, {job.rows_rejected} rejected, '
+                              f'{job.rows_read / (now - self.started):,.0f} rows/s')
@@ -0,0 +1,79 @@
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from employee_management.urls import router
+from utils import index_advisor
+import io
+
+class Command(BaseCommand):
+    """
+    Command to check that the list queries the API can run are served by
+    indexes.
+
+    For every registered viewset, the queries its ``filterset_fields``,
+    ``ordering_fields`` and ``search_fields`` allow are built from
+    representative requests and explained; any that still scan a whole table
+    or sort the matching rows are reported.  Runs against the configured
+    database, or with ``--employees`` against a throwaway test database
+    seeded with generate_data.
+    """
+    help = 'Explains the filter, ordering and search queries of each viewset and reports sequential scans and sorts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--employees', type=int,
+                            help='Seed a throwaway test database with this many employees instead of using the configured one')
+        parser.add_argument('--only', help='Only check viewsets whose route prefix contains this')
+        parser.add_argument('--min-rows', type=int, default=1000,
+                            help='Skip viewsets with fewer rows than this, which are scanned whatever the indexes (default 1000)')
+        parser.add_argument('--fail', action='store_true', help='Exit with an error if any query falls back')
+
+    def handle(self, *args, **options):
+        """
+        Handles the execution of the command.
+        """
+        if connection.vendor not in ('postgresql', 'sqlite'):
+            raise CommandError(f'Query plans on {connection.vendor} are not supported')
+        if options['employees'] is None:
+            flagged = self.check_all(options)
+        else:
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                self.stdout.write(self.style.SUCCESS(f"Seeding {options['employees']} employees..."))
+                call_command('generate_data', employees=options['employees'], workers=0, stdout=io.StringIO())
+                if connection.vendor == 'sqlite':
+                    with connection.cursor() as cursor:
+                        cursor.execute('ANALYZE')  # generate_data analyzes on PostgreSQL
+                flagged = self.check_all(options)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+        if flagged and options['fail']:
+            raise CommandError(f'{flagged} queries fall back to a sequential scan or sort')
+
+    def check_all(self, options):
+        # Not staff, so per-user querysets (export jobs) are filtered as for
+        # an ordinary user.
+        user = User.objects.filter(is_staff=False).first() or User(pk=0, username='index-advisor')
+        total = flagged = 0
+        for prefix, viewset, basename in router.registry:
+            if options['only'] and options['only'] not in prefix:
+                continue
+            count, checks = index_advisor.check_viewset(viewset, user, connection.vendor, options['min_rows'])
+            if not checks:
+                self.stdout.write(f'{prefix}: {count} rows, skipped')
+                continue
+            self.stdout.write(self.style.MIGRATE_HEADING(prefix))
+            for check in checks:
+                total += 1
+                params = ', '.join(f'{key}={value}' for key, value in check.params.items()) or '(no parameters)'
+                if not check.problems:
+                    self.stdout.write(f'  ok    {params}')
+                    continue
+                flagged += 1
+                self.stdout.write(self.style.WARNING(f"  FLAG  {params}: {', '.join(check.problems)}"))
+                if options['verbosity'] >= 2:
+                    for line in check.plan.splitlines():
+                        self.stdout.write(f'        {line}')
+        style = self.style.WARNING if flagged else self.style.SUCCESS
+        self.stdout.write(style(f'{flagged} of {total} queries fall back to a sequential scan or sort.'))
+        return flagged
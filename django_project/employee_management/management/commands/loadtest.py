@@ -0,0 +1,321 @@
+from django.conf import settings
+from django.contrib.auth.models import Group, Permission, User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework.throttling import SimpleRateThrottle
+from employee_management.authentication import auth_cache
+from employee_management.models import Department, Employee, PerformanceRecord, Attendance
+from utils import loadtesting
+from collections import defaultdict
+import argparse
+import http.client
+import io
+import itertools
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+RESOURCES = {
+    'employees': Employee,
+    'performance-records': PerformanceRecord,
+    'attendance': Attendance,
+}
+DEFAULT_MIX = 'list=50,detail=25,search=10,create=10,export=5'
+PASSWORD = 'loadtest-password'
+
+class Command(BaseCommand):
+    """
+    Command to load test the full stack over HTTP.
+
+    The app is served on localhost from this process (WSGI with Django's
+    threaded server, or ASGI with uvicorn) against a throwaway test database
+    seeded with generate_data.  A pool of users with model permissions logs
+    in through ``/api-token-auth/``, then requests are sent at the target rate
+    in the configured mix, through routing, token authentication, permissions,
+    throttling, filtering and rendering.
+
+    Latencies are measured from when each request was scheduled to be sent,
+    so a server that falls behind the target rate shows it in the tail.
+
+    ``--server both`` runs the same load against the two deployments in turn,
+    each in a child process: WSGI with the sync views (``ASYNC_READS=false``)
+    and ASGI with the async read views, and compares their throughput.  Use
+    ``--rate 0`` to measure how much each serves at ``--concurrency``
+    connections.
+    """
+    help = 'Replays a mix of API requests at a target rate and reports latency percentiles per endpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--server', choices=['wsgi', 'asgi', 'both'], default='wsgi',
+                            help='Serve the app with WSGI (default) or ASGI (needs uvicorn); both compares the WSGI '
+                                 'deployment with sync views and the ASGI deployment with async reads')
+        parser.add_argument('--port', type=int, default=0, help='Port to serve on (default: any free port)')
+        parser.add_argument('--employees', type=int, default=200, help='Employees to seed (default 200)')
+        parser.add_argument('--users', type=int, default=10, help='Synthetic API users (default 10)')
+        parser.add_argument('--rate', type=float, default=50,
+                            help='Target requests per second; 0 sends as fast as the clients can (default 50)')
+        parser.add_argument('--duration', type=float, default=30, help='Seconds to send requests for (default 30)')
+        parser.add_argument('--concurrency', type=int, default=16, help='Client threads (default 16)')
+        parser.add_argument('--mix', default=DEFAULT_MIX,
+                            help=f'Weights of list, detail, search, create and export requests (default {DEFAULT_MIX})')
+        parser.add_argument('--user-rate',
+                            help="Override the 'user' throttle rate, e.g. 100000/hour (default: configured rate)")
+        parser.add_argument('--auth-cache', action=argparse.BooleanOptionalAction, default=True,
+                            help='Cache token and permission lookups (default); compare the queries column of a run '
+                                 'with --no-auth-cache to see what the cache saves per request')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the request mix')
+        parser.add_argument('--output', help='Also write the results to this JSON file')
+
+    def handle(self, *args, **options):
+        """
+        Handles the execution of the command.
+        """
+        mix = self.parse_mix(options['mix'])
+        if options['server'] in ('asgi', 'both'):
+            try:
+                import uvicorn  # noqa: F401
+            except ImportError:
+                raise CommandError(f"--server {options['server']} needs uvicorn (pip install uvicorn)")
+        if options['server'] == 'both':
+            return self.compare(options)
+        if options['user_rate']:
+            SimpleRateThrottle.THROTTLE_RATES = {**SimpleRateThrottle.THROTTLE_RATES, 'user': options['user_rate']}
+        settings.MIDDLEWARE = ['utils.loadtesting.QueryCountMiddleware', *settings.MIDDLEWARE]
+        settings.AUTH_CACHE = {**getattr(settings, 'AUTH_CACHE', {}), 'ENABLED': options['auth_cache']}
+        settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, '127.0.0.1']
+        # 4xx responses are expected (throttling) and reported in the summary.
+        logging.getLogger('django.request').setLevel(logging.ERROR)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            # Fresh throttle counts, not those of the development server.
+            settings.THROTTLE_STORE = {**getattr(settings, 'THROTTLE_STORE', {}), 'PATH': os.path.join(tmp, 'throttle.sqlite3')}
+            if connection.vendor == 'sqlite':
+                # A file, not the default shared in-memory database, so the
+                # server's request threads get their own connections.
+                connection.settings_dict['TEST']['NAME'] = os.path.join(tmp, 'loadtest.sqlite3')
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                self.seed(options)
+                server = self.start_server(options)
+                try:
+                    tokens = [self.login(server.port, f'loadtest{n}') for n in range(options['users'])]
+                    samples, elapsed = self.run_load(server.port, tokens, mix, options)
+                finally:
+                    server.stop()
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+        self.report(samples, elapsed, options)
+
+    def compare(self, options):
+        """
+        Runs the load against each deployment in a child process and reports
+        their totals side by side.
+        """
+        totals = {}
+        with tempfile.TemporaryDirectory() as tmp:
+            for server, async_reads in (('wsgi', 'false'), ('asgi', 'true')):
+                output = os.path.join(tmp, f'{server}.json')
+                args = [sys.executable, '-m', 'django', 'loadtest', '--server', server, '--output', output,
+                        '--auth-cache' if options['auth_cache'] else '--no-auth-cache']
+                for name in ('port', 'employees', 'users', 'rate', 'duration', 'concurrency', 'mix', 'user_rate', 'seed'):
+                    if options[name] is not None:
+                        args += [f"--{name.replace('_', '-')}", str(options[name])]
+                env = {
+                    **os.environ, 'ASYNC_READS': async_reads,
+                    'PYTHONPATH': os.pathsep.join(filter(None, [str(settings.BASE_DIR), os.environ.get('PYTHONPATH')])),
+                }
+                self.stdout.write(self.style.MIGRATE_HEADING(f'{server.upper()}, ASYNC_READS={async_reads}'))
+                completed = subprocess.run(args, env=env, capture_output=True, text=True)
+                self.stdout.write(completed.stdout)
+                if completed.returncode:
+                    raise CommandError(f'The {server} run failed:\n{completed.stderr[-2000:]}')
+                with open(output) as f:
+                    totals[server] = json.load(f)['results']['TOTAL']
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Comparison'))
+        self.stdout.write(f"{'server':<8} {'requests':>8} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+        for server, total in totals.items():
+            latencies = ' '.join(
+                f'{total[key] * 1000:9.1f}' if total[key] is not None else f"{'-':>9}" for key in ('p50', 'p95', 'p99')
+            )
+            self.stdout.write(
+                f"{server:<8} {total['requests']:>8} {total['throughput']:>8.1f} {latencies} {total['error_rate']:>7.1%}"
+            )
+        if totals['wsgi']['throughput']:
+            self.stdout.write(f"ASGI/WSGI throughput: {totals['asgi']['throughput'] / totals['wsgi']['throughput']:.2f}x")
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({'options': {key: options[key] for key in (
+                    'server', 'employees', 'users', 'rate', 'duration', 'concurrency', 'mix', 'user_rate', 'auth_cache',
+                )}, 'results': totals}, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Wrote results to {options['output']}"))
+
+    def parse_mix(self, value):
+        mix = {}
+        for part in value.split(','):
+            kind, _, weight = part.partition('=')
+            if kind not in ('list', 'detail', 'search', 'create', 'export'):
+                raise CommandError(f'Unknown request kind in --mix: {kind!r}')
+            try:
+                mix[kind] = float(weight)
+            except ValueError:
+                raise CommandError(f'Invalid weight in --mix: {part!r}')
+        if not any(mix.values()):
+            raise CommandError('--mix needs at least one positive weight')
+        return mix
+
+    def seed(self, options):
+        self.stdout.write(self.style.SUCCESS(f"Seeding {options['employees']} employees..."))
+        call_command('generate_data', employees=options['employees'], seed=options['seed'], workers=0,
+                     stdout=io.StringIO())
+        group = Group.objects.create(name='loadtest')
+        group.permissions.set(Permission.objects.filter(content_type__app_label='employee_management'))
+        for n in range(options['users']):
+            User.objects.create_user(f'loadtest{n}', password=PASSWORD).groups.add(group)
+        self.ids = {name: list(model.objects.values_list('pk', flat=True)[:1000]) for name, model in RESOURCES.items()}
+        self.last_names = list(Employee.objects.values_list('last_name', flat=True).distinct()[:100])
+        self.departments = list(Department.objects.filter(employees__isnull=False).distinct().values_list('name', flat=True))
+        connection.close()  # The server threads open their own connections
+
+    def start_server(self, options):
+        if options['server'] == 'asgi':
+            from django.core.asgi import get_asgi_application
+            server = loadtesting.ASGIServerThread(get_asgi_application(), port=options['port'] or 8765)
+            server.start()
+            server.wait_until_started()
+        else:
+            from django.core.wsgi import get_wsgi_application
+            server = loadtesting.WSGIServerThread(get_wsgi_application(), port=options['port'])
+            server.start()
+        self.stdout.write(self.style.SUCCESS(f"Serving over {options['server'].upper()} on 127.0.0.1:{server.port}"))
+        return server
+
+    def send(self, port, method, path, body=None, headers=None):
+        """
+        Sends one request and reads the whole response.  Returns the status
+        and body, with status 0 if the connection failed.
+        """
+        client = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        headers = dict(headers or {})
+        if body is not None:
+            body = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        try:
+            client.request(method, path, body=body, headers=headers)
+            response = client.getresponse()
+            return response.status, response.read()
+        except OSError:
+            return 0, b''
+        finally:
+            client.close()
+
+    def login(self, port, username):
+        status, body = self.send(port, 'POST', '/api-token-auth/', {'username': username, 'password': PASSWORD})
+        if status != 200:
+            raise CommandError(f'Could not log in {username}: HTTP {status} {body[:200]!r}')
+        return json.loads(body)['token']
+
+    def build_request(self, kind, rng, sequence):
+        """
+        Returns (endpoint name, method, path, body) for one request.
+        """
+        resource = rng.choice(list(RESOURCES))
+        if kind == 'list':
+            return f'list {resource}', 'GET', f'/api/{resource}/?page={rng.randint(1, 5)}', None
+        if kind == 'detail':
+            return f'detail {resource}', 'GET', f'/api/{resource}/{rng.choice(self.ids[resource])}/', None
+        if kind == 'search':
+            return 'search employees', 'GET', f'/api/employees/?search={rng.choice(self.last_names)}', None
+        if kind == 'export':
+            return 'export employees', 'GET', f'/api/employees/export_csv/?department={rng.choice(self.departments)}', None
+        if sequence % 2:
+            return 'create performance-records', 'POST', '/api/performance-records/', {
+                'employee': rng.choice(self.ids['employees']), 'review_date': '2024-01-01',
+                'rating': rng.randint(1, 5), 'comments': 'Load test', 'reviewer_name': 'Load Test',
+            }
+        return 'create employees', 'POST', '/api/employees/', {
+            'first_name': 'Load', 'last_name': 'Test', 'email': f'loadtest-{sequence}@example.com',
+            'job_title': 'Tester', 'department': rng.choice(self.departments), 'hire_date': '2024-01-01',
+            'salary': '50000.00',
+        }
+
+    def run_load(self, port, tokens, mix, options):
+        """
+        Sends requests from ``--concurrency`` threads for ``--duration``
+        seconds.  Returns ``{endpoint: [(latency, status, queries)]}`` and the
+        elapsed time.
+        """
+        kinds, weights = zip(*mix.items())
+        rate, duration = options['rate'], options['duration']
+        sequence = itertools.count()
+        samples = defaultdict(list)
+        lock = threading.Lock()
+        self.stdout.write(self.style.SUCCESS(
+            f"Sending {'as many requests as possible' if rate <= 0 else f'{rate:g} requests/s'} "
+            f"for {duration:g}s from {options['concurrency']} threads..."
+        ))
+        started = time.monotonic()
+
+        def client(worker):
+            rng = random.Random(f"{options['seed']}:{worker}")
+            while True:
+                n = next(sequence)
+                scheduled = started + n / rate if rate > 0 else time.monotonic()
+                if scheduled - started >= duration or time.monotonic() - started >= duration:
+                    return
+                delay = scheduled - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                name, method, path, body = self.build_request(rng.choices(kinds, weights)[0], rng, n)
+                request_id = str(n)
+                status, _ = self.send(port, method, path, body, {
+                    'Authorization': f'Token {tokens[n % len(tokens)]}',
+                    loadtesting.REQUEST_ID_HEADER: request_id,
+                })
+                latency = time.monotonic() - scheduled
+                with lock:
+                    samples[name].append((latency, status, loadtesting.QUERY_COUNTS.pop(request_id, None)))
+
+        threads = [threading.Thread(target=client, args=(worker,)) for worker in range(options['concurrency'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return samples, time.monotonic() - started
+
+    def report(self, samples, elapsed, options):
+        rows = {name: loadtesting.summarize(endpoint_samples) for name, endpoint_samples in sorted(samples.items())}
+        rows['TOTAL'] = loadtesting.summarize([sample for values in samples.values() for sample in values])
+
+        def ms(value):
+            return f'{value * 1000:9.1f}' if value is not None else f"{'-':>9}"
+
+        self.stdout.write(
+            f"{'endpoint':<28} {'requests':>8} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+            f"{'errors':>7} {'throttled':>9} {'queries':>8}"
+        )
+        results = {}
+        for name, summary in rows.items():
+            error_rate = summary.errors / summary.requests if summary.requests else 0
+            queries = f'{summary.mean_queries:8.1f}' if summary.mean_queries is not None else f"{'-':>8}"
+            self.stdout.write(
+                f'{name:<28} {summary.requests:>8} {summary.requests / elapsed:>8.1f} {ms(summary.p50)} '
+                f'{ms(summary.p95)} {ms(summary.p99)} {error_rate:>7.1%} {summary.throttled:>9} {queries}'
+            )
+            results[name] = {**summary._asdict(), 'throughput': summary.requests / elapsed, 'error_rate': error_rate}
+        if options['auth_cache']:
+            for name, lru in (('Token', auth_cache.tokens), ('Permission', auth_cache.permissions)):
+                self.stdout.write(f'{name} cache: {lru.hits} hits, {lru.misses} misses')
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({'options': {key: options[key] for key in (
+                    'server', 'employees', 'users', 'rate', 'duration', 'concurrency', 'mix', 'user_rate', 'auth_cache',
+                )}, 'elapsed': elapsed, 'results': results}, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Wrote results to {options['output']}"))
@@ -0,0 +1,23 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from employee_management import change_feed
+
+class Command(BaseCommand):
+    """
+    Command to remove old change feed tombstones, meant to run daily.
+    """
+    help = 'Removes the change feed records of deletes older than CHANGE_FEED["TOMBSTONE_DAYS"]'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Keep the deletes of this many days (default TOMBSTONE_DAYS)')
+
+    def handle(self, *args, **options):
+        """
+        Handles the execution of the command.
+        """
+        days = options['days'] if options['days'] is not None else change_feed.get_change_feed_settings()['TOMBSTONE_DAYS']
+        if days < 0:
+            raise CommandError('--days must not be negative')
+        removed = change_feed.prune(timezone.now() - timedelta(days=days))
+        self.stdout.write(self.style.SUCCESS(f'Removed {removed} tombstones older than {days} days.'))
@@ -0,0 +1,24 @@
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from employee_management import attendance_rollups
+
+class Command(BaseCommand):
+    """
+    Command to backfill or repair the attendance hours rollups from the
+    attendance table.
+    """
+    help = 'Recomputes attendance hours rollups, optionally only for a date range'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=date.fromisoformat, help='First date to recompute (YYYY-MM-DD)')
+        parser.add_argument('--end', type=date.fromisoformat, help='Last date to recompute (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        """
+        Handles the execution of the command.
+        """
+        start, end = options['start'], options['end']
+        if start and end and start > end:
+            raise CommandError('--start must not be after --end')
+        scanned = attendance_rollups.rebuild(start=start, end=end)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt attendance rollups from {scanned} attendance records.'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from employee_management import department_stats
+
+class Command(BaseCommand):
+    """
+    Command to recompute DepartmentalPerformance from the employee and
+    performance record tables, e.g. after writes that bypassed the model
+    signals.
+    """
+    help = 'Recomputes departmental performance totals from scratch'
+
+    def handle(self, *args, **options):
+        """
+        Handles the execution of the command.
+        """
+        count = department_stats.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt statistics for {count} departments.'))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from employee_management.models import ExportJob
+from utils.export_jobs import run_export_job
+
+class Command(BaseCommand):
+    """
+    Command to finish background exports that were interrupted, e.g. by a
+    restart.  Chunks that were already written are kept.
+    """
+    help = 'Resumes pending and interrupted background CSV exports'
+
+    def handle(self, *args, **options):
+        """
+        Handles the execution of the command.
+        """
+        job_ids = list(
+            ExportJob.objects.filter(status__in=[ExportJob.STATUS_PENDING, ExportJob.STATUS_RUNNING])
+            .order_by('created_at').values_list('pk', flat=True)
+        )
+        for job_id in job_ids:
+            self.stdout.write(f"Running export job {job_id}...")
+            run_export_job(job_id)
+            job = ExportJob.objects.get(pk=job_id)
+            style = self.style.SUCCESS if job.status == ExportJob.STATUS_COMPLETED else self.style.ERROR
+            self.stdout.write(style(f"Export job {job_id}: {job.status} ({job.rows_written} rows)"))
+
+        self.stdout.write(self.style.SUCCESS(f'Processed {len(job_ids)} export jobs.'))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from employee_management.employee_import import run_import_job
+from employee_management.models import ImportJob
+
+class Command(BaseCommand):
+    """
+    Command to run background imports that had not started, e.g. because of
+    a restart.  Imports that were interrupted are marked failed rather than
+    run again: the batches they committed are kept, and running the file
+    again would reject those rows as existing emails.
+    """
+    help = 'Runs pending background imports and marks interrupted ones failed'
+
+    def handle(self, *args, **options):
+        """
+        Handles the execution of the command.
+        """
+        for job in ImportJob.objects.filter(status=ImportJob.STATUS_RUNNING).order_by('created_at'):
+            ImportJob.objects.filter(pk=job.pk, status=ImportJob.STATUS_RUNNING).update(
+                status=ImportJob.STATUS_FAILED, finished_at=timezone.now(),
+                error=f'Interrupted after {job.rows_read} rows; the rows loaded until then were kept.',
+            )
+            self.stdout.write(self.style.ERROR(f"Import job {job.pk}: interrupted after {job.rows_read} rows"))
+
+        job_ids = list(
+            ImportJob.objects.filter(status=ImportJob.STATUS_PENDING).order_by('created_at').values_list('pk', flat=True)
+        )
+        for job_id in job_ids:
+            self.stdout.write(f"Running import job {job_id}...")
+            run_import_job(job_id)
+            job = ImportJob.objects.get(pk=job_id)
+            style = self.style.SUCCESS if job.status == ImportJob.STATUS_COMPLETED else self.style.ERROR
+            self.stdout.write(style(f"Import job {job_id}: {job.status} ({job.rows_loaded} of {job.rows_read} rows loaded)"))
+
+        self.stdout.write(self.style.SUCCESS(f'Processed {len(job_ids)} import jobs.'))
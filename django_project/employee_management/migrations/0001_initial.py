@@ -0,0 +1,74 @@
+# Generated by Django 4.2.11 on 2026-10-17 20:14
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DepartmentalPerformance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('department_name', models.CharField(max_length=100, unique=True)),
+                ('average_rating', models.FloatField(default=0.0)),
+                ('total_employees', models.IntegerField(default=0)),
+                ('last_updated', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-average_rating'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Employee',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_name', models.CharField(max_length=100)),
+                ('last_name', models.CharField(max_length=100)),
+                ('email', models.EmailField(max_length=254, unique=True)),
+                ('job_title', models.CharField(max_length=100)),
+                ('department', models.CharField(max_length=100)),
+                ('hire_date', models.DateField()),
+                ('salary', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('is_active', models.BooleanField(default=True)),
+            ],
+            options={
+                'unique_together': {('email',)},
+            },
+        ),
+        migrations.CreateModel(
+            name='PerformanceRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('review_date', models.DateField()),
+                ('rating', models.IntegerField(validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(5)])),
+                ('comments', models.TextField()),
+                ('reviewer_name', models.CharField(max_length=200)),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='performance_records', to='employee_management.employee')),
+            ],
+            options={
+                'ordering': ['-review_date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Attendance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('clock_in', models.TimeField()),
+                ('clock_out', models.TimeField(blank=True, null=True)),
+                ('notes', models.TextField(blank=True, null=True)),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_records', to='employee_management.employee')),
+            ],
+            options={
+                'unique_together': {('employee', 'date')},
+            },
+        ),
+    ]
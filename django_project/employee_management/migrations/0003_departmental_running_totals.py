@@ -0,0 +1,56 @@
+# Generated by Django 4.2.11 on 2026-10-17 20:18
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_totals(apps, schema_editor):
+    """
+    Same computation as department_stats.rebuild(), on the historical models.
+    """
+    Employee = apps.get_model('employee_management', 'Employee')
+    PerformanceRecord = apps.get_model('employee_management', 'PerformanceRecord')
+    DepartmentalPerformance = apps.get_model('employee_management', 'DepartmentalPerformance')
+    headcounts = dict(
+        Employee.objects.filter(is_active=True).order_by()
+        .values('department').annotate(n=Count('id')).values_list('department', 'n')
+    )
+    ratings = {
+        department: (rating_sum, rating_count)
+        for department, rating_sum, rating_count in
+        PerformanceRecord.objects.filter(employee__is_active=True).order_by()
+        .values('employee__department').annotate(s=Sum('rating'), c=Count('id'))
+        .values_list('employee__department', 's', 'c')
+    }
+    for name in set(headcounts) | set(ratings):
+        rating_sum, rating_count = ratings.get(name, (0, 0))
+        DepartmentalPerformance.objects.update_or_create(
+            department_name=name,
+            defaults={
+                'total_employees': headcounts.get(name, 0),
+                'rating_sum': rating_sum,
+                'rating_count': rating_count,
+                'average_rating': rating_sum / rating_count if rating_count else 0.0,
+            },
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employee_management', '0002_exportjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='departmentalperformance',
+            name='rating_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='departmentalperformance',
+            name='rating_sum',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 4.2.11 on 2026-10-17 20:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_rollups(apps, schema_editor):
+    """
+    Same totals as attendance_rollups.rebuild(), on the historical models.
+    """
+    from employee_management.attendance_rollups import GRANULARITIES, period_start, shift_seconds
+
+    Attendance = apps.get_model('employee_management', 'Attendance')
+    EmployeeHoursRollup = apps.get_model('employee_management', 'EmployeeHoursRollup')
+    DepartmentHoursRollup = apps.get_model('employee_management', 'DepartmentHoursRollup')
+    employee_totals, department_totals = {}, {}
+    rows = Attendance.objects.values_list('employee_id', 'employee__department', 'date', 'clock_in', 'clock_out')
+    for employee_id, department, day, clock_in, clock_out in rows.iterator(chunk_size=2000):
+        seconds = shift_seconds(clock_in, clock_out)
+        values = (seconds or 0, 1, 1 if seconds is None else 0)
+        for granularity in GRANULARITIES:
+            start = period_start(day, granularity)
+            for totals, key in ((employee_totals, (employee_id, granularity, start)),
+                                (department_totals, (department, granularity, start))):
+                current = totals.get(key, (0, 0, 0))
+                totals[key] = tuple(a + b for a, b in zip(current, values))
+    EmployeeHoursRollup.objects.bulk_create(
+        [
+            EmployeeHoursRollup(employee_id=owner, granularity=granularity, period_start=start,
+                                seconds_worked=values[0], shifts=values[1], open_shifts=values[2])
+            for (owner, granularity, start), values in employee_totals.items()
+        ],
+        batch_size=2000,
+    )
+    DepartmentHoursRollup.objects.bulk_create(
+        [
+            DepartmentHoursRollup(department=owner, granularity=granularity, period_start=start,
+                                  seconds_worked=values[0], shifts=values[1], open_shifts=values[2])
+            for (owner, granularity, start), values in department_totals.items()
+        ],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employee_management', '0003_departmental_running_totals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DepartmentHoursRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('day', 'Day'), ('week', 'Week'), ('month', 'Month')], max_length=5)),
+                ('period_start', models.DateField()),
+                ('seconds_worked', models.BigIntegerField(default=0)),
+                ('shifts', models.IntegerField(default=0)),
+                ('open_shifts', models.IntegerField(default=0)),
+                ('department', models.CharField(max_length=100)),
+            ],
+            options={
+                'ordering': ['period_start'],
+                'unique_together': {('department', 'granularity', 'period_start')},
+            },
+        ),
+        migrations.CreateModel(
+            name='EmployeeHoursRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('day', 'Day'), ('week', 'Week'), ('month', 'Month')], max_length=5)),
+                ('period_start', models.DateField()),
+                ('seconds_worked', models.BigIntegerField(default=0)),
+                ('shifts', models.IntegerField(default=0)),
+                ('open_shifts', models.IntegerField(default=0)),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hours_rollups', to='employee_management.employee')),
+            ],
+            options={
+                'ordering': ['period_start'],
+                'unique_together': {('employee', 'granularity', 'period_start')},
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    from employee_management.search import create_search_index
+    create_search_index(schema_editor)
+
+
+def drop_search_index(apps, schema_editor):
+    from employee_management.search import drop_search_index
+    drop_search_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX on PostgreSQL locks the table for writes while it builds;
+    # on a large employee table, create the indexes CONCURRENTLY beforehand
+    # (same names) and the IF NOT EXISTS here skips them.
+
+    dependencies = [
+        ('employee_management', '0004_attendance_hours_rollups'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 4.2.11 on 2026-10-17 20:43
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('employee_management', '0005_employee_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['date', 'id'], name='attendance_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['clock_in', 'id'], name='attendance_clock_in_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='departmenthoursrollup',
+            index=models.Index(fields=['granularity', 'period_start'], name='dept_hours_period_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='employee',
+            index=models.Index(fields=['department', 'is_active'], name='employee_dept_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='employee',
+            index=models.Index(condition=models.Q(('is_active', False)), fields=['id'], name='employee_inactive_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='employee',
+            index=models.Index(fields=['first_name', 'id'], name='employee_first_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='employee',
+            index=models.Index(fields=['last_name', 'id'], name='employee_last_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='employee',
+            index=models.Index(fields=['hire_date', 'id'], name='employee_hire_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='employee',
+            index=models.Index(fields=['salary', 'id'], name='employee_salary_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exportjob',
+            index=models.Index(fields=['requested_by', '-created_at'], name='export_job_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='performancerecord',
+            index=models.Index(fields=['employee', '-review_date'], name='performance_employee_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='performancerecord',
+            index=models.Index(fields=['review_date', 'id'], name='performance_review_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='performancerecord',
+            index=models.Index(fields=['rating', 'id'], name='performance_rating_idx'),
+        ),
+        # Drop the single-column foreign key indexes once the composite
+        # indexes leading with the same columns exist.
+        migrations.AlterField(
+            model_name='attendance',
+            name='employee',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='attendance_records', to='employee_management.employee'),
+        ),
+        migrations.AlterField(
+            model_name='exportjob',
+            name='requested_by',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='export_jobs', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='performancerecord',
+            name='employee',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='performance_records', to='employee_management.employee'),
+        ),
+    ]
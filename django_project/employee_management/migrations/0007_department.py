@@ -0,0 +1,71 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_search_index(apps, schema_editor):
+    from employee_management.search import create_search_index
+    create_search_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+    # First of three steps moving the department name into Department:
+    # 0007 adds the table and nullable integer keys next to the name columns,
+    # 0008 fills them in batches and indexes them, and 0009 drops the name
+    # columns.  0007 and 0008 only add, so the previous release keeps working
+    # while they run.
+    # The name columns keep their database names as ``department_name``
+    # fields until 0009 drops them.  Unapplying rebuilds the employee table
+    # on SQLite, so the search triggers are created again.
+
+    dependencies = [
+        ('employee_management', '0006_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, create_search_index),  # Once unapplied
+        migrations.CreateModel(
+            name='Department',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+            ],
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.RemoveIndex(model_name='employee', name='employee_dept_active_idx'),
+                migrations.RenameField(model_name='employee', old_name='department', new_name='department_name'),
+                migrations.AlterField(
+                    model_name='employee',
+                    name='department_name',
+                    field=models.CharField(db_column='department', max_length=100),
+                ),
+                migrations.AddIndex(
+                    model_name='employee',
+                    index=models.Index(fields=['department_name', 'is_active'], name='employee_dept_active_idx'),
+                ),
+                migrations.RenameField(
+                    model_name='departmenthoursrollup', old_name='department', new_name='department_name',
+                ),
+                migrations.AlterField(
+                    model_name='departmenthoursrollup',
+                    name='department_name',
+                    field=models.CharField(db_column='department', max_length=100),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='employee',
+            name='department',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='employees', to='employee_management.department'),
+        ),
+        migrations.AddField(
+            model_name='departmentalperformance',
+            name='department',
+            field=models.OneToOneField(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='performance', to='employee_management.department'),
+        ),
+        migrations.AddField(
+            model_name='departmenthoursrollup',
+            name='department',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='hours_rollups', to='employee_management.department'),
+        ),
+    ]
@@ -0,0 +1,74 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+from django.db.models import Max, OuterRef, Subquery
+
+BATCH_SIZE = 5000
+
+MODELS = ('Employee', 'DepartmentalPerformance', 'DepartmentHoursRollup')
+
+
+def backfill_departments(apps, schema_editor):
+    """
+    Creates a Department per department name and points the rows that have
+    no department yet at it, ``BATCH_SIZE`` primary keys per UPDATE.  Also
+    run by 0009 for rows the previous release wrote in the meantime.
+    """
+    if schema_editor.connection.vendor == 'postgresql':
+        # Check the new foreign keys as rows are updated, so no deferred
+        # checks are pending when 0009 alters the tables.
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+    Department = apps.get_model('employee_management', 'Department')
+    models = [apps.get_model('employee_management', name) for name in MODELS]
+    names = set()
+    for model in models:
+        names.update(
+            model.objects.filter(department__isnull=True).order_by()
+            .values_list('department_name', flat=True).distinct()
+        )
+    Department.objects.bulk_create(
+        [Department(name=name) for name in sorted(names)], batch_size=BATCH_SIZE, ignore_conflicts=True,
+    )
+    department = Subquery(Department.objects.filter(name=OuterRef('department_name')).values('pk')[:1])
+    for model in models:
+        last = model.objects.filter(department__isnull=True).aggregate(last=Max('pk'))['last'] or 0
+        for low in range(0, last + 1, BATCH_SIZE):
+            model.objects.filter(
+                pk__gte=low, pk__lt=low + BATCH_SIZE, department__isnull=True,
+            ).update(department=department)
+
+
+class AddIndexConcurrentlyOnPostgreSQL(AddIndexConcurrently):
+    """
+    Builds the index without locking the table against writes on
+    PostgreSQL, and as AddIndex does elsewhere.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+        else:
+            migrations.AddIndex.database_forwards(self, app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+        else:
+            migrations.AddIndex.database_backwards(self, app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+    # Each batch commits on its own, so no long transaction holds the rows,
+    # and the index is built once the keys are filled in, concurrently.
+    atomic = False
+
+    dependencies = [
+        ('employee_management', '0007_department'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_departments, migrations.RunPython.noop),
+        AddIndexConcurrentlyOnPostgreSQL(
+            model_name='employee',
+            index=models.Index(fields=['department', 'is_active'], name='employee_department_active_idx'),
+        ),
+    ]
@@ -0,0 +1,82 @@
+import importlib
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+
+def backfill_departments(apps, schema_editor):
+    module = importlib.import_module('employee_management.migrations.0008_backfill_departments')
+    module.backfill_departments(apps, schema_editor)
+
+
+def restore_names(apps, schema_editor):
+    """
+    Copies department names back into the name columns, when unapplied.
+    """
+    Department = apps.get_model('employee_management', 'Department')
+    name = Subquery(Department.objects.filter(pk=OuterRef('department_id')).values('name')[:1])
+    for model_name in ('Employee', 'DepartmentalPerformance', 'DepartmentHoursRollup'):
+        apps.get_model('employee_management', model_name).objects.update(department_name=name)
+
+
+def create_search_index(apps, schema_editor):
+    from employee_management.search import create_search_index
+    create_search_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+    # Runs with the release that reads departments by key.  SQLite rebuilds
+    # the employee table to drop the name column (and to add it back when
+    # unapplied), so the search triggers are created again.
+
+    dependencies = [
+        ('employee_management', '0008_backfill_departments'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, create_search_index),  # Once unapplied
+        migrations.RunPython(backfill_departments, migrations.RunPython.noop),
+        # Nullable first, so that unapplying can add the columns back before
+        # restore_names() fills them.
+        migrations.AlterField(
+            model_name='employee',
+            name='department_name',
+            field=models.CharField(db_column='department', max_length=100, null=True),
+        ),
+        migrations.AlterField(
+            model_name='departmentalperformance',
+            name='department_name',
+            field=models.CharField(max_length=100, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='departmenthoursrollup',
+            name='department_name',
+            field=models.CharField(db_column='department', max_length=100, null=True),
+        ),
+        migrations.RunPython(migrations.RunPython.noop, restore_names),
+        migrations.RemoveIndex(model_name='employee', name='employee_dept_active_idx'),
+        migrations.RemoveField(model_name='employee', name='department_name'),
+        migrations.AlterField(
+            model_name='employee',
+            name='department',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='employees', to='employee_management.department'),
+        ),
+        migrations.RemoveField(model_name='departmentalperformance', name='department_name'),
+        migrations.AlterField(
+            model_name='departmentalperformance',
+            name='department',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='performance', to='employee_management.department'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='departmenthoursrollup',
+            unique_together={('department', 'granularity', 'period_start')},
+        ),
+        migrations.RemoveField(model_name='departmenthoursrollup', name='department_name'),
+        migrations.AlterField(
+            model_name='departmenthoursrollup',
+            name='department',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='hours_rollups', to='employee_management.department'),
+        ),
+        migrations.RunPython(create_search_index, migrations.RunPython.noop),
+    ]
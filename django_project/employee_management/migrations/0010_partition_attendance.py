@@ -0,0 +1,25 @@
+from django.db import migrations
+
+
+def partition_attendance(apps, schema_editor):
+    from employee_management.partitions import partition_attendance
+    partition_attendance(schema_editor)
+
+
+def unpartition_attendance(apps, schema_editor):
+    from employee_management.partitions import unpartition_attendance
+    unpartition_attendance(schema_editor)
+
+
+class Migration(migrations.Migration):
+    # PostgreSQL only, see employee_management/partitions.py.  The table is
+    # copied into its partitions under an exclusive lock: on a large
+    # attendance table, run this in a maintenance window.
+
+    dependencies = [
+        ('employee_management', '0009_department_contract'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_attendance, unpartition_attendance),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 4.2.11 on 2026-10-17 21:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employee_management', '0011_importjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmployeePerformanceTrend',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('review_count', models.IntegerField()),
+                ('window_size', models.IntegerField()),
+                ('moving_average', models.FloatField()),
+                ('previous_average', models.FloatField(null=True)),
+                ('slope', models.FloatField(null=True)),
+                ('latest_rating', models.IntegerField()),
+                ('last_review_date', models.DateField()),
+                ('computed_at', models.DateTimeField()),
+                ('department', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='performance_trends', to='employee_management.department')),
+                ('employee', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='performance_trend', to='employee_management.employee')),
+            ],
+            options={
+                'ordering': ['employee'],
+                'indexes': [models.Index(fields=['department', 'employee'], name='performance_trend_dept_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DepartmentRatingSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.IntegerField()),
+                ('quarter', models.IntegerField()),
+                ('review_count', models.IntegerField()),
+                ('mean_rating', models.FloatField()),
+                ('ratings_1', models.IntegerField()),
+                ('ratings_2', models.IntegerField()),
+                ('ratings_3', models.IntegerField()),
+                ('ratings_4', models.IntegerField()),
+                ('ratings_5', models.IntegerField()),
+                ('p25', models.IntegerField()),
+                ('median', models.IntegerField()),
+                ('p75', models.IntegerField()),
+                ('p90', models.IntegerField()),
+                ('computed_at', models.DateTimeField()),
+                ('department', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='rating_snapshots', to='employee_management.department')),
+            ],
+            options={
+                'ordering': ['year', 'quarter', 'department'],
+                'indexes': [models.Index(fields=['year', 'quarter'], name='dept_rating_period_idx')],
+                'unique_together': {('department', 'year', 'quarter')},
+            },
+        ),
+    ]
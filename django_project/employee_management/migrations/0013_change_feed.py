@@ -0,0 +1,77 @@
+# Generated by Django 4.2.11 on 2026-10-17 22:00
+
+from django.db import migrations, models
+
+
+def create_search_index(apps, schema_editor):
+    from employee_management.search import create_search_index
+    create_search_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+    # Existing rows get change_seq 0, so clients starting without a cursor
+    # receive them.  SQLite rebuilds the employee table to add the column
+    # (and to drop it when unapplied), so the search triggers are created
+    # again.
+
+    dependencies = [
+        ('employee_management', '0012_performance_snapshots'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, create_search_index),  # Once unapplied
+        migrations.CreateModel(
+            name='ChangeCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.BigIntegerField(default=0)),
+                ('pruned_through', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resource', models.CharField(max_length=50)),
+                ('object_id', models.BigIntegerField()),
+                ('change_seq', models.BigIntegerField(unique=True)),
+                ('deleted_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='attendance',
+            name='change_seq',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='employee',
+            name='change_seq',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='performancerecord',
+            name='change_seq',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['change_seq', 'id'], name='attendance_change_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='employee',
+            index=models.Index(fields=['change_seq', 'id'], name='employee_change_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='performancerecord',
+            index=models.Index(fields=['change_seq', 'id'], name='performance_change_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['resource', 'change_seq'], name='tombstone_resource_seq_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['deleted_at'], name='tombstone_deleted_at_idx'),
+        ),
+        migrations.RunPython(create_search_index, migrations.RunPython.noop),
+    ]
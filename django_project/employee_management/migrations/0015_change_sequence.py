@@ -0,0 +1,36 @@
+from django.db import migrations
+
+SEQUENCE = 'employee_management_change_seq'
+
+
+def create_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    ChangeCounter = apps.get_model('employee_management', 'ChangeCounter')
+    value = ChangeCounter.objects.using(schema_editor.connection.alias).values_list('value', flat=True).first() or 0
+    schema_editor.execute(f'CREATE SEQUENCE {SEQUENCE} AS bigint START WITH {value + 1}')
+
+
+def drop_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    ChangeCounter = apps.get_model('employee_management', 'ChangeCounter')
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'SELECT CASE WHEN is_called THEN last_value ELSE last_value - 1 END FROM {SEQUENCE}')
+        value, = cursor.fetchone()
+    ChangeCounter.objects.using(schema_editor.connection.alias).update_or_create(pk=1, defaults={'value': value})
+    schema_editor.execute(f'DROP SEQUENCE {SEQUENCE}')
+
+
+class Migration(migrations.Migration):
+    # On PostgreSQL change numbers come from a sequence, which continues
+    # from the counter row.  The previous release numbers from the row, so
+    # it must not be writing when this is applied.
+
+    dependencies = [
+        ('employee_management', '0014_importjob_upload'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_sequence, drop_sequence),
+    ]
@@ -1,7 +1,49 @@
-from django.db import models
+from django.db import models, router, transaction
 from django.core.validators import MinValueValidator, MaxValueValidator
 
-class Employee(models.Model):
+class TrackedFieldsMixin:
+    """
+    Remembers the values of ``tracked_fields`` as loaded from the database, so
+    signal handlers can see what a save changed without another query.  Saves
+    and deletes run in a transaction so the handlers' writes commit or roll
+    back with them.
+    """
+    tracked_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_tracked_fields()
+        return instance
+
+    def remember_tracked_fields(self):
+        deferred = self.get_deferred_fields()
+        self._loaded_values = {
+            name: getattr(self, name) for name in self.tracked_fields if name not in deferred
+        }
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+        self.remember_tracked_fields()
+
+    def delete(self, using=None, keep_parents=False):
+        using = using or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            return super().delete(using=using, keep_parents=keep_parents)
+
+class Department(models.Model):
+    """
+    A department.  Employees and the department aggregates reference it by
+    integer key; the API reads and writes it by name.
+    """
+    name = models.CharField(max_length=100, unique=True)
+
+    def __str__(self):
+        return self.name
+
+class Employee(TrackedFieldsMixin, models.Model):
     """
     Represents an employee in the company.
     """
@@ -9,10 +51,14 @@ class Employee(models.Model):
     last_name = models.CharField(max_length=100)
     email = models.EmailField(unique=True)
     job_title = models.CharField(max_length=100)
-    department = models.CharField(max_length=100)
+    # The (department, is_active) index covers department lookups.
+    department = models.ForeignKey(Department, on_delete=models.PROTECT, related_name='employees', db_index=False)
     hire_date = models.DateField()
     salary = models.DecimalField(max_digits=10, decimal_places=2)
     is_active = models.BooleanField(default=True)
+    change_seq = models.BigIntegerField(default=0, editable=False)  # Change feed sequence number, see change_feed.py
+
+    tracked_fields = ('department_id', 'is_active')
 
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
@@ -20,52 +66,325 @@ class Employee(models.Model):
     class Meta:
         # Add a unique constraint
         unique_together = ('email',)
+        # Indexes for EmployeeViewSet's filterset_fields and ordering_fields.
+        # Orderings end in the pk, the keyset pagination tiebreaker.
+        indexes = [
+            models.Index(fields=['department', 'is_active'], name='employee_department_active_idx'),
+            models.Index(fields=['id'], condition=models.Q(is_active=False), name='employee_inactive_idx'),
+            models.Index(fields=['first_name', 'id'], name='employee_first_name_idx'),
+            models.Index(fields=['last_name', 'id'], name='employee_last_name_idx'),
+            models.Index(fields=['hire_date', 'id'], name='employee_hire_date_idx'),
+            models.Index(fields=['salary', 'id'], name='employee_salary_idx'),
+            models.Index(fields=['change_seq', 'id'], name='employee_change_idx'),
+        ]
 
-class PerformanceRecord(models.Model):
+class PerformanceRecord(TrackedFieldsMixin, models.Model):
     """
     Stores performance reviews for employees.
     """
-    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='performance_records')
+    # Indexed by performance_employee_date_idx.
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='performance_records', db_index=False)
     review_date = models.DateField()
     rating = models.IntegerField(
         validators=[MinValueValidator(1), MaxValueValidator(5)]
     )  # Rating from 1 to 5
     comments = models.TextField()
     reviewer_name = models.CharField(max_length=200)
+    change_seq = models.BigIntegerField(default=0, editable=False)  # Change feed sequence number, see change_feed.py
+
+    tracked_fields = ('employee_id', 'rating')
 
     def __str__(self):
         return f"Performance Review for {self.employee} on {self.review_date}"
     
     class Meta:
         ordering = ['-review_date']  # Default ordering by review date
+        indexes = [
+            models.Index(fields=['employee', '-review_date'], name='performance_employee_date_idx'),
+            models.Index(fields=['review_date', 'id'], name='performance_review_date_idx'),
+            models.Index(fields=['rating', 'id'], name='performance_rating_idx'),
+            models.Index(fields=['change_seq', 'id'], name='performance_change_idx'),
+        ]
 
-class Attendance(models.Model):
+class Attendance(TrackedFieldsMixin, models.Model):
     """
     Records daily attendance for employees.
     """
-    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='attendance_records')
+    # Indexed by the (employee, date) unique constraint.
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='attendance_records', db_index=False)
     date = models.DateField()
     clock_in = models.TimeField()
     clock_out = models.TimeField(null=True, blank=True)
     notes = models.TextField(blank=True, null=True)
+    change_seq = models.BigIntegerField(default=0, editable=False)  # Change feed sequence number, see change_feed.py
+
+    tracked_fields = ('employee_id', 'date', 'clock_in', 'clock_out')
 
     def __str__(self):
         return f"{self.employee} - {self.date}"
     
     class Meta:
         unique_together = ('employee', 'date') # Ensure only one entry per employee per day
+        indexes = [
+            models.Index(fields=['date', 'id'], name='attendance_date_idx'),
+            models.Index(fields=['clock_in', 'id'], name='attendance_clock_in_idx'),
+            models.Index(fields=['change_seq', 'id'], name='attendance_change_idx'),
+        ]
 
 class DepartmentalPerformance(models.Model):
     """
     Tracks overall performance of departments.  Useful for analytics.
     """
-    department_name = models.CharField(max_length=100, unique=True)
+    department = models.OneToOneField(Department, on_delete=models.CASCADE, related_name='performance')
     average_rating = models.FloatField(default=0.0)  #  Average performance rating
-    total_employees = models.IntegerField(default=0)
+    total_employees = models.IntegerField(default=0)  # Active employees
+    # Running totals over the reviews of active employees, kept current by
+    # department_stats.py.  average_rating is rating_sum / rating_count.
+    rating_sum = models.BigIntegerField(default=0)
+    rating_count = models.IntegerField(default=0)
     last_updated = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return self.department_name
+        return self.department.name
     
     class Meta:
         ordering = ['-average_rating']
+
+class HoursRollup(models.Model):
+    """
+    Hours worked per day, week or month, maintained from Attendance writes by
+    attendance_rollups.py.  Each row covers the period starting on
+    ``period_start`` (weeks start on Monday, months on the 1st).
+    """
+    GRANULARITY_DAY = 'day'
+    GRANULARITY_WEEK = 'week'
+    GRANULARITY_MONTH = 'month'
+    GRANULARITY_CHOICES = [
+        (GRANULARITY_DAY, 'Day'),
+        (GRANULARITY_WEEK, 'Week'),
+        (GRANULARITY_MONTH, 'Month'),
+    ]
+
+    granularity = models.CharField(max_length=5, choices=GRANULARITY_CHOICES)
+    period_start = models.DateField()
+    seconds_worked = models.BigIntegerField(default=0)  # Completed shifts only
+    shifts = models.IntegerField(default=0)
+    open_shifts = models.IntegerField(default=0)  # Shifts without a clock_out yet
+
+    class Meta:
+        abstract = True
+
+class EmployeeHoursRollup(HoursRollup):
+    """
+    Hours worked by one employee.
+    """
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='hours_rollups')
+
+    def __str__(self):
+        return f"{self.employee_id} {self.granularity} {self.period_start}"
+
+    class Meta:
+        unique_together = ('employee', 'granularity', 'period_start')
+        ordering = ['period_start']
+
+class DepartmentHoursRollup(HoursRollup):
+    """
+    Hours worked by a department's current employees: an employee's hours
+    move with them when they change department, and leave with them when
+    they are deleted.
+    """
+    department = models.ForeignKey(Department, on_delete=models.CASCADE, related_name='hours_rollups', db_index=False)
+
+    def __str__(self):
+        return f"{self.department_id} {self.granularity} {self.period_start}"
+
+    class Meta:
+        unique_together = ('department', 'granularity', 'period_start')
+        ordering = ['period_start']
+        indexes = [
+            # All departments' series, without a department filter.
+            models.Index(fields=['granularity', 'period_start'], name='dept_hours_period_idx'),
+        ]
+
+class EmployeePerformanceTrend(models.Model):
+    """
+    An employee's rating trend over their latest reviews, from the snapshot
+    computed by performance_analytics.py.
+    """
+    employee = models.OneToOneField(Employee, on_delete=models.CASCADE, related_name='performance_trend')
+    # Indexed by performance_trend_dept_idx.
+    department = models.ForeignKey(Department, on_delete=models.CASCADE, related_name='performance_trends', db_index=False)
+    review_count = models.IntegerField()  # All of the employee's reviews
+    window_size = models.IntegerField()  # Latest reviews the average and slope cover
+    moving_average = models.FloatField()  # Mean rating of the window
+    previous_average = models.FloatField(null=True)  # The same, one review earlier
+    slope = models.FloatField(null=True)  # Rating change per review over the window, least squares
+    latest_rating = models.IntegerField()
+    last_review_date = models.DateField()
+    computed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.employee_id} {self.moving_average:.2f}"
+
+    class Meta:
+        ordering = ['employee']
+        indexes = [
+            models.Index(fields=['department', 'employee'], name='performance_trend_dept_idx'),
+        ]
+
+class DepartmentRatingSnapshot(models.Model):
+    """
+    The distribution of a department's review ratings in one quarter, from
+    the snapshot computed by performance_analytics.py.  Percentiles are
+    nearest-rank: the lowest rating at least that share of reviews has.
+    """
+    # Indexed by the (department, year, quarter) unique constraint.
+    department = models.ForeignKey(Department, on_delete=models.CASCADE, related_name='rating_snapshots', db_index=False)
+    year = models.IntegerField()
+    quarter = models.IntegerField()  # 1 to 4
+    review_count = models.IntegerField()
+    mean_rating = models.FloatField()
+    # Reviews with each rating.
+    ratings_1 = models.IntegerField()
+    ratings_2 = models.IntegerField()
+    ratings_3 = models.IntegerField()
+    ratings_4 = models.IntegerField()
+    ratings_5 = models.IntegerField()
+    p25 = models.IntegerField()
+    median = models.IntegerField()
+    p75 = models.IntegerField()
+    p90 = models.IntegerField()
+    computed_at = models.DateTimeField()
+
+    @property
+    def histogram(self):
+        return [self.ratings_1, self.ratings_2, self.ratings_3, self.ratings_4, self.ratings_5]
+
+    def __str__(self):
+        return f"{self.department_id} {self.year}Q{self.quarter}"
+
+    class Meta:
+        unique_together = ('department', 'year', 'quarter')
+        ordering = ['year', 'quarter', 'department']
+        indexes = [
+            # All departments in a quarter.
+            models.Index(fields=['year', 'quarter'], name='dept_rating_period_idx'),
+        ]
+
+class ChangeCounter(models.Model):
+    """
+    The last change feed sequence number handed out on databases without
+    sequences, i.e. SQLite (a single row).  See change_feed.py.
+    """
+    value = models.BigIntegerField(default=0)
+    # Cursors before this sequence number may have missed deletes: their
+    # tombstones were pruned, or the tables were regenerated.
+    pruned_through = models.BigIntegerField(default=0)
+
+class Tombstone(models.Model):
+    """
+    Records the deletion of an employee, performance record or attendance
+    record for the change feed.  See change_feed.py.
+    """
+    resource = models.CharField(max_length=50)  # Model name, e.g. 'employee'
+    object_id = models.BigIntegerField()
+    change_seq = models.BigIntegerField(unique=True)
+    deleted_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.resource} {self.object_id} deleted"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['resource', 'change_seq'], name='tombstone_resource_seq_idx'),
+            models.Index(fields=['deleted_at'], name='tombstone_deleted_at_idx'),
+        ]
+
+class ExportJob(models.Model):
+    """
+    A CSV export running in the background.  See utils/export_jobs.py.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_COMPLETED, 'Completed'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    resource = models.CharField(max_length=100)  # Router basename, e.g. 'employee'
+    view_class = models.CharField(max_length=255)  # Dotted path of the viewset that builds the queryset
+    query_params = models.JSONField(default=dict)  # Filters as {name: [values]}
+    params_hash = models.CharField(max_length=64, db_index=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    total_rows = models.BigIntegerField(null=True, blank=True)
+    rows_written = models.BigIntegerField(default=0)
+    chunks_written = models.IntegerField(default=0)
+    file_path = models.CharField(max_length=500, blank=True)
+    file_size = models.BigIntegerField(default=0)
+    error = models.TextField(blank=True)
+    requested_by = models.ForeignKey('auth.User', null=True, blank=True, on_delete=models.SET_NULL, related_name='export_jobs',
+                                     db_index=False)  # Indexed by export_job_user_idx
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Export {self.pk} of {self.resource} ({self.status})"
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['requested_by', '-created_at'], name='export_job_user_idx'),
+        ]
+
+class ImportJob(models.Model):
+    """
+    A bulk import of employees from an uploaded file.  See
+    employee_management/employee_import.py.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_COMPLETED, 'Completed'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    FORMAT_CSV = 'csv'
+    FORMAT_NDJSON = 'ndjson'
+    FORMAT_CHOICES = [
+        (FORMAT_CSV, 'CSV'),
+        (FORMAT_NDJSON, 'NDJSON'),
+    ]
+
+    file_name = models.CharField(max_length=255, blank=True)
+    input_format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    dry_run = models.BooleanField(default=False)  # Validated only, nothing loaded
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    upload_path = models.CharField(max_length=500, blank=True)  # The uploaded file, until the job has read it
+    rows_read = models.BigIntegerField(default=0)
+    rows_loaded = models.BigIntegerField(default=0)  # Or that would be, for a dry run
+    rows_rejected = models.BigIntegerField(default=0)
+    rows_per_second = models.FloatField(default=0.0)
+    report_path = models.CharField(max_length=500, blank=True)  # Rejected rows and why, gzip-compressed CSV
+    report_size = models.BigIntegerField(default=0)
+    error = models.TextField(blank=True)
+    requested_by = models.ForeignKey('auth.User', null=True, blank=True, on_delete=models.SET_NULL, related_name='import_jobs',
+                                     db_index=False)  # Indexed by import_job_user_idx
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Import {self.pk} of {self.file_name or 'employees'} ({self.status})"
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['requested_by', '-created_at'], name='import_job_user_idx'),
+        ]
@@ -0,0 +1,351 @@
+"""
+Pagination for the API viewsets.
+
+Clients choose the mode per request:
+
+* ``?page=N`` (default): page-number pagination with an exact ``COUNT(*)``.
+  ``?count=estimate`` swaps the count for the PostgreSQL planner estimate on
+  large unfiltered lists.
+* ``?pagination=cursor`` (or any request carrying ``?cursor=``): keyset
+  pagination.  Each page is fetched with ``WHERE (field, id) > (last values)``
+  instead of ``OFFSET``, so every page costs the same however deep it is.  No
+  count is returned unless ``?count=exact`` or ``?count=estimate`` is given.
+
+Each class also has ``apaginate_queryset()``, which reads the count and the
+page with the async ORM, for the async read views (async_views.py).
+"""
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.paginator import InvalidPage, Paginator as DjangoPaginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import BooleanField, F, Func, Value
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import BasePagination, PageNumberPagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+COUNT_EXACT = 'exact'
+COUNT_ESTIMATE = 'estimate'
+
+# Below this many rows an exact count is cheap enough to always use.
+ESTIMATED_COUNT_MIN_ROWS = 10000
+
+
+class RowComparison(Func):
+    """
+    ``(a, b) > (c, d)``, or ``<``: a row-value comparison, which PostgreSQL
+    turns into a single range scan of an index on ``(a, b)``, where the
+    equivalent ``a > c OR (a = c AND b > d)`` may not use the index at all.
+    """
+    output_field = BooleanField()
+
+    def __init__(self, left, right, operator):
+        if operator not in ('<', '>'):
+            raise ValueError(f'Unsupported operator {operator!r}')
+        self.operator = operator
+        super().__init__(*left, *right)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        sql, params = [], []
+        for expression in self.get_source_expressions():
+            expression_sql, expression_params = compiler.compile(expression)
+            sql.append(expression_sql)
+            params.extend(expression_params)
+        half = len(sql) // 2
+        return f"({', '.join(sql[:half])}) {self.operator} ({', '.join(sql[half:])})", params
+
+
+def estimate_count(queryset):
+    """
+    Returns the planner's row estimate (``pg_class.reltuples``) for an
+    unfiltered queryset on PostgreSQL, or None when an estimate is not
+    available or not meaningful.
+    """
+    connection = connections[queryset.db]
+    query = queryset.query
+    if connection.vendor != 'postgresql' or query.where or query.distinct or query.combinator:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+            [queryset.model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    if not row or row[0] < ESTIMATED_COUNT_MIN_ROWS:  # -1 means never analyzed
+        return None
+    return row[0]
+
+
+def get_count_mode(request, default=COUNT_EXACT):
+    mode = request.query_params.get('count', default)
+    return mode if mode in (COUNT_EXACT, COUNT_ESTIMATE) else default
+
+
+class EstimatedCountPaginator(DjangoPaginator):
+    """
+    Django paginator that uses the planner estimate for ``count`` when one
+    is available.
+    """
+    estimated = False
+
+    @cached_property
+    def count(self):
+        estimate = estimate_count(self.object_list)
+        if estimate is None:
+            return super().count
+        self.estimated = True
+        return estimate
+
+
+class CustomPageNumberPagination(PageNumberPagination):
+    """
+    Custom pagination class to set page size.
+    """
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if get_count_mode(request) == COUNT_ESTIMATE:
+            self.django_paginator_class = EstimatedCountPaginator
+        return super().paginate_queryset(queryset, request, view)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        paginator = self.django_paginator_class(queryset, page_size)
+        count = None
+        if get_count_mode(request) == COUNT_ESTIMATE:
+            count = await sync_to_async(estimate_count)(queryset)
+            paginator.estimated = count is not None
+        paginator.count = count if count is not None else await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+        self.page.object_list = [row async for row in self.page.object_list]
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        self.request = request
+        return list(self.page)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if getattr(self.page.paginator, 'estimated', False):
+            response.data['count_estimated'] = True
+        return response
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (cursor) pagination on the active ordering field with the primary
+    key as a tiebreaker.
+
+    The ordering comes from the ``ordering`` query parameter (restricted to the
+    view's ``ordering_fields`` by OrderingFilter), else the view's ``ordering``,
+    else the model's ``Meta.ordering``, else the primary key.  Only the first
+    ordering term is used.  Ordering fields must not be nullable.
+    """
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_queryset = self.get_page_queryset(queryset, request, view)
+        count_mode = request.query_params.get('count')
+        if count_mode == COUNT_ESTIMATE:
+            self.count = estimate_count(queryset)
+            self.count_estimated = self.count is not None
+        if count_mode in (COUNT_EXACT, COUNT_ESTIMATE) and self.count is None:
+            self.count = queryset.count()
+        return self.set_page(list(page_queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        page_queryset = self.get_page_queryset(queryset, request, view)
+        count_mode = request.query_params.get('count')
+        if count_mode == COUNT_ESTIMATE:
+            self.count = await sync_to_async(estimate_count)(queryset)
+            self.count_estimated = self.count is not None
+        if count_mode in (COUNT_EXACT, COUNT_ESTIMATE) and self.count is None:
+            self.count = await queryset.acount()
+        return self.set_page([row async for row in page_queryset])
+
+    def get_page_queryset(self, queryset, request, view):
+        """
+        Returns the query for the requested page plus one row, which tells
+        whether there is a next page.
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(request, queryset, view)
+        field_name = self.ordering.lstrip('-')
+        descending = self.ordering.startswith('-')
+        self.field = queryset.model._meta.pk if field_name == 'pk' else queryset.model._meta.get_field(field_name)
+        self.count, self.count_estimated = None, False
+
+        queryset = queryset.order_by(
+            *([self.ordering] if field_name != 'pk' else []), '-pk' if descending else 'pk'
+        )
+        position = self.decode_cursor(request)
+        if position is not None:
+            value, pk = position
+            if field_name == 'pk':
+                queryset = queryset.filter(**{f"pk__{'lt' if descending else 'gt'}": pk})
+            else:
+                pk_field = queryset.model._meta.pk
+                queryset = queryset.filter(RowComparison(
+                    (F(field_name), F('pk')),
+                    (Value(value, output_field=self.field), Value(pk, output_field=pk_field)),
+                    '<' if descending else '>',
+                ))
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, rows):
+        self.has_next = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        self.next_position = None
+        if self.has_next:
+            last = rows[-1]
+            self.next_position = (self.row_value(last, self.field.attname), self.row_value(last, 'pk'))
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param], strict=True, cutoff=self.max_page_size,
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def get_ordering(self, request, queryset, view):
+        ordering = None
+        if view is not None:
+            ordering = OrderingFilter().get_ordering(request, queryset, view)
+        ordering = ordering or queryset.model._meta.ordering or ['pk']
+        first = ordering[0]
+        if first.lstrip('-') in ('id', queryset.model._meta.pk.name):
+            return '-pk' if first.startswith('-') else 'pk'
+        return first
+
+    @staticmethod
+    def row_value(row, name):
+        """
+        Reads a value from a model instance or a named values_list row.
+        """
+        if name == 'pk' and not hasattr(row, 'pk'):
+            name = 'id'
+        return getattr(row, name)
+
+    def encode_cursor(self, position):
+        value, pk = position
+        payload = json.dumps({'o': self.ordering, 'v': value, 'id': pk}, cls=DjangoJSONEncoder)
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            if payload['o'] != self.ordering:
+                raise ValueError('cursor was issued for a different ordering')
+            value = self.field.to_python(payload['v'])
+            pk = self.field.model._meta.pk.to_python(payload['id'])
+        except (TypeError, ValueError, KeyError, binascii.Error, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return value, pk
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, 'page')
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def get_paginated_response(self, data):
+        fields = [('next', self.get_next_link())]
+        if self.count is not None:
+            fields.append(('count', self.count))
+            if self.count_estimated:
+                fields.append(('count_estimated', True))
+        fields.append(('results', data))
+        return Response(OrderedDict(fields))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'count': {'type': 'integer'},
+                'count_estimated': {'type': 'boolean'},
+                'results': schema,
+            },
+        }
+
+
+class SelectablePagination(BasePagination):
+    """
+    Lets each request pick page-number or keyset pagination.  Keyset mode is
+    used for ``?pagination=cursor`` or whenever a ``cursor`` is passed.
+    """
+    pagination_query_param = 'pagination'
+    page_class = CustomPageNumberPagination
+    cursor_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.paginator = self.cursor_class() if self.use_cursor(request) else self.page_class()
+        return self.paginator.paginate_queryset(queryset, request, view)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        self.paginator = self.cursor_class() if self.use_cursor(request) else self.page_class()
+        return await self.paginator.apaginate_queryset(queryset, request, view)
+
+    def use_cursor(self, request):
+        return (
+            request.query_params.get(self.pagination_query_param) == 'cursor'
+            or self.cursor_class.cursor_query_param in request.query_params
+        )
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return self.page_class().get_paginated_response_schema(schema)
+
+    def get_schema_operation_parameters(self, view):
+        parameters = self.page_class().get_schema_operation_parameters(view)
+        return parameters + [
+            {
+                'name': self.pagination_query_param,
+                'required': False,
+                'in': 'query',
+                'description': "Set to 'cursor' for keyset pagination.",
+                'schema': {'type': 'string', 'enum': ['page', 'cursor']},
+            },
+            {
+                'name': self.cursor_class.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'The pagination cursor value.',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': 'count',
+                'required': False,
+                'in': 'query',
+                'description': "'estimate' returns the planner's row estimate for large unfiltered lists.",
+                'schema': {'type': 'string', 'enum': [COUNT_EXACT, COUNT_ESTIMATE]},
+            },
+        ]
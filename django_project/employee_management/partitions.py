@@ -0,0 +1,349 @@
+"""
+Monthly range partitioning of the attendance table on PostgreSQL.
+
+Migration 0010 turns ``employee_management_attendance`` into a table
+partitioned by ``RANGE (date)``, with one partition per calendar month
+(``employee_management_attendance_y2024m01``) and a default partition for
+dates no monthly partition covers.  The ``attendance_partitions`` command
+creates partitions ahead of time and archives old ones.  On other databases
+the table stays as it is and the command refuses to run.
+
+PostgreSQL requires every unique constraint of a partitioned table to
+include the partition key, so the primary key becomes ``(id, date)``; ids
+still come from a single sequence and stay unique, and the ORM goes on
+treating ``id`` as the primary key.  The ``(employee, date)`` constraint
+includes the date already, so one attendance per employee per day is still
+enforced, across all partitions.  Queries with constant bounds on ``date``
+(the ``date_from``/``date_to`` filters of the attendance endpoint) are
+pruned to the partitions they cover when they are planned.
+
+Archiving a month detaches its partition, writes its rows to
+``ATTENDANCE_PARTITIONS['ARCHIVE_DIR']`` as gzip-compressed ``COPY`` text
+and drops it, all in one transaction.  Restoring loads the file into a new
+table and attaches it again; the file is kept.  Archived rows are not
+visible through the API, and the hours rollups keep counting them until a
+rollup rebuild covers their dates.
+
+Migrations that change the attendance table after 0010 must account for
+the partitioning: Django's schema editor does not know about it.
+"""
+import gzip
+import os
+import re
+from datetime import date
+
+from django.conf import settings
+from django.db import transaction
+
+from . import response_cache
+from .models import Attendance
+
+ATTENDANCE_PARTITIONS_DEFAULTS = {
+    'MONTHS_AHEAD': 3,
+    'ARCHIVE_DIR': None,  # BASE_DIR / 'archive'
+}
+
+TABLE = Attendance._meta.db_table
+SEQUENCE = f'{TABLE}_id_seq'
+DEFAULT_PARTITION = f'{TABLE}_default'
+PARTITION_RE = re.compile(rf'^{TABLE}_y(\d{{4}})m(\d{{2}})$')
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class PartitioningError(Exception):
+    pass
+
+
+def get_attendance_partitions_settings():
+    return {**ATTENDANCE_PARTITIONS_DEFAULTS, **getattr(settings, 'ATTENDANCE_PARTITIONS', {})}
+
+
+def get_archive_dir():
+    return str(get_attendance_partitions_settings()['ARCHIVE_DIR'] or os.path.join(settings.BASE_DIR, 'archive'))
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def parse_month(value):
+    """
+    Parses ``YYYY-MM`` into the first day of the month; for argparse.
+    """
+    try:
+        year, month = value.split('-')
+        return date(int(year), int(month), 1)
+    except ValueError:
+        raise ValueError(f'{value!r} is not a month (YYYY-MM)')
+
+
+def partition_name(month):
+    return f'{TABLE}_y{month.year:04d}m{month.month:02d}'
+
+
+def partition_month(name):
+    """
+    The month a partition holds, or None for other tables.
+    """
+    match = PARTITION_RE.match(name)
+    return date(int(match[1]), int(match[2]), 1) if match else None
+
+
+def archive_path(month, directory=None):
+    return os.path.join(directory or get_archive_dir(), f'{partition_name(month)}.copy.gz')
+
+
+def check_vendor(connection):
+    if connection.vendor != 'postgresql':
+        raise PartitioningError(f'Attendance partitioning needs PostgreSQL, not {connection.vendor}')
+
+
+def is_partitioned(connection):
+    check_vendor(connection)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [TABLE])
+        row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def list_partitions(connection):
+    """
+    Returns the months of the attached monthly partitions, in order, and
+    the number of rows in the default partition.
+    """
+    check_vendor(connection)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT child.relname FROM pg_inherits '
+            'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+            'WHERE pg_inherits.inhparent = to_regclass(%s)',
+            [TABLE],
+        )
+        names = [name for name, in cursor.fetchall()]
+        default_rows = 0
+        if DEFAULT_PARTITION in names:
+            cursor.execute(f'SELECT count(*) FROM {DEFAULT_PARTITION}')
+            default_rows = cursor.fetchone()[0]
+    return sorted(filter(None, map(partition_month, names))), default_rows
+
+
+def _bounds(month):
+    return month.isoformat(), add_months(month, 1).isoformat()
+
+
+def _create_partition(cursor, month):
+    """
+    Creates the partition for ``month``.  Rows of that month that went to
+    the default partition are moved into it.
+    """
+    name, (start, end) = partition_name(month), _bounds(month)
+    cursor.execute(
+        f'SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE date >= %s AND date < %s)', [start, end],
+    )
+    if not cursor.fetchone()[0]:
+        cursor.execute(f"CREATE TABLE {name} PARTITION OF {TABLE} FOR VALUES FROM ('{start}') TO ('{end}')")
+        return
+    # A new partition may not overlap rows already in the default one.
+    cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {DEFAULT_PARTITION}')
+    cursor.execute(f"CREATE TABLE {name} PARTITION OF {TABLE} FOR VALUES FROM ('{start}') TO ('{end}')")
+    cursor.execute(
+        f'WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE date >= %s AND date < %s RETURNING *) '
+        f'INSERT INTO {name} SELECT * FROM moved',
+        [start, end],
+    )
+    cursor.execute(f'ALTER TABLE {TABLE} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT')
+
+
+def create_partitions(connection, through, since=None):
+    """
+    Creates the missing monthly partitions from ``since`` (by default the
+    current month) through ``through``.  Returns the months created.
+    """
+    months, _ = list_partitions(connection)
+    existing = set(months)
+    month, created = month_start(since or date.today()), []
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        while month <= through:
+            if month not in existing:
+                _create_partition(cursor, month)
+                created.append(month)
+            month = add_months(month, 1)
+    return created
+
+
+def archive_partition(connection, month, directory=None):
+    """
+    Detaches the partition for ``month``, writes its rows to the archive
+    directory and drops it.  Returns the file written.
+    """
+    name, path = partition_name(month), archive_path(month, directory)
+    if month not in list_partitions(connection)[0]:
+        raise PartitioningError(f'No partition for {month:%Y-%m} is attached')
+    if os.path.exists(path):
+        raise PartitioningError(f'{path} already exists')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = f'{path}.partial'
+    try:
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {name}')
+            with open(partial, 'wb') as file:
+                with gzip.GzipFile(fileobj=file, mode='wb') as archive:
+                    _copy_out(cursor, f'COPY {name} TO STDOUT', archive)
+                file.flush()
+                os.fsync(file.fileno())
+            os.rename(partial, path)
+            cursor.execute(f'DROP TABLE {name}')
+    except BaseException:
+        # The partition is attached again; an archive would block the next attempt.
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    response_cache.bump(Attendance)
+    return path
+
+
+def restore_partition(connection, month, directory=None):
+    """
+    Loads the archive of ``month`` into a new partition and attaches it.
+    Returns the number of rows restored.
+    """
+    name, path, (start, end) = partition_name(month), archive_path(month, directory), _bounds(month)
+    if month in list_partitions(connection)[0]:
+        raise PartitioningError(f'A partition for {month:%Y-%m} is already attached')
+    if not os.path.exists(path):
+        raise PartitioningError(f'No archive at {path}')
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute(f'CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS)')
+        with gzip.open(path, 'rb') as archive:
+            _copy_in(cursor, f'COPY {name} FROM STDIN', archive)
+        # With the bounds already checked, ATTACH does not scan the table.
+        cursor.execute(
+            f'ALTER TABLE {name} ADD CONSTRAINT {name}_bounds '
+            f"CHECK (date IS NOT NULL AND date >= '{start}' AND date < '{end}')"
+        )
+        cursor.execute(f"ALTER TABLE {TABLE} ATTACH PARTITION {name} FOR VALUES FROM ('{start}') TO ('{end}')")
+        cursor.execute(f'ALTER TABLE {name} DROP CONSTRAINT {name}_bounds')
+        cursor.execute(f'SELECT count(*) FROM {name}')
+        rows = cursor.fetchone()[0]
+    response_cache.bump(Attendance)
+    return rows
+
+
+def _copy_out(cursor, sql, file):
+    raw = cursor.cursor
+    if hasattr(raw, 'copy_expert'):  # psycopg2
+        raw.copy_expert(sql, file)
+    else:  # psycopg 3
+        with raw.copy(sql) as copy:
+            for data in copy:
+                file.write(data)
+
+
+def _copy_in(cursor, sql, file):
+    raw = cursor.cursor
+    if hasattr(raw, 'copy_expert'):  # psycopg2
+        raw.copy_expert(sql, file, size=COPY_CHUNK_SIZE)
+    else:  # psycopg 3
+        with raw.copy(sql) as copy:
+            while data := file.read(COPY_CHUNK_SIZE):
+                copy.write(data)
+
+
+def _table_definitions(cursor, table):
+    """
+    The check, foreign key, unique and exclusion constraints and the plain
+    indexes of ``table``, as statements that recreate them on a table of the
+    same name.  Columns and NOT NULL constraints are copied by ``LIKE``.
+    """
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = to_regclass(%s) AND contype IN ('c', 'f', 'u', 'x') ORDER BY conname",
+        [table],
+    )
+    statements = [f'ALTER TABLE {table} ADD CONSTRAINT {name} {definition}' for name, definition in cursor.fetchall()]
+    cursor.execute(
+        'SELECT indexdef FROM pg_indexes WHERE schemaname = current_schema() AND tablename = %s '
+        'AND indexname NOT IN (SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(%s)) '
+        'ORDER BY indexname',
+        [table, table],
+    )
+    statements += [definition for definition, in cursor.fetchall()]
+    return statements
+
+
+def _rebuild_table(cursor, create, primary_key):
+    """
+    Replaces the attendance table with the one ``create`` makes from
+    ``{TABLE}_old``, keeping its rows, constraints and indexes.
+    """
+    definitions = _table_definitions(cursor, TABLE)
+    cursor.execute(f'SELECT coalesce(max(id), 0) FROM {TABLE}')
+    last_id = cursor.fetchone()[0]
+    cursor.execute(f'ALTER TABLE {TABLE} RENAME TO {TABLE}_old')
+    create(cursor)
+    cursor.execute(f'INSERT INTO {TABLE} SELECT * FROM {TABLE}_old')
+    # Dropping the old table frees the names of its sequence and indexes.
+    cursor.execute(f'DROP TABLE {TABLE}_old')
+    cursor.execute(f'ALTER TABLE {TABLE} ADD PRIMARY KEY ({primary_key})')
+    for statement in definitions:
+        cursor.execute(statement)
+    return last_id
+
+
+def partition_attendance(schema_editor):
+    """
+    Converts the attendance table to monthly partitions covering its rows
+    and ``MONTHS_AHEAD`` months ahead.  Does nothing on other databases.
+    Rewrites the table and holds an exclusive lock on it while it does.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql' or is_partitioned(connection):
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT min(date) FROM {TABLE}')
+        first = month_start(cursor.fetchone()[0] or date.today())
+        last = add_months(month_start(date.today()), get_attendance_partitions_settings()['MONTHS_AHEAD'])
+
+        def create(cursor):
+            # No INCLUDING IDENTITY: a partitioned table takes ids from a plain sequence.
+            cursor.execute(f'CREATE TABLE {TABLE} (LIKE {TABLE}_old) PARTITION BY RANGE (date)')
+            cursor.execute(f'CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT')
+            month = first
+            while month <= last:
+                start, end = _bounds(month)
+                cursor.execute(
+                    f"CREATE TABLE {partition_name(month)} PARTITION OF {TABLE} FOR VALUES FROM ('{start}') TO ('{end}')"
+                )
+                month = add_months(month, 1)
+
+        last_id = _rebuild_table(cursor, create, 'id, date')
+        cursor.execute(f'CREATE SEQUENCE {SEQUENCE} OWNED BY {TABLE}.id')
+        cursor.execute('SELECT setval(%s, %s, %s)', [SEQUENCE, max(last_id, 1), last_id > 0])
+        cursor.execute(f"ALTER TABLE {TABLE} ALTER COLUMN id SET DEFAULT nextval('{SEQUENCE}')")
+
+
+def unpartition_attendance(schema_editor):
+    """
+    Converts the attendance table back to a single table.  Rows of archived
+    partitions are not restored.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql' or not is_partitioned(connection):
+        return
+    with connection.cursor() as cursor:
+
+        def create(cursor):
+            cursor.execute(f'CREATE TABLE {TABLE} (LIKE {TABLE}_old)')
+
+        last_id = _rebuild_table(cursor, create, 'id')
+        cursor.execute(
+            f'ALTER TABLE {TABLE} ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY (START WITH {last_id + 1})'
+        )
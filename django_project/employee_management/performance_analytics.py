@@ -0,0 +1,240 @@
+"""
+Performance analytics snapshots, computed nightly by the
+``compute_performance_analytics`` command and served by the
+``performance-trends`` and ``department-ratings`` endpoints.
+
+Reviews are read once, ordered by employee and review date, in batches of
+``PERFORMANCE_ANALYTICS['BATCH_SIZE']`` rows that never split an
+employee's reviews (from the analytics replica when there is one, see
+utils/db_router.py).  Each batch becomes NumPy columns, and everything is
+computed on the columns, per group, without a Python loop over reviews:
+
+* per employee (EmployeePerformanceTrend): the mean of the latest
+  ``WINDOW`` ratings and of the window one review earlier, the least
+  squares slope of the ratings over the window, and the latest rating;
+* per department and quarter (DepartmentRatingSnapshot): the count of each
+  rating, added up across batches, from which the mean and the
+  nearest-rank percentiles follow.  Ratings are whole numbers from 1 to 5,
+  so the histogram is exact and small whatever the number of reviews.
+
+The time taken grows linearly with the number of reviews, and memory with
+the batch size.  Both snapshot tables are replaced in one transaction;
+until it commits the endpoints serve the previous snapshot.  Reviews are
+attributed to the employee's current department.
+"""
+import time
+from itertools import islice
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from utils import db_router
+
+from . import response_cache, synthetic_data
+from .models import DepartmentRatingSnapshot, EmployeePerformanceTrend, PerformanceRecord
+
+PERFORMANCE_ANALYTICS_DEFAULTS = {
+    'WINDOW': 8,
+    'BATCH_SIZE': 100000,
+}
+
+MIN_RATING, MAX_RATING = 1, 5
+PERCENTILES = {'p25': 0.25, 'median': 0.5, 'p75': 0.75, 'p90': 0.9}
+
+TREND_COLUMNS = (
+    'employee_id', 'department_id', 'review_count', 'window_size', 'moving_average', 'previous_average', 'slope',
+    'latest_rating', 'last_review_date', 'computed_at',
+)
+SNAPSHOT_COLUMNS = (
+    'department_id', 'year', 'quarter', 'review_count', 'mean_rating',
+    *(f'ratings_{rating}' for rating in range(MIN_RATING, MAX_RATING + 1)), *PERCENTILES, 'computed_at',
+)
+
+
+def get_performance_analytics_settings():
+    return {**PERFORMANCE_ANALYTICS_DEFAULTS, **getattr(settings, 'PERFORMANCE_ANALYTICS', {})}
+
+
+def to_columns(rows):
+    """
+    Turns ``(employee_id, department_id, review_date, rating)`` rows into
+    arrays.
+    """
+    employees, departments, dates, ratings = zip(*rows)
+    return (
+        np.array(employees, dtype=np.int64), np.array(departments, dtype=np.int64),
+        np.array(dates, dtype='datetime64[D]'), np.array(ratings, dtype=np.int64),
+    )
+
+
+def read_batches(batch_size, using):
+    """
+    Yields the reviews as column arrays (see to_columns), ordered by
+    employee and review date, about ``batch_size`` rows at a time.  The
+    reviews of the last employee in a batch are held back for the next one,
+    so no employee is split.
+    """
+    rows = (
+        PerformanceRecord.objects.using(using).order_by('employee_id', 'review_date', 'id')
+        .values_list('employee_id', 'employee__department_id', 'review_date', 'rating')
+        .iterator(chunk_size=min(batch_size, 10000))
+    )
+    held = None
+    while batch := list(islice(rows, batch_size)):
+        columns = to_columns(batch)
+        if held is not None:
+            columns = tuple(np.concatenate(pair) for pair in zip(held, columns))
+        employees = columns[0]
+        cut = np.searchsorted(employees, employees[-1])
+        held = tuple(column[cut:] for column in columns)
+        if cut:
+            yield tuple(column[:cut] for column in columns)
+    if held is not None:
+        yield held
+
+
+def _divide(numerator, denominator):
+    return np.divide(numerator, denominator, out=np.full(len(numerator), np.nan), where=denominator != 0)
+
+
+def employee_trends(employees, departments, dates, ratings, window):
+    """
+    Returns the trend columns of each employee in a batch, in employee
+    order: ``(employee_id, department_id, review_count, window_size,
+    moving_average, previous_average, slope, latest_rating,
+    last_review_date)``, with NaN where there were too few reviews.
+    """
+    starts = np.flatnonzero(np.r_[True, employees[1:] != employees[:-1]])
+    counts = np.diff(np.r_[starts, len(employees)])
+    groups = len(starts)
+    group = np.repeat(np.arange(groups), counts)
+    from_end = np.repeat(starts + counts, counts) - np.arange(len(employees)) - 1  # 0 for the latest review
+    values = ratings.astype(np.float64)
+
+    def window_sums(offset, weights):
+        mask = (from_end >= offset) & (from_end < offset + window)
+        return np.bincount(group[mask], weights=None if weights is None else weights[mask], minlength=groups)
+
+    size = window_sums(0, None)
+    moving_average = _divide(window_sums(0, values), size)
+    previous_average = _divide(window_sums(1, values), window_sums(1, None))
+
+    # Least squares over the window, x being the review's place in it.
+    x = (size[group] - 1 - from_end).astype(np.float64)
+    sum_x, sum_y = window_sums(0, x), window_sums(0, values)
+    sum_xy, sum_xx = window_sums(0, x * values), window_sums(0, x * x)
+    slope = _divide(size * sum_xy - sum_x * sum_y, size * sum_xx - sum_x * sum_x)
+
+    latest = starts + counts - 1
+    return (
+        employees[starts], departments[starts], counts, size.astype(np.int64), moving_average, previous_average,
+        slope, ratings[latest], dates[latest],
+    )
+
+
+# Department and quarter are packed in one integer key, which np.unique()
+# sorts far faster than rows of several columns.
+QUARTER_BITS = 20  # Quarters since 1970, offset so that earlier dates stay positive
+
+
+def rating_counts(departments, dates, ratings):
+    """
+    Returns ``(keys, counts)`` for a batch: the distinct (department,
+    quarter) keys, and the number of reviews with each rating for each key.
+    """
+    valid = (ratings >= MIN_RATING) & (ratings <= MAX_RATING)
+    departments, dates, ratings = departments[valid], dates[valid], ratings[valid]
+    quarters = dates.astype('datetime64[M]').astype(np.int64) // 3 + (1 << (QUARTER_BITS - 1))
+    keys, inverse = np.unique((departments << QUARTER_BITS) | quarters, return_inverse=True)
+    buckets = MAX_RATING - MIN_RATING + 1
+    counts = np.bincount(inverse * buckets + (ratings - MIN_RATING), minlength=len(keys) * buckets)
+    return keys, counts.reshape(len(keys), buckets)
+
+
+def combine_counts(parts):
+    """
+    Adds up the ``(keys, counts)`` of several batches.
+    """
+    if not parts:
+        return np.empty(0, dtype=np.int64), np.empty((0, MAX_RATING - MIN_RATING + 1), dtype=np.int64)
+    keys, inverse = np.unique(np.concatenate([keys for keys, _ in parts]), return_inverse=True)
+    counts = np.zeros((len(keys), MAX_RATING - MIN_RATING + 1), dtype=np.int64)
+    np.add.at(counts, inverse, np.concatenate([counts for _, counts in parts]))
+    return keys, counts
+
+
+def unpack_keys(keys):
+    """
+    Returns the departments, years and quarters (1 to 4) of packed keys.
+    """
+    quarters = (keys & ((1 << QUARTER_BITS) - 1)) - (1 << (QUARTER_BITS - 1))
+    return keys >> QUARTER_BITS, quarters // 4 + 1970, quarters % 4 + 1
+
+
+def distribution(counts):
+    """
+    Returns the review count, mean rating and nearest-rank percentiles of
+    rating histograms, one per row of ``counts``.
+    """
+    total = counts.sum(axis=1)
+    mean = _divide(counts @ np.arange(MIN_RATING, MAX_RATING + 1), total)
+    cumulative = counts.cumsum(axis=1)
+    percentiles = {
+        name: (cumulative < np.maximum(np.ceil(share * total), 1)[:, None]).sum(axis=1) + MIN_RATING
+        for name, share in PERCENTILES.items()
+    }
+    return total, mean, percentiles
+
+
+def _nullable(values):
+    return [None if value != value else value for value in values.tolist()]  # NaN -> None
+
+
+def compute_snapshots(window=None, batch_size=None, progress=None):
+    """
+    Recomputes both snapshots.  ``progress`` is called with the number of
+    reviews read after each batch.
+
+    Returns:
+        A dict of the reviews read, the rows written to each snapshot and
+        the seconds taken.
+    """
+    options = get_performance_analytics_settings()
+    window = window or options['WINDOW']
+    batch_size = batch_size or options['BATCH_SIZE']
+    started, computed_at = time.monotonic(), timezone.now()
+    reviews = trends = 0
+    parts = []
+    with transaction.atomic():
+        EmployeePerformanceTrend.objects.all().delete()
+        DepartmentRatingSnapshot.objects.all().delete()
+        for employees, departments, dates, ratings in read_batches(batch_size, db_router.choose_replica(analytics=True)):
+            columns = employee_trends(employees, departments, dates, ratings, window)
+            rows = list(zip(
+                *(column.tolist() for column in columns[:4]), *map(_nullable, columns[4:7]),
+                columns[7].tolist(), columns[8].astype(object), [computed_at] * len(columns[0]),
+            ))
+            synthetic_data.load_rows(EmployeePerformanceTrend, TREND_COLUMNS, rows, batch_size)
+            parts.append(rating_counts(departments, dates, ratings))
+            reviews += len(employees)
+            trends += len(rows)
+            if progress:
+                progress(reviews)
+
+        keys, counts = combine_counts(parts)
+        total, mean, percentiles = distribution(counts)
+        rows = list(zip(
+            *(column.tolist() for column in unpack_keys(keys)), total.tolist(), mean.tolist(), *counts.T.tolist(),
+            *(values.tolist() for values in percentiles.values()), [computed_at] * len(keys),
+        ))
+        synthetic_data.load_rows(DepartmentRatingSnapshot, SNAPSHOT_COLUMNS, rows, batch_size)
+        response_cache.bump(EmployeePerformanceTrend)
+        response_cache.bump(DepartmentRatingSnapshot)
+    return {
+        'reviews': reviews,
+        'employee_trends': trends,
+        'department_quarters': len(rows),
+        'seconds': time.monotonic() - started,
+    }
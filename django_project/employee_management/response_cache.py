@@ -0,0 +1,312 @@
+"""
+Response cache for the read endpoints, with conditional GET.
+
+``ResponseCacheMixin`` caches the rendered JSON of a viewset's ``list`` and
+``retrieve`` responses.  The cache key covers the full request URL (path,
+query parameters and host, which paginated responses echo in their links),
+the negotiated media type, the user's scope (``get_response_cache_scope``)
+and the current version of every model in ``response_cache_models``.
+
+Versions are counters kept in a Django cache (``RESPONSE_CACHE['CACHE']``),
+bumped by the ``post_save``/``post_delete`` handlers in signals.py and by
+code that writes without signals (department_stats.py, generate_data).  A
+write therefore changes the key of every response that depends on the
+model, and old entries simply age out.  For several processes to see each
+other's writes the versions must live in a cache they share: the
+``'shared'`` SQLite file on one host, or a cache server (checks.py refuses
+a per-process cache).  The rendered responses are kept in a per-process LRU
+bounded by ``RESPONSE_CACHE['MAX_BYTES']``.
+
+Every response carries a strong ``ETag`` derived from the key, and the time
+of the last write as ``Last-Modified``, so a client repeating a request with
+``If-None-Match`` gets a 304 from the versions alone.  HTTP dates have whole
+seconds, so ``Last-Modified`` is left out, and ``If-Modified-Since`` is not
+trusted, while the last write is in the current second: a later write in the
+same second would not change the date.  Bumps inside a
+transaction are repeated when it commits, so a response read between the
+write and the commit is not cached under the final version.  Responses read
+inside a transaction, which may yet roll back, are not stored, nor are
+responses read from a replica that may not have the last write yet; those
+get no validators either.
+
+``alist``/``aretrieve`` do the same for the async read views
+(async_views.py), reading the versions with the async cache API.
+"""
+import hashlib
+import time
+from collections import namedtuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe
+
+from utils.db_router import may_be_stale
+from utils.lru import LRUCache
+
+from .deltas import DeltaBuffer
+
+RESPONSE_CACHE_DEFAULTS = {
+    'ENABLED': True,
+    'CACHE': 'shared',
+    'MAX_BYTES': 32 * 1024 * 1024,
+}
+
+CACHE_STATUS_HEADER = 'X-Response-Cache'
+
+CachedResponse = namedtuple('CachedResponse', 'content content_type')
+
+
+def get_response_cache_settings():
+    return {**RESPONSE_CACHE_DEFAULTS, **getattr(settings, 'RESPONSE_CACHE', {})}
+
+
+def _version_cache():
+    return caches[get_response_cache_settings()['CACHE']]
+
+
+def _version_key(label):
+    return f'response-cache:version:{label}'
+
+
+def _modified_key(label):
+    return f'response-cache:modified:{label}'
+
+
+def _increment(labels):
+    cache = _version_cache()
+    for label in labels:
+        try:
+            cache.incr(_version_key(label))
+        except ValueError:  # Not set, or evicted
+            _initialize(cache, label)
+    cache.set_many({_modified_key(label): time.time() for label in labels}, timeout=None)
+
+
+def _initialize(cache, label):
+    # Versions start from the clock rather than 1, so a counter that was
+    # evicted never comes back at a value some cached response was stored at.
+    cache.add(_version_key(label), time.time_ns(), timeout=None)
+    cache.add(_modified_key(label), time.time(), timeout=None)
+
+
+async def _ainitialize(cache, label):
+    await cache.aadd(_version_key(label), time.time_ns(), timeout=None)
+    await cache.aadd(_modified_key(label), time.time(), timeout=None)
+
+
+def apply_bumps(bumps):
+    """
+    Applies ``{model label: (bump count,)}``: increments each version now,
+    and again when the current transaction commits.
+    """
+    labels = sorted(bumps)
+    if not labels:
+        return
+    _increment(labels)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: _increment(labels))
+
+
+_buffer = DeltaBuffer(apply_bumps)
+deferred = _buffer.deferred
+
+
+def bump(model):
+    """
+    Invalidates the cached responses that depend on ``model``.  Inside
+    ``deferred()`` all bumps of a model are applied once, at the end.
+    """
+    _buffer.add(model._meta.label_lower, (1,))
+
+
+def get_versions(models):
+    """
+    Returns the current versions of ``models`` and the time of the last
+    write to any of them.
+    """
+    cache = _version_cache()
+    labels = [model._meta.label_lower for model in models]
+    keys = [key for label in labels for key in (_version_key(label), _modified_key(label))]
+    values = cache.get_many(keys)
+    if len(values) < len(keys):
+        for label in labels:
+            if _version_key(label) not in values or _modified_key(label) not in values:
+                _initialize(cache, label)
+        values = cache.get_many(keys)
+    return _versions_from(values, labels)
+
+
+async def aget_versions(models):
+    """
+    ``get_versions()`` for async code.
+    """
+    cache = _version_cache()
+    labels = [model._meta.label_lower for model in models]
+    keys = [key for label in labels for key in (_version_key(label), _modified_key(label))]
+    values = await cache.aget_many(keys)
+    if len(values) < len(keys):
+        for label in labels:
+            if _version_key(label) not in values or _modified_key(label) not in values:
+                await _ainitialize(cache, label)
+        values = await cache.aget_many(keys)
+    return _versions_from(values, labels)
+
+
+def _versions_from(values, labels):
+    versions = tuple(values.get(_version_key(label)) for label in labels)
+    modified = max((values.get(_modified_key(label)) or time.time() for label in labels), default=time.time())
+    return versions, modified
+
+
+_responses = LRUCache(RESPONSE_CACHE_DEFAULTS['MAX_BYTES'])
+
+
+def get_responses():
+    """
+    The process's LRU of rendered responses, resized to the current setting.
+    """
+    _responses.max_size = get_response_cache_settings()['MAX_BYTES']
+    return _responses
+
+
+def not_modified(request, etag, last_modified):
+    """
+    Whether the client's copy is current: its ``If-None-Match`` lists the
+    ETag or, without ``If-None-Match``, ``If-Modified-Since`` is not before
+    the last write, which is in an earlier second than now.
+    """
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is not None:
+        # If-None-Match uses the weak comparison.
+        tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+        return '*' in tags or etag in tags
+    if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    return (
+        if_modified_since is not None and int(last_modified) <= if_modified_since
+        and int(last_modified) < int(time.time())
+    )
+
+
+class ResponseCacheMixin:
+    """
+    Caches the rendered JSON of ``list`` and ``retrieve`` responses and
+    answers conditional requests.  ``response_cache_models`` lists every
+    model the responses are built from.
+    """
+    response_cache_models = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    async def alist(self, request, *args, **kwargs):
+        return await self.acached_response(super().alist, request, *args, **kwargs)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        return await self.acached_response(super().aretrieve, request, *args, **kwargs)
+
+    def get_response_cache_scope(self, request):
+        """
+        The part of the cache key that stands for what the user may see.
+        Permissions are checked before the cache is consulted, and these
+        viewsets show every user the same rows, so this only tells staff
+        apart; a viewset whose queryset depends on the user must override it.
+        """
+        return 'staff' if request.user.is_staff else 'user'
+
+    def get_response_cache_key(self, request, versions):
+        parts = (
+            f'{type(self).__module__}.{type(self).__qualname__}', self.action, request.build_absolute_uri(),
+            request.accepted_media_type, self.get_response_cache_scope(request), versions,
+        )
+        return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+    def use_response_cache(self, request):
+        # Only JSON: the browsable API renders forms and the user's name.
+        return get_response_cache_settings()['ENABLED'] and request.accepted_renderer.format == 'json'
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if not self.use_response_cache(request):
+            return handler(request, *args, **kwargs)
+        versions, last_modified = get_versions(self.response_cache_models)
+        if None in versions:  # The version cache does not store anything (DummyCache)
+            return handler(request, *args, **kwargs)
+        key, response = self.get_cached_response(request, versions, last_modified)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            stale = may_be_stale(last_modified)
+            self.store_response(key, response, store=not connection.in_atomic_block and not stale)
+            if stale:
+                return self.add_validators(response, None, last_modified)
+        return self.add_validators(response, key, last_modified)
+
+    async def acached_response(self, handler, request, *args, **kwargs):
+        if not self.use_response_cache(request):
+            return await handler(request, *args, **kwargs)
+        versions, last_modified = await aget_versions(self.response_cache_models)
+        if None in versions:
+            return await handler(request, *args, **kwargs)
+        key, response = self.get_cached_response(request, versions, last_modified)
+        if response is None:
+            response = await handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            # The request's queries run on the connection of the thread
+            # sync_to_async uses, which is the one that may be in a transaction.
+            in_atomic_block = await sync_to_async(lambda: connection.in_atomic_block)()
+            stale = may_be_stale(last_modified)
+            self.store_response(key, response, store=not in_atomic_block and not stale)
+            if stale:
+                return self.add_validators(response, None, last_modified)
+        return self.add_validators(response, key, last_modified)
+
+    def get_cached_response(self, request, versions, last_modified):
+        """
+        Returns the cache key and a 304 or the cached response, or None on a
+        miss.
+        """
+        key = self.get_response_cache_key(request, versions)
+        if not_modified(request, f'"{key[:40]}"', last_modified):
+            return key, HttpResponseNotModified()
+        cached = get_responses().get(key)
+        if cached is None:
+            return key, None
+        response = HttpResponse(cached.content, content_type=cached.content_type)
+        response[CACHE_STATUS_HEADER] = 'hit'
+        return key, response
+
+    def store_response(self, key, response, store=True):
+        """
+        Renders a response built on a miss, and caches it unless ``store`` is
+        false.
+        """
+        response.accepted_renderer = self.request.accepted_renderer
+        response.accepted_media_type = self.request.accepted_media_type
+        response.renderer_context = self.get_renderer_context()
+        response.render()
+        if store:
+            cached = CachedResponse(bytes(response.content), response['Content-Type'])
+            get_responses().set(key, cached, len(cached.content) + len(key))
+        response[CACHE_STATUS_HEADER] = 'miss'
+
+    def add_validators(self, response, key, last_modified):
+        """
+        Adds the ETag and Last-Modified of the versions the key was built
+        from, unless ``key`` is None: a response read from a replica that may
+        lag the last write must not be revalidated as that version.
+        ``Last-Modified`` waits until the second of the last write is over.
+        """
+        if key is not None:
+            response['ETag'] = f'"{key[:40]}"'
+            if int(last_modified) < int(time.time()):
+                response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
@@ -0,0 +1,154 @@
+"""
+Index-backed employee search.
+
+``EmployeeSearchFilter`` replaces DRF's SearchFilter, which ORs an
+``ICONTAINS`` per field and per term and so scans the whole table.  The
+search structures are created by migration 0005:
+
+* PostgreSQL: a stored generated ``search_vector`` column (``tsvector`` over
+  the search fields, 'simple' configuration) with a GIN index, and a
+  ``pg_trgm`` GIN index over the same fields concatenated.  A row matches
+  when every term is a prefix of one of its words, or, for typos, when the
+  search is trigram-similar to part of the text (``<%``, i.e.
+  ``pg_trgm.word_similarity_threshold``).  Results are ranked by
+  ``ts_rank`` plus ``word_similarity``.
+* SQLite (local runs): an external-content FTS5 table kept in sync by
+  triggers.  Prefix matching ranked by bm25; no typo tolerance.
+
+Other databases fall back to SearchFilter.  An explicit ``?ordering=``
+overrides the relevance order.
+"""
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+
+SEARCH_FIELDS = ('first_name', 'last_name', 'email', 'job_title')
+FTS_TABLE = 'employee_management_employee_fts'
+
+WORD_RE = re.compile(r'\w+')
+
+
+def get_words(terms):
+    return [word.lower() for term in terms for word in WORD_RE.findall(term)]
+
+
+def search_text_sql(table=None):
+    """
+    The search fields concatenated, as indexed by the trigram index.
+    """
+    prefix = f'{table}.' if table else ''
+    return " || ' ' || ".join(f'{prefix}{field}' for field in SEARCH_FIELDS)
+
+
+def postgresql_search(queryset, words):
+    connection = connections[queryset.db]
+    table = connection.ops.quote_name(queryset.model._meta.db_table)
+    tsquery = ' & '.join(f"'{word}':*" for word in words)
+    text = ' '.join(words)
+    matches = RawSQL(
+        f"({table}.search_vector @@ to_tsquery('simple', %s) OR %s <%% ({search_text_sql(table)}))",
+        [tsquery, text],
+        output_field=BooleanField(),
+    )
+    rank = RawSQL(
+        f"ts_rank({table}.search_vector, to_tsquery('simple', %s)) + word_similarity(%s, {search_text_sql(table)})",
+        [tsquery, text],
+        output_field=FloatField(),
+    )
+    return queryset.filter(matches).annotate(search_rank=rank).order_by('-search_rank', 'pk')
+
+
+def sqlite_search(queryset, words):
+    connection = connections[queryset.db]
+    table = connection.ops.quote_name(queryset.model._meta.db_table)
+    match = ' '.join(f'"{word}"*' for word in words)
+    # A join rather than a rank subquery per row, which would rerun the
+    # match for every result.  FTS5's rank is bm25, where lower is better.
+    return queryset.extra(
+        tables=[FTS_TABLE],
+        where=[f'{FTS_TABLE}.rowid = {table}.id', f'{FTS_TABLE} MATCH %s'],
+        params=[match],
+        select={'search_rank': f'-{FTS_TABLE}.rank'},
+    ).order_by('-search_rank', 'pk')
+
+
+def create_search_index(schema_editor):
+    """
+    Creates the search column, indexes or FTS table for the database in use.
+    Called from migrations; SQLite drops the triggers whenever a migration
+    rebuilds the employee table, so such migrations must call it again.
+    """
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        schema_editor.execute(
+            "ALTER TABLE employee_management_employee ADD COLUMN IF NOT EXISTS search_vector tsvector "
+            "GENERATED ALWAYS AS ("
+            "setweight(to_tsvector('simple', first_name || ' ' || last_name), 'A') || "
+            "setweight(to_tsvector('simple', email), 'B') || "
+            "setweight(to_tsvector('simple', job_title), 'C')"
+            ") STORED"
+        )
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS employee_search_vector_idx '
+            'ON employee_management_employee USING gin (search_vector)'
+        )
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS employee_search_trgm_idx ON employee_management_employee '
+            f'USING gin (({search_text_sql()}) gin_trgm_ops)'
+        )
+    elif vendor == 'sqlite':
+        columns = ', '.join(SEARCH_FIELDS)
+        new_values = ', '.join(f'new.{field}' for field in SEARCH_FIELDS)
+        old_values = ', '.join(f'old.{field}' for field in SEARCH_FIELDS)
+        drop_search_index(schema_editor)
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5({columns}, "
+            f"content='employee_management_employee', content_rowid='id')"
+        )
+        # Names weigh most in bm25, then email, then job title.
+        schema_editor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) VALUES ('rank', 'bm25(10, 10, 5, 1)')")
+        schema_editor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        insert = f'INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.id, {new_values});'
+        delete = f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.id, {old_values});"
+        for name, event, body in (('ai', 'INSERT', insert), ('ad', 'DELETE', delete), ('au', 'UPDATE', delete + insert)):
+            schema_editor.execute(
+                f'CREATE TRIGGER {FTS_TABLE}_{name} AFTER {event} ON employee_management_employee '
+                f'BEGIN {body} END'
+            )
+
+
+def drop_search_index(schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS employee_search_trgm_idx')
+        schema_editor.execute('DROP INDEX IF EXISTS employee_search_vector_idx')
+        schema_editor.execute('ALTER TABLE employee_management_employee DROP COLUMN IF EXISTS search_vector')
+    elif vendor == 'sqlite':
+        for name in ('ai', 'ad', 'au'):
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS {FTS_TABLE}_{name}')
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+BACKENDS = {
+    'postgresql': postgresql_search,
+    'sqlite': sqlite_search,
+}
+
+
+class EmployeeSearchFilter(filters.SearchFilter):
+    """
+    SearchFilter using the database's search indexes, ranked by relevance.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        backend = BACKENDS.get(connections[queryset.db].vendor)
+        if backend is None:
+            return super().filter_queryset(request, queryset, view)
+        words = get_words(self.get_search_terms(request))
+        if not words:
+            return queryset
+        return backend(queryset, words)
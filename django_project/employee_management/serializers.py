@@ -1,21 +1,80 @@
+from django.db import transaction
+from django.urls import reverse
 from rest_framework import serializers
-from .models import Employee, PerformanceRecord, Attendance, DepartmentalPerformance
+from .bulk import PrefetchedPrimaryKeyRelatedField
+from .models import Department, Employee, PerformanceRecord, Attendance, DepartmentalPerformance, ExportJob, ImportJob, EmployeeHoursRollup, DepartmentHoursRollup
+from .models import EmployeePerformanceTrend, DepartmentRatingSnapshot
+
+class DepartmentNameField(serializers.SlugRelatedField):
+    """
+    Reads and writes a department by name.  Departments are created on first
+    use, as any name was accepted before they had a table of their own, but
+    not by validation: a new name gives an unsaved Department, which
+    ``save_department()`` creates in the transaction that writes the row, so
+    rejected rows create none.
+    """
+    default_error_messages = {
+        'blank': 'This field may not be blank.',
+        'max_length': 'Ensure this field has no more than {max_length} characters.',
+    }
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('slug_field', 'name')
+        if not kwargs.get('read_only'):
+            kwargs.setdefault('queryset', Department.objects.all())
+        super().__init__(**kwargs)
+        self.departments = {}  # One lookup per name, for bulk writes
+
+    def to_internal_value(self, data):
+        if not isinstance(data, str):
+            self.fail('invalid')
+        name = data.strip()
+        if not name:
+            self.fail('blank')
+        max_length = Department._meta.get_field('name').max_length
+        if len(name) > max_length:
+            self.fail('max_length', max_length=max_length)
+        if name not in self.departments:
+            self.departments[name] = self.get_queryset().filter(name=name).first() or Department(name=name)
+        return self.departments[name]
+
+def save_department(department):
+    """
+    Creates a department that DepartmentNameField validated but did not
+    save, in place, so the rows sharing it see it saved.  Returns it.
+    """
+    if department is not None and department.pk is None:
+        saved = Department.objects.get_or_create(name=department.name)[0]
+        department.pk, department._state.adding, department._state.db = saved.pk, False, saved._state.db
+    return department
 
 class EmployeeSerializer(serializers.ModelSerializer):
     """
     Serializer for Employee model.
     """
+    department = DepartmentNameField()
+
     class Meta:
         model = Employee
         fields = ['id', 'first_name', 'last_name', 'email', 'job_title', 'department', 'hire_date', 'salary', 'is_active']
         #  Added unique together constraint in Model, no need here.
         # extra_kwargs = {'email': {'validators': []}} # removes the unique validator
 
+    def create(self, validated_data):
+        with transaction.atomic():
+            save_department(validated_data.get('department'))
+            return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        with transaction.atomic():
+            save_department(validated_data.get('department'))
+            return super().update(instance, validated_data)
+
 class PerformanceRecordSerializer(serializers.ModelSerializer):
     """
     Serializer for PerformanceRecord model.
     """
-    employee = serializers.PrimaryKeyRelatedField(queryset=Employee.objects.all()) # changed to PK
+    employee = PrefetchedPrimaryKeyRelatedField(queryset=Employee.objects.all()) # changed to PK
     employee_name = serializers.CharField(source='employee', read_only=True) # added employee name
     class Meta:
         model = PerformanceRecord
@@ -25,7 +84,7 @@ class AttendanceSerializer(serializers.ModelSerializer):
     """
     Serializer for Attendance model.
     """
-    employee = serializers.PrimaryKeyRelatedField(queryset=Employee.objects.all())  # Changed to PK
+    employee = PrefetchedPrimaryKeyRelatedField(queryset=Employee.objects.all())  # Changed to PK
     employee_name = serializers.CharField(source='employee', read_only=True)
     class Meta:
         model = Attendance
@@ -40,6 +99,107 @@ class DepartmentalPerformanceSerializer(serializers.ModelSerializer):
     """
     Serializer for DepartmentalPerformance model
     """
+    department_name = serializers.CharField(source='department.name', read_only=True)
+
     class Meta:
         model = DepartmentalPerformance
-        fields = ['id', 'department_name', 'average_rating', 'total_employees', 'last_updated']
\ No newline at end of file
+        fields = ['id', 'department_name', 'average_rating', 'total_employees', 'last_updated']
+
+class HoursRollupSerializer(serializers.ModelSerializer):
+    """
+    Base serializer for the attendance hours rollups.
+    """
+    hours = serializers.SerializerMethodField()
+
+    def get_hours(self, obj):
+        return round(obj.seconds_worked / 3600, 2)
+
+class EmployeeHoursRollupSerializer(HoursRollupSerializer):
+    """
+    Serializer for EmployeeHoursRollup model.
+    """
+    class Meta:
+        model = EmployeeHoursRollup
+        fields = ['employee', 'granularity', 'period_start', 'hours', 'shifts', 'open_shifts']
+
+class DepartmentHoursRollupSerializer(HoursRollupSerializer):
+    """
+    Serializer for DepartmentHoursRollup model.
+    """
+    department = DepartmentNameField(read_only=True)
+
+    class Meta:
+        model = DepartmentHoursRollup
+        fields = ['department', 'granularity', 'period_start', 'hours', 'shifts', 'open_shifts']
+
+class EmployeePerformanceTrendSerializer(serializers.ModelSerializer):
+    """
+    Serializer for EmployeePerformanceTrend model.
+    """
+    department = DepartmentNameField(read_only=True)
+
+    class Meta:
+        model = EmployeePerformanceTrend
+        fields = ['employee', 'department', 'review_count', 'window_size', 'moving_average', 'previous_average', 'slope',
+                  'latest_rating', 'last_review_date', 'computed_at']
+
+class DepartmentRatingSnapshotSerializer(serializers.ModelSerializer):
+    """
+    Serializer for DepartmentRatingSnapshot model.  ``histogram`` counts the
+    reviews rated 1 to 5.
+    """
+    department = DepartmentNameField(read_only=True)
+    histogram = serializers.ListField(child=serializers.IntegerField(), read_only=True)
+
+    class Meta:
+        model = DepartmentRatingSnapshot
+        fields = ['department', 'year', 'quarter', 'review_count', 'mean_rating', 'histogram', 'p25', 'median', 'p75',
+                  'p90', 'computed_at']
+
+class ExportJobSerializer(serializers.ModelSerializer):
+    """
+    Serializer for ExportJob model.  Reports progress and, once the export
+    has completed, where to download it.
+    """
+    progress = serializers.SerializerMethodField()
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ExportJob
+        fields = ['id', 'resource', 'status', 'query_params', 'total_rows', 'rows_written', 'chunks_written',
+                  'progress', 'file_size', 'error', 'created_at', 'started_at', 'finished_at', 'download_url']
+        read_only_fields = fields
+
+    def get_progress(self, obj):
+        if obj.status == ExportJob.STATUS_COMPLETED:
+            return 1.0
+        if not obj.total_rows:
+            return 0.0
+        return round(obj.rows_written / obj.total_rows, 4)
+
+    def get_download_url(self, obj):
+        if obj.status != ExportJob.STATUS_COMPLETED:
+            return None
+        url = reverse('exportjob-download', kwargs={'pk': obj.pk})
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    """
+    Serializer for ImportJob model.  Reports the row counts and, if any rows
+    were rejected, where to download the report of why.
+    """
+    report_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ImportJob
+        fields = ['id', 'file_name', 'input_format', 'dry_run', 'status', 'rows_read', 'rows_loaded', 'rows_rejected',
+                  'rows_per_second', 'report_size', 'error', 'created_at', 'finished_at', 'report_url']
+        read_only_fields = fields
+
+    def get_report_url(self, obj):
+        if not obj.report_path:
+            return None
+        url = reverse('importjob-report', kwargs={'pk': obj.pk})
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
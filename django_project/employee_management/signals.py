@@ -0,0 +1,177 @@
+"""
+Signal handlers that number changes for the change feed (change_feed.py),
+keep the maintained aggregates current: departmental performance
+(department_stats.py) and attendance hours (attendance_rollups.py), and
+invalidate cached API responses (response_cache.py) and cached tokens and
+permissions (authentication.py).
+"""
+from django.contrib.auth.models import Group, Permission, User
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from . import attendance_rollups, authentication, change_feed, department_stats, response_cache
+from .models import Attendance, Department, DepartmentalPerformance, Employee, PerformanceRecord
+
+
+def _loaded(instance, name, default=None):
+    return getattr(instance, '_loaded_values', {}).get(name, default)
+
+
+def _deleted_with_employee(origin):
+    """
+    True when a record is being deleted because its employee is; the
+    employee's handler then removes all of its contributions in one step.
+    """
+    return isinstance(origin, Employee) or getattr(origin, 'model', None) is Employee
+
+
+# Connected first, so the number is taken right before the row is written.
+@receiver(pre_save, sender=Employee)
+@receiver(pre_save, sender=PerformanceRecord)
+@receiver(pre_save, sender=Attendance)
+def number_change(sender, instance, raw=False, **kwargs):
+    if not raw:  # Fixtures keep their numbers
+        instance.change_seq = change_feed.allocate()
+
+
+@receiver(pre_delete, sender=Employee)
+@receiver(pre_delete, sender=PerformanceRecord)
+@receiver(pre_delete, sender=Attendance)
+def number_delete(sender, instance, **kwargs):
+    change_feed.prepare_delete(instance)
+
+
+@receiver(post_delete, sender=Employee)
+@receiver(post_delete, sender=PerformanceRecord)
+@receiver(post_delete, sender=Attendance)
+def record_delete(sender, instance, **kwargs):
+    change_feed.record_delete(instance)
+
+
+@receiver(pre_save, sender=Employee)
+@receiver(pre_save, sender=PerformanceRecord)
+@receiver(pre_save, sender=Attendance)
+def load_previous_values(sender, instance, **kwargs):
+    """
+    Fetches the stored values for instances that were not loaded from the
+    database, e.g. ``Employee(pk=1, ...).save()``.
+    """
+    if hasattr(instance, '_loaded_values') or instance.pk is None:
+        return
+    instance._loaded_values = sender.objects.filter(pk=instance.pk).values(*sender.tracked_fields).first() or {}
+
+
+@receiver(post_save, sender=Employee)
+def employee_saved(sender, instance, created, **kwargs):
+    if created:
+        if instance.is_active and not department_stats.is_suspended():
+            department_stats.record(instance.department_id, employees=1)
+        return
+    old_department = _loaded(instance, 'department_id', instance.department_id)
+    old_active = _loaded(instance, 'is_active', instance.is_active)
+    if not department_stats.is_suspended() and (old_department, old_active) != (instance.department_id, instance.is_active):
+        rating_sum, rating_count = department_stats.employee_ratings(instance.pk)
+        if old_active:
+            department_stats.record(old_department, -1, -rating_sum, -rating_count)
+        if instance.is_active:
+            department_stats.record(instance.department_id, 1, rating_sum, rating_count)
+    if not attendance_rollups.is_suspended() and old_department != instance.department_id:
+        attendance_rollups.move_employee(instance.pk, old_department, instance.department_id)
+
+
+@receiver(pre_delete, sender=Employee)
+def employee_deleted(sender, instance, **kwargs):
+    department = _loaded(instance, 'department_id', instance.department_id)
+    if not department_stats.is_suspended() and _loaded(instance, 'is_active', instance.is_active):
+        rating_sum, rating_count = department_stats.employee_ratings(instance.pk)
+        department_stats.record(department, -1, -rating_sum, -rating_count)
+    if not attendance_rollups.is_suspended():
+        # The employee's own rollups are removed by the cascade.
+        attendance_rollups.move_employee(instance.pk, department, None)
+
+
+@receiver(post_save, sender=PerformanceRecord)
+def performance_record_saved(sender, instance, created, **kwargs):
+    if department_stats.is_suspended():
+        return
+    old_employee_id = None if created else _loaded(instance, 'employee_id', instance.employee_id)
+    old_rating = _loaded(instance, 'rating', instance.rating)
+    if created or (old_employee_id, old_rating) != (instance.employee_id, instance.rating):
+        if old_employee_id is not None:
+            old = Employee.objects.filter(pk=old_employee_id).values('department_id', 'is_active').first()
+            if old and old['is_active']:
+                department_stats.record(old['department_id'], rating_sum=-old_rating, rating_count=-1)
+        if instance.employee.is_active:
+            department_stats.record(instance.employee.department_id, rating_sum=instance.rating, rating_count=1)
+
+
+@receiver(post_delete, sender=PerformanceRecord)
+def performance_record_deleted(sender, instance, origin=None, **kwargs):
+    if department_stats.is_suspended() or _deleted_with_employee(origin):
+        return
+    employee = instance.employee
+    if employee.is_active:
+        department_stats.record(employee.department_id, rating_sum=-instance.rating, rating_count=-1)
+
+
+def _attendance_department(employee_id, instance):
+    if employee_id == instance.employee_id:
+        return instance.employee.department_id
+    return Employee.objects.filter(pk=employee_id).values_list('department_id', flat=True).first()
+
+
+@receiver(post_save, sender=Attendance)
+def attendance_saved(sender, instance, created, **kwargs):
+    if attendance_rollups.is_suspended():
+        return
+    current = (instance.employee_id, instance.date, instance.clock_in, instance.clock_out)
+    if not created:
+        previous = tuple(_loaded(instance, name, value) for name, value in zip(Attendance.tracked_fields, current))
+        if previous == current:
+            return
+        attendance_rollups.record(previous[0], _attendance_department(previous[0], instance), *previous[1:], sign=-1)
+    attendance_rollups.record(instance.employee_id, instance.employee.department_id, *current[1:])
+
+
+@receiver(post_delete, sender=Attendance)
+def attendance_deleted(sender, instance, origin=None, **kwargs):
+    if attendance_rollups.is_suspended() or _deleted_with_employee(origin):
+        return
+    attendance_rollups.record(
+        instance.employee_id, instance.employee.department_id,
+        instance.date, instance.clock_in, instance.clock_out, sign=-1,
+    )
+
+
+@receiver(post_save, sender=Employee)
+@receiver(post_save, sender=PerformanceRecord)
+@receiver(post_save, sender=Attendance)
+@receiver(post_save, sender=DepartmentalPerformance)
+@receiver(post_save, sender=Department)
+@receiver(post_delete, sender=Employee)
+@receiver(post_delete, sender=PerformanceRecord)
+@receiver(post_delete, sender=Attendance)
+@receiver(post_delete, sender=DepartmentalPerformance)
+@receiver(post_delete, sender=Department)
+def invalidate_responses(sender, **kwargs):
+    response_cache.bump(sender)
+
+
+@receiver(post_delete, sender=Token)
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=Permission)
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=Group.permissions.through)
+def invalidate_auth_cache(sender, **kwargs):
+    if kwargs.get('action', 'post_').startswith('post_'):  # m2m_changed sends pre_ and post_ actions
+        authentication.invalidate()
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, update_fields=None, **kwargs):
+    # Logins only update last_login.
+    if update_fields is None or set(update_fields) - {'last_login'}:
+        authentication.invalidate()
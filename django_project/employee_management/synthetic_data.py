@@ -0,0 +1,242 @@
+"""
+Synthetic data generation for the ``generate_data`` command.
+
+Employees are generated in chunks that worker processes can build
+independently.  Every employee draws from its own random stream, seeded from
+the run's seed and the employee id, so a given seed produces the same data
+whatever the number of workers or the chunk size.
+
+Attendance follows a workday calendar per employee: one shift on each
+weekday from the hire date (or the start of the history window) until today,
+or until the day an inactive employee left, minus a few days off.  Each
+employee has at most one row per day, so the ``(employee, date)`` constraint
+cannot be violated.  The employee's hours rollups are computed alongside
+(see attendance_rollups.py) and the department rollups are summed per chunk,
+so nothing has to rescan the attendance table after the load.
+
+On PostgreSQL each worker loads its chunk with ``COPY`` in its own
+transaction.  Other databases (SQLite for local use) cannot take parallel
+writers, so workers only generate and the command loads the rows in the
+parent process with batched INSERTs.
+"""
+import io
+import random
+import re
+from collections import namedtuple
+from datetime import date, time, timedelta
+
+from django.db import connections, router, transaction
+from faker import Faker
+
+from .attendance_rollups import GRANULARITIES, period_start
+from .models import Attendance, Employee, EmployeeHoursRollup, HoursRollup, PerformanceRecord
+
+DEFAULT_DEPARTMENTS = ['Sales', 'Marketing', 'Engineering', 'HR', 'Finance']
+POOL_SIZE = 500  # Distinct names, job titles and comments drawn from Faker
+ABSENCE_RATE = 0.04
+OPEN_SHIFT_RATE = 0.01
+NOTE_RATE = 0.02
+INACTIVE_RATE = 0.1
+
+EMPLOYEE_COLUMNS = ('id', 'first_name', 'last_name', 'email', 'job_title', 'department_id', 'hire_date', 'salary',
+                    'is_active', 'change_seq')
+REVIEW_COLUMNS = ('employee_id', 'review_date', 'rating', 'comments', 'reviewer_name', 'change_seq')
+ATTENDANCE_COLUMNS = ('employee_id', 'date', 'clock_in', 'clock_out', 'notes', 'change_seq')
+ROLLUP_COLUMNS = ('employee_id', 'granularity', 'period_start', 'seconds_worked', 'shifts', 'open_shifts')
+
+TABLES = (
+    (Employee, EMPLOYEE_COLUMNS),
+    (PerformanceRecord, REVIEW_COLUMNS),
+    (Attendance, ATTENDANCE_COLUMNS),
+    (EmployeeHoursRollup, ROLLUP_COLUMNS),
+)
+
+# ``departments`` are Department ids; every row gets the change feed number ``change_seq``.
+ChunkTask = namedtuple('ChunkTask', 'seed first_id count departments years reviews today load batch_size change_seq')
+ChunkResult = namedtuple('ChunkResult', 'counts department_rollups rows')
+
+_pools = {}
+
+
+def department_names(count):
+    """
+    Returns ``count`` department names, starting with the usual five.
+    """
+    names = DEFAULT_DEPARTMENTS[:count]
+    names += [f'Department {n}' for n in range(len(names) + 1, count + 1)]
+    return names
+
+
+def _pools_for(seed):
+    """
+    Returns the Faker-generated value pools for a seed.  Calling Faker per
+    row would dominate the run time, so each process builds the pools once.
+    """
+    if seed not in _pools:
+        fake = Faker()
+        fake.seed_instance(seed)
+        _pools[seed] = {
+            'first_name': [fake.first_name() for _ in range(POOL_SIZE)],
+            'last_name': [fake.last_name() for _ in range(POOL_SIZE)],
+            'job': [fake.job()[:100] for _ in range(POOL_SIZE)],
+            'name': [fake.name() for _ in range(POOL_SIZE)],
+            'text': [fake.text() for _ in range(POOL_SIZE)],
+            'note': [fake.sentence() for _ in range(POOL_SIZE)],
+        }
+    return _pools[seed]
+
+
+def _email_part(name):
+    return re.sub(r'[^a-z0-9]', '', name.lower()) or 'x'
+
+
+def _seconds_to_time(seconds):
+    return time(seconds // 3600, seconds // 60 % 60, seconds % 60)
+
+
+def generate_employee(task, employee_id, pools, rows, department_rollups):
+    """
+    Appends one employee and all of their history to ``rows``.
+    """
+    rng = random.Random(f'{task.seed}:{employee_id}')
+    today = task.today
+    first_name, last_name = rng.choice(pools['first_name']), rng.choice(pools['last_name'])
+    department_id = rng.choice(task.departments)
+    hire_date = today - timedelta(days=rng.randint(30, 3650))
+    is_active = rng.random() >= INACTIVE_RATE
+    last_day = today if is_active else hire_date + timedelta(days=rng.randint(0, (today - hire_date).days))
+    rows[Employee].append((
+        employee_id, first_name, last_name,
+        f'{_email_part(first_name)}.{_email_part(last_name)}.{employee_id}@example.com',
+        rng.choice(pools['job']), department_id, hire_date, rng.randint(50000, 150000), is_active, task.change_seq,
+    ))
+
+    for _ in range(task.reviews):
+        review_date = hire_date + timedelta(days=rng.randint(0, (last_day - hire_date).days))
+        rows[PerformanceRecord].append((
+            employee_id, review_date, rng.randint(1, 5), rng.choice(pools['text']), rng.choice(pools['name']),
+            task.change_seq,
+        ))
+
+    totals = {}
+    first_day = max(hire_date, today - timedelta(days=365 * task.years)).toordinal()
+    for ordinal in range(first_day, last_day.toordinal() + 1):
+        if (ordinal - 1) % 7 >= 5 or rng.random() < ABSENCE_RATE:  # Weekend or day off
+            continue
+        day = date.fromordinal(ordinal)
+        clock_in = rng.randint(7 * 3600, 10 * 3600) // 60 * 60
+        seconds = rng.randint(7 * 3600, 10 * 3600) // 60 * 60
+        if rng.random() < OPEN_SHIFT_RATE:
+            clock_out, values = None, (0, 1, 1)
+        else:
+            clock_out, values = _seconds_to_time(clock_in + seconds), (seconds, 1, 0)
+        note = rng.choice(pools['note']) if rng.random() < NOTE_RATE else None
+        rows[Attendance].append((employee_id, day, _seconds_to_time(clock_in), clock_out, note, task.change_seq))
+        rows[EmployeeHoursRollup].append((employee_id, HoursRollup.GRANULARITY_DAY, day, *values))
+        for granularity in GRANULARITIES[1:]:
+            key = (granularity, period_start(day, granularity))
+            current = totals.get(key, (0, 0, 0))
+            totals[key] = tuple(a + b for a, b in zip(current, values))
+        key = (department_id, HoursRollup.GRANULARITY_DAY, day)
+        current = department_rollups.get(key, (0, 0, 0))
+        department_rollups[key] = tuple(a + b for a, b in zip(current, values))
+
+    for (granularity, start), values in totals.items():
+        rows[EmployeeHoursRollup].append((employee_id, granularity, start, *values))
+        key = (department_id, granularity, start)
+        current = department_rollups.get(key, (0, 0, 0))
+        department_rollups[key] = tuple(a + b for a, b in zip(current, values))
+
+
+def generate_chunk(task):
+    """
+    Generates the employees ``first_id`` .. ``first_id + count - 1``.  With
+    ``task.load`` the rows are loaded here and not returned.
+    """
+    pools = _pools_for(task.seed)
+    rows = {model: [] for model, _ in TABLES}
+    counts = {model._meta.model_name: 0 for model, _ in TABLES}
+    department_rollups = {}
+
+    def flush(force=False):
+        for model, columns in TABLES:
+            if rows[model] and (force or len(rows[model]) >= task.batch_size):
+                load_rows(model, columns, rows[model], task.batch_size)
+                counts[model._meta.model_name] += len(rows[model])
+                rows[model] = []
+
+    with transaction.atomic():
+        for employee_id in range(task.first_id, task.first_id + task.count):
+            generate_employee(task, employee_id, pools, rows, department_rollups)
+            if task.load:
+                flush()
+        if task.load:
+            flush(force=True)
+
+    if not task.load:
+        for model, _ in TABLES:
+            counts[model._meta.model_name] = len(rows[model])
+    return ChunkResult(counts, department_rollups, None if task.load else rows)
+
+
+def _copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def copy_rows(model, columns, rows):
+    """
+    Loads rows with PostgreSQL ``COPY ... FROM STDIN`` (text format).
+    """
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join(map(_copy_value, row)))
+        buffer.write('\n')
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    sql = f'COPY {quote(model._meta.db_table)} ({", ".join(map(quote, columns))}) FROM STDIN'
+    with connection.cursor() as cursor:
+        raw = cursor.cursor
+        if hasattr(raw, 'copy_expert'):  # psycopg2
+            buffer.seek(0)
+            raw.copy_expert(sql, buffer)
+        else:  # psycopg 3
+            with raw.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+
+
+def insert_rows(model, columns, rows, batch_size):
+    """
+    Loads rows with ``executemany`` INSERTs, with values converted by the
+    model fields as ``bulk_create`` would but without building instances.
+    Plain ints and strings are passed through unconverted.
+    """
+    connection = connections[router.db_for_write(model)]
+    fields = [model._meta.get_field(column) for column in columns]
+    quote = connection.ops.quote_name
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        quote(model._meta.db_table), ', '.join(map(quote, columns)), ', '.join(['%s'] * len(columns)),
+    )
+    with connection.cursor() as cursor:
+        for i in range(0, len(rows), batch_size):
+            cursor.executemany(sql, [
+                [
+                    value if value is None or type(value) in (int, str) else field.get_db_prep_save(value, connection)
+                    for field, value in zip(fields, row)
+                ]
+                for row in rows[i:i + batch_size]
+            ])
+
+
+def load_rows(model, columns, rows, batch_size):
+    """
+    Loads rows of ``columns`` values into the model's table: ``COPY`` on
+    PostgreSQL, batched INSERTs elsewhere.
+    """
+    if connections[router.db_for_write(model)].vendor == 'postgresql':
+        copy_rows(model, columns, rows)
+    else:
+        insert_rows(model, columns, rows, batch_size)
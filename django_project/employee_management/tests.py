@@ -1,13 +1,58 @@
-from django.test import TestCase
+import asyncio
+import copy
+import csv
+import gzip
+import importlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import uuid
+from urllib.parse import parse_qs, urlsplit
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import Group, Permission, User
+from django.core.cache import cache, caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, connections, transaction
+from django.db.models import F
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from rest_framework import status
-from rest_framework.test import APIClient
-from .models import Employee, PerformanceRecord, Attendance
-from .factories import EmployeeFactory, PerformanceRecordFactory, AttendanceFactory  # If you use factory_boy
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework import serializers, status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework.throttling import SimpleRateThrottle
+from datetime import date, time, timedelta
+from .models import Department, Employee, PerformanceRecord, Attendance, DepartmentalPerformance, ExportJob
+from .models import EmployeeHoursRollup, DepartmentHoursRollup, EmployeePerformanceTrend, DepartmentRatingSnapshot
+from .models import ImportJob, Tombstone
+from . import authentication, change_feed, checks, partitions, performance_analytics, response_cache, throttling, views
+from .fast_list import RowSerializer
+from .serializers import EmployeeSerializer
+from .async_views import async_read_urls
+from .urls import router
+from utils import benchmarking, db_pool, db_router, index_advisor, loadtesting, query_budget
+from utils.logging_pipeline import BackgroundQueueHandler, JSONFormatter, SamplingFilter
+from utils.lru import LRUCache
+from .factories import DepartmentFactory, EmployeeFactory, PerformanceRecordFactory, AttendanceFactory  # If you use factory_boy
 
 class EmployeeAPITests(TestCase):
     def setUp(self):
         self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('tester', password='secret'))
         self.employee1 = EmployeeFactory()
         self.employee2 = EmployeeFactory()
 
@@ -15,7 +60,7 @@ class EmployeeAPITests(TestCase):
         url = reverse('employee-list')
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 2)
+        self.assertEqual(response.data['count'], 2)
 
     def test_get_employee_detail(self):
         url = reverse('employee-detail', kwargs={'pk': self.employee1.pk})
@@ -28,6 +73,7 @@ class EmployeeAPITests(TestCase):
 class PerformanceRecordAPITests(TestCase):
     def setUp(self):
         self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('tester', password='secret'))
         self.record1 = PerformanceRecordFactory()
         self.record2 = PerformanceRecordFactory()
 
@@ -35,13 +81,14 @@ class PerformanceRecordAPITests(TestCase):
         url = reverse('performancerecord-list')
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 2)
+        self.assertEqual(response.data['count'], 2)
 
     # Add more tests
 
 class AttendanceAPITests(TestCase):
     def setUp(self):
         self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('tester', password='secret'))
         self.attendance1 = AttendanceFactory()
         self.attendance2 = AttendanceFactory()
 
@@ -49,4 +96,1525 @@ class AttendanceAPITests(TestCase):
         url = reverse('attendance-list')
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 2)
\ No newline at end of file
+        self.assertEqual(response.data['count'], 2)
+
+class CSVExportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('tester', password='secret'))
+
+    def get_csv(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode().splitlines()
+
+    def test_export_employees_honours_filters(self):
+        EmployeeFactory(department='Sales', salary=50000)
+        EmployeeFactory(department='HR')
+        lines = self.get_csv(reverse('employee-export-csv') + '?department=Sales')
+        self.assertEqual(lines[0], 'id,first_name,last_name,email,job_title,department,hire_date,salary,is_active')
+        self.assertEqual(len(lines), 2)
+        self.assertIn(',Sales,', lines[1])
+        self.assertIn(',50000.00,True', lines[1])
+
+    def test_export_empty_result(self):
+        lines = self.get_csv(reverse('employee-export-csv'))
+        self.assertEqual(lines, ['id,first_name,last_name,email,job_title,department,hire_date,salary,is_active'])
+
+    def test_export_performance_records_includes_employee_name(self):
+        record = PerformanceRecordFactory()
+        lines = self.get_csv(reverse('performancerecord-export-csv'))
+        self.assertEqual(lines[0], 'id,employee,employee_name,review_date,rating,comments,reviewer_name')
+        self.assertTrue(lines[1].startswith(f'{record.pk},{record.employee.pk},{record.employee},'))
+
+class ExportJobTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('tester', password='secret'))
+        self.export_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.export_dir.cleanup)
+        settings_override = override_settings(EXPORT_JOBS={'ROOT': self.export_dir.name, 'MAX_WORKERS': 0, 'CHUNK_ROWS': 2})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        for _ in range(3):
+            EmployeeFactory(department='Sales')
+        EmployeeFactory(department='HR')
+
+    def start_export(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('employee-export-job') + '?department=Sales&page=2')
+
+    def test_export_job_writes_chunked_artifact(self):
+        response = self.start_export()
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        job = self.client.get(response['Location']).data
+        self.assertEqual(job['status'], ExportJob.STATUS_COMPLETED)
+        self.assertEqual(job['rows_written'], 3)
+        self.assertEqual(job['chunks_written'], 2)
+
+        download = self.client.get(job['download_url'])
+        lines = gzip.decompress(b''.join(download.streaming_content)).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[0], 'id')
+        self.assertEqual(len(lines), 4)
+
+    def test_download_supports_range(self):
+        job_id = self.start_export().data['id']
+        url = reverse('exportjob-download', kwargs={'pk': job_id})
+        full = b''.join(self.client.get(url).streaming_content)
+        response = self.client.get(url, HTTP_RANGE='bytes=10-')
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(response['Content-Range'], f'bytes 10-{len(full) - 1}/{len(full)}')
+        self.assertEqual(b''.join(response.streaming_content), full[10:])
+        response = self.client.get(url, HTTP_RANGE=f'bytes={len(full)}-')
+        self.assertEqual(response.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+
+    def test_identical_filters_reuse_job(self):
+        first = self.start_export()
+        second = self.start_export()
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(first.data['id'], second.data['id'])
+        self.assertEqual(ExportJob.objects.count(), 1)
+        self.client.force_authenticate(User.objects.create_user('other', password='secret'))
+        third = self.start_export()
+        self.assertEqual(third.status_code, status.HTTP_202_ACCEPTED)
+        self.assertNotEqual(third.data['id'], first.data['id'])
+
+class DepartmentStatsTests(TestCase):
+    def stats(self, name):
+        row = DepartmentalPerformance.objects.get(department__name=name)
+        return row.total_employees, row.rating_count, row.average_rating
+
+    def test_records_and_employees_update_totals(self):
+        employee = EmployeeFactory(department='Sales')
+        PerformanceRecordFactory(employee=employee, rating=4)
+        record = PerformanceRecordFactory(employee=employee, rating=2)
+        self.assertEqual(self.stats('Sales'), (1, 2, 3.0))
+
+        record.rating = 5
+        record.save()
+        self.assertEqual(self.stats('Sales'), (1, 2, 4.5))
+
+        employee.department = DepartmentFactory(name='HR')
+        employee.save()
+        self.assertEqual(self.stats('Sales'), (0, 0, 0.0))
+        self.assertEqual(self.stats('HR'), (1, 2, 4.5))
+
+        employee.is_active = False
+        employee.save()
+        self.assertEqual(self.stats('HR'), (0, 0, 0.0))
+
+        employee.is_active = True
+        employee.save()
+        record.delete()
+        self.assertEqual(self.stats('HR'), (1, 1, 4.0))
+
+        employee.delete()
+        self.assertEqual(self.stats('HR'), (0, 0, 0.0))
+
+    def test_rebuild_matches_incremental_totals(self):
+        for rating in (1, 2, 3):
+            PerformanceRecordFactory(employee__department='Sales', rating=rating)
+        EmployeeFactory(department='Sales', is_active=False)
+        expected = self.stats('Sales')
+        DepartmentalPerformance.objects.update(total_employees=0, rating_sum=0, rating_count=0, average_rating=0)
+        call_command('rebuild_department_stats', stdout=io.StringIO())
+        self.assertEqual(self.stats('Sales'), expected)
+        self.assertEqual(expected, (3, 3, 2.0))
+
+class PerformanceAnalyticsTests(TestCase):
+    def setUp(self):
+        self.sales, self.support = EmployeeFactory(department='Sales'), EmployeeFactory(department='Support')
+        self.reviews = {
+            self.sales: [(date(2024, 1, 10), 2), (date(2024, 2, 10), 3), (date(2024, 4, 1), 3), (date(2024, 5, 1), 5)],
+            self.support: [(date(2024, 3, 31), 4)],
+        }
+        for employee, reviews in self.reviews.items():
+            for review_date, rating in reviews:
+                PerformanceRecordFactory(employee=employee, review_date=review_date, rating=rating)
+
+    @staticmethod
+    def expected_slope(ratings):
+        n = len(ratings)
+        x_mean, y_mean = (n - 1) / 2, sum(ratings) / n
+        return sum((x - x_mean) * (y - y_mean) for x, y in enumerate(ratings)) / sum((x - x_mean) ** 2 for x in range(n))
+
+    def test_trends_match_a_plain_computation(self):
+        # A batch size smaller than an employee's reviews carries them over to the next batch.
+        stats = performance_analytics.compute_snapshots(window=3, batch_size=2)
+        self.assertEqual((stats['reviews'], stats['employee_trends']), (5, 2))
+        trend = EmployeePerformanceTrend.objects.get(employee=self.sales)
+        self.assertEqual((trend.review_count, trend.window_size, trend.latest_rating), (4, 3, 5))
+        self.assertAlmostEqual(trend.moving_average, (3 + 3 + 5) / 3)
+        self.assertAlmostEqual(trend.previous_average, (2 + 3 + 3) / 3)
+        self.assertAlmostEqual(trend.slope, self.expected_slope([3, 3, 5]))
+        self.assertEqual(trend.last_review_date, date(2024, 5, 1))
+        single = EmployeePerformanceTrend.objects.get(employee=self.support)
+        self.assertEqual((single.moving_average, single.previous_average, single.slope), (4.0, None, None))
+        self.assertEqual(single.department.name, 'Support')
+
+    def test_department_quarters(self):
+        PerformanceRecordFactory(employee=EmployeeFactory(department='Sales'), review_date=date(2024, 1, 1), rating=1)
+        call_command('compute_performance_analytics', stdout=io.StringIO())
+        snapshots = {
+            (row.department.name, row.year, row.quarter): row for row in DepartmentRatingSnapshot.objects.select_related('department')
+        }
+        self.assertEqual(sorted(snapshots), [('Sales', 2024, 1), ('Sales', 2024, 2), ('Support', 2024, 1)])
+        first = snapshots['Sales', 2024, 1]
+        self.assertEqual((first.review_count, first.histogram), (3, [1, 1, 1, 0, 0]))
+        self.assertAlmostEqual(first.mean_rating, 2.0)
+        self.assertEqual((first.p25, first.median, first.p75, first.p90), (1, 2, 3, 3))
+        self.assertEqual((snapshots['Sales', 2024, 2].median, snapshots['Support', 2024, 1].p90), (3, 4))
+
+    def test_percentiles_are_nearest_rank(self):
+        counts = performance_analytics.np.array([[0, 0, 0, 0, 10], [5, 0, 0, 0, 5], [1, 1, 1, 1, 6]])
+        total, mean, percentiles = performance_analytics.distribution(counts)
+        self.assertEqual(total.tolist(), [10, 10, 10])
+        self.assertEqual(mean.tolist(), [5.0, 3.0, 4.0])
+        self.assertEqual(percentiles['median'].tolist(), [5, 1, 5])
+        self.assertEqual(percentiles['p25'].tolist(), [5, 1, 3])
+
+    def test_recomputing_replaces_the_snapshots(self):
+        performance_analytics.compute_snapshots()
+        PerformanceRecord.objects.filter(employee=self.support).delete()
+        performance_analytics.compute_snapshots()
+        self.assertEqual(list(EmployeePerformanceTrend.objects.values_list('employee', flat=True)), [self.sales.pk])
+        PerformanceRecord.objects.all().delete()
+        self.assertEqual(performance_analytics.compute_snapshots()['reviews'], 0)
+        self.assertFalse(EmployeePerformanceTrend.objects.exists() or DepartmentRatingSnapshot.objects.exists())
+
+    def test_endpoints(self):
+        performance_analytics.compute_snapshots(window=2)
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user('tester', password='secret'))
+        response = client.get(reverse('employeeperformancetrend-list'), {'ordering': '-slope', 'department': 'Sales'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['employee'] for row in response.data['results']], [self.sales.pk])
+        self.assertEqual(response.data['results'][0]['department'], 'Sales')
+        response = client.get(reverse('employeeperformancetrend-detail', args=[self.support.pk]))
+        self.assertEqual((response.data['moving_average'], response.data['slope']), (4.0, None))
+        response = client.get(reverse('departmentratingsnapshot-list'), {'department': 'Sales', 'quarter': 2})
+        self.assertEqual([(row['year'], row['histogram']) for row in response.data['results']], [(2024, [0, 0, 1, 0, 1])])
+
+class DepartmentTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser('admin', password='secret'))
+
+    def employee_data(self, email, department):
+        return {'first_name': 'Ada', 'last_name': 'Lovelace', 'email': email, 'job_title': 'Engineer',
+                'department': department, 'hire_date': '2024-01-01', 'salary': '1000.00'}
+
+    def test_departments_are_read_and_written_by_name(self):
+        response = self.client.post(reverse('employee-list'), self.employee_data('a@example.com', ' Research '))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['department'], 'Research')
+        self.client.post(reverse('employee-list'), self.employee_data('b@example.com', 'Research'))
+        self.assertEqual(list(Department.objects.values_list('name', flat=True)), ['Research'])
+        employee = Employee.objects.get(email='b@example.com')
+        self.assertEqual(self.client.get(reverse('employee-detail', kwargs={'pk': employee.pk})).data['department'],
+                         'Research')
+        response = self.client.post(reverse('employee-list'), self.employee_data('c@example.com', ''))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('department', response.data)
+
+    def test_rejected_rows_create_no_department(self):
+        response = self.client.post(reverse('employee-list'), {**self.employee_data('a@example.com', 'Ghost'), 'salary': 'x'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        rows = [
+            self.employee_data('b@example.com', 'Research'),
+            {**self.employee_data('c@example.com', 'Ghost'), 'hire_date': 'x'},
+            self.employee_data('b@example.com', 'Phantom'),  # Rejected after validation, as a duplicate
+        ]
+        response = self.client.post(reverse('employee-bulk'), rows, format='json')
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(list(Department.objects.values_list('name', flat=True)), ['Research'])
+        self.assertEqual(Employee.objects.get(email='b@example.com').department.name, 'Research')
+
+    def test_department_filters_join_on_the_key(self):
+        sales = EmployeeFactory(department='Sales')
+        EmployeeFactory(department='HR')
+        for params in ({'department': 'Sales'}, {'department_id': sales.department_id}):
+            response = self.client.get(reverse('employee-list'), params)
+            self.assertEqual([row['id'] for row in response.data['results']], [sales.pk])
+        self.assertEqual(self.client.get(reverse('employee-list'), {'department': 'Nowhere'}).data['count'], 0)
+        response = self.client.get(reverse('departmentalperformance-list'))
+        self.assertEqual(sorted(row['department_name'] for row in response.data['results']), ['HR', 'Sales'])
+
+class DepartmentMigrationTests(TransactionTestCase):
+    def migrate(self, target):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate([('employee_management', target)])
+        return executor.loader.project_state(('employee_management', target)).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes('employee_management')[0][1])
+
+    def test_names_are_moved_into_departments(self):
+        apps = self.migrate('0007_department')
+        Employee = apps.get_model('employee_management', 'Employee')
+        DepartmentalPerformance = apps.get_model('employee_management', 'DepartmentalPerformance')
+        for index, name in enumerate(['Sales', 'HR', 'Sales']):
+            Employee.objects.create(first_name='A', last_name='B', email=f'{index}@example.com', job_title='Dev',
+                                    department_name=name, hire_date=date(2024, 1, 1), salary=1)
+        DepartmentalPerformance.objects.create(department_name='Legacy')
+        backfill = importlib.import_module('employee_management.migrations.0008_backfill_departments')
+        with mock.patch.object(backfill, 'BATCH_SIZE', 2):
+            apps = self.migrate('0009_department_contract')
+        Employee = apps.get_model('employee_management', 'Employee')
+        self.assertEqual(
+            sorted(Employee.objects.values_list('email', 'department__name')),
+            [('0@example.com', 'Sales'), ('1@example.com', 'HR'), ('2@example.com', 'Sales')],
+        )
+        self.assertEqual(
+            list(apps.get_model('employee_management', 'DepartmentalPerformance').objects
+                 .values_list('department__name', flat=True)),
+            ['Legacy'],
+        )
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('tester', password='secret'))
+        for salary in (50000, 60000, 60000, 60000, 70000):
+            EmployeeFactory(salary=salary)
+
+    def walk(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            ids.extend(row['id'] for row in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_cursor_walk_visits_every_row_once_in_order(self):
+        ids = self.walk(reverse('employee-list') + '?pagination=cursor&ordering=-salary&page_size=2')
+        expected = list(Employee.objects.order_by('-salary', '-pk').values_list('pk', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_pages_seek_with_a_row_value_comparison(self):
+        url = self.client.get(reverse('employee-list') + '?pagination=cursor&ordering=salary&page_size=2').data['next']
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertTrue(any('"salary", "employee_management_employee"."id") > (' in query['sql'] for query in queries))
+
+    def test_cursor_must_match_ordering(self):
+        response = self.client.get(reverse('employee-list') + '?pagination=cursor&ordering=salary&page_size=2')
+        cursor_url = response.data['next'].replace('ordering=salary', 'ordering=hire_date')
+        self.assertEqual(self.client.get(cursor_url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_count_modes(self):
+        response = self.client.get(reverse('employee-list') + '?pagination=cursor&count=exact')
+        self.assertEqual(response.data['count'], 5)
+        # The planner estimate is PostgreSQL-only; elsewhere the count stays exact.
+        response = self.client.get(reverse('employee-list') + '?count=estimate')
+        self.assertEqual(response.data['count'], 5)
+        self.assertNotIn('count_estimated', response.data)
+
+class AttendanceRollupTests(TestCase):
+    def setUp(self):
+        self.employee = EmployeeFactory(department='Sales')
+
+    def attend(self, day, clock_in, clock_out):
+        return Attendance.objects.create(employee=self.employee, date=day, clock_in=clock_in, clock_out=clock_out)
+
+    def rollup(self, model, granularity, **owner):
+        row = model.objects.get(granularity=granularity, **owner)
+        return row.seconds_worked, row.shifts, row.open_shifts
+
+    def test_rollups_follow_attendance_writes(self):
+        self.attend(date(2024, 1, 1), time(9), time(17))
+        overnight = self.attend(date(2024, 1, 2), time(22), time(6))
+        open_shift = self.attend(date(2024, 1, 3), time(9), None)
+        self.assertEqual(self.rollup(EmployeeHoursRollup, 'week', employee=self.employee), (16 * 3600, 3, 1))
+        self.assertEqual(self.rollup(DepartmentHoursRollup, 'month', department__name='Sales'), (16 * 3600, 3, 1))
+
+        open_shift.clock_out = time(12)
+        open_shift.save()
+        overnight.delete()
+        self.assertEqual(self.rollup(EmployeeHoursRollup, 'month', employee=self.employee), (11 * 3600, 2, 0))
+        self.assertEqual(
+            self.rollup(EmployeeHoursRollup, 'day', employee=self.employee, period_start=date(2024, 1, 2)), (0, 0, 0),
+        )
+
+    def test_department_rollups_follow_department_changes(self):
+        self.attend(date(2024, 1, 1), time(9), time(17))
+        self.employee.department = DepartmentFactory(name='HR')
+        self.employee.save()
+        self.assertEqual(self.rollup(DepartmentHoursRollup, 'month', department__name='Sales'), (0, 0, 0))
+        self.assertEqual(self.rollup(DepartmentHoursRollup, 'month', department__name='HR'), (8 * 3600, 1, 0))
+        self.employee.delete()
+        self.assertEqual(set(DepartmentHoursRollup.objects.values_list('seconds_worked', 'shifts')), {(0, 0)})
+
+    def test_rebuild_matches_incremental_totals(self):
+        self.attend(date(2024, 1, 30), time(8), time(16))
+        self.attend(date(2024, 2, 1), time(20), time(2))
+        expected = sorted(EmployeeHoursRollup.objects.filter(shifts__gt=0).values_list(
+            'granularity', 'period_start', 'seconds_worked', 'shifts'))
+        EmployeeHoursRollup.objects.all().delete()
+        DepartmentHoursRollup.objects.all().delete()
+        call_command('rebuild_attendance_rollups', stdout=io.StringIO())
+        self.assertEqual(sorted(EmployeeHoursRollup.objects.values_list(
+            'granularity', 'period_start', 'seconds_worked', 'shifts')), expected)
+        self.assertEqual(self.rollup(DepartmentHoursRollup, 'week', department__name='Sales'), (14 * 3600, 2, 0))
+
+    def test_hours_endpoint(self):
+        self.attend(date(2024, 1, 1), time(9), time(17))
+        self.attend(date(2024, 2, 1), time(9), time(13))
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user('tester', password='secret'))
+        url = reverse('attendance-hours-list')
+        response = client.get(url, {'granularity': 'month', 'department': 'Sales', 'start': '2024-02-01'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['hours'] for row in response.data['results']], [4.0])
+        response = client.get(url, {'granularity': 'month', 'employee': self.employee.pk})
+        self.assertEqual([row['hours'] for row in response.data['results']], [8.0, 4.0])
+        self.assertEqual(client.get(url, {'granularity': 'year'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+class AttendancePartitionTests(TestCase):
+    def test_date_range_filters(self):
+        employee = EmployeeFactory()
+        for day in (date(2024, 1, 31), date(2024, 2, 1), date(2024, 2, 29), date(2024, 3, 1)):
+            AttendanceFactory(employee=employee, date=day)
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user('tester', password='secret'))
+        url = reverse('attendance-list')
+        response = client.get(url, {'date_from': '2024-02-01', 'date_to': '2024-02-29', 'ordering': 'date'})
+        self.assertEqual([row['date'] for row in response.data['results']], ['2024-02-01', '2024-02-29'])
+        self.assertEqual(client.get(url, {'date_from': '2024-03-01'}).data['count'], 1)
+        self.assertEqual(client.get(url, {'date': '2024-01-31'}).data['count'], 1)
+        self.assertEqual(client.get(url, {'date_to': 'February'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_partition_months(self):
+        self.assertEqual(partitions.add_months(date(2024, 11, 1), 3), date(2025, 2, 1))
+        self.assertEqual(partitions.add_months(date(2024, 1, 1), -1), date(2023, 12, 1))
+        self.assertEqual(partitions.parse_month('2024-02'), date(2024, 2, 1))
+        with self.assertRaises(ValueError):
+            partitions.parse_month('2024-13')
+        name = partitions.partition_name(date(2024, 2, 1))
+        self.assertEqual(name, 'employee_management_attendance_y2024m02')
+        self.assertEqual(partitions.partition_month(name), date(2024, 2, 1))
+        self.assertIsNone(partitions.partition_month(partitions.DEFAULT_PARTITION))
+
+    def test_command_needs_postgresql(self):
+        if connection.vendor == 'postgresql':
+            self.skipTest('Checks the error on other databases')
+        with self.assertRaisesMessage(CommandError, 'needs PostgreSQL'):
+            call_command('attendance_partitions', 'create', stdout=io.StringIO())
+
+class BulkEndpointTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser('admin', password='secret'))
+
+    def employee_row(self, email, department='Sales', **extra):
+        row = {'first_name': 'A', 'last_name': 'B', 'email': email, 'job_title': 'Clerk',
+               'department': department, 'hire_date': '2024-01-01', 'salary': '1000.00'}
+        row.update(extra)
+        return row
+
+    def test_bulk_create_reports_row_errors(self):
+        EmployeeFactory(email='taken@example.com')
+        rows = [self.employee_row('a@example.com'), self.employee_row('taken@example.com'),
+                self.employee_row('b@example.com', salary='oops'), self.employee_row('a@example.com')]
+        response = self.client.post(reverse('employee-bulk'), rows, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([row['index'] for row in response.data['results']], [0])
+        self.assertEqual([error['index'] for error in response.data['errors']], [1, 2, 3])
+        self.assertIn('salary', response.data['errors'][1]['errors'])
+        self.assertEqual(DepartmentalPerformance.objects.get(department__name='Sales').total_employees, 1)
+
+    def test_bulk_upsert_updates_by_unique_key(self):
+        existing = EmployeeFactory(email='a@example.com', department='Sales', is_active=True)
+        rows = [self.employee_row('a@example.com', department='Support'), self.employee_row('b@example.com')]
+        response = self.client.put(reverse('employee-bulk'), rows, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([(row['id'] == existing.pk, row['created']) for row in response.data['results']],
+                         [(True, False), (False, True)])
+        self.assertEqual(Employee.objects.get(pk=existing.pk).department.name, 'Support')
+        totals = dict(DepartmentalPerformance.objects.values_list('department__name', 'total_employees'))
+        self.assertEqual((totals['Sales'], totals['Support']), (1, 1))
+
+    def test_bulk_attendance_upsert_keeps_rollups_current(self):
+        employee = EmployeeFactory(department='Sales')
+        other = EmployeeFactory()
+        rows = [{'employee': pk, 'date': '2024-01-01', 'clock_in': '09:00', 'clock_out': '17:00'}
+                for pk in (employee.pk, other.pk)]
+        missing = {'employee': 999999, 'date': '2024-01-01', 'clock_in': '09:00'}
+        response = self.client.post(reverse('attendance-bulk'), rows + [missing], format='json')
+        self.assertEqual(response.data['count'], 2)
+        self.assertIn('employee', response.data['errors'][0]['errors'])
+        rows[0]['clock_out'] = '12:00'
+        response = self.client.put(reverse('attendance-bulk'), rows[:1], format='json')
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(Attendance.objects.count(), 2)
+        rollup = EmployeeHoursRollup.objects.get(employee=employee, granularity='day')
+        self.assertEqual((rollup.seconds_worked, rollup.shifts), (3 * 3600, 1))
+
+    def test_bulk_delete(self):
+        records = [PerformanceRecordFactory(rating=4), PerformanceRecordFactory(rating=2)]
+        response = self.client.delete(reverse('performancerecord-bulk'), [records[0].pk, 999999], format='json')
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(response.data['errors'], [{'index': 1, 'errors': {'detail': 'Not found.'}}])
+        self.assertEqual(list(PerformanceRecord.objects.values_list('pk', flat=True)), [records[1].pk])
+        self.assertEqual(self.client.put(reverse('performancerecord-bulk'), [], format='json').status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+class EmployeeImportTests(TestCase):
+    CSV = (
+        'first_name,last_name,email,job_title,department,hire_date,salary,is_active\n'
+        'Ann,Lee,ann@example.com,Clerk,Sales,2024-01-02,1000.00,\n'
+        'Bob,Ray,not-an-email,Clerk,Sales,2024-01-02,1000.00,True\n'
+        'Cat,Fox,taken@example.com,Clerk,Sales,2024-01-02,1000.00,True\n'
+        'Dan,Orr,dan@example.com,Clerk,Acquired,2024-01-02,2000.00,False\n'
+        'Eve,Poe,ann@example.com,Clerk,Sales,2024-01-02,1000.00,True\n'
+    )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser('admin', password='secret'))
+        self.import_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.import_dir.cleanup)
+        settings_override = override_settings(IMPORT_JOBS={'ROOT': self.import_dir.name, 'BATCH_SIZE': 2, 'MAX_WORKERS': 0})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        EmployeeFactory(email='taken@example.com', department='Sales')
+
+    def upload(self, content, name='employees.csv', **data):
+        upload = io.BytesIO(content.encode())
+        upload.name = name
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('employee-import'), {'file': upload, **data}, format='multipart')
+        if response.status_code != status.HTTP_202_ACCEPTED:
+            return response
+        self.assertEqual(response.data['status'], ImportJob.STATUS_PENDING)
+        return self.client.get(response['Location'])
+
+    def test_csv_import_loads_valid_rows_and_reports_the_rest(self):
+        response = self.upload(self.CSV)
+        self.assertEqual(response.data['status'], ImportJob.STATUS_COMPLETED)
+        self.assertEqual((response.data['rows_read'], response.data['rows_loaded'], response.data['rows_rejected']), (5, 2, 3))
+        self.assertGreater(response.data['rows_per_second'], 0)
+        ann = Employee.objects.get(email='ann@example.com')
+        self.assertEqual((ann.department.name, ann.is_active), ('Sales', True))
+        self.assertFalse(Employee.objects.get(email='dan@example.com').is_active)
+        self.assertEqual(DepartmentalPerformance.objects.get(department__name='Sales').total_employees, 2)
+
+        report = self.client.get(response.data['report_url'])
+        lines = list(csv.reader(gzip.decompress(b''.join(report.streaming_content)).decode().splitlines()))
+        self.assertEqual(lines[0], ['line', 'errors', 'record'])
+        self.assertEqual([line[0] for line in lines[1:]], ['3', '4', '6'])
+        self.assertIn('email', json.loads(lines[1][1]))
+        self.assertEqual(json.loads(lines[3][1]), {'email': ['Duplicates the email of line 2.']})
+
+    def test_ndjson_upload_spooled_to_disk(self):
+        content = '\n'.join([
+            json.dumps({'first_name': 'Ann', 'last_name': 'Lee', 'email': 'ann@example.com', 'job_title': 'Clerk',
+                        'department': 'Sales', 'hire_date': '2024-01-02', 'salary': '1000.00'}),
+            '{"first_name": ',
+            '[1, 2]',
+            '',
+        ])
+        with override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=10):
+            response = self.upload(content, name='employees.ndjson')
+        self.assertEqual(response.data['status'], ImportJob.STATUS_COMPLETED)
+        self.assertEqual((response.data['rows_loaded'], response.data['rows_rejected']), (1, 2))
+        self.assertTrue(Employee.objects.filter(email='ann@example.com').exists())
+        self.assertEqual(os.listdir(self.import_dir.name), [f"import-{response.data['id']}-rejected.csv.gz"])
+
+    def test_dry_run_loads_nothing(self):
+        response = self.upload(self.CSV, dry_run='true')
+        self.assertEqual(response.data['status'], ImportJob.STATUS_COMPLETED)
+        self.assertEqual((response.data['rows_loaded'], response.data['rows_rejected']), (2, 3))
+        self.assertEqual(Employee.objects.count(), 1)
+        self.assertFalse(Department.objects.filter(name='Acquired').exists())
+        self.assertEqual(self.upload(self.CSV, name='employees.txt').status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_rejected_rows_create_no_department(self):
+        response = self.upload(self.CSV.replace('not-an-email,Clerk,Sales', 'not-an-email,Clerk,Ghost'))
+        self.assertEqual(response.data['rows_rejected'], 3)
+        self.assertFalse(Department.objects.filter(name='Ghost').exists())
+        self.assertTrue(Department.objects.filter(name='Acquired').exists())
+
+    def test_command(self):
+        path = f'{self.import_dir.name}/employees.csv'
+        with open(path, 'w') as file:
+            file.write(self.CSV)
+        stdout = io.StringIO()
+        call_command('import_employees', path, batch_size=100, stdout=stdout)
+        self.assertIn('Loaded 2 of 5 rows, 3 rejected', stdout.getvalue())
+        self.assertIn('rows/s', stdout.getvalue())
+        self.assertEqual(Employee.objects.count(), 3)
+
+    def test_resume_runs_pending_jobs_and_fails_interrupted_ones(self):
+        upload = io.BytesIO(self.CSV.encode())
+        upload.name = 'employees.csv'
+        with self.captureOnCommitCallbacks(execute=False):
+            response = self.client.post(reverse('employee-import'), {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        interrupted = ImportJob.objects.create(input_format=ImportJob.FORMAT_CSV, status=ImportJob.STATUS_RUNNING,
+                                               rows_read=4)
+        call_command('resume_import_jobs', stdout=io.StringIO())
+        job = ImportJob.objects.get(pk=response.data['id'])
+        self.assertEqual((job.status, job.rows_loaded, job.upload_path), (ImportJob.STATUS_COMPLETED, 2, ''))
+        interrupted.refresh_from_db()
+        self.assertEqual(interrupted.status, ImportJob.STATUS_FAILED)
+        self.assertIn('after 4 rows', interrupted.error)
+
+class ChangeFeedTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser('admin', password='secret'))
+
+    def sync(self, resource, since=None, limit=2):
+        """
+        Follows the feed until it is caught up; returns the changes and the
+        cursor to resume from.
+        """
+        params = {'limit': limit, **({'since': since} if since else {})}
+        changes = []
+        url = reverse(f'{resource}-changes')
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            changes += response.data['results']
+            url, params = response.data['next'], {}
+        return changes, response.data['cursor']
+
+    def test_sync_returns_only_what_changed_since_the_cursor(self):
+        first, second, third = (EmployeeFactory() for _ in range(3))
+        changes, cursor = self.sync('employee')
+        self.assertEqual([(change['id'], change['action']) for change in changes],
+                         [(first.pk, 'upsert'), (second.pk, 'upsert'), (third.pk, 'upsert')])
+        self.assertEqual(changes[0]['data']['email'], first.email)
+
+        second.job_title = 'Manager'
+        second.save()
+        deleted = first.pk
+        first.delete()
+        second.save()  # Reported once, as it is now
+        changes, cursor = self.sync('employee', cursor)
+        self.assertEqual([(change['id'], change['action']) for change in changes],
+                         [(deleted, 'delete'), (second.pk, 'upsert')])
+        self.assertEqual(changes[1]['data']['job_title'], 'Manager')
+        self.assertLess(changes[0]['seq'], changes[1]['seq'])
+        self.assertEqual(self.sync('employee', cursor), ([], cursor))
+
+    def test_rows_loaded_before_tracking_are_paged_by_id(self):
+        records = [PerformanceRecordFactory() for _ in range(3)]
+        PerformanceRecord.objects.update(change_seq=0)  # As after the migration
+        changes, _ = self.sync('performancerecord', limit=1)
+        self.assertEqual([change['id'] for change in changes], sorted(record.pk for record in records))
+        with self.assertNumQueries(3):  # Counter, rows, tombstones
+            self.client.get(reverse('performancerecord-changes'))
+
+    def test_bulk_writes_and_cascades_are_tracked(self):
+        employee = EmployeeFactory()
+        attendance = AttendanceFactory(employee=employee)
+        _, cursor = self.sync('attendance')
+        rows = [{'first_name': 'A', 'last_name': 'B', 'email': f'{name}@example.com', 'job_title': 'Clerk',
+                 'department': 'Sales', 'hire_date': '2024-01-01', 'salary': '1000.00'} for name in ('a', 'b')]
+        created = [row['id'] for row in self.client.post(reverse('employee-bulk'), rows, format='json').data['results']]
+        self.client.delete(reverse('employee-bulk'), created[:1], format='json')
+        deleted = (employee.pk, attendance.pk)
+        employee.delete()
+        changes, _ = self.sync('attendance', cursor)
+        self.assertEqual([(change['id'], change['action']) for change in changes], [(deleted[1], 'delete')])
+        changes, _ = self.sync('employee')
+        self.assertEqual([(change['id'], change['action']) for change in changes],
+                         [(created[1], 'upsert'), (created[0], 'delete'), (deleted[0], 'delete')])
+        self.assertEqual(Tombstone.objects.count(), 3)
+
+    def test_uncommitted_numbers_are_not_served(self):
+        employee = EmployeeFactory()
+        Employee.objects.filter(pk=employee.pk).update(change_seq=F('change_seq') + 100)  # Not yet committed
+        changes, cursor = self.sync('employee')
+        self.assertEqual(changes, [])
+        change_feed.allocate_many(100)
+        self.assertEqual([change['id'] for change in self.sync('employee', cursor)[0]], [employee.pk])
+
+    def test_pruned_or_regenerated_cursors_expire(self):
+        employee = EmployeeFactory()
+        _, cursor = self.sync('employee')
+        employee.delete()
+        self.assertEqual(change_feed.prune(timezone.now() - timedelta(days=1)), 0)
+        call_command('prune_tombstones', days=0, stdout=io.StringIO())
+        response = self.client.get(reverse('employee-changes'), {'since': cursor})
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+
+        call_command('generate_data', employees=3, workers=0, stdout=io.StringIO())
+        changes, cursor = self.sync('employee')
+        self.assertEqual(len(changes), 3)
+        self.assertEqual(self.sync('employee', cursor), ([], cursor))
+
+    def test_invalid_parameters(self):
+        for params in ({'since': 'nope'}, {'since': change_feed.encode_cursor('1', 2)}, {'limit': 0}):
+            response = self.client.get(reverse('employee-changes'), params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class ChangeFeedConcurrencyTests(TransactionTestCase):
+    def changed_ids(self, since):
+        response = self.client.get(reverse('employee-changes'), {'since': since})
+        return [change['id'] for change in response.data['results']]
+
+    def test_open_writes_hold_back_later_numbers(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('Writers of an in-memory SQLite database fail rather than wait for each other')
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser('admin', password='secret'))
+        first, second = EmployeeFactory(), EmployeeFactory()
+        cursor = self.client.get(reverse('employee-changes')).data['cursor']
+        allocate, numbers = change_feed.allocate, {}
+        numbered = {'first': threading.Event(), 'second': threading.Event()}
+        proceed = threading.Event()
+
+        def allocate_and_wait():
+            name = threading.current_thread().name
+            numbers[name] = allocate()
+            numbered[name].set()
+            if name == 'first':
+                proceed.wait(5)  # Holds the number, uncommitted
+            return numbers[name]
+
+        def write(employee):
+            try:
+                employee.save()
+            finally:
+                connection.close()
+
+        writers = [threading.Thread(target=write, args=(employee,), name=name)
+                   for name, employee in (('first', first), ('second', second))]
+        with mock.patch.object(change_feed, 'allocate', allocate_and_wait):
+            writers[0].start()
+            self.assertTrue(numbered['first'].wait(5))
+            writers[1].start()
+            # PostgreSQL numbers and commits the second write meanwhile;
+            # SQLite makes it wait for the first.
+            writers[1].join(0.3)
+            self.assertEqual(self.changed_ids(cursor), [])
+            proceed.set()
+            for writer in writers:
+                writer.join(10)
+        self.assertLess(numbers['first'], numbers['second'])
+        self.assertEqual(self.changed_ids(cursor), [first.pk, second.pk])
+
+    def test_numbers_are_only_allocated_in_a_transaction(self):
+        with self.assertRaises(transaction.TransactionManagementError):
+            change_feed.allocate()
+
+class GenerateDataTests(TestCase):
+    def generate(self, **options):
+        call_command('generate_data', employees=12, seed=3, workers=0, stdout=io.StringIO(), **options)
+        return list(Attendance.objects.order_by('employee_id', 'date').values_list(
+            'employee_id', 'date', 'clock_in', 'clock_out'))
+
+    def test_same_seed_same_data_whatever_the_chunking(self):
+        first = self.generate(chunk_size=5)
+        self.assertTrue(first)
+        self.assertEqual(self.generate(chunk_size=12), first)
+        self.assertEqual(Employee.objects.count(), 12)
+        self.assertEqual(PerformanceRecord.objects.count(), 36)
+        self.assertTrue(all(day.weekday() < 5 for _, day, _, _ in first))
+
+    def test_maintained_aggregates_match_rebuilds(self):
+        self.generate(reviews=2)
+        rollups = sorted(DepartmentHoursRollup.objects.values_list(
+            'department', 'granularity', 'period_start', 'seconds_worked', 'shifts', 'open_shifts'))
+        stats = sorted(DepartmentalPerformance.objects.values_list('department__name', 'total_employees', 'rating_sum'))
+        call_command('rebuild_attendance_rollups', stdout=io.StringIO())
+        call_command('rebuild_department_stats', stdout=io.StringIO())
+        self.assertEqual(sorted(DepartmentHoursRollup.objects.values_list(
+            'department', 'granularity', 'period_start', 'seconds_worked', 'shifts', 'open_shifts')), rollups)
+        self.assertEqual(sorted(DepartmentalPerformance.objects.values_list(
+            'department__name', 'total_employees', 'rating_sum')), stats)
+
+class GenerateDataFlushTests(TransactionTestCase):
+    def test_regenerating_removes_the_analytics_snapshots(self):
+        call_command('generate_data', employees=4, workers=0, stdout=io.StringIO())
+        call_command('compute_performance_analytics', stdout=io.StringIO())
+        self.assertEqual(EmployeePerformanceTrend.objects.count(), 4)
+        call_command('generate_data', employees=4, workers=0, stdout=io.StringIO())
+        self.assertEqual(EmployeePerformanceTrend.objects.count(), 0)
+        self.assertEqual(DepartmentRatingSnapshot.objects.count(), 0)
+        self.assertEqual(Employee.objects.count(), 4)
+
+class BenchmarkingTests(TestCase):
+    def test_measure_counts_queries(self):
+        EmployeeFactory()
+        measurement = benchmarking.measure(lambda: list(Employee.objects.all()), repeat=2)
+        self.assertEqual(measurement.queries, 1)
+        self.assertGreater(measurement.peak_kib, 0)
+
+    def test_compare_flags_regressions_beyond_threshold(self):
+        Measurement = benchmarking.Measurement
+        baseline = {'a': Measurement(1.0, 1000, 2), 'b': Measurement(0.001, 10, 1), 'gone': Measurement(1, 1, 1)}
+        results = {'a': Measurement(1.5, 1100, 3), 'b': Measurement(0.002, 20, 1), 'new': Measurement(1, 1, 1)}
+        regressions = benchmarking.compare(baseline, results, threshold=0.2)
+        self.assertEqual([(r.name, r.metric) for r in regressions], [('a', 'seconds'), ('a', 'queries')])
+
+    def test_baseline_round_trip(self):
+        results = {'a': benchmarking.Measurement(0.5, 12.5, 3)}
+        with tempfile.TemporaryDirectory() as root:
+            path = f'{root}/nested/baseline.json'
+            benchmarking.save_baseline(path, results)
+            self.assertEqual(benchmarking.load_baseline(path), results)
+
+class LoadTestingTests(TestCase):
+    def test_summarize_percentiles_and_errors(self):
+        samples = [(n / 100, 200, 2) for n in range(1, 98)] + [(0.98, 429, 1), (0.99, 500, None), (1.0, 0, None)]
+        summary = loadtesting.summarize(samples)
+        self.assertEqual((summary.requests, summary.errors, summary.throttled), (100, 2, 1))
+        self.assertEqual((summary.p50, summary.p95, summary.p99), (0.5, 0.95, 0.99))
+        self.assertAlmostEqual(summary.mean_queries, 195 / 98)
+
+    @override_settings(MIDDLEWARE=['utils.loadtesting.QueryCountMiddleware', *settings.MIDDLEWARE])
+    def test_middleware_counts_queries_per_request(self):
+        user = User.objects.create_user('tester', password='secret')
+        token = self.client.post(reverse('api-token-auth'), {'username': 'tester', 'password': 'secret'}).json()['token']
+        EmployeeFactory()
+        response = self.client.get(reverse('employee-export-csv'), HTTP_AUTHORIZATION=f'Token {token}',
+                                   **{'HTTP_X_LOADTEST_REQUEST': 'r1'})
+        b''.join(response.streaming_content)
+        # The token lookup, plus the export query run while streaming.
+        self.assertEqual(loadtesting.QUERY_COUNTS.pop('r1'), 2)
+        self.assertEqual(user.auth_token.key, token)
+
+class QueryBudgetTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('tester', password='secret'))
+        for employee in EmployeeFactory.create_batch(3):
+            PerformanceRecordFactory.create_batch(4, employee=employee)
+            AttendanceFactory.create_batch(4, employee=employee)
+
+    def test_list_queries_do_not_grow_with_page_size(self):
+        for name in ('employee-list', 'performancerecord-list', 'attendance-list'):
+            counts = []
+            for page_size in (1, 12):
+                with query_budget.count_queries() as stats:
+                    response = self.client.get(reverse(name), {'page_size': page_size})
+                self.assertEqual(len(response.data['results']), min(page_size, response.data['count']))
+                counts.append(stats.count)
+            self.assertEqual(counts[0], counts[1], name)
+            self.assertLessEqual(counts[1], views.READ_QUERY_BUDGETS['list'], name)
+
+    @override_settings(QUERY_BUDGET={'HEADERS': True})
+    def test_headers_report_queries(self):
+        response = self.client.get(reverse('attendance-list'))
+        # The page count and the page, with employee names joined in.
+        self.assertEqual(response[query_budget.QUERY_COUNT_HEADER], '2')
+        self.assertGreaterEqual(float(response[query_budget.QUERY_TIME_HEADER]), 0)
+
+    @override_settings(QUERY_BUDGET={'HEADERS': False})
+    def test_headers_can_be_disabled(self):
+        response = self.client.get(reverse('attendance-list'))
+        self.assertNotIn(query_budget.QUERY_COUNT_HEADER, response)
+
+    @override_settings(QUERY_BUDGET={'RAISE': True})
+    def test_exceeding_budget_raises(self):
+        with mock.patch.object(views.AttendanceViewSet, 'query_budgets', {'list': 1}):
+            with self.assertRaises(query_budget.QueryBudgetExceeded):
+                self.client.get(reverse('attendance-list'))
+
+    def test_exceeding_budget_logs(self):
+        with mock.patch.object(views.AttendanceViewSet, 'query_budgets', {'list': 1}):
+            with self.assertLogs('utils.query_budget', 'WARNING') as logs:
+                self.client.get(reverse('attendance-list'))
+        self.assertIn('over its budget of 1', logs.output[0])
+
+class EmployeeSearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('tester', password='secret'))
+        self.smith = EmployeeFactory(first_name='Anna', last_name='Smith', email='anna.smith@example.com', job_title='Engineer')
+        self.smithson = EmployeeFactory(first_name='Bob', last_name='Smithson', email='bob@example.com', job_title='Analyst')
+        self.other = EmployeeFactory(first_name='Carl', last_name='Jones', email='carl@example.com', job_title='Smith')
+
+    def search(self, query, **params):
+        response = self.client.get(reverse('employee-list'), {'search': query, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [row['id'] for row in response.data['results']]
+
+    def test_prefix_matches_ranked_by_relevance(self):
+        # Names weigh more than job titles.
+        self.assertEqual(self.search('smi'), [self.smith.pk, self.smithson.pk, self.other.pk])
+        self.assertEqual(self.search('anna smi'), [self.smith.pk])
+        self.assertEqual(self.search('nobody'), [])
+
+    def test_explicit_ordering_overrides_rank(self):
+        self.assertEqual(self.search('smi', ordering='-first_name'), [self.other.pk, self.smithson.pk, self.smith.pk])
+
+    def test_index_follows_writes(self):
+        self.smithson.last_name = 'Brown'
+        self.smithson.save()
+        self.other.delete()
+        EmployeeFactory(first_name='Smitty', last_name='Lee', email='lee@example.com')
+        self.assertEqual(len(self.search('smi')), 2)
+        self.assertEqual(self.search('brown'), [self.smithson.pk])
+
+class IndexAdvisorTests(TestCase):
+    def test_plan_problems_postgresql(self):
+        plan = (
+            "Limit  (cost=1.2..1.3 rows=10 width=64)\n"
+            "  ->  Sort  (cost=1.2..1.3 rows=40 width=64)\n"
+            "        Sort Key: rating, id\n"
+            "        ->  Seq Scan on employee_management_performancerecord  (cost=0.00..1.1 rows=40 width=64)"
+        )
+        self.assertEqual(index_advisor.plan_problems('postgresql', plan),
+                         ['sort', 'sequential scan on employee_management_performancerecord'])
+        self.assertEqual(index_advisor.plan_problems('postgresql', plan, allow_sort=True, allow_scan=True), [])
+        indexed = "Limit\n  ->  Index Scan using employee_last_name_idx on employee_management_employee"
+        self.assertEqual(index_advisor.plan_problems('postgresql', indexed), [])
+
+    def test_plan_problems_sqlite(self):
+        plan = "4 0 0 SCAN employee_management_employee\n29 0 0 USE TEMP B-TREE FOR ORDER BY"
+        self.assertEqual(index_advisor.plan_problems('sqlite', plan),
+                         ['sequential scan on employee_management_employee', 'sort'])
+        indexed = "5 0 0 SCAN employee_management_employee USING INDEX employee_salary_idx"
+        self.assertEqual(index_advisor.plan_problems('sqlite', indexed), [])
+
+    def test_command_reports_each_viewset(self):
+        for employee in EmployeeFactory.create_batch(5):
+            PerformanceRecordFactory(employee=employee)
+        stdout = io.StringIO()
+        call_command('index_advisor', min_rows=1, only='e', stdout=stdout)
+        output = stdout.getvalue()
+        self.assertIn('ordering=last_name', output)
+        self.assertIn('search=', output)
+        self.assertIn('employee=', output)
+        self.assertIn('queries fall back to a sequential scan or sort.', output)
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('tester', password='secret'))
+        self.employee = EmployeeFactory(department='Sales')
+
+    def test_conditional_get_skips_the_database(self):
+        url = reverse('employee-detail', kwargs={'pk': self.employee.pk})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['ETag'].startswith('"'))
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_writes_change_the_etag_of_dependent_responses(self):
+        urls = [reverse('employee-list'), reverse('attendance-list'), reverse('departmentalperformance-list')]
+        etags = [self.client.get(url)['ETag'] for url in urls]
+        self.employee.department = DepartmentFactory(name='Support')
+        self.employee.save()
+        for url, etag in zip(urls, etags):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_200_OK, url)
+        # Attendance writes leave employee responses alone.
+        etag = self.client.get(urls[0])['ETag']
+        AttendanceFactory(employee=self.employee)
+        self.assertEqual(self.client.get(urls[0], HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_two_writes_in_one_second_are_not_masked_by_the_date(self):
+        url = reverse('employee-list')
+        clock = mock.Mock(wraps=response_cache.time)
+        with mock.patch.object(response_cache, 'time', clock):
+            clock.time.return_value = 1000.3
+            EmployeeFactory()
+            clock.time.return_value = 1000.4
+            self.assertNotIn('Last-Modified', self.client.get(url))
+            clock.time.return_value = 1000.8
+            EmployeeFactory()
+            clock.time.return_value = 1000.9
+            response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=http_date(1000))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.json()['count'], 3)
+            clock.time.return_value = 1001.2
+            response = self.client.get(url)
+            self.assertEqual(response['Last-Modified'], http_date(1000.8))
+            response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_query_params_are_part_of_the_key(self):
+        url = reverse('employee-list')
+        etag = self.client.get(url)['ETag']
+        self.assertNotEqual(self.client.get(url, {'department': 'Sales'})['ETag'], etag)
+
+    def test_bulk_writes_bump_once(self):
+        url = reverse('employee-list')
+        etag = self.client.get(url)['ETag']
+        with mock.patch.object(response_cache, '_increment', wraps=response_cache._increment) as increment:
+            with response_cache.deferred():
+                for _ in range(3):
+                    EmployeeFactory()
+        self.assertEqual(increment.call_count, 1)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+    def test_writes_in_another_process_change_the_etag(self):
+        url = reverse('employee-list')
+        etag = self.client.get(url)['ETag']
+        bump = (
+            'from utils.sqlite_cache import SQLiteCache;'
+            f'SQLiteCache({caches["shared"].path!r}, {{}}).incr({response_cache._version_key("employee_management.employee")!r})'
+        )
+        subprocess.run([sys.executable, '-c', bump], cwd=settings.BASE_DIR, check=True)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+    def test_versions_must_be_kept_in_a_shared_cache(self):
+        self.assertEqual(checks.check_response_cache(None), [])
+        with override_settings(RESPONSE_CACHE={'CACHE': 'default'}):
+            self.assertEqual([error.id for error in checks.check_response_cache(None)], ['employee_management.E001'])
+        with override_settings(RESPONSE_CACHE={'ENABLED': False, 'CACHE': 'default'}):
+            self.assertEqual(checks.check_response_cache(None), [])
+
+class ResponseCacheStorageTests(TransactionTestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('tester', password='secret'))
+        response_cache.get_responses().clear()
+        EmployeeFactory()
+
+    def test_responses_are_served_from_the_cache_until_a_write(self):
+        url = reverse('employee-list')
+        self.assertEqual(self.client.get(url)[response_cache.CACHE_STATUS_HEADER], 'miss')
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response[response_cache.CACHE_STATUS_HEADER], 'hit')
+        self.assertEqual(response.json()['count'], 1)
+        EmployeeFactory()
+        response = self.client.get(url)
+        self.assertEqual(response[response_cache.CACHE_STATUS_HEADER], 'miss')
+        self.assertEqual(response.json()['count'], 2)
+
+    def test_browsable_api_is_not_cached(self):
+        response = self.client.get(reverse('employee-list'), HTTP_ACCEPT='text/html')
+        self.assertNotIn(response_cache.CACHE_STATUS_HEADER, response)
+
+class LRUCacheTests(TestCase):
+    def test_evicts_least_recently_used_beyond_max_size(self):
+        cache = LRUCache(max_size=10)
+        cache.set('a', 1, 4)
+        cache.set('b', 2, 4)
+        cache.get('a')
+        cache.set('c', 3, 4)
+        self.assertEqual((cache.get('a'), cache.get('b'), cache.get('c')), (1, None, 3))
+        self.assertEqual((cache.size, cache.evictions), (8, 1))
+        cache.set('huge', 4, 11)
+        self.assertIsNone(cache.get('huge'))
+
+class AuthCacheTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('tester', password='secret')
+        self.group = Group.objects.create(name='editors')
+        self.group.permissions.add(Permission.objects.get(codename='add_performancerecord'))
+        self.user.groups.add(self.group)
+        self.token = self.client.post(reverse('api-token-auth'), {'username': 'tester', 'password': 'secret'}).json()['token']
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+        self.employee = EmployeeFactory()
+
+    def create_record(self):
+        return self.client.post(reverse('performancerecord-list'), {
+            'employee': self.employee.pk, 'review_date': '2024-01-01', 'rating': 4,
+            'comments': 'Good', 'reviewer_name': 'Lead',
+        })
+
+    def test_token_and_permission_lookups_are_cached(self):
+        with query_budget.count_queries() as first:
+            self.assertEqual(self.create_record().status_code, status.HTTP_201_CREATED)
+        with query_budget.count_queries() as second:
+            self.assertEqual(self.create_record().status_code, status.HTTP_201_CREATED)
+        # The token+user query and the user and group permission queries.
+        self.assertEqual(first.count - second.count, 3)
+
+    def test_deleted_token_is_rejected_immediately(self):
+        self.assertEqual(self.client.get(reverse('employee-list')).status_code, status.HTTP_200_OK)
+        self.user.auth_token.delete()
+        self.assertEqual(self.client.get(reverse('employee-list')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_permission_changes_apply_immediately(self):
+        self.assertEqual(self.create_record().status_code, status.HTTP_201_CREATED)
+        self.group.permissions.clear()
+        self.assertEqual(self.create_record().status_code, status.HTTP_403_FORBIDDEN)
+        self.user.user_permissions.add(Permission.objects.get(codename='add_performancerecord'))
+        self.assertEqual(self.create_record().status_code, status.HTTP_201_CREATED)
+        self.user.groups.clear()
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.create_record().status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_invalidation_by_another_process(self):
+        self.client.get(reverse('employee-list'))
+        self.assertEqual(len(authentication.auth_cache.tokens), 1)
+        invalidate = (
+            'from utils.sqlite_cache import SQLiteCache;'
+            f'SQLiteCache({caches["shared"].path!r}, {{}}).incr({authentication.GENERATION_KEY!r})'
+        )
+        subprocess.run([sys.executable, '-c', invalidate], cwd=settings.BASE_DIR, check=True)
+        self.assertTrue(authentication.auth_cache.sync())
+        self.assertEqual(len(authentication.auth_cache.tokens), 0)
+
+    def test_generation_must_be_kept_in_a_shared_cache(self):
+        self.assertEqual(checks.check_auth_cache(None), [])
+        with override_settings(AUTH_CACHE={'CACHE': 'default'}):
+            self.assertEqual([error.id for error in checks.check_auth_cache(None)], ['employee_management.E002'])
+        with override_settings(AUTH_CACHE={'ENABLED': False, 'CACHE': 'default'}):
+            self.assertEqual(checks.check_auth_cache(None), [])
+
+    def test_last_login_updates_keep_the_cache(self):
+        self.client.get(reverse('employee-list'))
+        self.user.save(update_fields=['last_login'])
+        with self.assertNumQueries(2):  # The page count and the page
+            self.client.get(reverse('employee-list'), {'page_size': 5})
+
+def count_allowed_hits(path, hits):
+    store = throttling.SQLiteWindowStore(path)
+    return sum(store.hit('user-1', 100, 3600, 1800.0)[0] for _ in range(hits))
+
+class ThrottleTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = f'{self.tmp.name}/throttle.sqlite3'
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser('admin', password='secret'))
+
+    def test_sliding_window_weighs_the_previous_window(self):
+        self.assertEqual(throttling.sliding_window(10, 4, 10, 0.5), (True, None))
+        allowed, wait = throttling.sliding_window(10, 5, 10, 0.5)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(wait, 0.1)  # Until 4 of the previous 10 remain
+        allowed, wait = throttling.sliding_window(0, 10, 10, 0.25)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(wait, 0.85)  # Until 1 of this window's 10 remain
+
+    def test_stores_agree(self):
+        stores = [throttling.SQLiteWindowStore(self.path), throttling.CacheWindowStore('default')]
+        key = f'test-{uuid.uuid4()}'
+        results = [[store.hit(key, 5, 60, now)[0] for now in (1, 2, 3, 4, 5, 6, 61, 62, 90, 91, 92, 121)] for store in stores]
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[0], [True] * 5 + [False, False, False, True, True, False, True])
+
+    def test_requests_count_in_the_sqlite_store(self):
+        with override_settings(THROTTLE_STORE={'BACKEND': 'sqlite', 'PATH': self.path}):
+            self.assertIsInstance(throttling.get_throttle_store(), throttling.SQLiteWindowStore)
+            self.assertEqual(self.client.get(reverse('employee-list')).status_code, status.HTTP_200_OK)
+        with sqlite3.connect(self.path) as store:
+            self.assertEqual(store.execute('PRAGMA journal_mode').fetchone(), ('wal',))
+            self.assertEqual(store.execute('SELECT SUM(count) FROM throttle_window').fetchone(), (1,))
+
+    def test_sqlite_store_is_exact_across_processes(self):
+        with multiprocessing.get_context('fork').Pool(4) as pool:
+            allowed = pool.starmap(count_allowed_hits, [(self.path, 40)] * 4)
+        self.assertEqual(sum(allowed), 100)
+
+    def test_bulk_and_export_actions_have_their_own_scopes(self):
+        rates = {'user': '100/day', 'anon': '10/day', 'bulk': '1/hour', 'export': '1/hour'}
+        with mock.patch.object(SimpleRateThrottle, 'THROTTLE_RATES', rates), \
+                override_settings(THROTTLE_STORE={'BACKEND': 'sqlite', 'PATH': self.path}):
+            for url, method in ((reverse('employee-bulk'), 'delete'), (reverse('employee-export-csv'), 'get')):
+                self.assertEqual(getattr(self.client, method)(url, [], format='json').status_code, status.HTTP_200_OK)
+                response = getattr(self.client, method)(url, [], format='json')
+                self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+                self.assertGreater(int(response['Retry-After']), 3000)
+            self.assertEqual(self.client.get(reverse('employee-list')).status_code, status.HTTP_200_OK)
+
+class AsyncReadTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser('admin', password='secret')
+        self.token = Token.objects.create(user=self.user)
+        self.employees = EmployeeFactory.create_batch(12, department='Sales')
+        self.factory = APIRequestFactory()
+
+    def get_views(self, name):
+        sync_view = next(pattern.callback for pattern in router.urls if pattern.name == name)
+        return sync_view, sync_view.cls.as_async_read_view(sync_view)
+
+    def request(self, method, path, data=None, **extra):
+        return getattr(self.factory, method)(path, data, HTTP_AUTHORIZATION=f'Token {self.token.key}', **extra)
+
+    def test_async_reads_match_sync_reads(self):
+        sync_list, async_list = self.get_views('employee-list')
+        sync_detail, async_detail = self.get_views('employee-detail')
+        for view_pair, path, params, kwargs in (
+            ((sync_list, async_list), '/api/employees/', {'department': 'Sales', 'page': 2}, {}),
+            ((sync_list, async_list), '/api/employees/', {'pagination': 'cursor', 'ordering': 'last_name', 'count': 'exact'}, {}),
+            ((sync_detail, async_detail), f'/api/employees/{self.employees[0].pk}/', {}, {'pk': str(self.employees[0].pk)}),
+            ((sync_detail, async_detail), '/api/employees/0/', {}, {'pk': '0'}),
+        ):
+            expected = view_pair[0](self.request('get', path, params), **kwargs).render()
+            response = async_to_sync(view_pair[1])(self.request('get', path, params), **kwargs).render()
+            self.assertEqual(response.status_code, expected.status_code)
+            self.assertEqual(json.loads(response.content), json.loads(expected.content))
+
+    def test_writes_and_other_formats_use_the_sync_view(self):
+        _, async_list = self.get_views('employee-list')
+        response = async_to_sync(async_list)(self.request('post', '/api/employees/', {
+            'first_name': 'Ada', 'last_name': 'Lovelace', 'email': 'ada@example.com', 'job_title': 'Engineer',
+            'department': 'Engineering', 'hire_date': '2024-01-01', 'salary': '1000.00',
+        }, format='json'))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = async_to_sync(async_list)(self.request('get', '/api/employees/', {'format': 'api'}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.accepted_renderer.format, 'api')
+
+    def test_async_reads_authenticate_and_throttle(self):
+        _, async_list = self.get_views('employee-list')
+        response = async_to_sync(async_list)(self.factory.get('/api/employees/', HTTP_AUTHORIZATION='Token invalid'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        rates = {**SimpleRateThrottle.THROTTLE_RATES, 'user': '2/min'}
+        with mock.patch.object(SimpleRateThrottle, 'THROTTLE_RATES', rates), \
+                override_settings(THROTTLE_STORE={'BACKEND': 'cache', 'CACHE': 'default'}):
+            cache.clear()
+            statuses = [async_to_sync(async_list)(self.request('get', '/api/employees/')).status_code for _ in range(3)]
+        self.assertEqual(statuses, [status.HTTP_200_OK, status.HTTP_200_OK, status.HTTP_429_TOO_MANY_REQUESTS])
+
+    def test_async_read_urls_swap_list_and_detail_views(self):
+        urls = [copy.copy(pattern) for pattern in router.urls]
+        with override_settings(ASYNC_READS=True):
+            urls = async_read_urls(urls)
+        swapped = {pattern.name for pattern in urls if asyncio.iscoroutinefunction(pattern.callback)}
+        self.assertIn('employee-list', swapped)
+        self.assertIn('departmentalperformance-detail', swapped)
+        self.assertNotIn('employee-export-csv', swapped)
+        self.assertNotIn('exportjob-list', swapped)
+
+    @override_settings(QUERY_BUDGET={'HEADERS': True})
+    async def test_asgi_requests_count_queries(self):
+        response = await self.async_client.get(
+            reverse('employee-list'), headers={'Authorization': f'Token {self.token.key}'},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertGreater(int(response[query_budget.QUERY_COUNT_HEADER]), 0)
+
+
+@override_settings(RESPONSE_CACHE={'ENABLED': False})
+class FastListConformanceTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser('admin', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        employees = EmployeeFactory.create_batch(15, department='Sales')
+        employees[0].salary = '1234.5'
+        employees[0].first_name = 'Zoë "Quoted" \\ Name'
+        employees[0].save()
+        for index, employee in enumerate(employees[:6]):
+            PerformanceRecordFactory(employee=employee)
+            AttendanceFactory(
+                employee=employee, date=date(2024, 1, index + 1), clock_in=time(9, 0, 0, 250),
+                clock_out=None if index % 2 else time(17, 30), notes=None if index % 3 else 'Late',
+            )
+        DepartmentalPerformance.objects.filter(department__name='Sales').update(average_rating=10 / 3)
+        DepartmentalPerformance.objects.create(department=DepartmentFactory(name='Empty'))
+
+    def assertSameBytes(self, viewset, path, params):
+        response = self.client.get(path, params)
+        with mock.patch.object(viewset, 'fast_list', False):
+            expected = self.client.get(path, params)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response.content, expected.content)
+        return response
+
+    def test_fast_list_matches_serializers(self):
+        for viewset, path, params in (
+            (views.EmployeeViewSet, '/api/employees/', {}),
+            (views.EmployeeViewSet, '/api/employees/', {'page': 2, 'ordering': '-salary'}),
+            (views.EmployeeViewSet, '/api/employees/', {'search': 'Quoted'}),
+            (views.EmployeeViewSet, '/api/employees/', {'pagination': 'cursor', 'ordering': 'hire_date', 'page_size': 4}),
+            (views.PerformanceRecordViewSet, '/api/performance-records/', {'ordering': 'rating'}),
+            (views.PerformanceRecordViewSet, '/api/performance-records/', {'pagination': 'cursor', 'page_size': 2}),
+            (views.AttendanceViewSet, '/api/attendance/', {'ordering': '-clock_in'}),
+            (views.AttendanceViewSet, '/api/attendance/', {'pagination': 'cursor', 'ordering': 'date', 'page_size': 2}),
+            (views.DepartmentalPerformanceViewSet, '/api/department-performance/', {}),
+        ):
+            with self.subTest(path=path, params=params):
+                response = self.assertSameBytes(viewset, path, params)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertTrue(response.json()['results'])
+
+    def test_cursor_pages_follow_on(self):
+        params = {'pagination': 'cursor', 'ordering': 'hire_date', 'page_size': 4}
+        response = self.assertSameBytes(views.EmployeeViewSet, '/api/employees/', params)
+        cursor = parse_qs(urlsplit(response.json()['next']).query)['cursor'][0]
+        response = self.assertSameBytes(views.EmployeeViewSet, '/api/employees/', {**params, 'cursor': cursor})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_async_fast_list_matches_serializers(self):
+        sync_view = next(pattern.callback for pattern in router.urls if pattern.name == 'attendance-list')
+        async_view = sync_view.cls.as_async_read_view(sync_view)
+        factory = APIRequestFactory()
+        token = Token.objects.create(user=self.user)
+        params = {'ordering': 'clock_in'}
+        response = async_to_sync(async_view)(
+            factory.get('/api/attendance/', params, HTTP_AUTHORIZATION=f'Token {token.key}'),
+        ).render()
+        with mock.patch.object(views.AttendanceViewSet, 'fast_list', False):
+            expected = sync_view(factory.get('/api/attendance/', params, HTTP_AUTHORIZATION=f'Token {token.key}')).render()
+        self.assertEqual(response.content, expected.content)
+
+    def test_fields_without_a_column_are_rejected(self):
+        class NameSerializer(EmployeeSerializer):
+            name = serializers.CharField(source='__str__', read_only=True)
+
+            class Meta(EmployeeSerializer.Meta):
+                fields = ['id', 'name']
+
+        with self.assertRaises(ImproperlyConfigured):
+            RowSerializer(NameSerializer)
+
+
+class ListHandler(logging.Handler):
+    """
+    Keeps the records it handles, formatted, optionally waiting for ``gate``
+    before each one.
+    """
+
+    def __init__(self, gate=None):
+        super().__init__()
+        self.records, self.messages = [], []
+        self.entered, self.gate = threading.Event(), gate
+
+    def emit(self, record):
+        self.entered.set()
+        if self.gate:
+            self.gate.wait(5)
+        self.records.append(record)
+        self.messages.append(self.format(record))
+
+
+class LoggingPipelineTests(TestCase):
+    def make_record(self, name='employee_management', level=logging.INFO, msg='Created employee %s', args=(1,), **extra):
+        record = logging.makeLogRecord({'name': name, 'levelno': level, 'levelname': logging.getLevelName(level),
+                                        'msg': msg, 'args': args})
+        record.__dict__.update(extra)
+        return record
+
+    def make_handler(self, target, **kwargs):
+        handler = BackgroundQueueHandler([target], **kwargs)
+        self.addCleanup(handler.close)
+        return handler
+
+    def test_json_formatter_includes_extras(self):
+        entry = json.loads(JSONFormatter().format(self.make_record(employee_id=1, department_id=2)))
+        self.assertEqual(entry['message'], 'Created employee 1')
+        self.assertEqual(entry['level'], 'INFO')
+        self.assertEqual(entry['logger'], 'employee_management')
+        self.assertEqual((entry['employee_id'], entry['department_id']), (1, 2))
+        self.assertNotIn('args', entry)
+
+    def test_json_formatter_includes_exceptions(self):
+        try:
+            raise ValueError('boom')
+        except ValueError:
+            record = self.make_record(level=logging.ERROR, exc_info=sys.exc_info())
+        entry = json.loads(JSONFormatter().format(record))
+        self.assertIn('ValueError: boom', entry['exc_info'])
+
+    def test_sampling_keeps_a_fraction_per_logger(self):
+        sampling = SamplingFilter({'django.request': 0.1})
+        kept = [sampling.filter(self.make_record('django.request', logging.WARNING)) for _ in range(100)]
+        self.assertEqual(sum(kept), 10)
+        self.assertTrue(kept[0])
+        self.assertEqual(sampling.sampled_out, 90)
+        self.assertTrue(sampling.filter(self.make_record('django.request', logging.ERROR)))
+        self.assertTrue(sampling.filter(self.make_record('django.server', logging.WARNING)))
+
+    def test_records_are_formatted_by_the_listener(self):
+        target = ListHandler()
+        target.setFormatter(JSONFormatter())
+        handler = self.make_handler(target)
+        arguments = [1]
+        handler.handle(self.make_record(args=(arguments,)))
+        handler.flush()
+        self.assertEqual(json.loads(target.messages[0])['message'], 'Created employee [1]')
+        self.assertEqual(target.records[0].args, (arguments,))  # Not formatted before queueing
+
+    def test_full_queue_drops_and_counts(self):
+        gate = threading.Event()
+        target = ListHandler(gate)
+        handler = self.make_handler(target, max_size=2)
+        handler.handle(self.make_record(args=(0,)))
+        self.assertTrue(target.entered.wait(5))  # The listener is busy with the first record
+        for number in range(1, 6):
+            handler.handle(self.make_record(args=(number,)))
+        self.assertEqual(handler.dropped, 3)
+        gate.set()
+        handler.flush()
+        self.assertEqual([record.getMessage() for record in target.records], [
+            'Created employee 0', 'Dropped 3 log records: the logging queue was full',
+            'Created employee 1', 'Created employee 2',
+        ])
+
+    def test_settings_route_loggers_through_the_queue(self):
+        handlers = logging.getLogger('employee_management').handlers
+        self.assertEqual([type(handler) for handler in handlers], [BackgroundQueueHandler])
+
+
+class ConnectionPoolTests(TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.healthy = True
+
+    def make_pool(self, **options):
+        def check(connection):
+            connection.execute('SELECT 1')
+            return self.healthy
+        return db_pool.ConnectionPool(lambda: sqlite3.connect(':memory:', check_same_thread=False), check,
+                                      clock=lambda: self.now, **options)
+
+    def test_connections_are_reused(self):
+        pool = self.make_pool()
+        first = pool.get()
+        pool.put(first)
+        self.now += 5
+        self.assertIs(pool.get(), first)  # After a health check
+        stats = pool.stats()
+        self.assertEqual((stats['created'], stats['checkouts'], stats['in_use'], stats['idle']), (1, 2, 1, 0))
+
+    def test_failed_health_check_replaces_the_connection(self):
+        pool = self.make_pool(check_after=1)
+        first = pool.get()
+        pool.put(first)
+        self.healthy = False
+        self.assertIs(pool.get(), first)  # Not idle long enough to be checked
+        pool.put(first)
+        self.now += 1
+        second = pool.get()
+        self.assertIsNot(second, first)
+        self.assertEqual((pool.stats()['failed_checks'], pool.stats()['closed'], pool.stats()['size']), (1, 1, 1))
+
+    def test_old_and_unusable_connections_are_closed(self):
+        pool = self.make_pool(max_lifetime=60, max_idle=30)
+        first = pool.get()
+        self.now += 60
+        pool.put(first)
+        second = pool.get()
+        pool.put(second)
+        self.now += 30
+        third = pool.get()
+        pool.put(third, reusable=False)
+        self.assertEqual(len({id(first), id(second), id(third)}), 3)
+        self.assertEqual((pool.stats()['created'], pool.stats()['closed'], pool.stats()['size']), (3, 3, 0))
+
+    def test_full_pool_times_out(self):
+        pool = db_pool.ConnectionPool(lambda: sqlite3.connect(':memory:'), lambda connection: True,
+                                      max_size=1, timeout=0.01)
+        pool.get()
+        with self.assertRaises(db_pool.PoolTimeout):
+            pool.get()
+        self.assertEqual(pool.stats()['timeouts'], 1)
+
+    def test_waits_for_a_returned_connection(self):
+        pool = db_pool.ConnectionPool(lambda: sqlite3.connect(':memory:', check_same_thread=False),
+                                      lambda connection: True, max_size=1, timeout=5)
+        first = pool.get()
+        timer = threading.Timer(0.05, pool.put, [first])
+        timer.start()
+        self.assertIs(pool.get(), first)
+        timer.join()
+        stats = pool.stats()
+        self.assertEqual((stats['waits'], stats['created']), (1, 1))
+        self.assertGreater(stats['max_wait_seconds'], 0)
+
+    def test_health_reports_pools(self):
+        pool = self.make_pool()
+        with mock.patch.dict(db_pool._pools, clear=True):
+            db_pool.get_pool('default', 'employee_db', '', lambda: pool)
+            pool.put(pool.get())
+            response = views.EmployeeViewSet.as_view({'get': 'health'}, permission_classes=[], throttle_classes=[])(
+                APIRequestFactory().get('/api/employees/health/'))
+        self.assertEqual(response.data['database_pools']['default']['idle'], 1)
+
+
+@override_settings(REPLICA_ROUTING={'REPLICAS': ['replica'], 'STICKY_SECONDS': 10}, RESPONSE_CACHE={'ENABLED': False})
+class ReplicaRoutingTests(TransactionTestCase):
+    @classmethod
+    def setUpClass(cls):
+        # A second connection to the test database stands in for the replica.
+        if 'replica' not in connections:
+            connections.settings['replica'] = {**connections['default'].settings_dict}
+            cls.addClassCleanup(cls.remove_replica)
+        cls.databases = {'default', 'replica'}
+        super().setUpClass()
+
+    @staticmethod
+    def remove_replica():
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+
+    def setUp(self):
+        caches['shared'].clear()
+        db_router._lags.clear()
+        self.client = APIClient()
+        token = Token.objects.create(user=User.objects.create_superuser('admin', password='secret'))
+        self.authorization = f'Token {token.key}'
+        self.client.credentials(HTTP_AUTHORIZATION=self.authorization)
+        EmployeeFactory()
+
+    def employee_queries(self, alias, method, *args, **kwargs):
+        with CaptureQueriesContext(connections[alias]) as queries:
+            response = method(*args, **kwargs)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertLess(response.status_code, 300)
+        return [query['sql'] for query in queries if 'employee_management_employee' in query['sql']]
+
+    def test_reads_go_to_the_replica(self):
+        self.assertTrue(self.employee_queries('replica', self.client.get, reverse('employee-list')))
+        self.assertFalse(self.employee_queries('default', self.client.get, reverse('employee-list')))
+
+    def test_writers_read_from_the_primary_for_a_while(self):
+        self.client.patch(reverse('employee-detail', args=[Employee.objects.get().pk]), {'job_title': 'Clerk'})
+        self.assertFalse(self.employee_queries('replica', self.client.get, reverse('employee-list')))
+        other = APIClient()
+        other.force_authenticate(User.objects.get())
+        self.assertTrue(self.employee_queries('replica', other.get, reverse('employee-list')))
+        caches['shared'].delete(db_router.get_pin_key(APIRequestFactory().get('/', HTTP_AUTHORIZATION=self.authorization)))
+        self.assertTrue(self.employee_queries('replica', self.client.get, reverse('employee-list')))
+
+    def test_pins_must_be_kept_in_a_shared_cache(self):
+        self.assertEqual(checks.check_replica_routing(None), [])
+        with override_settings(REPLICA_ROUTING={'REPLICAS': ['replica'], 'CACHE': 'default'}):
+            self.assertEqual([error.id for error in checks.check_replica_routing(None)], ['employee_management.E003'])
+        with override_settings(REPLICA_ROUTING={'CACHE': 'default'}):
+            self.assertEqual(checks.check_replica_routing(None), [])
+
+    def test_unreachable_or_lagging_replicas_are_skipped(self):
+        for lag in (None, 60):
+            db_router._lags.clear()
+            with mock.patch.object(db_router, 'measure_lag', return_value=lag):
+                self.assertFalse(self.employee_queries('replica', self.client.get, reverse('employee-list')))
+        db_router._lags.clear()
+        with mock.patch.object(db_router, 'measure_lag', return_value=1.5) as measure_lag:
+            self.assertTrue(self.employee_queries('replica', self.client.get, reverse('employee-list')))
+            self.client.get(reverse('employee-list'))
+        self.assertEqual(measure_lag.call_count, 1)  # Until CHECK_INTERVAL passes
+
+    @override_settings(REPLICA_ROUTING={'ANALYTICS_REPLICA': 'replica'})
+    def test_exports_read_from_the_analytics_replica(self):
+        self.assertTrue(self.employee_queries('replica', self.client.get, '/api/employees/export_csv/'))
+        self.assertFalse(self.employee_queries('replica', self.client.get, reverse('employee-list')))
+
+    @override_settings(RESPONSE_CACHE={'ENABLED': True})
+    def test_responses_that_may_be_stale_get_no_validators(self):
+        response_cache.get_responses().clear()
+        EmployeeFactory()  # A write just now, which the replica may lack
+        response = self.client.get(reverse('employee-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('ETag', response)
+        self.assertNotIn('Last-Modified', response)
+        with override_settings(REPLICA_ROUTING={'REPLICAS': ['replica'], 'MAX_LAG_SECONDS': -1}):
+            self.assertIn('ETag', self.client.get(reverse('employee-list')))
+
+    def test_reads_outside_requests_and_in_transactions_use_the_primary(self):
+        router = db_router.ReplicaRouter()
+        self.assertEqual(router.db_for_read(Employee), 'default')
+        token = db_router._state.set(db_router.RoutingState('replica'))
+        self.addCleanup(db_router._state.reset, token)
+        self.assertEqual(router.db_for_read(Employee), 'replica')
+        self.assertEqual(router.db_for_read(User), 'default')
+        with transaction.atomic():
+            self.assertEqual(router.db_for_read(Employee), 'default')
+        self.assertEqual(router.db_for_write(Employee), 'default')
+        self.assertTrue(db_router._state.get().wrote)
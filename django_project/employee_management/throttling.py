@@ -0,0 +1,270 @@
+"""
+Rate throttles that count in a store shared by every worker process.
+
+DRF's ``SimpleRateThrottle`` keeps a list of request times per client in the
+default cache and rewrites the whole list on every request; with the
+default per-process LocMem cache each gunicorn worker also enforces the
+limit on its own, so a client gets the rate once per worker.
+
+These throttles keep two counters per client instead: requests in the
+current fixed window (as long as the rate's period) and in the previous
+one.  The number of requests in the last period is estimated as the
+previous count weighted by how much of the previous window still overlaps
+it, plus the current count, so a request costs one lookup and one increment
+whatever the rate.  Denied requests are not counted.
+
+``THROTTLE_STORE['BACKEND']`` picks where the counters live:
+
+``sqlite`` (the default)
+    A SQLite file in WAL mode (``THROTTLE_STORE['PATH']``), shared by the
+    processes of one host.  Each check is a single ``BEGIN IMMEDIATE``
+    transaction, so limits are exact across processes.
+``cache``
+    The Django cache ``THROTTLE_STORE['CACHE']``, which must be a cache
+    server (Redis, Memcached) to be shared.  Counters are changed with
+    atomic ``incr``/``decr``; concurrent requests at the limit may both be
+    denied, but the limit is never exceeded.
+
+A view action can be counted under its own rate by setting
+``throttle_scope`` in its ``@action`` decorator (``bulk``, ``export``); the
+rate comes from ``DEFAULT_THROTTLE_RATES`` like any other scope.
+"""
+import os
+import sqlite3
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import AnonRateThrottle, SimpleRateThrottle, UserRateThrottle
+
+THROTTLE_STORE_DEFAULTS = {
+    'BACKEND': 'sqlite',
+    'PATH': None,
+    'CACHE': 'default',
+}
+
+CLEANUP_EVERY = 1000  # Checks per connection between deletions of expired windows
+
+
+def get_throttle_store_settings():
+    return {**THROTTLE_STORE_DEFAULTS, **getattr(settings, 'THROTTLE_STORE', {})}
+
+
+def sliding_window(previous, current, limit, elapsed):
+    """
+    Decides one request given the counts of the previous and current window
+    and the fraction of the current window that has ``elapsed``.  Returns
+    ``(allowed, wait)``, where ``wait`` is the time until a request would be
+    allowed, as a fraction of the window, or None.
+    """
+    if previous * (1 - elapsed) + current + 1 <= limit:
+        return True, None
+    if current + 1 <= limit:
+        # Allowed once enough of the previous window has slid out.
+        return False, 1 - (limit - current - 1) / previous - elapsed
+    # Not before the next window, once enough of this one has slid out.
+    return False, 1 - elapsed + max(0, 1 - (limit - 1) / max(current, 1))
+
+
+class SQLiteWindowStore:
+    """
+    Window counters in a SQLite file, with a connection per thread and
+    process.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._local = threading.local()
+
+    def connection(self):
+        # Connections are not shared with processes forked after opening one.
+        if getattr(self._local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            connection.execute('PRAGMA journal_mode = WAL')
+            connection.execute('PRAGMA synchronous = NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS throttle_window ('
+                ' key TEXT NOT NULL, duration INTEGER NOT NULL, period INTEGER NOT NULL,'
+                ' count INTEGER NOT NULL, expires REAL NOT NULL,'
+                ' PRIMARY KEY (key, duration, period)'
+                ') WITHOUT ROWID'
+            )
+            self._local.connection, self._local.pid, self._local.checks = connection, os.getpid(), 0
+        return self._local.connection
+
+    def hit(self, key, limit, duration, now):
+        """
+        Counts a request for ``key`` if fewer than ``limit`` were made in the
+        last ``duration`` seconds.  Returns ``(allowed, wait)`` with ``wait``
+        in seconds.
+        """
+        window, offset = divmod(now, duration)
+        window = int(window)
+        connection = self.connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            counts = dict(connection.execute(
+                'SELECT period, count FROM throttle_window WHERE key = ? AND duration = ? AND period >= ?',
+                (key, duration, window - 1),
+            ))
+            allowed, wait = sliding_window(counts.get(window - 1, 0), counts.get(window, 0), limit, offset / duration)
+            if allowed:
+                connection.execute(
+                    'INSERT INTO throttle_window (key, duration, period, count, expires) VALUES (?, ?, ?, 1, ?)'
+                    ' ON CONFLICT (key, duration, period) DO UPDATE SET count = count + 1',
+                    (key, duration, window, (window + 2) * duration),
+                )
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        self._local.checks += 1
+        if self._local.checks % CLEANUP_EVERY == 0:
+            connection.execute('DELETE FROM throttle_window WHERE expires < ?', (now,))
+        return allowed, None if wait is None else wait * duration
+
+    def clear(self):
+        """
+        Forgets every count.
+        """
+        self.connection().execute('DELETE FROM throttle_window')
+
+    async def ahit(self, key, limit, duration, now):
+        # A check may wait for another process's lock, so it runs in a
+        # worker thread rather than on the event loop.
+        return await sync_to_async(self.hit, thread_sensitive=False)(key, limit, duration, now)
+
+
+class CacheWindowStore:
+    """
+    Window counters in a Django cache.
+    """
+
+    def __init__(self, alias):
+        self.alias = alias
+
+    def hit(self, key, limit, duration, now):
+        """
+        Counts a request for ``key`` if fewer than ``limit`` were made in the
+        last ``duration`` seconds.  Returns ``(allowed, wait)`` with ``wait``
+        in seconds.
+        """
+        cache = caches[self.alias]
+        window, offset = divmod(now, duration)
+        current_key, previous_key = self.window_keys(key, duration, int(window))
+        # Count first, so concurrent requests see each other's increments.
+        try:
+            current = cache.incr(current_key)
+        except ValueError:  # First request of the window
+            if cache.add(current_key, 1, timeout=2 * duration + 1):
+                current = 1
+            else:
+                current = cache.incr(current_key)
+        previous = cache.get(previous_key, 0)
+        allowed, wait = sliding_window(previous, current - 1, limit, offset / duration)
+        if not allowed:
+            cache.decr(current_key)
+        return allowed, None if wait is None else wait * duration
+
+    async def ahit(self, key, limit, duration, now):
+        cache = caches[self.alias]
+        window, offset = divmod(now, duration)
+        current_key, previous_key = self.window_keys(key, duration, int(window))
+        try:
+            current = await cache.aincr(current_key)
+        except ValueError:
+            if await cache.aadd(current_key, 1, timeout=2 * duration + 1):
+                current = 1
+            else:
+                current = await cache.aincr(current_key)
+        previous = await cache.aget(previous_key, 0)
+        allowed, wait = sliding_window(previous, current - 1, limit, offset / duration)
+        if not allowed:
+            await cache.adecr(current_key)
+        return allowed, None if wait is None else wait * duration
+
+    @staticmethod
+    def window_keys(key, duration, window):
+        return f'throttle-window:{key}:{duration}:{window}', f'throttle-window:{key}:{duration}:{window - 1}'
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_throttle_store():
+    """
+    The store selected by ``THROTTLE_STORE``, one instance per process.
+    """
+    options = get_throttle_store_settings()
+    if options['BACKEND'] == 'sqlite':
+        path = options['PATH'] or os.path.join(settings.BASE_DIR, 'throttle.sqlite3')
+        key, factory = ('sqlite', str(path)), lambda: SQLiteWindowStore(path)
+    elif options['BACKEND'] == 'cache':
+        key, factory = ('cache', options['CACHE']), lambda: CacheWindowStore(options['CACHE'])
+    else:
+        raise ValueError(f"Unknown THROTTLE_STORE backend {options['BACKEND']!r}")
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = factory()
+        return _stores[key]
+
+
+class SharedRateThrottle(SimpleRateThrottle):
+    """
+    SimpleRateThrottle counting sliding windows in the shared throttle store.
+    With ``use_view_scope``, a view's ``throttle_scope``, when set, replaces
+    the throttle's scope.
+    """
+    use_view_scope = True
+
+    def get_key(self, request, view):
+        """
+        Applies the view's scope and returns the key to count the request
+        under, or None if it is not throttled.
+        """
+        scope = getattr(view, 'throttle_scope', None) if self.use_view_scope else None
+        if scope and scope != self.scope:
+            self.scope = scope
+            self.rate = self.get_rate()
+            self.num_requests, self.duration = self.parse_rate(self.rate)
+        if self.rate is None:
+            return None
+        self.key = self.get_cache_key(request, view)
+        return self.key
+
+    def allow_request(self, request, view):
+        if self.get_key(request, view) is None:
+            return True
+        allowed, self.wait_time = get_throttle_store().hit(self.key, self.num_requests, self.duration, self.timer())
+        return allowed
+
+    async def aallow_request(self, request, view):
+        """
+        ``allow_request()`` for the async read views.
+        """
+        if self.get_key(request, view) is None:
+            return True
+        allowed, self.wait_time = await get_throttle_store().ahit(
+            self.key, self.num_requests, self.duration, self.timer(),
+        )
+        return allowed
+
+    def wait(self):
+        return self.wait_time
+
+
+class SharedUserRateThrottle(SharedRateThrottle, UserRateThrottle):
+    """
+    UserRateThrottle counting in the shared throttle store.
+    """
+
+
+class SharedAnonRateThrottle(SharedRateThrottle, AnonRateThrottle):
+    """
+    AnonRateThrottle counting in the shared throttle store.  Action scopes
+    are for authenticated users, so anonymous requests always count as
+    ``anon``.
+    """
+    use_view_scope = False
@@ -1,13 +1,20 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import EmployeeViewSet, PerformanceRecordViewSet, AttendanceViewSet, DepartmentalPerformanceViewSet
+from .async_views import async_read_urls
+from .views import EmployeeViewSet, PerformanceRecordViewSet, AttendanceViewSet, DepartmentalPerformanceViewSet, ExportJobViewSet, ImportJobViewSet, AttendanceHoursViewSet
+from .views import EmployeePerformanceTrendViewSet, DepartmentRatingSnapshotViewSet
 
 router = DefaultRouter()
 router.register(r'employees', EmployeeViewSet)
 router.register(r'performance-records', PerformanceRecordViewSet)
 router.register(r'attendance', AttendanceViewSet)
 router.register(r'department-performance', DepartmentalPerformanceViewSet)
+router.register(r'performance-trends', EmployeePerformanceTrendViewSet)
+router.register(r'department-ratings', DepartmentRatingSnapshotViewSet)
+router.register(r'export-jobs', ExportJobViewSet)
+router.register(r'import-jobs', ImportJobViewSet)
+router.register(r'attendance-hours', AttendanceHoursViewSet, basename='attendance-hours')
 
 urlpatterns = [
-    path('', include(router.urls)),
+    path('', include(async_read_urls(router.urls))),  # Async list and detail reads, see ASYNC_READS
 ]
\ No newline at end of file
@@ -1,113 +1,316 @@
-from rest_framework import viewsets, filters, status
+from rest_framework import viewsets, filters, mixins, status
+from rest_framework.exceptions import ValidationError
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
-from rest_framework.authentication import BasicAuthentication, TokenAuthentication
+from rest_framework.parsers import MultiPartParser
+from rest_framework.authentication import BasicAuthentication
 from rest_framework.permissions import IsAuthenticated, DjangoModelPermissions
-from rest_framework.throttling import UserRateThrottle, AnonRateThrottle
+from .throttling import SharedUserRateThrottle, SharedAnonRateThrottle
 from django_filters.rest_framework import DjangoFilterBackend
-from django.http import HttpResponse
-from django.db.models import Avg, Count
-import csv,logging
-from .models import Employee, PerformanceRecord, Attendance, DepartmentalPerformance
-from .serializers import EmployeeSerializer, PerformanceRecordSerializer, AttendanceSerializer, DepartmentalPerformanceSerializer
+from django.db.models import Avg, Count, Value
+from django.db.models.functions import Concat
+import logging
+from django.urls import reverse
+from datetime import date
+from utils import db_pool
+from utils.export_jobs import ExportJobMixin, ranged_file_response
+from utils.export_utils import CSVExportMixin
+from . import employee_import
+from .async_views import AsyncReadMixin
+from .authentication import CachedTokenAuthentication
+from .bulk import BulkMixin
+from .change_feed import ChangeFeedMixin
+from .fast_list import FastListMixin
+from .filters import AttendanceFilter, EmployeeFilter, EmployeePerformanceTrendFilter, DepartmentRatingSnapshotFilter
+from .response_cache import ResponseCacheMixin
+from .pagination import CustomPageNumberPagination, SelectablePagination
+from .search import EmployeeSearchFilter
+from .models import Department, Employee, PerformanceRecord, Attendance, DepartmentalPerformance, ExportJob, ImportJob, EmployeeHoursRollup, DepartmentHoursRollup, HoursRollup
+from .models import EmployeePerformanceTrend, DepartmentRatingSnapshot
+from .serializers import EmployeeSerializer, PerformanceRecordSerializer, AttendanceSerializer, DepartmentalPerformanceSerializer, ExportJobSerializer
+from .serializers import ImportJobSerializer
+from .serializers import EmployeeHoursRollupSerializer, DepartmentHoursRollupSerializer
+from .serializers import EmployeePerformanceTrendSerializer, DepartmentRatingSnapshotSerializer
+from .serializers import save_department
 
 logger = logging.getLogger(__name__)
 
-class EmployeeViewSet(viewsets.ModelViewSet):
-    # ...
-    def create(self, request, *args, **kwargs):
-        logger.info(f"Creating employee with data: {request.data}")
-        try:
-            return super().create(request, *args, **kwargs)
-        except Exception as e:
-            logger.error(f"Error creating employee: {e}")
-            raise
+# Query budgets for the read endpoints (see utils/query_budget.py): at most
+# authentication, the page count and the page itself, whatever the page size.
+# The change feed reads the counter, the rows and the tombstones.
+READ_QUERY_BUDGETS = {'list': 5, 'retrieve': 4, 'changes': 5}
 
-class CustomPageNumberPagination(PageNumberPagination):
-    """
-    Custom pagination class to set page size.
-    """
-    page_size = 10
-    page_size_query_param = 'page_size'
-    max_page_size = 100
+# Same value as Employee.__str__, computed in the database for exports.
+EMPLOYEE_NAME = Concat('employee__first_name', Value(' '), 'employee__last_name')
 
-class EmployeeViewSet(viewsets.ModelViewSet):
+class EmployeeViewSet(ResponseCacheMixin, FastListMixin, AsyncReadMixin, BulkMixin, ExportJobMixin, CSVExportMixin, ChangeFeedMixin,
+                      viewsets.ModelViewSet):
     """
     API endpoints for managing employees.
     """
-    queryset = Employee.objects.all()
+    queryset = Employee.objects.select_related('department')
     serializer_class = EmployeeSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['department', 'is_active']
+    filter_backends = [DjangoFilterBackend, EmployeeSearchFilter, filters.OrderingFilter]
+    filterset_class = EmployeeFilter
     search_fields = ['first_name', 'last_name', 'email', 'job_title']
     ordering_fields = ['first_name', 'last_name', 'hire_date', 'salary']
-    pagination_class = CustomPageNumberPagination
-    authentication_classes = [TokenAuthentication, BasicAuthentication] #  authentication
+    pagination_class = SelectablePagination
+    authentication_classes = [CachedTokenAuthentication, BasicAuthentication] #  authentication
     permission_classes = [IsAuthenticated, DjangoModelPermissions] #  permissions
-    throttle_classes = [UserRateThrottle] # Throttling
-    
-    @action(detail=False, methods=['get'])
-    def health(self, request):
+    throttle_classes = [SharedUserRateThrottle] # Throttling
+    query_budgets = READ_QUERY_BUDGETS
+    response_cache_models = (Employee, Department)
+    fast_list = True
+    export_filename = 'employees'
+    export_columns = {'department': 'department__name'}
+    bulk_unique_fields = ('email',)
+
+    def before_bulk_write(self, instances):
+        for employee in instances:
+            employee.department = save_department(employee.department)  # Validation only looked it up
+
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        employee = serializer.instance
+        logger.info("Created employee %s", employee.pk,
+                    extra={'employee_id': employee.pk, 'department_id': employee.department_id, 'user_id': self.request.user.pk})
+
+    @action(detail=False, methods=['post'], url_path='import', url_name='import', throttle_scope='bulk',
+            parser_classes=[MultiPartParser])
+    def import_file(self, request):
         """
-        Endpoint to check the health of the API.
+        Endpoint to import employees from an uploaded CSV or NDJSON ``file``.
+        The format is taken from ``input_format`` or the file's name;
+        ``dry_run=true`` validates without loading.  The import runs in the
+        background; poll the job at the ``Location`` returned.  See
+        employee_management/employee_import.py.
         """
-        return Response({"status": "ok"}, status=status.HTTP_200_OK)
-    
+        upload = request.FILES.get('file')
+        if upload is None:
+            raise ValidationError({'file': ['No file was submitted.']})
+        input_format = request.data.get('input_format') or employee_import.detect_format(upload.name, upload.content_type)
+        if input_format not in dict(ImportJob.FORMAT_CHOICES):
+            raise ValidationError({'input_format': ['Must be csv or ndjson.']})
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true', 'yes', 'on')
+        job = employee_import.enqueue_import(upload, input_format, dry_run, requested_by=request.user)
+        serializer = ImportJobSerializer(job, context=self.get_serializer_context())
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED,
+                        headers={'Location': reverse('importjob-detail', kwargs={'pk': job.pk})})
+
     @action(detail=False, methods=['get'])
-    def export_csv(self, request):
+    def health(self, request):
         """
-        Endpoint to export employee data to CSV.
+        Endpoint to check the health of the API.  With the pooled database
+        backend, also reports this process's connection pools.
         """
-        employees = self.filter_queryset(self.get_queryset())
-        serializer = self.get_serializer(employees, many=True)
-        
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="employees.csv"'
-        
-        writer = csv.writer(response)
-        # Write header
-        writer.writerow(serializer.data[0].keys())
-        # Write data rows
-        for row in serializer.data:
-            writer.writerow(row.values())
-        
-        return response
-
-class PerformanceRecordViewSet(viewsets.ModelViewSet):
+        data = {"status": "ok"}
+        pools = db_pool.pool_stats()
+        if pools:
+            data["database_pools"] = pools
+        return Response(data, status=status.HTTP_200_OK)
+
+class PerformanceRecordViewSet(ResponseCacheMixin, FastListMixin, AsyncReadMixin, BulkMixin, ExportJobMixin, CSVExportMixin, ChangeFeedMixin,
+                               viewsets.ModelViewSet):
     """
     API endpoints for managing performance records.
     """
-    queryset = PerformanceRecord.objects.all()
+    queryset = PerformanceRecord.objects.select_related('employee')  # employee_name
     serializer_class = PerformanceRecordSerializer
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['employee', 'review_date']
     ordering_fields = ['review_date', 'rating']
-    pagination_class = CustomPageNumberPagination
-    authentication_classes = [TokenAuthentication, BasicAuthentication] #  authentication
+    pagination_class = SelectablePagination
+    authentication_classes = [CachedTokenAuthentication, BasicAuthentication] #  authentication
     permission_classes = [IsAuthenticated, DjangoModelPermissions] #  permissions
-    throttle_classes = [UserRateThrottle] # Throttling
+    throttle_classes = [SharedUserRateThrottle] # Throttling
+    query_budgets = READ_QUERY_BUDGETS
+    response_cache_models = (PerformanceRecord, Employee)
+    fast_list = True
+    export_filename = 'performance_records'
+    export_annotations = {'employee_name': EMPLOYEE_NAME}
 
-class AttendanceViewSet(viewsets.ModelViewSet):
+class AttendanceViewSet(ResponseCacheMixin, FastListMixin, AsyncReadMixin, BulkMixin, ExportJobMixin, CSVExportMixin, ChangeFeedMixin,
+                        viewsets.ModelViewSet):
     """
     API endpoints for managing employee attendance.
     """
-    queryset = Attendance.objects.all()
+    queryset = Attendance.objects.select_related('employee')  # employee_name
     serializer_class = AttendanceSerializer
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
-    filterset_fields = ['employee', 'date']
+    filterset_class = AttendanceFilter
     ordering_fields = ['date', 'clock_in']
-    pagination_class = CustomPageNumberPagination
-    authentication_classes = [TokenAuthentication, BasicAuthentication]  # authentication
+    pagination_class = SelectablePagination
+    authentication_classes = [CachedTokenAuthentication, BasicAuthentication]  # authentication
     permission_classes = [IsAuthenticated, DjangoModelPermissions]  # permissions
-    throttle_classes = [UserRateThrottle]  # Throttling
+    throttle_classes = [SharedUserRateThrottle]  # Throttling
+    query_budgets = READ_QUERY_BUDGETS
+    response_cache_models = (Attendance, Employee)
+    fast_list = True
+    export_filename = 'attendance'
+    bulk_unique_fields = ('employee', 'date')
+    export_annotations = {'employee_name': EMPLOYEE_NAME}
 
-class DepartmentalPerformanceViewSet(viewsets.ReadOnlyModelViewSet):
+class DepartmentalPerformanceViewSet(ResponseCacheMixin, FastListMixin, AsyncReadMixin, viewsets.ReadOnlyModelViewSet):
     """
     API endpoint for viewing departmental performance.
     """
-    queryset = DepartmentalPerformance.objects.all()
+    queryset = DepartmentalPerformance.objects.select_related('department')
     serializer_class = DepartmentalPerformanceSerializer
-    authentication_classes = [TokenAuthentication, BasicAuthentication]  # authentication
+    pagination_class = SelectablePagination
+    authentication_classes = [CachedTokenAuthentication, BasicAuthentication]  # authentication
     permission_classes = [IsAuthenticated]  # permissions
-    throttle_classes = [UserRateThrottle, AnonRateThrottle]  # Throttling.  Added AnonRateThrottle
+    throttle_classes = [SharedUserRateThrottle, SharedAnonRateThrottle]  # Throttling.  Added AnonRateThrottle
+    query_budgets = READ_QUERY_BUDGETS
+    response_cache_models = (DepartmentalPerformance, Department)
+    fast_list = True
+    analytics_actions = ('list', 'retrieve')  # Read from the analytics replica, see utils/db_router.py
+
+class EmployeePerformanceTrendViewSet(ResponseCacheMixin, AsyncReadMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    API endpoint for employees' rating trends, from the nightly snapshot
+    (see performance_analytics.py).  Looked up by employee id.
+    """
+    queryset = EmployeePerformanceTrend.objects.select_related('department')
+    serializer_class = EmployeePerformanceTrendSerializer
+    lookup_field = 'employee'
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_class = EmployeePerformanceTrendFilter
+    ordering_fields = ['slope', 'moving_average', 'review_count', 'last_review_date']
+    pagination_class = SelectablePagination
+    authentication_classes = [CachedTokenAuthentication, BasicAuthentication]  # authentication
+    permission_classes = [IsAuthenticated]  # permissions
+    throttle_classes = [SharedUserRateThrottle]  # Throttling
+    query_budgets = READ_QUERY_BUDGETS
+    response_cache_models = (EmployeePerformanceTrend, Department)
+    analytics_actions = ('list', 'retrieve')  # Read from the analytics replica, see utils/db_router.py
+
+class DepartmentRatingSnapshotViewSet(ResponseCacheMixin, AsyncReadMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    API endpoint for the distribution of ratings per department and quarter,
+    from the nightly snapshot (see performance_analytics.py).
+    """
+    queryset = DepartmentRatingSnapshot.objects.select_related('department')
+    serializer_class = DepartmentRatingSnapshotSerializer
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_class = DepartmentRatingSnapshotFilter
+    ordering_fields = ['year', 'quarter', 'mean_rating', 'review_count']
+    pagination_class = SelectablePagination
+    authentication_classes = [CachedTokenAuthentication, BasicAuthentication]  # authentication
+    permission_classes = [IsAuthenticated]  # permissions
+    throttle_classes = [SharedUserRateThrottle]  # Throttling
+    query_budgets = READ_QUERY_BUDGETS
+    response_cache_models = (DepartmentRatingSnapshot, Department)
+    analytics_actions = ('list', 'retrieve')  # Read from the analytics replica, see utils/db_router.py
+
+class AttendanceHoursViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+    """
+    API endpoint for hours worked over time, read from the attendance rollups.
+
+    Query parameters: ``granularity`` (day, week or month; default day),
+    ``start`` and ``end`` (dates bounding the period start), ``department``,
+    and ``employee``.  With ``employee`` the series is per employee, otherwise
+    per department.
+    """
+    pagination_class = SelectablePagination
+    authentication_classes = [CachedTokenAuthentication, BasicAuthentication]  # authentication
+    permission_classes = [IsAuthenticated]  # permissions
+    throttle_classes = [SharedUserRateThrottle]  # Throttling
+    query_budgets = READ_QUERY_BUDGETS
+    analytics_actions = ('list',)  # Read from the analytics replica, see utils/db_router.py
+
+    def per_employee(self):
+        return 'employee' in self.request.query_params
+
+    def get_serializer_class(self):
+        return EmployeeHoursRollupSerializer if self.per_employee() else DepartmentHoursRollupSerializer
+
+    def get_queryset(self):
+        params = self.request.query_params
+        granularity = params.get('granularity', HoursRollup.GRANULARITY_DAY)
+        if granularity not in dict(HoursRollup.GRANULARITY_CHOICES):
+            raise ValidationError({'granularity': f"Must be one of {', '.join(dict(HoursRollup.GRANULARITY_CHOICES))}."})
+
+        if self.per_employee():
+            queryset = EmployeeHoursRollup.objects.filter(granularity=granularity)
+            try:
+                queryset = queryset.filter(employee_id=int(params['employee']))
+            except ValueError:
+                raise ValidationError({'employee': 'Must be an employee id.'})
+            if 'department' in params:
+                queryset = queryset.filter(employee__department__name=params['department'])
+        else:
+            queryset = DepartmentHoursRollup.objects.filter(granularity=granularity).select_related('department')
+            if 'department' in params:
+                queryset = queryset.filter(department__name=params['department'])
+
+        for param, lookup in (('start', 'period_start__gte'), ('end', 'period_start__lte')):
+            if param in params:
+                try:
+                    queryset = queryset.filter(**{lookup: date.fromisoformat(params[param])})
+                except ValueError:
+                    raise ValidationError({param: 'Must be a date in YYYY-MM-DD format.'})
+        return queryset.order_by('period_start', 'pk')
+
+class ExportJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    API endpoints for checking on and downloading background CSV exports.
+    Exports are started with POST to the ``export_job`` action of a resource.
+    """
+    queryset = ExportJob.objects.all()
+    serializer_class = ExportJobSerializer
+    pagination_class = CustomPageNumberPagination
+    authentication_classes = [CachedTokenAuthentication, BasicAuthentication]  # authentication
+    permission_classes = [IsAuthenticated]  # permissions
+    throttle_classes = [SharedUserRateThrottle]  # Throttling
+    query_budgets = READ_QUERY_BUDGETS
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(requested_by=self.request.user)
+        return queryset
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """
+        Endpoint to download a finished export.  Supports Range requests.
+        """
+        job = self.get_object()
+        if job.status != ExportJob.STATUS_COMPLETED:
+            return Response({"detail": f"Export is {job.status}."}, status=status.HTTP_409_CONFLICT)
+        etag = f'"export-{job.pk}-{job.file_size}"'
+        return ranged_file_response(request, job.file_path, f'{job.resource}.csv.gz',
+                                    content_type='application/gzip', etag=etag)
+
+class ImportJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    API endpoints for checking on employee imports and downloading the
+    report of rejected rows.  Imports are run with POST to
+    ``/api/employees/import/``.
+    """
+    queryset = ImportJob.objects.all()
+    serializer_class = ImportJobSerializer
+    pagination_class = CustomPageNumberPagination
+    authentication_classes = [CachedTokenAuthentication, BasicAuthentication]  # authentication
+    permission_classes = [IsAuthenticated]  # permissions
+    throttle_classes = [SharedUserRateThrottle]  # Throttling
+    query_budgets = READ_QUERY_BUDGETS
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(requested_by=self.request.user)
+        return queryset
+
+    @action(detail=True, methods=['get'])
+    def report(self, request, pk=None):
+        """
+        Endpoint to download the rejected rows of an import.  Supports Range
+        requests.
+        """
+        job = self.get_object()
+        if not job.report_path:
+            return Response({"detail": "No rows were rejected."}, status=status.HTTP_404_NOT_FOUND)
+        etag = f'"import-{job.pk}-{job.report_size}"'
+        return ranged_file_response(request, job.report_path, f'import-{job.pk}-rejected.csv.gz',
+                                    content_type='application/gzip', etag=etag)
@@ -0,0 +1,115 @@
+"""
+Helpers for timing code paths and comparing the results against a stored
+JSON baseline.  Used by the ``benchmark`` management command.
+
+A baseline file looks like::
+
+    {
+        "environment": {"python": "3.11.7", "django": "4.2.11", "database": "sqlite"},
+        "results": {
+            "serialize.attendance@10000": {"seconds": 0.041, "peak_kib": 912.4, "queries": 1},
+            ...
+        }
+    }
+"""
+import gc
+import json
+import platform
+import time
+import tracemalloc
+from collections import namedtuple
+from pathlib import Path
+
+import django
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+Measurement = namedtuple('Measurement', 'seconds peak_kib queries')
+Regression = namedtuple('Regression', 'name metric baseline current change')
+
+DEFAULT_THRESHOLD = 0.2
+# Differences smaller than these are noise whatever the relative change.
+MIN_SECONDS_DELTA = 0.005
+MIN_PEAK_KIB_DELTA = 64
+
+
+def measure(func, repeat=3, using='default'):
+    """
+    Measures a callable.
+
+    The wall time is the best of ``repeat`` runs and the query count is taken
+    from the first of them.  Peak memory is measured in one further run under
+    tracemalloc, which would otherwise slow the timed runs down.
+
+    Returns:
+        A Measurement.
+    """
+    connection = connections[using]
+    timings = []
+    queries = None
+    for _ in range(max(repeat, 1)):
+        gc.collect()
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started)
+        if queries is None:
+            queries = len(captured)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return Measurement(round(min(timings), 6), round(peak / 1024, 1), queries)
+
+
+def environment(using='default'):
+    return {
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connections[using].vendor,
+    }
+
+
+def save_baseline(path, results, using='default'):
+    """
+    Writes ``{name: Measurement}`` to ``path`` as a baseline file.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    data = {
+        'environment': environment(using),
+        'results': {name: measurement._asdict() for name, measurement in sorted(results.items())},
+    }
+    path.write_text(json.dumps(data, indent=2) + '\n')
+
+
+def load_baseline(path):
+    """
+    Reads a baseline file back into ``{name: Measurement}``.
+    """
+    data = json.loads(Path(path).read_text())
+    return {name: Measurement(**values) for name, values in data['results'].items()}
+
+
+def compare(baseline, results, threshold=DEFAULT_THRESHOLD):
+    """
+    Returns the regressions of ``results`` against ``baseline``: wall time or
+    peak memory more than ``threshold`` (a fraction) above the baseline, or
+    any increase in the number of queries.  Benchmarks missing from either
+    side are skipped.
+    """
+    regressions = []
+    for name in sorted(set(baseline) & set(results)):
+        old, new = baseline[name], results[name]
+        for metric, min_delta in (('seconds', MIN_SECONDS_DELTA), ('peak_kib', MIN_PEAK_KIB_DELTA)):
+            before, after = getattr(old, metric), getattr(new, metric)
+            if after - before > max(before * threshold, min_delta):
+                regressions.append(Regression(name, metric, before, after, (after - before) / before if before else None))
+        if new.queries > old.queries:
+            regressions.append(Regression(name, 'queries', old.queries, new.queries,
+                                          (new.queries - old.queries) / old.queries if old.queries else None))
+    return regressions
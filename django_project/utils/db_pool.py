@@ -0,0 +1,226 @@
+"""
+A per-process pool of open database connections, used by the
+``utils.pooled_postgresql`` database backend.
+
+Django opens a connection the first time a request queries the database and
+closes it when the request finishes (``CONN_MAX_AGE = 0``).  With the pooled
+backend "opening" takes an idle connection from the pool and "closing" puts
+it back, so the TCP and authentication handshake happens once per
+connection rather than once per request.  Threads (WSGI worker threads, or
+the threads ASGI runs ORM calls in) share their process's pool:
+
+* at most ``MAX_SIZE`` connections are open at once; a thread needing one
+  when all are in use waits up to ``TIMEOUT`` seconds, then fails;
+* a connection that has been idle for ``CHECK_AFTER`` seconds or more is
+  checked with ``SELECT 1`` before it is handed out, and replaced if the
+  check fails, e.g. after a database restart;
+* connections are closed rather than reused once they are ``MAX_LIFETIME``
+  seconds old, or have been idle for ``MAX_IDLE`` seconds.
+
+A pool belongs to the process that created it: forked processes create
+their own, and leave the parent's connections alone.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+POOL_DEFAULTS = {
+    'MAX_SIZE': 10,
+    'TIMEOUT': 30,
+    'MAX_LIFETIME': 3600,
+    'MAX_IDLE': 600,
+    'CHECK_AFTER': 1,
+}
+
+
+def get_pool_settings(settings_dict):
+    """
+    The ``POOL`` options of a ``DATABASES`` entry, with defaults.
+    """
+    return {**POOL_DEFAULTS, **settings_dict.get('POOL', {})}
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """
+    Hands out connections made by ``connect()``, at most ``max_size`` at a
+    time.  ``check(connection)`` returns whether a connection that has been
+    idle for ``check_after`` seconds still works.
+    """
+
+    def __init__(self, connect, check, max_size=10, timeout=30, max_lifetime=3600, max_idle=600, check_after=1,
+                 clock=time.monotonic):
+        self.connect = connect
+        self.check = check
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.check_after = check_after
+        self.clock = clock
+        self._idle = deque()  # (connection, created, returned), most recently returned last
+        self._created = {}  # Connection -> when it was opened, for the ones in use
+        self._size = 0  # Connections open or being opened, idle or in use
+        self._condition = threading.Condition()
+        self.created = self.closed = self.checkouts = self.waits = self.timeouts = self.failed_checks = 0
+        self.wait_seconds = self.max_wait_seconds = 0.0
+
+    def get(self):
+        """
+        Returns a connection, waiting up to ``timeout`` seconds for one if
+        ``max_size`` are in use.
+        """
+        started = self.clock()
+        waited = False
+        while True:
+            with self._condition:
+                while not self._idle and self._size >= self.max_size:
+                    remaining = self.timeout - (self.clock() - started)
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise PoolTimeout(f'No database connection free after {self.timeout}s: '
+                                          f'all {self.max_size} are in use')
+                    waited = True
+                    self._condition.wait(remaining)
+                if self._idle:
+                    connection, created, returned = self._idle.pop()
+                else:
+                    connection, created, returned = None, None, None
+                    self._size += 1
+
+            if connection is None:
+                connection, created = self.open(), self.clock()
+                break
+            now = self.clock()
+            if self.expired(created, returned, now):
+                self.discard(connection)
+            elif now - returned >= self.check_after and not self.check(connection):
+                with self._condition:
+                    self.failed_checks += 1
+                self.discard(connection)
+            else:
+                break
+
+        with self._condition:
+            self._created[connection] = created
+            self.checkouts += 1
+            if waited:
+                seconds = self.clock() - started
+                self.waits += 1
+                self.wait_seconds += seconds
+                self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+        return connection
+
+    def put(self, connection, reusable=True):
+        """
+        Returns a connection from get(), closing it if it is not
+        ``reusable`` or too old to be reused.
+        """
+        with self._condition:
+            created = self._created.pop(connection)
+        now = self.clock()
+        if not reusable or now - created >= self.max_lifetime:
+            self.discard(connection)
+            return
+        with self._condition:
+            self._idle.append((connection, created, now))
+            self._condition.notify()
+
+    def open(self):
+        try:
+            connection = self.connect()
+        except BaseException:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self.created += 1
+        return connection
+
+    def discard(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self._condition:
+            self._size -= 1
+            self.closed += 1
+            self._condition.notify()
+
+    def expired(self, created, returned, now):
+        return now - created >= self.max_lifetime or now - returned >= self.max_idle
+
+    def close_idle(self):
+        """
+        Closes the idle connections.  Connections in use are still returned
+        to the pool.
+        """
+        with self._condition:
+            idle, self._idle = self._idle, deque()
+        for connection, _, _ in idle:
+            self.discard(connection)
+
+    def stats(self):
+        with self._condition:
+            return {
+                'max_size': self.max_size,
+                'size': self._size,
+                'in_use': len(self._created),
+                'idle': len(self._idle),
+                'created': self.created,
+                'closed': self.closed,
+                'checkouts': self.checkouts,
+                'waits': self.waits,
+                'wait_seconds': round(self.wait_seconds, 6),
+                'max_wait_seconds': round(self.max_wait_seconds, 6),
+                'timeouts': self.timeouts,
+                'failed_checks': self.failed_checks,
+            }
+
+
+# (pid, alias, database name, connection parameters) -> ConnectionPool
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, name, params, factory):
+    """
+    This process's pool for a database connection, made by ``factory()`` the
+    first time.  Pools of a parent process stay referenced, so their
+    connections are never closed by this one.
+    """
+    key = (os.getpid(), alias, name, params)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = factory()
+        return _pools[key]
+
+
+def close_idle_connections(name=None):
+    """
+    Closes the idle connections of this process's pools, or only of those
+    connecting to database ``name``.
+    """
+    with _pools_lock:
+        pools = [pool for (pid, _, pool_name, _), pool in _pools.items()
+                 if pid == os.getpid() and name in (None, pool_name)]
+    for pool in pools:
+        pool.close_idle()
+
+
+def pool_stats():
+    """
+    ``{alias: stats}`` for this process's pools.  Pools of the same alias,
+    e.g. after the test runner renamed the database, are reported apart.
+    """
+    with _pools_lock:
+        pools = [(alias, name, pool) for (pid, alias, name, _), pool in _pools.items() if pid == os.getpid()]
+    stats = {}
+    for alias, name, pool in pools:
+        stats[alias if alias not in stats else f'{alias} ({name})'] = pool.stats()
+    return stats
@@ -0,0 +1,264 @@
+"""
+Read/write split between the primary database and its read replicas.
+
+``ReplicaRoutingMiddleware`` picks, for each GET, HEAD or OPTIONS request,
+the database its reads go to, and ``ReplicaRouter`` sends them there; all
+writes, and every read of other requests, go to the primary (``default``):
+
+* a request is given one of ``REPLICA_ROUTING['REPLICAS']`` at random, so
+  its queries (e.g. a page and its count) see one consistent state;
+* the viewset actions listed in a viewset's ``analytics_actions`` (CSV
+  exports, departmental performance, attendance hours) are given
+  ``ANALYTICS_REPLICA`` when one is configured.  Background exports read
+  from it too;
+* replicas are checked at most every ``CHECK_INTERVAL`` seconds per
+  process.  One that cannot be reached, or that is more than
+  ``MAX_LAG_SECONDS`` behind the primary, is skipped; with none left the
+  primary serves the reads;
+* after a request that writes, the same client (its ``Authorization``
+  header or session cookie) reads from the primary for ``STICKY_SECONDS``,
+  so it sees its own writes.  The pins are kept in the cache
+  ``REPLICA_ROUTING['CACHE']``, the ``'shared'`` cache that all processes
+  see; with a per-process cache a client's next request would usually land
+  on a worker that never saw its pin, so checks.py refuses one while
+  replicas are configured.
+
+Users, tokens and sessions are always read from the primary, so a token
+issued a moment ago is found.  Reads inside a transaction on the primary
+stay on the primary.
+"""
+import contextvars
+import hashlib
+import logging
+import random
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+REPLICA_ROUTING_DEFAULTS = {
+    'REPLICAS': [],
+    'ANALYTICS_REPLICA': None,
+    'STICKY_SECONDS': 10,
+    'MAX_LAG_SECONDS': 5,
+    'CHECK_INTERVAL': 5,
+    'CACHE': 'shared',
+}
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PRIMARY_APPS = {'auth', 'authtoken', 'sessions', 'contenttypes', 'admin'}
+
+# Seconds the replica's last replayed transaction is behind, 0 when it has
+# replayed everything it received (an idle primary sends nothing new).
+LAG_SQL = (
+    "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+def get_replica_routing_settings():
+    return {**REPLICA_ROUTING_DEFAULTS, **getattr(settings, 'REPLICA_ROUTING', {})}
+
+
+def uses_replicas():
+    options = get_replica_routing_settings()
+    return bool(options['REPLICAS'] or options['ANALYTICS_REPLICA'])
+
+
+class RoutingState:
+    """
+    Where a request reads from, and whether it has written.
+    """
+
+    def __init__(self, read_alias=DEFAULT_DB_ALIAS):
+        self.read_alias = read_alias
+        self.wrote = False
+
+
+_state = contextvars.ContextVar('replica_routing', default=None)
+
+_lags = {}  # Alias -> (when it was checked, lag in seconds or None if unreachable)
+_lags_lock = threading.Lock()
+
+
+def measure_lag(alias):
+    """
+    Returns how many seconds replica ``alias`` is behind, or None if it
+    cannot be reached.
+    """
+    connection = connections[alias]
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(LAG_SQL if connection.vendor == 'postgresql' else 'SELECT 0')
+            return float(cursor.fetchone()[0])
+    except DatabaseError:
+        logger.warning('Replica %s cannot be reached', alias, exc_info=True, extra={'replica': alias})
+        connection.close()
+        return None
+
+
+def get_lag(alias, interval):
+    """
+    The last measured lag of a replica, measured again if it is older than
+    ``interval`` seconds.  Other threads use the previous value meanwhile.
+    """
+    now = time.monotonic()
+    with _lags_lock:
+        checked, lag = _lags.get(alias, (None, None))
+        if checked is not None and now - checked < interval:
+            return lag
+        _lags[alias] = (now, lag)
+    lag = measure_lag(alias)
+    with _lags_lock:
+        _lags[alias] = (time.monotonic(), lag)
+    return lag
+
+
+def is_current(alias, options):
+    lag = get_lag(alias, options['CHECK_INTERVAL'])
+    return lag is not None and lag <= options['MAX_LAG_SECONDS']
+
+
+def choose_replica(analytics=False):
+    """
+    Returns the alias to read from: the analytics replica for ``analytics``
+    reads, if configured and current, or else a current replica, or else
+    the primary.
+    """
+    options = get_replica_routing_settings()
+    if analytics and options['ANALYTICS_REPLICA'] and is_current(options['ANALYTICS_REPLICA'], options):
+        return options['ANALYTICS_REPLICA']
+    replicas = [alias for alias in options['REPLICAS'] if is_current(alias, options)]
+    return random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+
+
+def reads_from_replica():
+    """
+    Whether the current request reads from a replica.
+    """
+    state = _state.get()
+    return state is not None and state.read_alias != DEFAULT_DB_ALIAS
+
+
+def may_be_stale(last_modified):
+    """
+    Whether the current request reads from a replica that may not have the
+    write made at ``last_modified`` (a timestamp) yet.
+    """
+    return reads_from_replica() and time.time() - last_modified <= get_replica_routing_settings()['MAX_LAG_SECONDS']
+
+
+def get_pin_key(request):
+    credential = request.headers.get('Authorization') or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if not credential:
+        return None
+    return f'replica-routing:pin:{hashlib.sha256(credential.encode()).hexdigest()}'
+
+
+class ReplicaRouter:
+    """
+    Sends reads to the replica chosen for the current request, and writes
+    to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or model._meta.app_label in PRIMARY_APPS or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return state.read_alias
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True  # All databases hold the same data
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        options = get_replica_routing_settings()
+        return db not in options['REPLICAS'] and db != options['ANALYTICS_REPLICA']
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Chooses the database each request reads from, and pins clients that
+    wrote to the primary.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = request.replica_routing = RoutingState()
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        key = get_pin_key(request)
+        if key and (state.wrote or request.method not in SAFE_METHODS) and uses_replicas():
+            self.pin_cache().set(key, True, get_replica_routing_settings()['STICKY_SECONDS'])
+        return self.stream_with_state(response, state)
+
+    async def __acall__(self, request):
+        state = request.replica_routing = RoutingState()
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        key = get_pin_key(request)
+        if key and (state.wrote or request.method not in SAFE_METHODS) and uses_replicas():
+            await self.pin_cache().aset(key, True, get_replica_routing_settings()['STICKY_SECONDS'])
+        return self.stream_with_state(response, state)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = getattr(request, 'replica_routing', None)
+        if state is None or request.method not in SAFE_METHODS or not uses_replicas():
+            return
+        key = get_pin_key(request)
+        if key and self.pin_cache().get(key):
+            return
+        action = (getattr(view_func, 'actions', None) or {}).get(request.method.lower())
+        analytics = action in getattr(getattr(view_func, 'cls', None), 'analytics_actions', ())
+        state.read_alias = choose_replica(analytics)
+
+    @staticmethod
+    def pin_cache():
+        return caches[get_replica_routing_settings()['CACHE']]
+
+    @staticmethod
+    def stream_with_state(response, state):
+        """
+        Streamed content (CSV exports) is produced after the middleware
+        returns, so it is read in a context of its own with the request's
+        routing state.
+        """
+        if not response.streaming or getattr(response, 'is_async', False) or state.read_alias == DEFAULT_DB_ALIAS:
+            return response
+        context = contextvars.copy_context()
+        context.run(_state.set, state)
+        iterator = iter(response.streaming_content)
+
+        def content():
+            while True:
+                try:
+                    yield context.run(next, iterator)
+                except StopIteration:
+                    return
+        response.streaming_content = content()
+        return response
@@ -0,0 +1,323 @@
+"""
+Background CSV exports.
+
+A POST to a viewset's ``export_job`` action records an ExportJob with the
+request's filter parameters and hands it to a local process pool.  The worker
+rebuilds the viewset's filtered queryset from those parameters and writes it
+as a series of gzip chunk files, updating the job's progress as each chunk is
+completed.  Chunks are written to a temporary name and renamed into place, so
+a job that is interrupted can be resumed from the last complete chunk.  When
+all rows are written the chunks are concatenated into one file (concatenated
+gzip members are a valid gzip file), which is served with HTTP Range support.
+
+Identical filter sets requested by one user within ``REUSE_SECONDS`` share
+one job.
+"""
+import csv
+import gzip
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import re
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.http import FileResponse, HttpRequest, HttpResponse, QueryDict, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from employee_management.models import ExportJob
+from employee_management.serializers import ExportJobSerializer
+from utils import db_router
+from utils.export_utils import Echo
+
+logger = logging.getLogger(__name__)
+
+EXPORT_JOB_DEFAULTS = {
+    'ROOT': Path(settings.BASE_DIR) / 'exports',
+    'MAX_WORKERS': 2,  # 0 runs jobs in the requesting process, e.g. for tests
+    'CHUNK_ROWS': 50000,
+    'REUSE_SECONDS': 15 * 60,
+}
+
+# Query parameters that change the page, not the data, of a list request.
+IGNORED_PARAMS = {'page', 'page_size', 'format'}
+
+CHUNK_NAME = 'part-{:05d}.csv.gz'
+ARTIFACT_NAME = 'export.csv.gz'
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+READ_BLOCK_SIZE = 64 * 1024
+
+_executor = None
+
+
+def get_export_job_settings():
+    return {**EXPORT_JOB_DEFAULTS, **getattr(settings, 'EXPORT_JOBS', {})}
+
+
+def _init_worker():
+    """
+    Runs once in each pool process before it accepts jobs.
+    """
+    import django
+    django.setup()
+
+
+def get_executor():
+    """
+    Returns the process pool, creating it on first use.  Workers are spawned
+    rather than forked so they never inherit the parent's database connections
+    or threads.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=get_export_job_settings()['MAX_WORKERS'],
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+        )
+    return _executor
+
+
+def submit_export_job(job_id):
+    if get_export_job_settings()['MAX_WORKERS'] <= 0:
+        run_export_job(job_id)
+    else:
+        get_executor().submit(run_export_job, job_id)
+
+
+def hash_export_params(view_class, query_params):
+    payload = json.dumps([view_class, query_params], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def enqueue_export(view, request):
+    """
+    Records an export of the view's filtered queryset, or returns a recent job
+    of the same user for the same filters.
+
+    Returns:
+        A tuple of (job, created).
+    """
+    view_class = f'{type(view).__module__}.{type(view).__qualname__}'
+    query_params = {
+        name: values for name, values in sorted(request.query_params.lists())
+        if name not in IGNORED_PARAMS
+    }
+    params_hash = hash_export_params(view_class, query_params)
+    reuse_after = timezone.now() - timedelta(seconds=get_export_job_settings()['REUSE_SECONDS'])
+    requested_by = request.user if request.user.is_authenticated else None
+
+    # Only the user's own jobs: another user's job would not be theirs to read.
+    recent = (
+        ExportJob.objects.filter(params_hash=params_hash, requested_by=requested_by, created_at__gte=reuse_after)
+        .exclude(status=ExportJob.STATUS_FAILED)
+        .first()
+    )
+    if recent and (recent.status != ExportJob.STATUS_COMPLETED or os.path.exists(recent.file_path)):
+        return recent, False
+
+    job = ExportJob.objects.create(
+        resource=view.basename,
+        view_class=view_class,
+        query_params=query_params,
+        params_hash=params_hash,
+        requested_by=requested_by,
+    )
+    transaction.on_commit(lambda: submit_export_job(job.pk))
+    return job, True
+
+
+def build_view(job):
+    """
+    Instantiates the job's viewset with a GET request carrying the job's
+    query parameters, so filter_queryset behaves exactly as it did for the
+    original request.
+    """
+    view_class = import_string(job.view_class)
+    http_request = HttpRequest()
+    http_request.method = 'GET'
+    http_request.GET = QueryDict(mutable=True)
+    for name, values in job.query_params.items():
+        http_request.GET.setlist(name, values)
+    request = Request(http_request)
+    return view_class(
+        request=request, args=(), kwargs={}, format_kwarg=None,
+        action='export_csv', basename=job.resource,
+    )
+
+
+def get_job_dir(job_id):
+    return Path(get_export_job_settings()['ROOT']) / str(job_id)
+
+
+def write_chunk(path, rows, header=None):
+    """
+    Writes rows to a gzip CSV file atomically.
+    """
+    tmp_path = path.with_name(path.name + '.tmp')
+    writer = csv.writer(Echo())
+    with gzip.open(tmp_path, 'wt', newline='') as fh:
+        if header:
+            fh.write(writer.writerow(header))
+        for row in rows:
+            fh.write(writer.writerow(row))
+    os.replace(tmp_path, path)
+
+
+def iter_chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run_export_job(job_id):
+    """
+    Writes the job's export, skipping any chunks a previous attempt completed.
+    """
+    job = ExportJob.objects.get(pk=job_id)
+    chunk_rows = get_export_job_settings()['CHUNK_ROWS']
+    try:
+        view = build_view(job)
+        fields = view.get_export_fields()
+        queryset = view.get_export_queryset()
+        # A total order keeps chunk boundaries stable across attempts.
+        ordering = list(queryset.query.order_by or queryset.model._meta.ordering)
+        queryset = queryset.order_by(*ordering, 'pk').using(db_router.choose_replica(analytics=True))
+
+        job_dir = get_job_dir(job.pk)
+        job_dir.mkdir(parents=True, exist_ok=True)
+        done = 0
+        while (job_dir / CHUNK_NAME.format(done)).exists():
+            done += 1
+        skip = done * chunk_rows
+
+        ExportJob.objects.filter(pk=job.pk).update(
+            status=ExportJob.STATUS_RUNNING, started_at=timezone.now(),
+            total_rows=queryset.count(), chunks_written=done, rows_written=skip,
+        )
+
+        rows = queryset.values_list(*view.get_export_values(fields))[skip:].iterator(chunk_size=min(chunk_rows, 5000))
+        index, written = done, skip
+        for chunk in iter_chunks(rows, chunk_rows):
+            write_chunk(job_dir / CHUNK_NAME.format(index), chunk, header=fields if index == 0 else None)
+            index += 1
+            written += len(chunk)
+            ExportJob.objects.filter(pk=job.pk).update(chunks_written=index, rows_written=written)
+        if index == 0:
+            write_chunk(job_dir / CHUNK_NAME.format(0), [], header=fields)
+            index = 1
+
+        artifact = job_dir / ARTIFACT_NAME
+        with open(artifact, 'wb') as out:
+            for i in range(index):
+                with open(job_dir / CHUNK_NAME.format(i), 'rb') as part:
+                    shutil.copyfileobj(part, out)
+        for i in range(index):
+            os.remove(job_dir / CHUNK_NAME.format(i))
+
+        ExportJob.objects.filter(pk=job.pk).update(
+            status=ExportJob.STATUS_COMPLETED, finished_at=timezone.now(), chunks_written=index,
+            file_path=str(artifact), file_size=artifact.stat().st_size,
+        )
+    except Exception as e:
+        logger.exception("Export job %s failed", job_id)
+        ExportJob.objects.filter(pk=job_id).update(
+            status=ExportJob.STATUS_FAILED, error=str(e), finished_at=timezone.now(),
+        )
+    finally:
+        if get_export_job_settings()['MAX_WORKERS'] > 0:
+            connections.close_all()
+
+
+def iter_file_range(fh, start, length):
+    with fh:
+        fh.seek(start)
+        while length > 0:
+            data = fh.read(min(READ_BLOCK_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
+
+def ranged_file_response(request, path, filename, content_type='application/octet-stream', etag=None):
+    """
+    Serves a file, honouring a single-range ``Range`` header so interrupted
+    downloads can be resumed.  An ``If-Range`` that does not match ``etag``
+    returns the full file, as RFC 7233 requires.
+    """
+    size = os.path.getsize(path)
+    range_header = request.META.get('HTTP_RANGE', '').strip()
+    if_range = request.META.get('HTTP_IF_RANGE')
+    match = RANGE_RE.match(range_header)
+    if range_header and (if_range is None or if_range == etag):
+        if not match or match.groups() == ('', ''):
+            match = None
+        if match:
+            first, last = match.groups()
+            if first:
+                start = int(first)
+                end = min(int(last), size - 1) if last else size - 1
+            else:
+                start = max(size - int(last), 0)
+                end = size - 1
+            if start >= size or start > end:
+                response = HttpResponse(status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+                response['Content-Range'] = f'bytes */{size}'
+                return response
+            length = end - start + 1
+            response = StreamingHttpResponse(
+                iter_file_range(open(path, 'rb'), start, length),
+                status=status.HTTP_206_PARTIAL_CONTENT, content_type=content_type,
+            )
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = str(length)
+            response['Content-Disposition'] = f'attachment; filename="{filename}"'
+            response['Accept-Ranges'] = 'bytes'
+            if etag:
+                response['ETag'] = etag
+            return response
+
+    response = FileResponse(open(path, 'rb'), as_attachment=True, filename=filename, content_type=content_type)
+    response['Accept-Ranges'] = 'bytes'
+    if etag:
+        response['ETag'] = etag
+    return response
+
+
+class ExportJobMixin:
+    """
+    Adds an ``export_job`` action that runs the CSV export in the background.
+    Requires CSVExportMixin, which provides the export columns and queryset.
+    """
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated], throttle_scope='export')
+    def export_job(self, request):
+        """
+        Endpoint to start a background CSV export with the list filters.
+        """
+        job, created = enqueue_export(self, request)
+        serializer = ExportJobSerializer(job, context=self.get_serializer_context())
+        return Response(
+            serializer.data,
+            status=status.HTTP_202_ACCEPTED if created else status.HTTP_200_OK,
+            headers={'Location': reverse('exportjob-detail', kwargs={'pk': job.pk})},
+        )
@@ -1,58 +1,148 @@
 import csv
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import render # Added to remove import error
 from django.conf import settings
 from django.shortcuts import redirect
 from django.urls import reverse
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, action
 from rest_framework.response import Response
 from rest_framework import status
 
+# Number of rows fetched per round trip.  On PostgreSQL QuerySet.iterator()
+# uses a server-side cursor, so this is also the most we ever hold in memory.
+EXPORT_CHUNK_SIZE = 2000
+
+
+class Echo:
+    """
+    File-like object that hands back whatever is written to it, so csv.writer
+    can be used to format single rows without buffering the whole file.
+    """
+    def write(self, value):
+        return value
+
+
+def iter_export_rows(queryset, fields, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Iterates over a queryset as plain value tuples, one chunk at a time.
+
+    Args:
+        queryset: The (already filtered and ordered) queryset to export.
+        fields: Field names or annotation names to fetch, in column order.
+        chunk_size: Number of rows fetched from the database per round trip.
+    Returns:
+        An iterator of tuples.
+    """
+    return queryset.values_list(*fields).iterator(chunk_size=chunk_size)
+
+
+def iter_csv(rows, header, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Formats rows as CSV text, yielding one string per chunk of rows.
+    """
+    writer = csv.writer(Echo())
+    buffer = [writer.writerow(header)]
+    for row in rows:
+        buffer.append(writer.writerow(row))
+        if len(buffer) >= chunk_size:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+def csv_streaming_response(rows, header, filename):
+    """
+    Builds a StreamingHttpResponse that writes the CSV as it is produced.
+
+    Args:
+        rows: An iterable of row tuples, typically from iter_export_rows.
+        header: A list of column names.
+        filename: The name of the CSV file (without the .csv extension).
+    Returns:
+        A Django StreamingHttpResponse with the CSV data.
+    """
+    response = StreamingHttpResponse(iter_csv(rows, header), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+    return response
+
+
 def export_to_csv(queryset, filename, header=None):
     """
     Exports a Django queryset to a CSV file.
 
+    Rows are streamed from a chunked values_list iterator, so memory use does
+    not depend on the size of the queryset.  Foreign keys are exported as
+    primary keys.
+
     Args:
         queryset: The Django queryset to export.
         filename: The name of the CSV file (without the .csv extension).
         header: (Optional) A list of field names for the CSV header.  If not
-            provided, the function will use the fields from the first object
-            in the queryset.
+            provided, the function will use the concrete fields of the
+            queryset's model.
     Returns:
-        A Django HttpResponse with the CSV data.
+        A Django StreamingHttpResponse with the CSV data.
     """
-    if not queryset:
+    if not queryset.exists():
         # Return a user-friendly message
         return HttpResponse("No data to export.", content_type="text/plain")
 
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
-
-    writer = csv.writer(response)
-    
-    if header:
-        writer.writerow(header)
-    else:
+    if not header:
         # Use the fields from the model
-        first_object = queryset.first()
-        if not first_object:
-            return HttpResponse("No data to export", content_type='text/plain')
-        
-        header = [field.name for field in first_object._meta.fields]
-        writer.writerow(header)
-
-    for obj in queryset:
-        row = []
-        for field_name in header:
-            try:
-                field_value = getattr(obj, field_name)
-                if callable(field_value):
-                    field_value = field_value()  # Handle callable attributes (e.g., methods)
-                row.append(field_value)
-            except AttributeError:
-                row.append('')  # Handle fields that don't exist on this object
-        writer.writerow(row)
-    return response
+        header = [field.name for field in queryset.model._meta.concrete_fields]
+
+    return csv_streaming_response(iter_export_rows(queryset, header), header, filename)
+
+
+class CSVExportMixin:
+    """
+    Adds a streaming ``export_csv`` action to a viewset.
+
+    The export goes through the viewset's filter backends, so it honours the
+    same filter, search and ordering query parameters as the list endpoint.
+    Columns default to the serializer's ``Meta.fields``; columns that are not
+    model fields (e.g. ``employee_name``) are provided as query expressions in
+    ``export_annotations``, and ``export_columns`` maps a column to the field
+    path its values are read from (e.g. ``department`` to
+    ``department__name``).
+    """
+    export_fields = None
+    export_annotations = {}
+    export_columns = {}
+    export_filename = None
+    throttle_scope = None  # Set to 'export' for the export action
+    analytics_actions = ('export_csv',)  # Read from the analytics replica, see utils/db_router.py
+
+    def get_export_fields(self):
+        if self.export_fields is not None:
+            return list(self.export_fields)
+        return list(self.get_serializer_class().Meta.fields)
+
+    def get_export_values(self, fields):
+        """
+        Returns the ``values_list`` arguments for the export ``fields``.
+        """
+        return [self.export_columns.get(field, field) for field in fields]
+
+    def get_export_filename(self):
+        return self.export_filename or self.basename
+
+    def get_export_queryset(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        if self.export_annotations:
+            queryset = queryset.annotate(**self.export_annotations)
+        return queryset
+
+    @action(detail=False, methods=['get'], throttle_scope='export')
+    def export_csv(self, request):
+        """
+        Endpoint to export the filtered records to CSV.
+        """
+        fields = self.get_export_fields()
+        rows = iter_export_rows(self.get_export_queryset(), self.get_export_values(fields))
+        return csv_streaming_response(rows, fields, self.get_export_filename())
+
 
 @api_view(['GET'])
 def export_employees_csv(request):
@@ -61,4 +151,4 @@ def export_employees_csv(request):
     """
     from employee_management.models import Employee  # Import here to avoid circular imports
     employees = Employee.objects.all()
-    return export_to_csv(employees, 'employees')
\ No newline at end of file
+    return export_to_csv(employees, 'employees')
@@ -0,0 +1,151 @@
+"""
+Helpers for the ``index_advisor`` management command: builds the list
+queries a viewset can run from its filter fields, ``ordering_fields``
+and ``search_fields``, and reads sequential scans and sorts out of their
+``EXPLAIN`` output.
+
+Each query is built by the viewset's own filter backends from a
+representative request, ordered the way KeysetPagination orders pages (the
+ordering with a primary key tiebreaker) and cut to one page, so a plan that
+still scans the table or sorts the matches means no index serves it.
+Filter values come from the middle row of the table.  Plans depend on table
+statistics: run against realistic data that has been analyzed.
+"""
+import re
+from collections import namedtuple
+from itertools import combinations
+
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+Check = namedtuple('Check', 'params plan problems')
+
+PAGE_SIZE = 10
+
+PG_SEQ_SCAN_RE = re.compile(r'\bSeq Scan on (\S+)')
+PG_SORT_RE = re.compile(r'^(?:->\s*)?Sort\s+\(')
+SQLITE_SCAN_RE = re.compile(r'\bSCAN (\S+)(.*)$')
+
+
+def plan_problems(vendor, plan, allow_sort=False, allow_scan=False):
+    """
+    Returns the sequential scans and sorts in an ``EXPLAIN`` plan as short
+    descriptions.  Only PostgreSQL and SQLite plans are understood.
+    """
+    problems = []
+    for line in plan.splitlines():
+        if vendor == 'postgresql':
+            node = line.strip()
+            match = PG_SEQ_SCAN_RE.search(node)
+            if match and not allow_scan:
+                problems.append(f'sequential scan on {match.group(1)}')
+            elif PG_SORT_RE.match(node) and not allow_sort:
+                problems.append('sort')
+        elif vendor == 'sqlite':
+            match = SQLITE_SCAN_RE.search(line)
+            # "SCAN t USING INDEX i" walks an index in order; virtual tables
+            # (the FTS5 search table) use their own index.
+            if match and 'USING' not in match.group(2) and 'VIRTUAL TABLE' not in match.group(2):
+                if match.group(1) != 'CONSTANT' and not allow_scan:
+                    problems.append(f'sequential scan on {match.group(1)}')
+            elif 'USE TEMP B-TREE FOR ORDER BY' in line and not allow_sort:
+                problems.append('sort')
+    return problems
+
+
+def keyset_ordered(queryset):
+    """
+    Orders ``queryset`` like a KeysetPagination page: the current ordering's
+    first term, or the model's default, then the primary key in the same
+    direction.
+    """
+    ordering = [str(term) for term in queryset.query.order_by or queryset.model._meta.ordering][:1]
+    if ordering and ordering[0].lstrip('-') in ('pk', 'id'):
+        return queryset.order_by(*ordering)
+    descending = bool(ordering) and ordering[0].startswith('-')
+    return queryset.order_by(*ordering, '-pk' if descending else 'pk')
+
+
+def param_value(value):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def sample_row(queryset, fields, count):
+    """
+    Returns ``{field: value}`` for the middle row of ``queryset`` by primary
+    key, which has ``count`` rows.
+    """
+    if not fields:
+        return {}
+    return queryset.order_by('pk').values(*fields)[count // 2]
+
+
+def filter_fields(viewset):
+    """
+    The model fields a viewset filters on by equality: its
+    ``filterset_fields``, or those its ``filterset_class`` generates.
+    """
+    filterset_class = getattr(viewset, 'filterset_class', None)
+    if filterset_class is None:
+        return list(getattr(viewset, 'filterset_fields', None) or [])
+    return [name for name in filterset_class._meta.fields or [] if name not in filterset_class.declared_filters]
+
+
+def representative_params(viewset, sample):
+    """
+    Yields ``(params, allow_sort)`` for the list requests to check: no
+    parameters, each filter field and each pair of them, each ordering field
+    alone and combined with each filter, and a search on a sampled value.
+    Search results are ranked, so sorting the matches is expected there.
+    """
+    names = [name for name in filter_fields(viewset) if name in sample]
+    ordering_fields = getattr(viewset, 'ordering_fields', None)
+    ordering_fields = ordering_fields if isinstance(ordering_fields, (list, tuple)) else []
+    filter_sets = [()] + [combo for size in (1, 2) for combo in combinations(names, size)]
+    for fields in filter_sets:
+        filters = {name: param_value(sample[name]) for name in fields}
+        yield filters, False
+        if len(fields) <= 1:
+            for ordering in ordering_fields:
+                yield {**filters, 'ordering': ordering}, False
+    search_fields = getattr(viewset, 'search_fields', None)
+    if search_fields and sample.get(search_fields[0]):
+        yield {'search': str(sample[search_fields[0]]).split()[0]}, True
+
+
+def check_viewset(viewset, user, vendor, min_rows=1):
+    """
+    Explains the representative list queries of ``viewset``.  Returns the
+    number of rows and a list of Checks, which is empty when there are fewer
+    than ``min_rows`` rows: planners rightly scan small tables.
+
+    Unfiltered pages are read from the start of the table or of an index, so
+    scans are only reported for filtered queries.
+    """
+    factory = APIRequestFactory()
+
+    def build_queryset(params):
+        view = viewset(action='list', format_kwarg=None, args=(), kwargs={})
+        request = Request(factory.get('/', params))
+        request.user = user
+        view.request = request
+        return view.filter_queryset(view.get_queryset())
+
+    base = build_queryset({})
+    count = base.count()
+    if count < max(min_rows, 1):
+        return count, []
+    fields = filter_fields(viewset)
+    fields += list(getattr(viewset, 'search_fields', None) or [])[:1]
+    sample = sample_row(base, list(dict.fromkeys(fields)), count)
+    checks = []
+    for params, allow_sort in representative_params(viewset, sample):
+        queryset = keyset_ordered(build_queryset(params))[:PAGE_SIZE]
+        plan = queryset.explain()
+        allow_scan = not set(params) - {'ordering'}
+        checks.append(Check(params, plan, plan_problems(vendor, plan, allow_sort, allow_scan)))
+    return count, checks
@@ -0,0 +1,161 @@
+"""
+Helpers for the ``loadtest`` management command: an in-process HTTP server
+for the project's WSGI or ASGI application, per-request query counting, and
+latency statistics.
+
+Query counts are collected server-side by ``QueryCountMiddleware``, keyed by
+the ``X-Loadtest-Request`` header the load generator sends, and read back
+by the client once it has received the whole response.  Queries run while a
+streaming response is being sent (e.g. CSV exports) are included.
+"""
+import math
+import threading
+import time
+from collections import namedtuple
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from utils.query_budget import QueryStats
+
+REQUEST_ID_HEADER = 'X-Loadtest-Request'
+
+# Request id -> number of queries, filled in by QueryCountMiddleware.
+QUERY_COUNTS = {}
+
+Summary = namedtuple('Summary', 'requests errors throttled p50 p95 p99 mean_queries')
+
+
+class QueryCountMiddleware:
+    """
+    Records how many queries each load test request ran in ``QUERY_COUNTS``.
+    Only installed by the ``loadtest`` command.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request_id = request.headers.get(REQUEST_ID_HEADER)
+        if request_id is None:
+            return self.get_response(request)
+        stats = QueryStats()
+        with stats.installed():
+            response = self.get_response(request)
+        return self.record(request_id, response, stats)
+
+    async def __acall__(self, request):
+        request_id = request.headers.get(REQUEST_ID_HEADER)
+        if request_id is None:
+            return await self.get_response(request)
+        stats = QueryStats()
+        async with stats.ainstalled():
+            response = await self.get_response(request)
+        return self.record(request_id, response, stats)
+
+    def record(self, request_id, response, stats):
+        if response.streaming and not getattr(response, 'is_async', False):
+            response.streaming_content = self.count_while_streaming(response.streaming_content, stats, request_id)
+        else:
+            QUERY_COUNTS[request_id] = stats.count
+        return response
+
+    @staticmethod
+    def count_while_streaming(content, stats, request_id):
+        try:
+            with stats.installed():
+                yield from content
+        finally:
+            QUERY_COUNTS[request_id] = stats.count
+
+
+class WSGIServerThread(threading.Thread):
+    """
+    Serves a WSGI application from Django's threaded development server in a
+    background thread, one thread per request, without request logging.
+    """
+
+    def __init__(self, application, host='127.0.0.1', port=0):
+        super().__init__(daemon=True)
+        from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+
+        class QuietHandler(WSGIRequestHandler):
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadedWSGIServer((host, port), QuietHandler, allow_reuse_address=True)
+        self.httpd.daemon_threads = True
+        self.httpd.set_app(application)
+        self.port = self.httpd.server_address[1]
+
+    def run(self):
+        self.httpd.serve_forever(poll_interval=0.1)
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class ASGIServerThread(threading.Thread):
+    """
+    Serves an ASGI application with uvicorn in a background thread.  uvicorn
+    is optional and only needed for ``loadtest --server asgi``.
+    """
+
+    def __init__(self, application, host='127.0.0.1', port=8765):
+        super().__init__(daemon=True)
+        import uvicorn
+
+        self.port = port
+        self.server = uvicorn.Server(uvicorn.Config(
+            application, host=host, port=port, log_level='warning', lifespan='off', access_log=False,
+        ))
+
+    def run(self):
+        self.server.run()
+
+    def wait_until_started(self, timeout=10):
+        deadline = time.monotonic() + timeout
+        while not self.server.started:
+            if time.monotonic() > deadline or not self.is_alive():
+                raise RuntimeError('uvicorn did not start')
+            time.sleep(0.05)
+
+    def stop(self):
+        self.server.should_exit = True
+        self.join(timeout=10)
+
+
+def percentile(sorted_values, fraction):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(samples):
+    """
+    Summarizes ``(latency_seconds, status, queries)`` samples.  Statuses of
+    0 (connection failures) and 400 or above are errors, except 429s, which
+    are counted as throttled.
+    """
+    latencies = sorted(latency for latency, _, _ in samples)
+    queries = [count for _, _, count in samples if count is not None]
+    return Summary(
+        requests=len(samples),
+        errors=sum(1 for _, status, _ in samples if status == 0 or (status >= 400 and status != 429)),
+        throttled=sum(1 for _, status, _ in samples if status == 429),
+        p50=percentile(latencies, 0.50),
+        p95=percentile(latencies, 0.95),
+        p99=percentile(latencies, 0.99),
+        mean_queries=sum(queries) / len(queries) if queries else None,
+    )
@@ -0,0 +1,202 @@
+"""
+Logging that never blocks the request path.
+
+Loggers are attached to one ``BackgroundQueueHandler`` (see ``LOGGING`` in
+settings.py).  In the thread that logs it only applies the sampling filter
+and puts the record, unformatted, on a bounded queue; a listener thread per
+process takes records off the queue and hands them to the real handlers
+(``targets``, by name), which format and write them.  Message arguments
+are interpolated by the listener, so they should not be mutated after they
+are logged.
+
+When the queue is full the record is dropped and counted rather than
+waiting for the listener; the listener logs how many were dropped once it
+catches up.  ``SamplingFilter`` keeps a fraction of the records of busy
+loggers (``sampling``, e.g. ``{'django.request': 0.1}`` for 4xx warnings);
+records at ERROR and above are always kept.
+
+``JSONFormatter`` writes one JSON object per record, with anything passed
+in ``extra`` as fields of its own.
+
+The listener is started on the first record a process logs, so processes
+forked by gunicorn start their own, and stopped, after writing out what is
+queued, when logging shuts down at exit.
+"""
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+from datetime import datetime, timezone
+
+# Attributes every LogRecord has; the others came from ``extra``.
+RECORD_ATTRIBUTES = frozenset(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    Formats a record as a single-line JSON object.
+    """
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'process': record.process,
+            'thread': record.thread,
+        }
+        for name, value in vars(record).items():
+            if name not in RECORD_ATTRIBUTES and not name.startswith('_'):
+                entry[name] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry['stack_info'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Passes one in every ``1 / rate`` records of each logger in ``rates``
+    (``{logger name: rate}``, covering the logger's children too), starting
+    with the first.  Records at ``always_level`` or above always pass.
+    """
+
+    def __init__(self, rates, always_level=logging.ERROR):
+        super().__init__()
+        self.rates = {name: float(rate) for name, rate in rates.items()}
+        self.always_level = always_level
+        self.sampled_out = 0
+        self._keys = {}  # Logger name -> entry of rates that applies, or None
+        self._credits = {}
+        self._lock = threading.Lock()
+
+    def get_key(self, name):
+        if name not in self._keys:
+            matches = [key for key in self.rates if name == key or name.startswith(f'{key}.')]
+            self._keys[name] = max(matches, key=len, default=None)
+        return self._keys[name]
+
+    def filter(self, record):
+        if record.levelno >= self.always_level:
+            return True
+        key = self.get_key(record.name)
+        if key is None or self.rates[key] >= 1:
+            return True
+        rate = self.rates[key]
+        with self._lock:
+            credit = self._credits.get(key, 1 - rate) + rate
+            passed = credit >= 1 - 1e-9
+            self._credits[key] = credit - 1 if passed else credit
+            if not passed:
+                self.sampled_out += 1
+        return passed
+
+
+class BackgroundListener(logging.handlers.QueueListener):
+    """
+    QueueListener that reports records its handler dropped.
+    """
+
+    def __init__(self, source, handlers):
+        super().__init__(source.queue, *handlers, respect_handler_level=True)
+        self.source = source
+        self.reported = source.dropped
+
+    def handle(self, record):
+        super().handle(record)
+        dropped = self.source.dropped
+        if dropped != self.reported:
+            count, self.reported = dropped - self.reported, dropped
+            super().handle(logging.makeLogRecord({
+                'name': __name__, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                'msg': 'Dropped %d log records: the logging queue was full', 'args': (count,),
+                'dropped': count,
+            }))
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)  # Waits for room, unlike put_nowait()
+
+
+class BackgroundQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queues records for a listener thread that passes them to ``targets``,
+    handlers or the names of configured handlers.  At most ``max_size``
+    records wait; more are dropped and counted in ``dropped``.
+    """
+
+    def __init__(self, targets=(), max_size=10000, sampling=None):
+        super().__init__(queue.Queue(max_size))
+        self.targets = self.get_targets(targets)
+        self.max_size = max_size
+        self.dropped = 0
+        self.sampling = SamplingFilter(sampling) if sampling else None
+        if self.sampling:
+            self.addFilter(self.sampling)
+        self.listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    @staticmethod
+    def get_targets(targets):
+        # Looked up now: handlers no logger uses are only kept by name while
+        # something else holds them.
+        handlers = []
+        for target in targets:
+            if isinstance(target, str):
+                name, target = target, logging._handlers.get(target)  # logging.getHandlerByName() from 3.12
+                if target is None:
+                    raise ValueError(f'No logging handler named {name!r}')
+            handlers.append(target)
+        return handlers
+
+    def start(self):
+        """
+        Starts this process's listener, if it has not yet.  A listener
+        inherited from the parent process has no thread here, and neither
+        has its queue's lock holder, so both are replaced.
+        """
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid != os.getpid():
+                if self._pid is not None:
+                    self.queue = queue.Queue(self.max_size)
+                self.listener = BackgroundListener(self, self.targets)
+                self.listener.start()
+                self._pid = os.getpid()
+
+    def emit(self, record):
+        try:
+            self.start()
+            self.enqueue(self.prepare(record))
+        except Exception:
+            self.handleError(record)
+
+    def prepare(self, record):
+        # Unlike QueueHandler.prepare(), leaves formatting to the listener.
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._start_lock:
+                self.dropped += 1
+
+    def flush(self):
+        """
+        Waits until the listener has handled every queued record.
+        """
+        if self._pid == os.getpid():
+            self.queue.join()
+
+    def close(self):
+        if self._pid == os.getpid():
+            self.listener.stop()
+            self._pid = None
+        super().close()
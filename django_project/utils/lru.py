@@ -0,0 +1,76 @@
+"""
+A thread-safe least-recently-used cache bounded by the total size of its
+values, for caches local to one process.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Maps keys to values, each stored with a size given by the caller (bytes
+    for the response cache; 1 per entry by default, bounding the number of
+    entries).  Setting a value evicts the least recently used entries until
+    the total size is at most ``max_size``; values larger than that on their
+    own are not stored.  With ``ttl`` (seconds), entries also expire.
+    """
+
+    def __init__(self, max_size, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.size = 0
+        self.hits = self.misses = self.evictions = 0
+        self._entries = OrderedDict()  # key -> (value, size, expires)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] is not None and entry[2] <= time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, size=1):
+        with self._lock:
+            self._remove(key)
+            if size > self.max_size:
+                return
+            expires = time.monotonic() + self.ttl if self.ttl is not None else None
+            self._entries[key] = (value, size, expires)
+            self.size += size
+            while self.size > self.max_size:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def delete_matching(self, predicate):
+        """
+        Removes the entries for which ``predicate(key, value)`` is true.
+        """
+        with self._lock:
+            for key in [key for key, (value, _, _) in self._entries.items() if predicate(key, value)]:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[1]
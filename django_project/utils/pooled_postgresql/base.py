@@ -0,0 +1,99 @@
+"""
+PostgreSQL database backend taking connections from a per-process pool (see
+utils/db_pool.py) instead of opening one for every request::
+
+    DATABASES = {
+        'default': {
+            'ENGINE': 'utils.pooled_postgresql',
+            ...
+            'POOL': {'MAX_SIZE': 20, 'TIMEOUT': 5},
+        }
+    }
+
+Connections are returned to the pool when Django closes them, so
+``CONN_MAX_AGE`` must be 0.  A connection is rolled back before it is
+returned; one closed inside ``atomic()`` or that failed is closed for real.
+Session state set with ``SET`` outlives the request, as it does with
+``CONN_MAX_AGE``.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.base.base import NO_DB_ALIAS
+from django.db.backends.postgresql import base, creation
+from django.utils.asyncio import async_unsafe
+
+from utils import db_pool
+
+IDLE, UNKNOWN = 0, 4  # Transaction statuses, the same in psycopg2 and psycopg 3
+
+
+def ping(connection):
+    """
+    Returns whether a connection answers ``SELECT 1``.
+    """
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        if connection.info.transaction_status != IDLE:
+            connection.rollback()
+    except base.Database.Error:
+        return False
+    return True
+
+
+def reset(connection):
+    """
+    Ends the transaction a connection is in.  Returns whether it can be
+    reused.
+    """
+    if connection.closed:
+        return False
+    status = connection.info.transaction_status
+    if status == UNKNOWN:
+        return False
+    if status != IDLE:
+        try:
+            connection.rollback()
+        except base.Database.Error:
+            return False
+    return True
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Idle connections to the test database would keep it from being dropped.
+        db_pool.close_idle_connections(test_database_name)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+    pool = None
+
+    def get_pool(self, conn_params):
+        if self.alias == NO_DB_ALIAS:
+            return None  # Connections to the maintenance database, e.g. to create the test database
+        if self.settings_dict['CONN_MAX_AGE'] != 0:
+            raise ImproperlyConfigured('The pooled PostgreSQL backend needs CONN_MAX_AGE = 0.')
+        options = {name.lower(): value for name, value in db_pool.get_pool_settings(self.settings_dict).items()}
+        connect = super().get_new_connection
+        return db_pool.get_pool(
+            self.alias, self.settings_dict['NAME'], repr(sorted(conn_params.items())),
+            lambda: db_pool.ConnectionPool(lambda: connect(conn_params), ping, **options),
+        )
+
+    @async_unsafe
+    def get_new_connection(self, conn_params):
+        self.pool = self.get_pool(conn_params)
+        if self.pool is None:
+            return super().get_new_connection(conn_params)
+        try:
+            return self.pool.get()
+        except db_pool.PoolTimeout as exc:
+            raise self.Database.OperationalError(str(exc)) from exc
+
+    def _close(self):
+        if self.connection is None or self.pool is None:
+            return super()._close()
+        # Closed inside atomic(), this wrapper still holds the connection.
+        reusable = not self.in_atomic_block and reset(self.connection)
+        self.pool.put(self.connection, reusable)
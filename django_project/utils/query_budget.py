@@ -0,0 +1,177 @@
+"""
+Per-request SQL query instrumentation and query budgets.
+
+``QueryBudgetMiddleware`` counts the queries each request runs and the time
+spent in them, including queries run while a streaming response is sent.
+With ``QUERY_BUDGET['HEADERS']`` (on by default when DEBUG is) the totals are
+returned in ``X-DB-Queries`` and ``X-DB-Time-Ms`` response headers; streaming
+responses have sent their headers before their queries finish, so they get
+no headers.
+
+Views declare budgets per viewset action in ``query_budgets``, e.g.
+``{'list': 5}``; other endpoints use ``QUERY_BUDGET['DEFAULT']`` (None for no
+budget).  Budgets count every query in the request, authentication and
+permission checks included.  A request over its budget is logged, or raises
+``QueryBudgetExceeded`` with ``QUERY_BUDGET['RAISE']``, which is meant for
+tests and development.
+
+``count_queries()`` gives the same numbers for a block of code.
+
+Under ASGI the middleware runs as a coroutine, so it does not hold a thread
+for async views.  Their queries run on the connections of the thread
+``sync_to_async`` gives the request, so that is where the counter goes.
+"""
+import logging
+import time
+from contextlib import ExitStack, asynccontextmanager, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+QUERY_BUDGET_DEFAULTS = {
+    'DEFAULT': None,
+    'HEADERS': None,  # None follows DEBUG
+    'RAISE': False,
+}
+
+QUERY_COUNT_HEADER = 'X-DB-Queries'
+QUERY_TIME_HEADER = 'X-DB-Time-Ms'
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def get_query_budget_settings():
+    return {**QUERY_BUDGET_DEFAULTS, **getattr(settings, 'QUERY_BUDGET', {})}
+
+
+class QueryStats:
+    """
+    ``connection.execute_wrapper`` callable that counts queries and the time
+    spent executing them.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+    @contextmanager
+    def installed(self):
+        """
+        Counts the queries run on every configured database during the block.
+        """
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(self))
+            yield self
+
+    @asynccontextmanager
+    async def ainstalled(self):
+        """
+        ``installed()`` for async code: counts the queries the async ORM and
+        ``sync_to_async`` run for the current request.
+        """
+        manager = self.installed()
+        await sync_to_async(manager.__enter__)()
+        try:
+            yield self
+        finally:
+            await sync_to_async(manager.__exit__)(None, None, None)
+
+
+def count_queries():
+    """
+    Context manager that yields a QueryStats counting the block's queries.
+    """
+    return QueryStats().installed()
+
+
+def get_query_budget(request, view_func):
+    """
+    Returns the budget for the viewset action handling ``request``, or the
+    default budget.
+    """
+    cls = getattr(view_func, 'cls', None)
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(request.method.lower())
+    budgets = getattr(cls, 'query_budgets', None) or {}
+    if action in budgets:
+        return budgets[action]
+    return get_query_budget_settings()['DEFAULT']
+
+
+class QueryBudgetMiddleware:
+    """
+    Counts each request's queries, reports them in response headers and
+    enforces the endpoint's query budget.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request.query_budget = None
+        stats = QueryStats()
+        with stats.installed():
+            response = self.get_response(request)
+        return self.process_stats(request, response, stats)
+
+    async def __acall__(self, request):
+        request.query_budget = None
+        stats = QueryStats()
+        async with stats.ainstalled():
+            response = await self.get_response(request)
+        return self.process_stats(request, response, stats)
+
+    def process_stats(self, request, response, stats):
+        if response.streaming and not getattr(response, 'is_async', False):
+            response.streaming_content = self.count_while_streaming(request, response.streaming_content, stats)
+            return response
+        self.check_budget(request, stats)
+        options = get_query_budget_settings()
+        if options['HEADERS'] if options['HEADERS'] is not None else settings.DEBUG:
+            response[QUERY_COUNT_HEADER] = str(stats.count)
+            response[QUERY_TIME_HEADER] = f'{stats.seconds * 1000:.1f}'
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = get_query_budget(request, view_func)
+
+    def count_while_streaming(self, request, content, stats):
+        with stats.installed():
+            yield from content
+        self.check_budget(request, stats)
+
+    def check_budget(self, request, stats):
+        budget = request.query_budget
+        if budget is None or stats.count <= budget:
+            return
+        if get_query_budget_settings()['RAISE']:
+            raise QueryBudgetExceeded(
+                f'{request.method} {request.path} ran {stats.count} queries '
+                f'({stats.seconds * 1000:.1f} ms), over its budget of {budget}'
+            )
+        logger.warning(
+            '%s %s ran %d queries (%.1f ms), over its budget of %d',
+            request.method, request.path, stats.count, stats.seconds * 1000, budget,
+            extra={'path': request.path, 'queries': stats.count, 'query_budget': budget},
+        )
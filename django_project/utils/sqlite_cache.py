@@ -0,0 +1,136 @@
+"""
+A Django cache backend in a SQLite file, shared by the processes of one host.
+
+``LocMemCache`` is private to each process, so under several gunicorn or
+uvicorn workers a counter bumped in one of them is never seen by the others.
+This backend keeps entries in a SQLite file in WAL mode (``LOCATION``), which
+every process on the host opens, for the small, hot keys the app shares
+between processes (the ``'shared'`` cache in settings.py).  Reads do
+not block writers; ``incr()`` reads and writes in one ``BEGIN IMMEDIATE``
+transaction, so concurrent increments are never lost.  Deployments on
+several hosts point those settings at a cache server instead.
+
+Values are pickled, as ``LocMemCache`` does.  Expired entries are ignored
+when read and deleted every ``CULL_EVERY`` writes per connection.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+CULL_EVERY = 1000  # Writes per connection between deletions of expired entries
+
+LIVE = '(expires IS NULL OR expires > ?)'
+
+
+class SQLiteCache(BaseCache):
+    """
+    Cache entries in a SQLite file, with a connection per thread and process.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.path = str(location)
+        self._local = threading.local()
+
+    def connection(self):
+        # Connections are not shared with processes forked after opening one.
+        if getattr(self._local, 'pid', None) != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            connection.execute('PRAGMA journal_mode = WAL')
+            connection.execute('PRAGMA synchronous = NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache_entry ('
+                ' key TEXT NOT NULL PRIMARY KEY, value BLOB NOT NULL, expires REAL'
+                ') WITHOUT ROWID'
+            )
+            self._local.connection, self._local.pid, self._local.writes = connection, os.getpid(), 0
+        return self._local.connection
+
+    def _written(self, connection):
+        self._local.writes += 1
+        if self._local.writes % CULL_EVERY == 0:
+            connection.execute('DELETE FROM cache_entry WHERE expires <= ?', (time.time(),))
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        connection = self.connection()
+        # Replaces an expired entry, and leaves a live one alone.
+        cursor = connection.execute(
+            'INSERT INTO cache_entry (key, value, expires) VALUES (?, ?, ?)'
+            ' ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires = excluded.expires'
+            ' WHERE cache_entry.expires IS NOT NULL AND cache_entry.expires <= ?',
+            (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), self.get_backend_timeout(timeout), time.time()),
+        )
+        self._written(connection)
+        return cursor.rowcount > 0
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self.connection().execute(
+            f'SELECT value FROM cache_entry WHERE key = ? AND {LIVE}', (key, time.time()),
+        ).fetchone()
+        return default if row is None else pickle.loads(row[0])
+
+    def get_many(self, keys, version=None):
+        keys = {self.make_and_validate_key(key, version=version): key for key in keys}
+        if not keys:
+            return {}
+        rows = self.connection().execute(
+            f'SELECT key, value FROM cache_entry WHERE key IN ({", ".join("?" * len(keys))}) AND {LIVE}',
+            (*keys, time.time()),
+        )
+        return {keys[key]: pickle.loads(value) for key, value in rows}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        rows = [
+            (self.make_and_validate_key(key, version=version), pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires)
+            for key, value in data.items()
+        ]
+        connection = self.connection()
+        connection.executemany('INSERT OR REPLACE INTO cache_entry (key, value, expires) VALUES (?, ?, ?)', rows)
+        self._written(connection)
+        return []
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self.connection().execute(
+            f'UPDATE cache_entry SET expires = ? WHERE key = ? AND {LIVE}',
+            (self.get_backend_timeout(timeout), key, time.time()),
+        )
+        return cursor.rowcount > 0
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self.connection().execute('DELETE FROM cache_entry WHERE key = ?', (key,)).rowcount > 0
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        connection = self.connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute(
+                f'SELECT value FROM cache_entry WHERE key = ? AND {LIVE}', (key, time.time()),
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            connection.execute(
+                'UPDATE cache_entry SET value = ? WHERE key = ?', (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), key),
+            )
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return value
+
+    def clear(self):
+        self.connection().execute('DELETE FROM cache_entry')
@@ -0,0 +1,60 @@
+"""
+The project's test runner (``TEST_RUNNER``).
+
+Tests count throttle hits in the store ``THROTTLE_STORE`` selects, as a
+deployment does, but a SQLite store gets a file of its own for the run,
+emptied before each test.  Users created by different tests get the same
+ids, so they would otherwise use up each other's rates, and those of
+earlier runs and of a server using the default file.  The ``'shared'``
+cache, when it is a SQLite file, is given one of its own in the same way.
+"""
+import tempfile
+import unittest
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import caches
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+from employee_management import throttling
+from utils.sqlite_cache import SQLiteCache
+
+SQLITE_CACHE_BACKEND = f'{SQLiteCache.__module__}.{SQLiteCache.__qualname__}'
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.store_directory = tempfile.TemporaryDirectory()
+        directory = Path(self.store_directory.name)
+        cache_settings = {
+            alias: {**options, 'LOCATION': str(directory / f'{alias}_cache.sqlite3')}
+            if options.get('BACKEND') == SQLITE_CACHE_BACKEND else options
+            for alias, options in settings.CACHES.items()
+        }
+        self.store_settings = override_settings(
+            THROTTLE_STORE={**settings.THROTTLE_STORE, 'PATH': directory / 'throttle.sqlite3'},
+            CACHES=cache_settings,
+        )
+        self.store_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.store_settings.disable()
+        self.store_directory.cleanup()
+        super().teardown_test_environment(**kwargs)
+
+    def get_resultclass(self):
+        resultclass = super().get_resultclass() or unittest.TextTestResult
+
+        class StoreResetResult(resultclass):
+            def startTest(self, test):
+                store = throttling.get_throttle_store()
+                if isinstance(store, throttling.SQLiteWindowStore):
+                    store.clear()
+                for alias in settings.CACHES:
+                    if isinstance(caches[alias], SQLiteCache):
+                        caches[alias].clear()
+                super().startTest(test)
+
+        return StoreResetResult